@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+
+"""
+Benchmark force interpolation and relaxation of the C++ core with the padded float32 force field layout against the
+default double layout.
+
+Run with ``python benchmarks/bench_ff_layout.py``.
+"""
+
+import time
+
+import numpy as np
+
+import ppafm.common as PPU
+import ppafm.core as core
+
+
+def make_ff(n=(120, 128, 128), seed=0):
+    rng = np.random.default_rng(seed)
+    nz, ny, nx = n
+    lvec = np.array([[0.0, 0.0, 0.0], [16.0, 0.0, 0.0], [0.0, 16.0, 0.0], [0.0, 0.0, 15.0]])
+    # Smooth periodic field with random phases
+    x, y, z = np.meshgrid(np.arange(nx) / nx, np.arange(ny) / ny, np.arange(nz) / nz, indexing="xy")
+    x, y, z = x.transpose(2, 0, 1), y.transpose(2, 0, 1), z.transpose(2, 0, 1)
+    FF = np.zeros((nz, ny, nx, 3))
+    for i in range(3):
+        for _ in range(4):
+            k = rng.integers(1, 4, size=3)
+            phase = rng.uniform(0, 2 * np.pi)
+            FF[..., i] += 0.01 * np.sin(2 * np.pi * (k[0] * x + k[1] * y + k[2] * z) + phase)
+    return FF, lvec
+
+
+def bench_interpolation(FF, lvec, n_points=2000000, n_repeat=3):
+    core.setFF_shape(FF.shape[:3], lvec)
+    rs = np.random.default_rng(1).uniform(-20.0, 40.0, size=(n_points, 3))
+    times = {}
+    for layout in ["double", "float32"]:
+        core.setFF_Fpointer(FF, layout=layout)
+        core.interpolateForces(rs[:10])  # Build the float32 copy outside of the timed region
+        ts = []
+        for _ in range(n_repeat):
+            t0 = time.perf_counter()
+            core.interpolateForces(rs)
+            ts.append(time.perf_counter() - t0)
+        times[layout] = min(ts)
+    return times
+
+
+def bench_relaxation(FF, lvec, n_repeat=3):
+    core.setFF_shape(FF.shape[:3], lvec)
+    core.setTip(lRadial=4.0, kRadial=20.0 / -PPU.eVA_Nm, rPP0=np.array([0.0, 0.0, 0.0]), kSpring=np.array([0.25, 0.25, 0.0]) / -PPU.eVA_Nm)
+    xs, ys, zs = np.linspace(0, 16, 50, endpoint=False), np.linspace(0, 16, 50, endpoint=False), np.linspace(12, 6, 40)
+    rTips = np.stack(np.meshgrid(xs, ys, zs, indexing="ij"), axis=-1).copy()
+    times = {}
+    for layout in ["double", "float32"]:
+        core.setFF_Fpointer(FF, layout=layout)
+        ts = []
+        for _ in range(n_repeat):
+            rs = np.zeros(rTips.shape)
+            fs = np.zeros(rTips.shape)
+            t0 = time.perf_counter()
+            core.relaxTipStrokes_omp(rTips, rs, fs)
+            ts.append(time.perf_counter() - t0)
+        times[layout] = min(ts)
+    return times
+
+
+if __name__ == "__main__":
+    FF, lvec = make_ff()
+    print(f"Force field grid: {FF.shape[:3]}")
+    for name, bench in [("interpolateForces", bench_interpolation), ("relaxTipStrokes_omp", bench_relaxation)]:
+        times = bench(FF, lvec)
+        print(f"{name} time (double): {times['double']:.4f} s")
+        print(f"{name} time (float32): {times['float32']:.4f} s")
+        print(f"{name} speed-up factor: {times['double'] / times['float32']:.2f}")
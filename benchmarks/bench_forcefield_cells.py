@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+
+"""
+Benchmark the cell-list variant of the OpenCL Lennard-Jones force field kernel against the all-atoms kernel on a large slab.
+
+Run with ``python benchmarks/bench_forcefield_cells.py``.
+"""
+
+import time
+
+import numpy as np
+
+import ppafm.common as PPU
+import ppafm.ocl.field as FFcl
+import ppafm.ocl.oclUtils as oclu
+
+
+def make_slab(n_xy, n_layers, a=2.5, seed=0):
+    rng = np.random.default_rng(seed)
+    ix, iy, iz = np.meshgrid(np.arange(n_xy), np.arange(n_xy), np.arange(n_layers), indexing="ij")
+    xyzs = np.stack([ix.ravel() * a, iy.ravel() * a, -iz.ravel() * a], axis=1).astype(np.float64)
+    xyzs += rng.uniform(-0.3, 0.3, size=xyzs.shape)
+    Zs = rng.choice([1, 6, 7, 8], size=len(xyzs))
+    qs = rng.uniform(-0.2, 0.2, size=len(xyzs))
+    return xyzs, Zs, qs
+
+
+def bench_addLJ(atoms, cLJs, lvec, use_cell_list, cutoff=10.0, n_repeat=3):
+    ff = FFcl.ForceField_LJC(use_cell_list=use_cell_list, cutoff=cutoff)
+    ff.initSampling(lvec, pixPerAngstrome=5)
+    ff.prepareBuffers(atoms, cLJs)
+    ts = []
+    for _ in range(n_repeat):
+        ff.initialize(bFinish=True)
+        t0 = time.perf_counter()
+        ff.addLJ()
+        ff.queue.finish()
+        ts.append(time.perf_counter() - t0)
+    FF = ff.downloadFF()
+    ff.tryReleaseBuffers()
+    return min(ts), FF
+
+
+if __name__ == "__main__":
+    oclu.init_env(i_platform=0)
+
+    xyzs, Zs, qs = make_slab(40, 3)
+    atoms = np.concatenate([xyzs, qs[:, None]], axis=1)
+    cLJs = PPU.REA2LJ(PPU.getAtomsREA(8, Zs, PPU.loadSpecies()))
+    lvec = np.array([[40.0, 40.0, 3.0], [20.0, 0, 0], [0, 20.0, 0], [0, 0, 6.0]])
+    print(f"Number of atoms: {len(atoms)}")
+
+    t_all, FF_all = bench_addLJ(atoms, cLJs, lvec, use_cell_list=False)
+    t_cell, FF_cell = bench_addLJ(atoms, cLJs, lvec, use_cell_list=True)
+    print(f"addLJ time (all atoms): {t_all:.4f} s")
+    print(f"addLJ time (cell list): {t_cell:.4f} s")
+    print(f"Speed-up factor: {t_all / t_cell:.2f}")
+    print(f"Max force difference: {np.abs(FF_cell[..., :3] - FF_all[..., :3]).max()}")
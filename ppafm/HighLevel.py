@@ -131,23 +131,80 @@ def relaxedScan3D_omp(xTips, yTips, zTips, trj=None, bF3d=False, tip_spline=None
     return fzs, rs
 
 
-def perform_relaxation(
-    lvec,
-    FFLJ,
-    FFel=None,
-    FFpauli=None,
-    FFboltz=None,
-    FFkpfm_t0sV=None,
-    FFkpfm_tVs0=None,
-    tip_spline=None,
-    bPPdisp=False,
-    bFFtotDebug=False,
-    parameters=None,
-):
+def relaxStrokes(xyTips, zTips, tip_spline=None):
+    """
+    Relax the probe particle along a set of approach strokes in parallel. The strokes do not have to lie on a regular grid,
+    and each stroke can have its own tip heights.
+
+    Arguments:
+        xyTips: np.ndarray of shape (n_strokes, 2). Lateral tip positions of the strokes relative to the grid origin.
+        zTips: np.ndarray of shape (n_strokes, nz). Tip heights of the strokes relative to the grid origin, in the order in
+            which they are relaxed (typically decreasing).
+        tip_spline: :class:`.SplineParameters` or None. Optional tip force spline.
+
+    Returns:
+        fs: np.ndarray of shape (n_strokes, nz, 3). Forces on the probe particle.
+        rs: np.ndarray of shape (n_strokes, nz, 3). Relaxed probe particle positions.
+    """
+    xyTips = np.asarray(xyTips, dtype=np.float64)
+    zTips = np.asarray(zTips, dtype=np.float64)
+    n, nz = zTips.shape
+    rTips = np.zeros((n, 1, nz, 3))
+    rTips[:, 0, :, 0] = xyTips[:, 0, None]
+    rTips[:, 0, :, 1] = xyTips[:, 1, None]
+    rTips[:, 0, :, 2] = zTips
+    rs = np.zeros(rTips.shape)
+    fs = np.zeros(rTips.shape)
+    core.relaxTipStrokes_omp(rTips, rs, fs, tip_spline=tip_spline)
+    return fs[:, 0], rs[:, 0]
+
+
+def relaxPoints(points, zStart, dz, tip_spline=None):
+    """
+    Relax the probe particle only at the given tip positions. The points are grouped into approach strokes by their lateral
+    position, and each stroke approaches the sample from the height zStart in steps of dz so that the probe particle follows
+    the same relaxation path as in a full scan.
+
+    Arguments:
+        points: np.ndarray of shape (n_points, 3). Tip positions relative to the grid origin.
+        zStart: float. Height relative to the grid origin where the approach starts.
+        dz: float. Height step of the approach.
+        tip_spline: :class:`.SplineParameters` or None. Optional tip force spline.
+
+    Returns:
+        fs: np.ndarray of shape (n_points, 3). Forces on the probe particle at the points.
+        rs: np.ndarray of shape (n_points, 3). Relaxed probe particle positions at the points.
+    """
+    points = np.asarray(points, dtype=np.float64)
+    xyTips, inds = np.unique(points[:, :2], axis=0, return_inverse=True)
+    inds = inds.ravel()
+    strokes = []
+    for i in range(len(xyTips)):
+        zs = points[inds == i, 2]
+        zs_approach = np.arange(zStart, zs.min(), -dz)
+        zs_approach = zs_approach[np.abs(zs_approach[:, None] - zs[None, :]).min(axis=1) > 1e-6 * dz]
+        strokes.append(np.unique(np.concatenate([zs_approach, zs]))[::-1])
+
+    # Strokes are padded to equal length by repeating the starting height
+    nz = max(len(zs) for zs in strokes)
+    zTips = np.empty((len(strokes), nz))
+    for i, zs in enumerate(strokes):
+        zTips[i, : nz - len(zs)] = zs[0]
+        zTips[i, nz - len(zs) :] = zs
+    fs, rs = relaxStrokes(xyTips, zTips, tip_spline=tip_spline)
+
+    iz = np.empty(len(points), dtype=np.int64)
+    for i, zs in enumerate(strokes):
+        mask = inds == i
+        iz[mask] = nz - len(zs) + np.searchsorted(-zs, -points[mask, 2])
+    return fs[inds, iz], rs[inds, iz]
+
+
+def _setupRelaxation(lvec, FFLJ, FFel, FFpauli, FFboltz, FFkpfm_t0sV, FFkpfm_tVs0, bFFtotDebug, parameters):
+    """
+    Sum the force field components into the total force field and set it and the tip parameters for the relaxation.
+    """
     global FF  # We need FF global otherwise it is garbage collected and program crashes inside C++ e.g. in stiffnessMatrix()
-    if verbose > 0:
-        print(">>>BEGIN: perform_relaxation()")
-    xTips, yTips, zTips, lvecScan = PPU.prepareScanGrids(parameters=parameters)
     FF = FFLJ.copy()
     if FFel is not None:
         FF += FFel * parameters.charge
@@ -161,16 +218,42 @@ def perform_relaxation(
         FF += FFpauli * parameters.Apauli
     if FFboltz != None:
         FF += FFboltz
-    if bFFtotDebug:
-        io.save_vec_field("FFtotDebug", FF, lvec)
     core.setFF_shape(np.shape(FF), lvec, parameters=parameters)
-    core.setFF_Fpointer(FF)
+    if FF.ndim == 3:
+        # energy grids, the forces are taken from the gradient of the B-spline fitted to the total energy
+        if bFFtotDebug:
+            io.save_scal_field("EtotDebug", FF, lvec)
+        core.setFF_Epointer(FF)
+        core.setFF_layout("energy")
+    else:
+        if bFFtotDebug:
+            io.save_vec_field("FFtotDebug", FF, lvec)
+        core.setFF_Fpointer(FF, layout=parameters.ffLayout)
     if (np.array(parameters.stiffness) < 0.0).any():
         parameters.stiffness = np.array([parameters.klat, parameters.klat, parameters.krad])
     if verbose > 0:
         print("stiffness:", parameters.stiffness)
     core.setTip(kSpring=np.array((parameters.stiffness[0], parameters.stiffness[1], 0.0)) / -PPU.eVA_Nm, kRadial=parameters.stiffness[2] / -PPU.eVA_Nm, parameters=parameters)
 
+
+def perform_relaxation(
+    lvec,
+    FFLJ,
+    FFel=None,
+    FFpauli=None,
+    FFboltz=None,
+    FFkpfm_t0sV=None,
+    FFkpfm_tVs0=None,
+    tip_spline=None,
+    bPPdisp=False,
+    bFFtotDebug=False,
+    parameters=None,
+):
+    if verbose > 0:
+        print(">>>BEGIN: perform_relaxation()")
+    xTips, yTips, zTips, lvecScan = PPU.prepareScanGrids(parameters=parameters)
+    _setupRelaxation(lvec, FFLJ, FFel, FFpauli, FFboltz, FFkpfm_t0sV, FFkpfm_tVs0, bFFtotDebug, parameters)
+
     # grid origin has to be moved to zero, hence the subtraction of lvec[0,:] from trj and xTip, yTips, zTips
     trj = None
     if parameters.tiltedScan:
@@ -193,23 +276,146 @@ def perform_relaxation(
         print("<<<END: perform_relaxation()")
 
     core.deleteFF_Fpointer()
+    core.deleteFF_Epointer()
 
     return fzs, PPpos, PPdisp, lvecScan
 
 
+def perform_relaxation_points(
+    lvec,
+    points,
+    FFLJ,
+    FFel=None,
+    FFpauli=None,
+    FFboltz=None,
+    FFkpfm_t0sV=None,
+    FFkpfm_tVs0=None,
+    tip_spline=None,
+    bFFtotDebug=False,
+    dFFs=None,
+    dTip=None,
+    parameters=None,
+):
+    """
+    Same as :func:`perform_relaxation`, but the probe particle is relaxed only at the given tip positions instead of the
+    full scan grid. See :func:`relaxPoints`. The approach starts at the top of the scan (parameters.scanMax) and proceeds in
+    steps of parameters.scanStep.
+
+    Arguments:
+        lvec: np.ndarray of shape (4, 3). Origin and lattice vectors of the force field grid.
+        points: np.ndarray of shape (n_points, 3). Tip positions.
+        FFLJ, FFel, FFpauli, FFboltz, FFkpfm_t0sV, FFkpfm_tVs0, tip_spline, bFFtotDebug, parameters: See :func:`perform_relaxation`.
+        dFFs, dTip: Parameters for which the sensitivities of the forces are computed. See :func:`relaxationSensitivities`.
+
+    Returns:
+        fs: np.ndarray of shape (n_points, 3). Forces on the probe particle at the points.
+        PPpos: np.ndarray of shape (n_points, 3). Relaxed probe particle positions.
+        dfs: dict or None. Derivatives of fs with respect to the parameters in dFFs and dTip. None if no parameters are given.
+    """
+    if verbose > 0:
+        print(">>>BEGIN: perform_relaxation_points()")
+    _setupRelaxation(lvec, FFLJ, FFel, FFpauli, FFboltz, FFkpfm_t0sV, FFkpfm_tVs0, bFFtotDebug, parameters)
+    points = shift_positions(points, -lvec[0])
+    zStart = max(parameters.scanMax[2] - lvec[0, 2], points[:, 2].max())
+    fs, PPpos = relaxPoints(points, zStart, parameters.scanStep[2], tip_spline=tip_spline)
+    if dFFs or dTip:
+        dfs = relaxationSensitivities(points, PPpos, dFFs=dFFs, dTip=dTip, tip_spline=tip_spline, parameters=parameters)
+    else:
+        dfs = None
+    PPpos = shift_positions(PPpos, lvec[0])
+    if verbose > 0:
+        print("<<<END: perform_relaxation_points()")
+
+    core.deleteFF_Fpointer()
+    core.deleteFF_Epointer()
+
+    return fs, PPpos, dfs
+
+
+def relaxationSensitivities(rTips, rPPs, dFFs=None, dTip=None, ddisp=0.05, tip_spline=None, parameters=None):
+    """
+    Compute the derivatives of the forces on the relaxed probe particle with respect to model parameters. At equilibrium, the total
+    force G(r, p) = F(r, p) + F_tip(r, p) on the probe particle vanishes, so by the implicit-function theorem the relaxed position
+    changes as dr/dp = D^-1 dG/dp, where D = -dG/dr is the dynamical matrix (see :func:`.core.dynamicalMatrices`). The derivative of
+    the force field force F(r(p), p) is then dF/dp + (dF/dr) dr/dp.
+
+    The total force field and the tip have to be set up for the relaxation before calling this function, as in :func:`perform_relaxation_points`.
+
+    Arguments:
+        rTips: np.ndarray of shape (n, 3). Tip positions relative to the grid origin.
+        rPPs: np.ndarray of shape (n, 3). Relaxed probe particle positions relative to the grid origin.
+        dFFs: dict or None. Maps parameter names to the derivatives of the total force field with respect to the parameter,
+            e.g. {'charge': FFel} or the grids from :func:`assembleLJFFDerivatives`. Energy grids are used for energy force fields.
+        dTip: list of str or None. Tip parameters, any of 'klat' and 'krad'. The derivatives are per N/m of stiffness.
+        ddisp: float. Displacement used for the finite differences of the forces.
+        tip_spline: :class:`.SplineParameters` or None. Optional tip force spline.
+        parameters: :class:`.PpafmParameters`. Used for the force field layout and the tip geometry.
+
+    Returns:
+        dfs: dict. Maps the parameter names to arrays of shape (n, 3) of derivatives of the forces.
+    """
+    rTips = np.asarray(rTips, dtype=np.float64)
+    rPPs = np.asarray(rPPs, dtype=np.float64)
+    dynmats = core.dynamicalMatrices(rTips, rPPs, ddisp=ddisp, tip_spline=tip_spline)
+    dFdr = np.empty(dynmats.shape)  # dFdr[i, k, j] = dF_k / dr_j
+    for j in range(3):
+        d = np.zeros(3)
+        d[j] = ddisp
+        dFdr[:, :, j] = (core.interpolateForces(rPPs + d) - core.interpolateForces(rPPs - d)) / (2 * ddisp)
+
+    # Partial derivatives of the force field force and the total force
+    dF = {}
+    dG = {}
+    drTip = rPPs - rTips
+    for name in dTip or []:
+        dF[name] = np.zeros_like(rPPs)
+        if name == "klat":
+            dG[name] = (drTip - np.array([parameters.r0Probe[0], parameters.r0Probe[1], 0.0])) * np.array([1.0, 1.0, 0.0]) / -PPU.eVA_Nm
+        elif name == "krad":
+            if tip_spline is not None:
+                raise ValueError("Sensitivity with respect to krad is not available with a tip force spline")
+            l = np.linalg.norm(drTip, axis=1, keepdims=True)
+            dG[name] = drTip * (l - parameters.r0Probe[2]) / l / -PPU.eVA_Nm
+        else:
+            raise ValueError(f"Unknown tip parameter `{name}`")
+    for name, dFF in (dFFs or {}).items():
+        if dFF.ndim == 3:
+            core.setFF_Epointer(dFF)
+            core.setFF_layout("energy")
+        else:
+            core.setFF_Fpointer(dFF, layout=parameters.ffLayout)
+        dF[name] = core.interpolateForces(rPPs)
+        dG[name] = dF[name]
+    core.deleteFF_Fpointer()
+    core.deleteFF_Epointer()
+
+    dfs = {}
+    for name in dF:
+        dr = np.linalg.solve(dynmats.transpose(0, 2, 1), dG[name][..., None])
+        dfs[name] = dF[name] + (dFdr @ dr)[..., 0]
+    return dfs
+
+
 # ==== Forcefield grid generation
 
 
-def prepareArrays(FF, Vpot, parameters):
+def prepareArrays(FF, Vpot, parameters, computeForce=True):
     if parameters.gridN[0] <= 0:
         PPU.autoGridN()
-    if FF is None:
+    if not computeForce:
+        # energy-only mode, make sure that no stale force field array is written into
+        gridN = parameters.gridN
+        FF = None
+        core.deleteFF_Fpointer()
+        Vpot = True
+    elif FF is None:
         gridN = parameters.gridN
         FF = np.zeros((gridN[2], gridN[1], gridN[0], 3))
+        core.setFF_Fpointer(FF)
     else:
         gridN = np.shape(FF)
         parameters.gridN = gridN
-    core.setFF_Fpointer(FF)
+        core.setFF_Fpointer(FF)
     if Vpot:
         V = np.zeros((gridN[2], gridN[1], gridN[0]))
         core.setFF_Epointer(V)
@@ -218,7 +424,9 @@ def prepareArrays(FF, Vpot, parameters):
     return FF, V
 
 
-def computeLJ(geomFile, speciesFile, geometry_format=None, save_format=None, computeVpot=False, Fmax=Fmax_DEFAULT, Vmax=Vmax_DEFAULT, ffModel="LJ", parameters=None):
+def computeLJ(
+    geomFile, speciesFile, geometry_format=None, save_format=None, computeVpot=False, Fmax=Fmax_DEFAULT, Vmax=Vmax_DEFAULT, ffModel="LJ", computeForce=True, parameters=None
+):
     if verbose > 0:
         print(">>>BEGIN: computeLJ()")
     # --- load species (LJ potential)
@@ -234,10 +442,12 @@ def computeLJ(geomFile, speciesFile, geometry_format=None, save_format=None, com
     # --- prepare LJ parameters
     iPP = PPU.atom2iZ(parameters.probeType, elem_dict)
     # --- prepare arrays and compute
-    FF, V = prepareArrays(None, computeVpot, parameters=parameters)
+    computeVpot = computeVpot or not computeForce
+    FF, V = prepareArrays(None, computeVpot, parameters=parameters, computeForce=computeForce)
+    grid = FF if computeForce else V
     if verbose > 0:
-        print("FFLJ.shape", FF.shape)
-    core.setFF_shape(np.shape(FF), lvec, parameters=parameters)
+        print("FFLJ.shape", grid.shape)
+    core.setFF_shape(np.shape(grid)[:3], lvec, parameters=parameters)
 
     # shift atoms to the coordinate system in which the grid origin is zero
     Rs0 = shift_positions(Rs, -lvec[0])
@@ -257,7 +467,7 @@ def computeLJ(geomFile, speciesFile, geometry_format=None, save_format=None, com
         cLJs = PPU.getAtomsLJ(iPP, iZs, FFparams)
         core.getLennardJonesFF(Rs0, cLJs)  # THE MAIN STUFF HERE
     # --- post porces FFs
-    if Fmax is not None:
+    if (Fmax is not None) and computeForce:
         if verbose > 0:
             print("Clamp force >", Fmax)
         io.limit_vec_field(FF, Fmax=Fmax)
@@ -269,7 +479,8 @@ def computeLJ(geomFile, speciesFile, geometry_format=None, save_format=None, com
     if save_format is not None:
         if verbose > 0:
             print("computeLJ Save ", save_format)
-        io.save_vec_field("FF" + ffModel, FF, lvec, data_format=save_format, head=atomstring, atomic_info=(atoms[:4], lvec))
+        if computeForce:
+            io.save_vec_field("FF" + ffModel, FF, lvec, data_format=save_format, head=atomstring, atomic_info=(atoms[:4], lvec))
         if computeVpot:
             io.save_scal_field("E" + ffModel, V, lvec, data_format=save_format, head=atomstring, atomic_info=(atoms[:4], lvec))
     if verbose > 0:
@@ -277,7 +488,125 @@ def computeLJ(geomFile, speciesFile, geometry_format=None, save_format=None, com
     return FF, V, nDim, lvec
 
 
-def computeDFTD3(input_file, df_params="PBE", geometry_format=None, save_format=None, compute_energy=False, parameters=None):
+def computeLJBasis(iZs, Rs, lvec, computeVpot=False, parameters=None):
+    """
+    Compute per-species basis grids of the Lennard-Jones force field. At fixed geometry the Lennard-Jones force field
+    is linear in the C6 and C12 coefficients, so the basis grids have to be computed only once, after which the force
+    field for any set of species parameters can be assembled as a weighted sum with :func:`assembleLJFF`.
+
+    Arguments:
+        iZs: np.ndarray of shape (n_atoms,). Species indices of the atoms (as returned by :func:`.parseAtoms`).
+        Rs: np.ndarray of shape (n_atoms, 3). Atom positions.
+        lvec: np.ndarray of shape (4, 3). Origin and lattice vectors of the force field grid.
+        computeVpot: bool. Whether to also compute the energy basis grids.
+        parameters: :class:`.PpafmParameters`. The grid size is taken from parameters.gridN.
+
+    Returns:
+        basis: dict. Maps each species index to a tuple (FF6, FF12, V6, V12) of the force fields and energies of all atoms
+            of the species with unit C6 and C12 coefficients, respectively. V6 and V12 are None if computeVpot is False.
+    """
+    if verbose > 0:
+        print(">>>BEGIN: computeLJBasis()")
+    iZs = np.array(iZs)
+    Rs0 = shift_positions(Rs, -lvec[0])
+    gridN = parameters.gridN
+    core.setFF_shape((gridN[2], gridN[1], gridN[0]), lvec, parameters=parameters)
+    basis = {}
+    for iZ in np.unique(iZs):
+        mask = iZs == iZ
+        grids = []
+        for cLJ in [(1.0, 0.0), (0.0, 1.0)]:
+            FF, V = prepareArrays(None, computeVpot, parameters=parameters)
+            core.getLennardJonesFF(Rs0[mask].copy(), np.tile(cLJ, (mask.sum(), 1)))
+            grids.append((FF, V))
+        basis[int(iZ)] = (grids[0][0], grids[1][0], grids[0][1], grids[1][1])
+    core.deleteFF_Fpointer()
+    core.deleteFF_Epointer()
+    if verbose > 0:
+        print("<<<END: computeLJBasis()")
+    return basis
+
+
+def assembleLJFF(basis, iPP, FFparams, Fmax=Fmax_DEFAULT, Vmax=Vmax_DEFAULT, FF=None):
+    """
+    Assemble the Lennard-Jones force field for the given species parameters from the basis grids computed by :func:`computeLJBasis`.
+
+    Arguments:
+        basis: dict. Per-species basis grids.
+        iPP: int. Species index of the probe particle.
+        FFparams: np.ndarray. Species parameters, as returned by :func:`.loadSpecies`.
+        Fmax: float or None. Clamp force magnitudes larger than this value.
+        Vmax: float or None. Clamp energies larger than this value.
+        FF: np.ndarray or None. Optional preallocated output array for the force field.
+
+    Returns:
+        FF: np.ndarray of shape (nz, ny, nx, 3). Lennard-Jones force field.
+        V: np.ndarray of shape (nz, ny, nx) or None. Lennard-Jones energy, if the basis contains the energies.
+    """
+    FF6, _, V6, _ = next(iter(basis.values()))
+    if FF is None:
+        FF = np.zeros_like(FF6)
+    else:
+        FF[:] = 0
+    V = None if V6 is None else np.zeros_like(V6)
+    for iZ, (FF6, FF12, V6, V12) in basis.items():
+        c6, c12 = PPU.get_C612(iPP - 1, iZ - 1, FFparams)
+        FF += c6 * FF6
+        FF += c12 * FF12
+        if V is not None:
+            V += c6 * V6
+            V += c12 * V12
+    if Fmax is not None:
+        io.limit_vec_field(FF, Fmax=Fmax)
+    if (Vmax is not None) and (V is not None):
+        V[V > Vmax] = Vmax
+    return FF, V
+
+
+def assembleLJFFDerivatives(basis, iPP, FFparams, iZ, Fmax=Fmax_DEFAULT):
+    """
+    Assemble the derivatives of the Lennard-Jones force field with respect to the parameters of one species from the basis grids
+    computed by :func:`computeLJBasis`.
+
+    Arguments:
+        basis: dict. Per-species basis grids.
+        iPP: int. Species index of the probe particle.
+        FFparams: np.ndarray. Species parameters, as returned by :func:`.loadSpecies`.
+        iZ: int. Species index of the species whose parameters are differentiated. Can also be the probe particle species.
+        Fmax: float or None. Force clamping used in :func:`assembleLJFF`, which is taken into account in the derivatives.
+
+    Returns:
+        dFF_dR: np.ndarray of shape (nz, ny, nx, 3). Derivative of the force field with respect to rmin of the species.
+        dFF_dE: np.ndarray of shape (nz, ny, nx, 3). Derivative of the force field with respect to epsilon of the species.
+    """
+    FF6 = next(iter(basis.values()))[0]
+    dFF_dR = np.zeros_like(FF6)
+    dFF_dE = np.zeros_like(FF6)
+    for jZ, (FF6, FF12, _, _) in basis.items():
+        # The pair parameters depend on the species parameters through the mixing rules R = R_pp + R_s and E = sqrt(E_pp * E_s)
+        w = (iZ == iPP) + (iZ == jZ)
+        if w == 0:
+            continue
+        R = FFparams[iPP - 1][0] + FFparams[jZ - 1][0]
+        E = np.sqrt(FFparams[iPP - 1][1] * FFparams[jZ - 1][1])
+        dFF_dR += (w * 12 * E * R**5) * FF6
+        dFF_dR += (w * 12 * E * R**11) * FF12
+        dE = w * E / (2 * FFparams[iZ - 1][1])
+        dFF_dE += (dE * 2 * R**6) * FF6
+        dFF_dE += (dE * R**12) * FF12
+    if Fmax is not None:
+        # derivative of the clamping Fmax * F / |F|, which is Fmax / |F| * (dF - n (n . dF)) with n = F / |F|
+        FF, _ = assembleLJFF(basis, iPP, FFparams, Fmax=None, Vmax=None)
+        FR = np.sqrt((FF**2).sum(axis=-1))
+        mask = FR > Fmax
+        n = FF[mask] / FR[mask, None]
+        for dFF in [dFF_dR, dFF_dE]:
+            dF = dFF[mask]
+            dFF[mask] = (Fmax / FR[mask, None]) * (dF - n * (n * dF).sum(axis=-1, keepdims=True))
+    return dFF_dR, dFF_dE
+
+
+def computeDFTD3(input_file, df_params="PBE", geometry_format=None, save_format=None, compute_energy=False, compute_force=True, parameters=None):
     """
     Compute the Grimme DFT-D3 force field and optionally save to a file. See also :meth:`.add_dftd3`.
 
@@ -287,12 +616,14 @@ def computeDFTD3(input_file, df_params="PBE", geometry_format=None, save_format=
             that can be either 'xsf' or 'npy'.
         compute_energy: bool. In addition to force, also compute the energy. The energy is saved to file Evdw if save format
             is not None.
+        compute_force: bool. If False, only the energy is computed (implies compute_energy=True) and FF is None. The forces
+            can then be taken from the energy during the relaxation with the 'energy' force field layout.
         df_params: str or dict. Functional-specific scaling parameters. Can be a str with the
             functional name or a dict with manually specified parameters.
 
     Returns:
-        FF: np.ndarray of shape (nx, ny, nz, 3). Force field.
-        V: np.ndarray of shape (nx, ny, nz) or None. Energy, if compute_energy == True.
+        FF: np.ndarray of shape (nx, ny, nz, 3) or None. Force field, if compute_force == True.
+        V: np.ndarray of shape (nx, ny, nz) or None. Energy, if compute_energy == True or compute_force == False.
         lvec: np.ndarray of shape (4, 3). Origin and lattice vectors of the force field.
     """
 
@@ -307,21 +638,23 @@ def computeDFTD3(input_file, df_params="PBE", geometry_format=None, save_format=
     coeffs = core.computeD3Coeffs(Rs, iZs, iPP, df_params)
 
     # Compute the force field
-    FF, V = prepareArrays(None, compute_energy, parameters=parameters)
-    core.setFF_shape(np.shape(FF), lvec, parameters=parameters)
+    compute_energy = compute_energy or not compute_force
+    FF, V = prepareArrays(None, compute_energy, parameters=parameters, computeForce=compute_force)
+    core.setFF_shape(np.shape(FF if compute_force else V)[:3], lvec, parameters=parameters)
     core.getDFTD3FF(shift_positions(Rs, -lvec[0]), coeffs)
 
     # Save to file
     if save_format is not None:
         atom_string = io.primcoords2Xsf(PPU.atoms2iZs(atoms[0], elem_dict), atoms[1:4], lvec)
-        io.save_vec_field("FFvdW", FF, lvec, data_format=save_format, head=atom_string, atomic_info=(atoms[:4], lvec))
+        if compute_force:
+            io.save_vec_field("FFvdW", FF, lvec, data_format=save_format, head=atom_string, atomic_info=(atoms[:4], lvec))
         if compute_energy:
             io.save_scal_field("EvdW", V, lvec, data_format=save_format, head=atom_string, atomic_info=(atoms[:4], lvec))
 
     return FF, V, lvec
 
 
-def computeELFF_pointCharge(geomFile, geometry_format=None, tip="s", save_format=None, computeVpot=False, Fmax=Fmax_DEFAULT, Vmax=Vmax_DEFAULT, parameters=None):
+def computeELFF_pointCharge(geomFile, geometry_format=None, tip="s", save_format=None, computeVpot=False, Fmax=Fmax_DEFAULT, Vmax=Vmax_DEFAULT, computeForce=True, parameters=None):
     if verbose > 0:
         print(">>>BEGIN: computeELFF_pointCharge()")
     tipKinds = {"s": 0, "pz": 1, "dz2": 2}
@@ -339,15 +672,16 @@ def computeELFF_pointCharge(geomFile, geometry_format=None, tip="s", save_format
     if verbose > 0:
         print(parameters.gridN, parameters.gridA, parameters.gridB, parameters.gridC)
     _, Rs, Qs = PPU.parseAtoms(atoms, elem_dict=elem_dict, autogeom=False, PBC=parameters.PBC, lvec=lvec, parameters=parameters)
-    FF, V = prepareArrays(None, computeVpot, parameters=parameters)
-    core.setFF_shape(np.shape(FF), lvec, parameters=parameters)
+    computeVpot = computeVpot or not computeForce
+    FF, V = prepareArrays(None, computeVpot, parameters=parameters, computeForce=computeForce)
+    core.setFF_shape(np.shape(FF if computeForce else V)[:3], lvec, parameters=parameters)
 
     # shift atoms to the coordinate system in which the grid origin is zero
     Rs0 = shift_positions(Rs, -lvec[0])
 
     core.getCoulombFF(Rs0, Qs * PPU.CoulombConst, kind=tipKind)  # THE MAIN STUFF HERE
     # --- post porces FFs
-    if Fmax is not None:
+    if (Fmax is not None) and computeForce:
         if verbose > 0:
             print("Clamp force >", Fmax)
         io.limit_vec_field(FF, Fmax=Fmax)
@@ -359,7 +693,8 @@ def computeELFF_pointCharge(geomFile, geometry_format=None, tip="s", save_format
     if save_format is not None:
         if verbose > 0:
             print("computeLJ Save ", save_format)
-        io.save_vec_field("FFel", FF, lvec, data_format=save_format, head=atomstring, atomic_info=(atoms[:4], lvec))
+        if computeForce:
+            io.save_vec_field("FFel", FF, lvec, data_format=save_format, head=atomstring, atomic_info=(atoms[:4], lvec))
         if computeVpot:
             io.save_scal_field("Vel", V, lvec, data_format=save_format, head=atomstring, atomic_info=(atoms[:4], lvec))
     if verbose > 0:
@@ -367,7 +702,7 @@ def computeELFF_pointCharge(geomFile, geometry_format=None, tip="s", save_format
     return FF, V, nDim, lvec
 
 
-def computeElFF(V, lvec, nDim, tip, computeVpot=False, tilt=0.0, sigma=None, deleteV=True, parameters=None):
+def computeElFF(V, lvec, nDim, tip, computeVpot=False, tilt=0.0, sigma=None, deleteV=True, computeForce=True, parameters=None):
     rho = None
     multipole = None
     if sigma is None:
@@ -385,8 +720,14 @@ def computeElFF(V, lvec, nDim, tip, computeVpot=False, tilt=0.0, sigma=None, del
             if any(nDim_tip != nDim):
                 sys.exit("Error: Input file for tip charge density has been specified, but the dimensions are incompatible with the Hartree potential file!")
             rho *= -1  # Negative charge density from positive electron density
-    Fel_x, Fel_y, Fel_z, Vout = fFFT.potential2forces_mem(V, lvec, nDim, rho=rho, sigma=sigma, multipole=multipole, doPot=computeVpot, tilt=tilt, deleteV=deleteV)
-    FFel = io.packVecGrid(Fel_x, Fel_y, Fel_z)
+    computeVpot = computeVpot or not computeForce
+    Fel_x, Fel_y, Fel_z, Vout = fFFT.potential2forces_mem(
+        V, lvec, nDim, rho=rho, sigma=sigma, multipole=multipole, doForce=computeForce, doPot=computeVpot, tilt=tilt, deleteV=deleteV
+    )
+    if computeForce:
+        FFel = io.packVecGrid(Fel_x, Fel_y, Fel_z)
+    else:
+        FFel = None
     del Fel_x, Fel_y, Fel_z
     return FFel, Vout
 
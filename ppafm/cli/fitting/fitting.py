@@ -4,7 +4,6 @@ from collections import OrderedDict
 from optparse import OptionParser
 
 import numpy as np
-from scipy.interpolate import RegularGridInterpolator
 from scipy.optimize import minimize
 
 import ppafm.HighLevel as PPH
@@ -29,42 +28,18 @@ def pN2ev_o_a(val):
     return res
 
 
-def getFzlist(BIGarray, MIN, MAX, points):
-    """
-    Function makes an interpolation of a function stored in the BIGarray and finds its values in the "points"
-    BIGarray - a 3d array containing a grid of function values
-    MIN,MAX  - 1d array containing the minimum and maximum values of x,y,z
-    """
-    x = np.linspace(MIN[0], MAX[0], BIGarray.shape[2])
-    y = np.linspace(MIN[1], MAX[1], BIGarray.shape[1])
-    z = np.linspace(MIN[2], MAX[2], BIGarray.shape[0])
-    result = []
-    interp = RegularGridInterpolator((z, y, x), BIGarray)
-    #    print BIGarray.shape
-    for p in points:
-        if (p >= MIN).all() and (p <= MAX).all():
-            result.append(interp([p[2], p[1], p[0]])[0])
-    #    print "TEST", interp([MAX[2], current_pos[1],current_pos[0]])
-    #    print "TEST", interp([8.0, current_pos[1],current_pos[0]])
-    return np.array(result)
-
-
 FFparams = None
 if os.path.isfile("atomtypes.ini"):
     print(">> LOADING LOCAL atomtypes.ini")
     FFparams = common.loadSpecies("atomtypes.ini")
     print(FFparams)
-    elem_dict = {}
-    for i, ff in enumerate(FFparams):
-        elem_dict[ff[3]] = i
+    elem_dict = common.getFFdict(FFparams)
 else:
     raise ValueError('Please provide the file "atomtypes.ini"')
 
 
 parameters = common.PpafmParameters.from_file("params.ini")
 print(" >> OVEWRITING SETTINGS by params.ini  ")
-scan_min = parameters.scanMin
-scan_max = parameters.scanMax
 atoms, nDim, lvec = io.loadGeometry("p_eq.xyz", parameters=parameters)
 # The function automatically loads the geometry from the file of any
 # supported format. The decision about the file format is based on the
@@ -75,8 +50,18 @@ parameters.gridB = lvec[2]
 parameters.gridC = lvec[3]
 V, lvec_bak, nDim_bak, head = io.loadCUBE("hartree.cube")
 loaded_forces = np.loadtxt("frc_tip.txt", converters={0: pm2a, 1: pm2a, 2: pm2a}, skiprows=2, usecols=(0, 1, 2, 5))
+# only the reference points inside of the scan window are fitted
+in_window = np.all((loaded_forces[:, :3] >= parameters.scanMin) & (loaded_forces[:, :3] <= parameters.scanMax), axis=1)
+loaded_forces = loaded_forces[in_window]
 points = loaded_forces[:, :3]
-iZs, Rs, Qs = PPH.parseAtoms(atoms, autogeom=False, PBC=parameters.PBC, FFparams=FFparams)
+iZs, Rs, Qs = common.parseAtoms(atoms, elem_dict, autogeom=False, PBC=parameters.PBC, lvec=lvec, parameters=parameters)
+iPP = common.atom2iZ(parameters.probeType, elem_dict)
+
+# The LJ force field is linear in the per-species C6 and C12 coefficients, so the basis grids are computed only once
+# and the force field for the current parameters is assembled as their weighted sum in every iteration
+LJ_basis = PPH.computeLJBasis(iZs, Rs, lvec, parameters=parameters)
+FFLJ = None
+FFel_cache = {}
 
 fit_dict = OrderedDict()
 
@@ -87,7 +72,7 @@ def update_atoms(atms=None):
     x = []
     constr = []
     for atm in atms:
-        i = elem_dict[atm[0]]
+        i = common.atom2iZ(atm[0], elem_dict) - 1
         val1, val2 = float(atm[1]), float(atm[2])
         FFparams[i][0] = val1
         x.append(val1)
@@ -152,28 +137,66 @@ def update_fit_dict(x=[]):
             i += 1
 
 
-def comp_msd(x=[]):
+def sensitivity_params():
+    """
+    Function which collects the force field derivative grids and tip parameters for the sensitivities of the forces
+    with respect to the fitted parameters, in the order of the parameter vector
+    """
+    names = []
+    dFFs = {}
+    dTip = []
+    for key, value in fit_dict.items():
+        if key == "atom":
+            for atm in value:
+                dFF_dR, dFF_dE = PPH.assembleLJFFDerivatives(LJ_basis, iPP, FFparams, common.atom2iZ(atm[0], elem_dict))
+                dFFs[atm[0] + "_rmin"] = dFF_dR
+                dFFs[atm[0] + "_epsilon"] = dFF_dE
+                names += [atm[0] + "_rmin", atm[0] + "_epsilon"]
+        elif key == "charge":
+            dFFs[key] = FFel_cache[(str(parameters.tip), parameters.sigma)]
+            names.append(key)
+        elif key in ["klat", "krad"]:
+            dTip.append(key)
+            names.append(key)
+        else:
+            raise ValueError(f"Analytic sensitivity with respect to `{key}` is not available")
+    return names, dFFs, dTip
+
+
+def comp_msd(x=[], return_grad=False):
     """Function computes the Mean Square Deviation of DFT forces (provided in the file frc_tip.ini)
-    and forces computed with the ProbeParticle approach"
+    and forces computed with the ProbeParticle approach". If return_grad is True, also its gradient
+    with respect to the fitted parameters is returned
     """
-    global iteration
+    global iteration, FFLJ
     iteration += 1
     update_fit_dict(x)  # updating the array with the optimized values
     parameters.apply_options(fit_dict)  # setting up all the options according to their
     # current values
+    if "klat" in fit_dict or "krad" in fit_dict:
+        parameters.stiffness = np.array([parameters.klat, parameters.klat, parameters.krad])
     update_atoms(atms=fit_dict["atom"])
     print(FFparams)
-    FFLJ, VLJ = PPH.computeLJFF(iZs, Rs, FFparams)
-    FFel = PPH.computeElFF(V, lvec_bak, nDim_bak, parameters.tip)
-    FFboltz = None
-    fzs, PPpos, PPdisp, lvecScan = PPH.perform_relaxation(lvec, FFLJ, FFel, FFboltz, tipspline=None)
-    Fzlist = getFzlist(BIGarray=fzs, MIN=scan_min, MAX=scan_max, points=points)
-    dev_arr = np.abs(loaded_forces[:, 3] - Fzlist * 1.60217733e3)
-    max_dev = np.max(dev_arr)
-    min_dev = np.min(dev_arr)
+    FFLJ, _ = PPH.assembleLJFF(LJ_basis, iPP, FFparams, FF=FFLJ)
+    # the electrostatic force field depends only on the tip and not on the fitted charge
+    el_key = (str(parameters.tip), parameters.sigma)
+    if el_key not in FFel_cache:
+        FFel_cache.clear()
+        FFel_cache[el_key], _ = PPH.computeElFF(V, lvec_bak, nDim_bak, parameters.tip, deleteV=False, parameters=parameters)
+    FFel = FFel_cache[el_key]
+    names, dFFs, dTip = sensitivity_params() if return_grad else ([], None, None)
+    # relax only at the tip positions of the reference data
+    fs, PPpos, dfs = PPH.perform_relaxation_points(lvec, points, FFLJ, FFel=FFel, dFFs=dFFs, dTip=dTip, parameters=parameters)
+    Fzlist = fs[:, 2]
+    dev_arr = loaded_forces[:, 3] - Fzlist * 1.60217733e3
+    max_dev = np.max(np.abs(dev_arr))
+    min_dev = np.min(np.abs(dev_arr))
     rmsd = np.sum(dev_arr**2) / len(Fzlist)
     with open("iteration.txt", "a") as myfile:
         myfile.write("iteration {}: {} rmsd: {} max dev: {} min dev: " "{}\n".format(iteration, x, rmsd, max_dev, min_dev))
+    if return_grad:
+        grad = np.array([-2 * 1.60217733e3 * np.sum(dev_arr * dfs[name][:, 2]) / len(Fzlist) for name in names])
+        return rmsd, grad
     return rmsd
 
 
@@ -195,12 +218,17 @@ if __name__ == "__main__":
     print("params", x_new)
     print("bounds", bounds)
     #    print "fit_dict", fit_dict
+    # with analytic gradients quasi-Newton methods can be used, the width of the tip charge has to be fitted without them
+    use_grad = "sigma" not in fit_dict
     it = 0
     if opt_dict["nobounds"] is not True:
         while it == 0 or np.max(np.abs((x - x_new) / x)) > 0.10:
             x = x_new.copy()
             print("Starting bounded optimization")
-            result = minimize(comp_msd, x, bounds=bounds)
+            if use_grad:
+                result = minimize(comp_msd, x, args=(True,), jac=True, bounds=bounds, method="L-BFGS-B")
+            else:
+                result = minimize(comp_msd, x, bounds=bounds)
             x_new = result.x.copy()
             it += 1
     print("Bounded optimization is finished")
@@ -208,7 +236,10 @@ if __name__ == "__main__":
     while it == 0 or np.max(np.abs((x - x_new) / x)) > 0.001:
         print("Starting non-bounded optimization")
         x = x_new.copy()
-        result = minimize(comp_msd, x, method="Nelder-Mead")
+        if use_grad:
+            result = minimize(comp_msd, x, args=(True,), jac=True, method="BFGS")
+        else:
+            result = minimize(comp_msd, x, method="Nelder-Mead")
         x_new = result.x.copy()
         it += 1
     print("Non-bounded optimization is finished")
@@ -14,7 +14,7 @@ def main(argv=None):
         description="Generate Grimme DFT-D3 vdW force field using the Becke-Johnson damping function. The generated force field is saved to FFvdW_{x,y,z}.[ext]."
     )
 
-    parser.add_arguments(["input", "input_format", "output_format", "noPBC", "energy"])
+    parser.add_arguments(["input", "input_format", "output_format", "noPBC", "energy", "energy_only"])
     parser.add_argument(
         "--df_name",
         action="store",
@@ -49,7 +49,15 @@ def main(argv=None):
             sys.exit(1)
         df_params = args.df_name
 
-    computeDFTD3(args.input, df_params=df_params, geometry_format=args.input_format, save_format=args.output_format, compute_energy=args.energy, parameters=parameters)
+    computeDFTD3(
+        args.input,
+        df_params=df_params,
+        geometry_format=args.input_format,
+        save_format=args.output_format,
+        compute_energy=args.energy,
+        compute_force=not args.energy_only,
+        parameters=parameters,
+    )
 
     # Make sure that the energy and force field pointers are deleted so that they don't interfere if any other force fields are computed after this.
     gc.collect()
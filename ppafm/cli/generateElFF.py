@@ -21,7 +21,7 @@ def main(argv=None):
     )
 
     # fmt: off
-    parser.add_arguments(['input', 'input_format', 'output_format', 'tip', 'sigma', 'Rcore', 'energy', 'noPBC'])
+    parser.add_arguments(['input', 'input_format', 'output_format', 'tip', 'sigma', 'Rcore', 'energy', 'energy_only', 'noPBC'])
     parser.add_argument("--tip_dens",   action="store", type=str,   default=None,  help="Use tip density from a file (.xsf or .cube). Overrides --tip.")
     parser.add_argument("--doDensity",  action="store_true",                       help="Do density overlap")
     parser.add_argument( "--tilt",      action="store", type=float, default=0,     help="Tilt of tip electrostatic field (radians)")
@@ -47,20 +47,12 @@ def main(argv=None):
         valence_electrons_dictionary = loadValenceElectronDict()
         rs_tip, elems_tip = getAtomsWhichTouchPBCcell(args.tip_dens, Rcut=args.Rcore, parameters=parameters)
 
-    atoms_samp, _, lvec_samp = io.loadGeometry(args.input, format=args.input_format, parameters=parameters)
-    head_samp = io.primcoords2Xsf(atoms_samp[0], [atoms_samp[1], atoms_samp[2], atoms_samp[3]], lvec_samp)
-
-    # Load electrostatic potential.
-    loaders = {
-        "xsf": io.loadXSF,
-        "cube": io.loadCUBE,
-    }
+    # Load sample geometry and electrostatic potential.
     input_format = args.input_format
-    try:
-        electrostatic_potential, lvec, n_dim, _ = loaders[input_format](args.input)
-    except KeyError:
+    if input_format not in ["xsf", "cube"]:
         input_format = args.input.split(".")[-1]
-        electrostatic_potential, lvec, n_dim, _ = loaders[input_format](args.input)
+    atoms_samp, _, lvec_samp, (electrostatic_potential, lvec, n_dim, _) = io.loadGeometryAndGrid(args.input, format=input_format, parameters=parameters)
+    head_samp = io.primcoords2Xsf(atoms_samp[0], [atoms_samp[1], atoms_samp[2], atoms_samp[3]], lvec_samp)
 
     electrostatic_potential *= -1  # Unit conversion, energy to potential (eV -> V)
 
@@ -154,12 +146,15 @@ def main(argv=None):
         io.save_vec_field("FFkpfm_tVs0", ff_kpfm_tvs0, lvec_samp, data_format=args.output_format, head=head_samp)
 
     print(">>> Calculating electrostatic forcefield with FFT convolution as Eel(R) = Integral( rho_tip(r-R) V_sample(r) ) ... ")
-    ff_electrostatic, e_electrostatic = computeElFF(electrostatic_potential, lvec, n_dim, parameters.tip, computeVpot=args.energy, tilt=args.tilt, parameters=parameters)
+    ff_electrostatic, e_electrostatic = computeElFF(
+        electrostatic_potential, lvec, n_dim, parameters.tip, computeVpot=args.energy, tilt=args.tilt, computeForce=not args.energy_only, parameters=parameters
+    )
 
     print(">>> Saving electrostatic forcefield ... ")
 
-    io.save_vec_field("FFel", ff_electrostatic, lvec_samp, data_format=args.output_format, head=head_samp, atomic_info=(atoms_samp[:4], lvec_samp))
-    if args.energy:
+    if not args.energy_only:
+        io.save_vec_field("FFel", ff_electrostatic, lvec_samp, data_format=args.output_format, head=head_samp, atomic_info=(atoms_samp[:4], lvec_samp))
+    if args.energy or args.energy_only:
         io.save_scal_field("Eel", e_electrostatic, lvec_samp, data_format=args.output_format, head=head_samp, atomic_info=(atoms_samp[:4], lvec_samp))
 
     # Make sure that the energy and force field pointers are deleted so that they don't interfere if any other force fields are computed after this.
@@ -8,7 +8,7 @@ from ..HighLevel import computeLJ
 
 def main(argv=None):
     parser = common.CLIParser(description="Generate a Lennard-Jones, Morse, or vdW force field. The generated force field is saved to FFLJ_{x,y,z}.[ext].")
-    parser.add_arguments(["input", "input_format", "output_format", "ffModel", "energy", "noPBC"])
+    parser.add_arguments(["input", "input_format", "output_format", "ffModel", "energy", "energy_only", "noPBC"])
     args = parser.parse_args(argv)
     parameters = common.PpafmParameters.from_file("params.ini")
     parameters.apply_options(vars(args))
@@ -20,6 +20,7 @@ def main(argv=None):
         save_format=args.output_format,
         computeVpot=args.energy,
         ffModel=args.ffModel,
+        computeForce=not args.energy_only,
         parameters=parameters,
     )
 
@@ -4,8 +4,10 @@
 # https://matplotlib.org/examples/user_interfaces/embedding_in_qt5.html
 # embedding_in_qt5.py --- Simple Qt5 application embedding matplotlib canvases
 
+import functools
 import os
 import sys
+import threading
 import time
 import traceback
 from argparse import ArgumentParser
@@ -97,6 +99,7 @@ def parse_args():
     parser.add_argument("-d", "--device",       action="store", type=int, default=0,  help="Choose OpenCL device.")
     parser.add_argument("-l", "--list-devices", action="store_true",                  help="List available OpenCL devices and exit.")
     parser.add_argument("-v", '--verbosity',    action="store", type=int, default=0,  help="Set verbosity level (0-2).")
+    parser.add_argument("-p", '--preview',      action="store", type=int, default=4,  help="Downsampling factor of the scan for the quick preview that is shown before the full-resolution image when the force field changes. Values < 2 disable the preview.")
     # fmt: on
     args = parser.parse_args()
     if args.input:
@@ -112,13 +115,119 @@ def parse_args():
     return args
 
 
+class SimulationWorker(QtCore.QObject):
+    """
+    Runs the simulations of :class:`ApplicationWindow` in a background thread so that the UI stays responsive.
+
+    Each request is first simulated at a lower resolution, both in the scan and in the force field grid, as a quick preview,
+    and then at the full resolution. Requests that have been superseded by a newer one are skipped between the stages.
+    If the force field has not changed since the previous simulation, e.g. when only the tip stiffness or the df settings
+    changed, the force field is reused and the preview is skipped.
+
+    The AFMulator is only accessed while holding ``lock``, which is released between the stages, so that the UI thread can
+    safely modify the simulation parameters while holding the same lock.
+
+    Arguments:
+        afmulator: :class:`.AFMulator`. The simulator shared with the UI.
+        lock: threading.RLock. Lock guarding the access to the AFMulator.
+        preview_factor: int. Downsampling factor of the scan in x and y for the preview. The force field grid is made
+            two times coarser. Values < 2 disable the preview.
+        verbose: int. Verbosity level.
+    """
+
+    finished = QtCore.pyqtSignal(int, object, bool)  # Request id, df, whether this is the final full-resolution image
+    failed = QtCore.pyqtSignal(int, str)  # Request id, error message
+
+    def __init__(self, afmulator, lock, preview_factor=4, verbose=0):
+        super().__init__()
+        self.afmulator = afmulator
+        self.lock = lock
+        self.preview_factor = preview_factor
+        self.verbose = verbose
+        self.latest_request = 0  # Set by the UI thread
+
+    def _cancelled(self, request_id):
+        return request_id != self.latest_request
+
+    @QtCore.pyqtSlot(int, object)
+    def run(self, request_id, args):
+        """
+        Run a simulation request.
+
+        Arguments:
+            request_id: int. Running number of the request. Only the request that matches :attr:`latest_request` is run.
+            args: dict. Keyword arguments for :meth:`.AFMulator.eval`.
+        """
+        if self._cancelled(request_id):
+            return
+        if self.verbose > 1:
+            t0 = time.perf_counter()
+        try:
+            with self.lock:
+                if self.afmulator.isFFCurrent(**args):
+                    # Same force field as before, only the scan needs to be redone
+                    df = self.afmulator.eval_scan_only()
+                    if self.verbose > 1:
+                        print(f"Scan with cached force field time [s]: {time.perf_counter() - t0}")
+                    self.finished.emit(request_id, df, True)
+                    return
+                if self._preview_enabled():
+                    df = self._eval_preview(args)
+                    if self.verbose > 1:
+                        print(f"Preview time [s]: {time.perf_counter() - t0}")
+                    self.finished.emit(request_id, df, False)
+            with self.lock:
+                if self._cancelled(request_id):
+                    return
+                df = self.afmulator(**args)
+            if self.verbose > 1:
+                print(f"AFMulator total time [s]: {time.perf_counter() - t0}")
+            self.finished.emit(request_id, df, True)
+        except Exception:
+            traceback.print_exc()
+            self.failed.emit(request_id, traceback.format_exc())
+
+    def _preview_enabled(self):
+        scan_dim = self.afmulator.scan_dim
+        return self.preview_factor > 1 and min(scan_dim[0], scan_dim[1]) >= 2 * self.preview_factor
+
+    def _eval_preview(self, args):
+        """Simulate with a coarser scan and force field, and upsample the result to the full scan size."""
+        afmulator = self.afmulator
+        scan_dim = afmulator.scan_dim
+        pixPerAngstrome = afmulator.pixPerAngstrome
+        preview_dim = (scan_dim[0] // self.preview_factor, scan_dim[1] // self.preview_factor, scan_dim[2])
+        try:
+            afmulator.setScanWindow(scan_dim=preview_dim)
+            afmulator.setLvec(pixPerAngstrome=max(pixPerAngstrome // 2, 1))
+            df = afmulator(**args)
+        finally:
+            afmulator.setScanWindow(scan_dim=scan_dim)
+            afmulator.setLvec(pixPerAngstrome=pixPerAngstrome)
+        ix = np.round(np.linspace(0, preview_dim[0] - 1, scan_dim[0])).astype(np.int32)
+        iy = np.round(np.linspace(0, preview_dim[1] - 1, scan_dim[1])).astype(np.int32)
+        return df[ix][:, iy]
+
+
+def _with_sim_lock(func):
+    """Hold the simulation lock of the :class:`ApplicationWindow` while running the method."""
+
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        with self.sim_lock:
+            return func(self, *args, **kwargs)
+
+    return wrapper
+
+
 class ApplicationWindow(QtWidgets.QMainWindow):
     sw_pad = 4.0  # Default padding for scan window on each side of the molecule in xy plane
     zoom_step = 1.0  # How much to increase/reduce scan size on zoom
     df_range = (-1, 1)  # min and max df value in colorbar
     fixed_df_range = False  # Keep track if df range was fixed by user or should be set automatically
+    simulationRequested = QtCore.pyqtSignal(int, object)
 
-    def __init__(self, input_files=None, device=0, verbose=0):
+    def __init__(self, input_files=None, device=0, verbose=0, preview_factor=4):
         self.df = None
         self.xyzs = None
         self.Zs = None
@@ -149,6 +258,17 @@ class ApplicationWindow(QtWidgets.QMainWindow):
         # --- init QtMain
         QtWidgets.QMainWindow.__init__(self)
         self.setAttribute(QtCore.Qt.WA_DeleteOnClose)
+
+        # Run the simulations in a background thread. The UI thread holds the lock while modifying the AFMulator.
+        self.sim_lock = threading.RLock()
+        self.request_id = 0
+        self.worker = SimulationWorker(self.afmulator, self.sim_lock, preview_factor=preview_factor, verbose=verbose)
+        self.worker_thread = QtCore.QThread(self)
+        self.worker.moveToThread(self.worker_thread)
+        self.simulationRequested.connect(self.worker.run)
+        self.worker.finished.connect(self.onSimulationFinished)
+        self.worker.failed.connect(self.onSimulationFailed)
+        self.worker_thread.start()
         self.setWindowTitle("Probe Particle Model")
         self.main_widget = QtWidgets.QWidget(self)
         l00 = QtWidgets.QHBoxLayout(self.main_widget)
@@ -190,6 +310,13 @@ class ApplicationWindow(QtWidgets.QMainWindow):
         self.status_bar.showMessage(msg)
         self.status_bar.repaint()
 
+    def closeEvent(self, event):
+        self.worker.latest_request = -1  # Cancel any pending requests
+        self.worker_thread.quit()
+        self.worker_thread.wait()
+        super().closeEvent(event)
+
+    @_with_sim_lock
     def setScanWindow(self, scan_size, scan_start, step, distance, amplitude):
         """Set scan window in AFMulator and update input fields"""
 
@@ -275,6 +402,7 @@ class ApplicationWindow(QtWidgets.QMainWindow):
             print("updateRotation", a, self.rot)
         self.update()
 
+    @_with_sim_lock
     def updateParams(self, preset_none=True):
         """Get parameter values from input fields and update"""
 
@@ -386,6 +514,7 @@ class ApplicationWindow(QtWidgets.QMainWindow):
             self.btDfReset.setDisabled(True)
         self.updateDataView()
 
+    @_with_sim_lock
     def setPBC(self, lvec, enabled):
         """Set periodic boundary condition lattice"""
 
@@ -457,34 +586,46 @@ class ApplicationWindow(QtWidgets.QMainWindow):
             self.updateParams(preset_none=False)
 
     def update(self):
-        """Run simulation, and show the result"""
+        """Request a simulation in the background. The result is shown when it is ready, see :meth:`onSimulationFinished`."""
         if self.xyzs is None:
             return
-        if self.verbose > 1:
-            t0 = time.perf_counter()
+        self.request_id += 1
+        self.worker.latest_request = self.request_id
         self.status_message("Running simulation...")
-        try:
-            self.df = self.afmulator(
-                self.xyzs,
-                self.Zs,
-                self.qs,
-                rho_sample=self.rho_sample,
-                sample_lvec=self.sample_lvec,
-                rot=self.rot,
-            )
-        except Exception:
-            traceback.print_exc()
-            guiw.show_warning(self, f"Error during simulation! Error message:\n{traceback.format_exc()}", "Simulation error!")
-        if self.verbose > 1:
-            print(f"AFMulator total time [s]: {time.perf_counter() - t0}")
+        args = {
+            "xyzs": self.xyzs,
+            "Zs": self.Zs,
+            "qs": self.qs,
+            "rho_sample": self.rho_sample,
+            "sample_lvec": self.sample_lvec,
+            "rot": self.rot,
+        }
+        self.simulationRequested.emit(self.request_id, args)
+
+    def onSimulationFinished(self, request_id, df, final):
+        """Show the result of a simulation, unless a newer one has been requested already"""
+        if request_id != self.request_id:
+            return
+        self.df = df
         self.status_message("Updating plot...")
         self.updateDataView()
+        if not final:
+            self.status_message("Refining...")
+            return
         if self.FFViewer.isVisible():
             self.status_message("Updating Force field viewer...")
-            self.FFViewer.updateFF()
+            with self.sim_lock:
+                self.FFViewer.updateFF()
             self.FFViewer.updateView()
         self.status_message("Ready")
 
+    def onSimulationFailed(self, request_id, error_message):
+        if request_id != self.request_id:
+            return
+        guiw.show_warning(self, f"Error during simulation! Error message:\n{error_message}", "Simulation error!")
+        self.status_message("Ready")
+
+    @_with_sim_lock
     def loadInput(self, main_input, rho_sample=None, rho_tip=None, rho_tip_delta=None):
         """Load input file(s) and show the result
 
@@ -653,7 +794,8 @@ class ApplicationWindow(QtWidgets.QMainWindow):
     def showFFViewer(self):
         if self.xyzs is None:
             return
-        self.FFViewer.updateFF()
+        with self.sim_lock:
+            self.FFViewer.updateFF()
         self.FFViewer.updateView()
         self.FFViewer.show()
 
@@ -865,60 +1007,61 @@ class ApplicationWindow(QtWidgets.QMainWindow):
         file_path, _ = QtWidgets.QFileDialog.getOpenFileName(self, "Open parameters file", default_path, "(*.ini)")
         if not file_path:
             return
-        self.afmulator.load_params(file_path)
-
-        # Set preset to nothing
-        guiw.set_widget_value(self.slPreset, -1)
-
-        # Set probe settings
-        guiw.set_widget_value(self.bxZPP, self.afmulator.iZPP)
-        if isinstance(self.afmulator._rho, dict):
-            tip = list(self.afmulator._rho.keys())[0]
-            guiw.set_widget_value(self.slMultipole, tip)
-            guiw.set_widget_value(self.bxQ, self.afmulator._rho[tip])
-            guiw.set_widget_value(self.bxS, self.afmulator.sigma)
-        guiw.set_widget_value(self.bxKx, self.afmulator.scanner.stiffness[0] * -PPU.eVA_Nm)
-        guiw.set_widget_value(self.bxKy, self.afmulator.scanner.stiffness[1] * -PPU.eVA_Nm)
-        guiw.set_widget_value(self.bxKr, self.afmulator.scanner.stiffness[3] * -PPU.eVA_Nm)
-        guiw.set_widget_value(self.bxP0x, self.afmulator.tipR0[0])
-        guiw.set_widget_value(self.bxP0y, self.afmulator.tipR0[1])
-        guiw.set_widget_value(self.bxP0r, self.afmulator.tipR0[2])
-        if self.rho_sample is not None:  # Using FDBM
-            guiw.set_widget_value(self.bxV0, self.afmulator.A_pauli)
-            guiw.set_widget_value(self.bxAlpha, self.afmulator.B_pauli)
-        else:
-            self.afmulator.setBPauli(B_pauli=1.0)  # Not using the FDBM so make sure the tip density is not being raised to the power
-
-        # Set scan settings
-        scan_size = (self.afmulator.scan_window[1][0] - self.afmulator.scan_window[0][0], self.afmulator.scan_window[1][1] - self.afmulator.scan_window[0][1])
-        scan_step = ((scan_size[0]) / (self.afmulator.scan_dim[0] - 1), (scan_size[1]) / (self.afmulator.scan_dim[1] - 1), self.afmulator.dz)
-        guiw.set_widget_value(self.bxStepX, scan_step[0])
-        guiw.set_widget_value(self.bxStepY, scan_step[1])
-        guiw.set_widget_value(self.bxStepZ, scan_step[2])
-        guiw.set_widget_value(self.bxSSx, scan_size[0])
-        guiw.set_widget_value(self.bxSSy, scan_size[1])
-        guiw.set_widget_value(self.bxSCx, self.afmulator.scan_window[0][0])
-        guiw.set_widget_value(self.bxSCy, self.afmulator.scan_window[0][1])
-        if self.xyzs is not None:
-            d = self.afmulator.scan_window[0][2] + self.afmulator.amplitude / 2 - self.xyzs[:, 2].max()
-            guiw.set_widget_value(self.bxD, d)
-        guiw.set_widget_value(self.bxA, self.afmulator.amplitude)
-
-        # Set PBC settings
-        guiw.set_widget_value(self.bxPBCz, False)  # The CPU code actually never uses periodic copies in the z direction
-        if isinstance(self.qs, HartreePotential):
-            # To be consistent with the CPU scripts, we should always prioritize the sample lattice vectors
-            # from the .xsf/.cube files
-            self.afmulator.sample_lvec = self.qs.lvec[1:]
-        self.setPBC(
-            self.afmulator.sample_lvec,
-            enabled=not (np.array(self.afmulator.npbc) == 0).all(),
-        )
+        with self.sim_lock:
+            self.afmulator.load_params(file_path)
+
+            # Set preset to nothing
+            guiw.set_widget_value(self.slPreset, -1)
+
+            # Set probe settings
+            guiw.set_widget_value(self.bxZPP, self.afmulator.iZPP)
+            if isinstance(self.afmulator._rho, dict):
+                tip = list(self.afmulator._rho.keys())[0]
+                guiw.set_widget_value(self.slMultipole, tip)
+                guiw.set_widget_value(self.bxQ, self.afmulator._rho[tip])
+                guiw.set_widget_value(self.bxS, self.afmulator.sigma)
+            guiw.set_widget_value(self.bxKx, self.afmulator.scanner.stiffness[0] * -PPU.eVA_Nm)
+            guiw.set_widget_value(self.bxKy, self.afmulator.scanner.stiffness[1] * -PPU.eVA_Nm)
+            guiw.set_widget_value(self.bxKr, self.afmulator.scanner.stiffness[3] * -PPU.eVA_Nm)
+            guiw.set_widget_value(self.bxP0x, self.afmulator.tipR0[0])
+            guiw.set_widget_value(self.bxP0y, self.afmulator.tipR0[1])
+            guiw.set_widget_value(self.bxP0r, self.afmulator.tipR0[2])
+            if self.rho_sample is not None:  # Using FDBM
+                guiw.set_widget_value(self.bxV0, self.afmulator.A_pauli)
+                guiw.set_widget_value(self.bxAlpha, self.afmulator.B_pauli)
+            else:
+                self.afmulator.setBPauli(B_pauli=1.0)  # Not using the FDBM so make sure the tip density is not being raised to the power
+
+            # Set scan settings
+            scan_size = (self.afmulator.scan_window[1][0] - self.afmulator.scan_window[0][0], self.afmulator.scan_window[1][1] - self.afmulator.scan_window[0][1])
+            scan_step = ((scan_size[0]) / (self.afmulator.scan_dim[0] - 1), (scan_size[1]) / (self.afmulator.scan_dim[1] - 1), self.afmulator.dz)
+            guiw.set_widget_value(self.bxStepX, scan_step[0])
+            guiw.set_widget_value(self.bxStepY, scan_step[1])
+            guiw.set_widget_value(self.bxStepZ, scan_step[2])
+            guiw.set_widget_value(self.bxSSx, scan_size[0])
+            guiw.set_widget_value(self.bxSSy, scan_size[1])
+            guiw.set_widget_value(self.bxSCx, self.afmulator.scan_window[0][0])
+            guiw.set_widget_value(self.bxSCy, self.afmulator.scan_window[0][1])
+            if self.xyzs is not None:
+                d = self.afmulator.scan_window[0][2] + self.afmulator.amplitude / 2 - self.xyzs[:, 2].max()
+                guiw.set_widget_value(self.bxD, d)
+            guiw.set_widget_value(self.bxA, self.afmulator.amplitude)
+
+            # Set PBC settings
+            guiw.set_widget_value(self.bxPBCz, False)  # The CPU code actually never uses periodic copies in the z direction
+            if isinstance(self.qs, HartreePotential):
+                # To be consistent with the CPU scripts, we should always prioritize the sample lattice vectors
+                # from the .xsf/.cube files
+                self.afmulator.sample_lvec = self.qs.lvec[1:]
+            self.setPBC(
+                self.afmulator.sample_lvec,
+                enabled=not (np.array(self.afmulator.npbc) == 0).all(),
+            )
 
-        # Set df settings
-        guiw.set_widget_value(self.bxCant_K, self.afmulator.kCantilever / 1000)
-        guiw.set_widget_value(self.bxCant_f0, self.afmulator.f0Cantilever / 1000)
-        guiw.set_widget_value(self.bxdfst, self.afmulator.scan_dim[2] - self.afmulator.df_steps + 1)
+            # Set df settings
+            guiw.set_widget_value(self.bxCant_K, self.afmulator.kCantilever / 1000)
+            guiw.set_widget_value(self.bxCant_f0, self.afmulator.f0Cantilever / 1000)
+            guiw.set_widget_value(self.bxdfst, self.afmulator.scan_dim[2] - self.afmulator.df_steps + 1)
 
         self.update()
 
@@ -1351,7 +1494,7 @@ def main():
         oclu.print_platforms()
         sys.exit(0)
     try:
-        aw = ApplicationWindow(args.input, args.device, args.verbosity)
+        aw = ApplicationWindow(args.input, args.device, args.verbosity, args.preview)
         aw.show()
         sys.exit(qApp.exec_())
     except SystemExit:
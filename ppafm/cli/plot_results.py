@@ -17,6 +17,19 @@ print("plot WITHOUT Xserver")
 atom_size = 0.15
 
 
+class _SliceWindow:
+    """Slices of a z-stack that is available only for a window of heights starting at i0, indexed with the absolute slice index."""
+
+    def __init__(self, data, i0):
+        self.data = data
+        self.i0 = i0
+
+    def __getitem__(self, key):
+        if isinstance(key, tuple):
+            return self.data[(key[0] - self.i0,) + key[1:]]
+        return self.data[key - self.i0]
+
+
 def main(argv=None):
     # fmt: off
     parser = common.CLIParser( description="Plot results for a scan with a specified charge, amplitude, and spring constant.Images are saved in folder Q{charge}K{klat}/Amp{Amplitude}." )
@@ -35,6 +48,7 @@ def main(argv=None):
     parser.add_argument( "--cbar",      action="store_true",                           help="Plot colorbars to images")
     parser.add_argument( "--WSxM",      action="store_true",                           help="Save frequency shift into WsXM *.dat files"    )
     parser.add_argument( "--bI",        action="store_true",                           help="Plot images for Boltzmann current"    )
+    parser.add_argument( "--slices",    action="store",      type=int,    nargs="+",   help="Indices of the heights to plot. Only the data needed for these heights is read. By default all heights are plotted.")
     # fmt: on
 
     parameters = common.PpafmParameters.from_file("params.ini")
@@ -98,6 +112,15 @@ def main(argv=None):
     tip_positions_x, tip_positions_y, tip_positions_z, _ = common.prepareScanGrids(parameters=parameters)
     extent = (tip_positions_x[0], tip_positions_x[-1], tip_positions_y[0], tip_positions_y[-1])
 
+    # Heights to plot. The data is read only for the range of z-slices between the lowest and highest of these.
+    n_z = len(tip_positions_z)
+    slices = sorted(set(opt_dict["slices"])) if opt_dict["slices"] is not None else list(range(n_z))
+    if slices[0] < 0 or slices[-1] >= n_z:
+        parser.error(f"Slice indices should be in the range 0-{n_z - 1}")
+    z0, z1 = slices[0], slices[-1] + 1
+    # Frequency shift is needed for all heights if it is saved or post-processed
+    df_all = opt_dict["save_df"] or opt_dict["WSxM"] or opt_dict["LCPD_maps"] or opt_dict["Laplace"]
+
     atoms_str = ""
     atoms = None
     bonds = None
@@ -135,14 +158,15 @@ def main(argv=None):
             if applied_bias:
                 dirname = f"Q{charge:1.2f}K{stiffness:1.2f}V{voltage:1.2f}"
             if opt_dict["pos"]:
-                pp_positions, lvec, _, atomic_info_or_head = io.load_vec_field(dirname + "/PPpos", data_format=args.output_format)
+                pp_positions, lvec, _, atomic_info_or_head = io.open_vec_field(dirname + "/PPpos", data_format=args.output_format)
+                pp_positions = pp_positions[z0:z1]
                 print("Plotting PPpos: ")
                 PPPlot.plotDistortions(
                     dirname + "/xy" + atoms_str + cbar_str,
-                    pp_positions[:, :, :, 0],
-                    pp_positions[:, :, :, 1],
-                    slices=list(range(0, len(pp_positions))),
-                    BG=pp_positions[:, :, :, 2],
+                    _SliceWindow(pp_positions[:, :, :, 0], z0),
+                    _SliceWindow(pp_positions[:, :, :, 1], z0),
+                    slices=slices,
+                    BG=_SliceWindow(pp_positions[:, :, :, 2], z0),
                     extent=extent,
                     atoms=atoms,
                     bonds=bonds,
@@ -153,7 +177,8 @@ def main(argv=None):
                 print()
 
             if opt_dict["iets"] is not None:
-                eigenvalue_k, lvec, _, atomic_info_or_head = io.load_vec_field(dirname + "/eigvalKs", data_format=args.output_format)
+                eigenvalue_k, lvec, _, atomic_info_or_head = io.open_vec_field(dirname + "/eigvalKs", data_format=args.output_format)
+                eigenvalue_k = eigenvalue_k[z0:z1]
                 iets_m = opt_dict["iets"][0]
                 iets_e = opt_dict["iets"][1]
                 iets_w = opt_dict["iets"][2]
@@ -163,8 +188,8 @@ def main(argv=None):
 
                 PPPlot.plotImages(
                     dirname + "/IETS" + atoms_str + cbar_str,
-                    iets,
-                    slices=list(range(0, len(iets))),
+                    _SliceWindow(iets, z0),
+                    slices=slices,
                     zs=tip_positions_z,
                     extent=extent,
                     atoms=atoms,
@@ -176,8 +201,8 @@ def main(argv=None):
 
                 PPPlot.plotImages(
                     dirname + "/Evib" + atoms_str + cbar_str,
-                    e_vib[:, :, :, 0],
-                    slices=list(range(0, len(iets))),
+                    _SliceWindow(e_vib[:, :, :, 0], z0),
+                    slices=slices,
                     zs=tip_positions_z,
                     extent=extent,
                     atoms=atoms,
@@ -189,8 +214,8 @@ def main(argv=None):
 
                 PPPlot.plotImages(
                     dirname + "/Kvib" + atoms_str + cbar_str,
-                    16.0217662 * eigenvalue_k[:, :, :, 0],
-                    slices=list(range(0, len(iets))),
+                    _SliceWindow(16.0217662 * eigenvalue_k[:, :, :, 0], z0),
+                    slices=slices,
                     zs=tip_positions_z,
                     extent=extent,
                     atoms=atoms,
@@ -201,12 +226,12 @@ def main(argv=None):
                 print()
 
             if opt_dict["bI"]:
-                current, lvec, _, atomic_info_or_head = io.load_scal_field(dirname + "/OutI_boltzmann", data_format=args.output_format)
+                current, lvec, _, atomic_info_or_head = io.open_scal_field(dirname + "/OutI_boltzmann", data_format=args.output_format)
                 print("Plotting Boltzmann current: ")
                 PPPlot.plotImages(
                     dirname + "/OutI" + atoms_str + cbar_str,
                     current,
-                    slices=list(range(0, len(current))),
+                    slices=slices,
                     zs=tip_positions_z,
                     extent=extent,
                     atoms=atoms,
@@ -294,7 +319,11 @@ def main(argv=None):
                             lvec,
                             _,
                             atomic_info_or_head,
-                        ) = io.load_vec_field(dirname + "/OutF", data_format=args.output_format)
+                        ) = io.open_vec_field(dirname + "/OutF", data_format=args.output_format)
+                        n_w = len(common.get_df_weight(amplitude, dz=np.linalg.norm(parameters.scanTilt)))
+                        n_df = len(f_out) - n_w + 1
+                        d0, d1 = (0, n_df) if df_all else (min(z0, n_df), min(z1, n_df))
+                        f_out = f_out[d0 : d1 + n_w - 1]
                         dfs = common.Fz2df_tilt(
                             f_out,
                             parameters.scanTilt,
@@ -312,10 +341,14 @@ def main(argv=None):
                             lvec,
                             _,
                             atomic_info_or_head,
-                        ) = io.load_scal_field(dirname + "/OutFz", data_format=args.output_format)
+                        ) = io.open_scal_field(dirname + "/OutFz", data_format=args.output_format)
+                        n_w = len(common.get_df_weight(amplitude, dz=dz))
+                        n_df = len(fzs) - n_w + 1
+                        d0, d1 = (0, n_df) if df_all else (min(z0, n_df), min(z1, n_df))
+                        fzs = fzs[d0 : d1 + n_w - 1]
                         if applied_bias:
                             r_tip = parameters.Rtip
-                            for iz, z in enumerate(tip_positions_z):
+                            for iz, z in enumerate(tip_positions_z[d0 : d1 + n_w - 1]):
                                 fzs[iz, :, :] = fzs[iz, :, :] - np.pi * parameters.permit * ((r_tip * r_tip) / ((z - args.z0) * (z + r_tip))) * (voltage - args.V0) * (
                                     voltage - args.V0
                                 )
@@ -329,6 +362,7 @@ def main(argv=None):
                         lvec_df = np.array(lvec.copy())
                         lvec_df[0][2] += amplitude / 2
                         lvec_df[3][2] -= amplitude
+                    df_slices = [i for i in slices if i < n_df]
 
                     if opt_dict["save_df"]:
                         io.save_scal_field(
@@ -343,8 +377,8 @@ def main(argv=None):
                         print("Plotting df: ")
                         PPPlot.plotImages(
                             dir_name_amplitude + "/df" + atoms_str + cbar_str,
-                            dfs,
-                            slices=list(range(0, len(dfs))),
+                            _SliceWindow(dfs, d0),
+                            slices=df_slices,
                             zs=tip_positions_z + parameters.Amplitude / 2.0,
                             extent=extent,
                             cmap=parameters.colorscale,
@@ -371,7 +405,7 @@ def main(argv=None):
                         PPPlot.plotImages(
                             dir_name_amplitude + "/df_laplace" + atoms_str + cbar_str,
                             df_laplace_filtered,
-                            slices=list(range(0, len(dfs))),
+                            slices=df_slices,
                             zs=tip_positions_z + parameters.Amplitude / 2.0,
                             extent=extent,
                             cmap=parameters.colorscale,
@@ -405,7 +439,7 @@ def main(argv=None):
                     PPPlot.plotImages(
                         dir_name_lcpd + "/LCPD" + atoms_str + cbar_str,
                         lcpd,
-                        slices=list(range(0, len(lcpd))),
+                        slices=df_slices,
                         zs=tip_positions_z + parameters.Amplitude / 2.0,
                         extent=extent,
                         cmap=parameters.colorscale_kpfm,
@@ -422,7 +456,7 @@ def main(argv=None):
                     PPPlot.plotImages(
                         dir_name_lcpd + "/_Asym-LCPD" + atoms_str + cbar_str,
                         lcpd,
-                        slices=list(range(0, len(lcpd))),
+                        slices=df_slices,
                         zs=tip_positions_z + parameters.Amplitude / 2.0,
                         extent=extent,
                         cmap=parameters.colorscale_kpfm,
@@ -454,12 +488,12 @@ def main(argv=None):
                     lvec,
                     _,
                     atomic_info_or_head,
-                ) = io.load_scal_field(dirname + "/OutFz", data_format=args.output_format)
+                ) = io.open_scal_field(dirname + "/OutFz", data_format=args.output_format)
                 print("Plotting Fz: ")
                 PPPlot.plotImages(
                     dirname + "/Fz" + atoms_str + cbar_str,
                     fzs,
-                    slices=list(range(0, len(fzs))),
+                    slices=slices,
                     zs=tip_positions_z,  # + parameters.Amplitude / 2.0, # no oscillation to the force
                     extent=extent,
                     cmap=parameters.colorscale,
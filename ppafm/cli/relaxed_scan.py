@@ -34,7 +34,7 @@ def main(argv=None):
         description="Perform a scan, relaxing the probe particle in a precalculated force field. The generated force field is saved to Q{charge}K{klat}/OutFz.xsf."
     )
     # fmt: off
-    parser.add_arguments(['klat', 'krange', 'charge', 'qrange', 'Vbias', 'Vrange', 'Apauli', 'output_format'])
+    parser.add_arguments(['klat', 'krange', 'charge', 'qrange', 'Vbias', 'Vrange', 'Apauli', 'output_format', 'output_dtype', 'compress', 'energy_only'])
     parser.add_argument("--noLJ",           action="store_true",                          help="Load Pauli and vdW force fields from separate files")
     parser.add_argument("-b","--boltzmann", action="store_true",                          help="Calculate forces with boltzmann particle")
     parser.add_argument("--bI",             action="store_true",                          help="Calculate current between boltzmann particle and tip")
@@ -99,7 +99,23 @@ def main(argv=None):
 
     ff_vdw = ff_pauli = ff_electrostatics = ff_boltzman = ff_kpfm_t0sv = ff_kpfm_tvs0 = None
 
-    if args.noLJ:
+    if args.energy_only:
+        if args.noLJ or args.boltzmann or args.bI or applied_bias:
+            print("--energy_only supports only the Lennard-Jones and the electrostatic contributions.", file=sys.stderr)
+            sys.exit(1)
+
+        # The energies are rotationally invariant scalars, so only the lattice vectors are rotated below.
+        print("Loading Lennard-Jones energy from ELJ")
+        ff_vdw, lvec, _, atomic_info_or_head = io.load_scal_field("ELJ", data_format=args.output_format)
+
+        if charged_system:
+            # Eel is written by ppafm-generate-elff, Vel by ppafm-generate-elff-point-charges
+            ext = "npz" if args.output_format == "npy" else args.output_format
+            el_name = "Eel" if os.path.exists(f"Eel.{ext}") else "Vel"
+            print(f"Loading electrostatic energy from {el_name}")
+            ff_electrostatics, lvec, _, atomic_info_or_head = io.load_scal_field(el_name, data_format=args.output_format)
+
+    elif args.noLJ:
         print("Apauli", parameters.Apauli)
 
         print("Loading Pauli force field from FFpauli_{x,y,z}")
@@ -115,7 +131,7 @@ def main(argv=None):
         ff_vdw, lvec, _, atomic_info_or_head = io.load_vec_field("FFLJ", data_format=args.output_format)
         ff_vdw[0, :, :, :], ff_vdw[1, :, :, :] = rotate_ff(ff_vdw[0, :, :, :], ff_vdw[1, :, :, :], opt_dict["rotate"])
 
-    if charged_system:
+    if charged_system and not args.energy_only:
         print("Loading electrostatic force field from FFel_{x,y,z}")
         ff_electrostatics, lvec, _, atomic_info_or_head = io.load_vec_field("FFel", data_format=args.output_format)
         ff_electrostatics[0, :, :, :], ff_electrostatics[1, :, :, :] = rotate_ff(ff_electrostatics[0, :, :, :], ff_electrostatics[1, :, :, :], opt_dict["rotate"])
@@ -178,7 +194,14 @@ def main(argv=None):
             parameters=parameters,
         )
 
-        data_info = {"lvec": lvec_scan, "data_format": args.output_format, "head": atomic_info_or_head, "atomic_info": atomic_info_or_head}
+        data_info = {
+            "lvec": lvec_scan,
+            "data_format": args.output_format,
+            "head": atomic_info_or_head,
+            "atomic_info": atomic_info_or_head,
+            "dtype": args.output_dtype,
+            "compress": args.compress,
+        }
         if parameters.tiltedScan:
             io.save_vec_field(dirname + "/OutF", fzs, **data_info)
         else:
@@ -27,9 +27,7 @@ if __name__ == "__main__":
     elem_dict = common.getFFdict(FFparams)
     # print elem_dict
 
-    atoms, nDim, lvec = io.loadGeometry(options.input, params=common.PpafmParameters())
-
-    data, lvec, nDim, head = io.loadCUBE(options.input)
+    atoms, nDim, lvec, (data, lvec, nDim, head) = io.loadGeometryAndGrid(options.input, format="cube", parameters=common.PpafmParameters())
     lvec[0] = [0.0, 0.0, 0.0]
     lvec = np.array([lvec[0], lvec[3], lvec[2], lvec[1]])
     data = np.transpose(data, (2, 1, 0))
@@ -71,6 +71,7 @@ class PpafmParameters(pydantic.BaseModel):
     Rtip: float = 30.0
     permit: float = 0.00552634959
     vdWDampKind: int = 2
+    ffLayout: str = "double"
     Vbias: float = 0.0
 
     class Config:
@@ -250,6 +251,17 @@ class CLIParser(ArgumentParser):
             "default": "xsf",
             "help": "Specify the output format. Supported formats are: xsf, npy",
         },
+        "output_dtype": {
+            "action": "store",
+            "default": None,
+            "choices": ["float32", "float64"],
+            "help": "Data type of the saved data for the npy output format. float32 halves the file size. By default the data type is not changed.",
+        },
+        "compress": {
+            "action": "store_true",
+            "default": False,
+            "help": "Compress the saved data for the npy output format.",
+        },
         "noPBC": {
             "action": "store_false",
             "dest": "PBC",
@@ -262,6 +274,11 @@ class CLIParser(ArgumentParser):
             "default": False,
             "help": "Compute the potential energy in addition to the force.",
         },
+        "energy_only": {
+            "action": "store_true",
+            "default": False,
+            "help": "Compute or use only the potential energy instead of the force. The relaxation then takes the forces from the gradient of the energy.",
+        },
         "krange": {
             "action": "store",
             "type": float,
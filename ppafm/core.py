@@ -75,7 +75,41 @@ lib.setFF_Fpointer.argtypes = [array4d]
 lib.setFF_Fpointer.restype = None
 
 
-def setFF_Fpointer(gridF):
+# void setFF_layout( int layout )
+lib.setFF_layout.argtypes = [c_int]
+lib.setFF_layout.restype = None
+
+FF_LAYOUTS = {"double": 0, "float32": 1, "bspline": 2, "energy": 3}
+
+
+def setFF_layout(layout):
+    """
+    Select how forces are interpolated from the grid during relaxation.
+
+    Arguments:
+        layout: str. 'double' interpolates trilinearly directly from the force field array. 'float32' interpolates trilinearly
+            from a float32 RGBA copy of the force field padded with one periodic ghost layer on each axis, which avoids index
+            wrapping in the inner loop and halves the memory traffic. 'bspline' interpolates from periodic cubic B-spline
+            coefficients fitted to the force field, which gives forces with continuous derivatives and allows for much coarser
+            grids than trilinear interpolation. 'energy' takes the forces as the analytic gradient of periodic cubic B-spline
+            fitted to the energy array set by :func:`setFF_Epointer`, so that no force field array is needed. The derived grids
+            are made lazily before the next interpolation and are refreshed after each force field computation in C++.
+            If the arrays are modified from Python in place, call this function again to refresh them.
+    """
+    if layout not in FF_LAYOUTS:
+        raise ValueError(f"Unknown force field layout `{layout}`. Should be one of {list(FF_LAYOUTS.keys())}.")
+    lib.setFF_layout(FF_LAYOUTS[layout])
+
+
+def setFF_Fpointer(gridF, layout="double"):
+    """
+    Set the force field array used by the relaxation and force interpolation functions.
+
+    Arguments:
+        gridF: np.ndarray of shape (nz, ny, nx, 3). Force field array. The array is used in place, so it has to be kept alive by the caller.
+        layout: str. How forces are interpolated from the grid during relaxation. See :func:`setFF_layout`.
+    """
+    setFF_layout(layout)
     lib.setFF_Fpointer(gridF)
     weakref.finalize(gridF, deleteFF_Fpointer)  # Set array pointer to NULL when garbage collector runs.
 
@@ -136,7 +170,7 @@ lib.setRelax.argtypes = [c_int, c_double, c_double, c_double]
 lib.setRelax.restype = None
 
 
-def setRelax(maxIters=1000, convF2=1.0e-4, dt=0.1, damping=0.1):
+def setRelax(maxIters=1000, convF=1.0e-4, dt=0.1, damping=0.1):
     lib.setRelax(maxIters, convF * convF, dt, damping)
 
 
@@ -268,26 +302,50 @@ def getDFTD3FF(Rs, d3_coeffs):
 
 
 # void computeD3Coeffs(
-#    const int natoms_, const double *rs, const double *elems, const double *r_cov, const double *r_cut, const double *ref_cn,
-#    const double *ref_c6, const double *r4r2, const double *k, const double *params, const int elem_pp, double *coeffs
+#    const int natoms_, const double *rs, const int *elems, const double *r_cov, const double *ref_cn,
+#    const double *c6_pp, const double *r4r2, const double *k, const double *params, const int elem_pp, const double cn_cutoff, double *d3_coeffs
 # )
-lib.computeD3Coeffs.argtypes = [c_int, array2d, array1i, array1d, array1d, array1d, array1d, array1d, array1d, array1d, c_int, array1d]
+lib.computeD3Coeffs.argtypes = [c_int, array2d, array1i, array1d, array1d, array1d, array1d, array1d, array1d, c_int, c_double, array1d]
 lib.computeD3Coeffs.restype = None
 
+_D3_TABLES = None
 
-def computeD3Coeffs(Rs, iZs, iZPP, df_params):
+
+def _d3_tables():
+    global _D3_TABLES
+    if _D3_TABLES is None:
+        _D3_TABLES = (
+            d3.R_COV.astype(np.float64),
+            d3.REF_CN.astype(np.float64).flatten(),
+            d3.R4R2.astype(np.float64),
+            np.array([d3.K1, d3.K2, d3.K3], dtype=np.float64),
+        )
+    return _D3_TABLES
+
+
+def computeD3Coeffs(Rs, iZs, iZPP, df_params, cn_cutoff=d3.CN_CUTOFF):
+    """
+    Compute the DFT-D3 coefficients (C6, C8, R0^6, R0^8) for the interaction of each atom with the probe particle.
+
+    Arguments:
+        Rs: array of shape (natoms, 3). Atom positions.
+        iZs: array of shape (natoms,). Atomic numbers.
+        iZPP: int. Atomic number of the probe particle.
+        df_params: dict. Functional-specific scaling parameters s6, s8, a1, and a2.
+        cn_cutoff: float. Pairs of atoms farther apart than this do not contribute to the coordination numbers.
+            Non-positive value sums over all pairs.
+
+    Returns:
+        coeffs: np.ndarray of shape (natoms, 4).
+    """
     natom = len(Rs)
-    Rs = np.array(Rs, dtype=np.float64)
-    iZs = np.array(iZs, dtype=np.int32)
-    r_cov = d3.R_COV.astype(np.float64)
-    r_cut = d3.load_R0().astype(np.float64).flatten()
-    ref_cn = d3.REF_CN.astype(np.float64).flatten()
-    r4r2 = d3.R4R2.astype(np.float64)
-    ref_c6 = d3.load_ref_c6().astype(np.float64).flatten()
-    k = np.array([d3.K1, d3.K2, d3.K3], dtype=np.float64)
+    Rs = np.ascontiguousarray(Rs, dtype=np.float64)
+    iZs = np.ascontiguousarray(iZs, dtype=np.int32)
+    r_cov, ref_cn, r4r2, k = _d3_tables()
+    c6_pp = d3.load_ref_c6_pp(iZPP).astype(np.float64).flatten()
     df_params = np.array([df_params["s6"], df_params["s8"], df_params["a1"], df_params["a2"] * bohrRadius2angstroem], dtype=np.float64)
     coeffs = np.empty(4 * natom, dtype=np.float64)
-    lib.computeD3Coeffs(natom, Rs, iZs, r_cov, r_cut, ref_cn, ref_c6, r4r2, k, df_params, iZPP, coeffs)
+    lib.computeD3Coeffs(natom, Rs, iZs, r_cov, ref_cn, c6_pp, r4r2, k, df_params, iZPP, cn_cutoff, coeffs)
     return coeffs.reshape((natom, 4))
 
 
@@ -366,6 +424,28 @@ def relaxTipStrokes_omp(rTips, rs, fs, probeStart=1, relaxAlg=1, tip_spline=None
     return lib.relaxTipStrokes_omp(nx, ny, probeStart, relaxAlg, nz, rTips, rs, fs, tip_spline)
 
 
+# void interpolateForces( int n, double * rs_, double * fs_ )
+lib.interpolateForces.argtypes = [c_int, array2d, array2d]
+lib.interpolateForces.restype = None
+
+
+def interpolateForces(rs):
+    """
+    Interpolate forces from the force field grid set by :func:`setFF_Fpointer` in many positions at once.
+
+    Arguments:
+        rs: np.ndarray of shape (..., 3). Cartesian positions relative to the grid origin.
+
+    Returns:
+        fs: np.ndarray of same shape as rs. Interpolated forces.
+    """
+    rs = np.asarray(rs, dtype=np.float64)
+    rs_flat = np.ascontiguousarray(rs.reshape(-1, 3))
+    fs = np.zeros_like(rs_flat)
+    lib.interpolateForces(len(rs_flat), rs_flat, fs)
+    return fs.reshape(rs.shape)
+
+
 # void stiffnessMatrix( double ddisp, int which, int n, double * rTips_, double * rPPs_, double * eigenvals_, double * evec1_, double * evec2_, double * evec3_, TIP::SplineParams *sp )
 lib.stiffnessMatrix.argtypes = [c_double, c_int, c_int, array2d, array2d, array2d, array2d, array2d, array2d, POINTER(SplineParameters)]
 lib.stiffnessMatrix.restype = None
@@ -387,6 +467,34 @@ def stiffnessMatrix(rTips, rPPs, which=0, ddisp=0.05, tip_spline=None):
     return eigenvals, evecs
 
 
+# void dynamicalMatrices( double ddisp, int n, double * rTips_, double * rPPs_, double * dynmats_, TIP::SplineParams *sp )
+lib.dynamicalMatrices.argtypes = [c_double, c_int, array2d, array2d, array3d, POINTER(SplineParameters)]
+lib.dynamicalMatrices.restype = None
+
+
+def dynamicalMatrices(rTips, rPPs, ddisp=0.05, tip_spline=None):
+    """
+    Evaluate the full dynamical matrices of the probe particle, i.e. the negative derivatives of the total force on the probe particle
+    with respect to its position. These are the same matrices whose eigenvalues are computed in :func:`stiffnessMatrix`, but
+    without the symmetrization, because the forces interpolated from a force field grid are not exactly conservative.
+
+    Arguments:
+        rTips: np.ndarray of shape (n, 3). Tip positions relative to the grid origin.
+        rPPs: np.ndarray of shape (n, 3). Probe particle positions relative to the grid origin.
+        ddisp: float. Displacement used for the finite differences.
+        tip_spline: :class:`SplineParameters` or None. Optional tip force spline.
+
+    Returns:
+        dynmats: np.ndarray of shape (n, 3, 3). Dynamical matrices, dynmats[:, i, j] = -dF_j / dr_i.
+    """
+    rTips = np.ascontiguousarray(rTips, dtype=np.float64)
+    rPPs = np.ascontiguousarray(rPPs, dtype=np.float64)
+    n = len(rTips)
+    dynmats = np.zeros((n, 3, 3))
+    lib.dynamicalMatrices(ddisp, n, rTips, rPPs, dynmats, tip_spline)
+    return dynmats
+
+
 # void subsample_uniform_spline( double x0, double dx, int n, double * ydys, int m, double * xs_, double * ys_ )
 lib.subsample_uniform_spline.argtypes = [c_double, c_double, c_int, array2d, c_int, array1d, array1d]
 lib.subsample_uniform_spline.restype = None
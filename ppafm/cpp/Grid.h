@@ -108,6 +108,119 @@ inline Vec3d interpolate3DvecWrap( Vec3d * grid, const Vec3i& n, const Vec3d& r
 	return out;
 }
 
+// interpolation of vector force-field stored as float32 RGBA (fx,fy,fz,0) with one ghost layer along each axis, i.e. array float[nz+1][ny+1][nx+1][4] where index n is a copy of index 0
+// thanks to the ghost layer only the lower corner index is wrapped, and the 4 components of each corner are blended in one SIMD operation
+inline Vec3d interpolate3DvecPadF4( const float * grid, const Vec3i& n, const Vec3d& r ){
+	int xoff = n.x<<3; int imx = r.x +xoff;	float tx = r.x - imx +xoff;	float mx = 1 - tx;	imx=imx%n.x;
+	int yoff = n.y<<3; int imy = r.y +yoff;	float ty = r.y - imy +yoff;	float my = 1 - ty;	imy=imy%n.y;
+	int zoff = n.z<<3; int imz = r.z +zoff;	float tz = r.z - imz +zoff;	float mz = 1 - tz;	imz=imz%n.z;
+	const int dx = 4; const int dy = 4*(n.x+1); const int dz = dy*(n.y+1);
+	const float * g = grid + imz*dz + imy*dy + imx*dx;
+	const int   offs[8] = { 0, dx, dy, dy+dx, dz, dz+dx, dz+dy, dz+dy+dx };
+	const float ws  [8] = { mz*my*mx, mz*my*tx, mz*ty*mx, mz*ty*tx, tz*my*mx, tz*my*tx, tz*ty*mx, tz*ty*tx };
+	float out[4] = { 0.0f, 0.0f, 0.0f, 0.0f };
+	for( int k=0; k<8; k++ ){
+		const float * gk = g + offs[k];
+		#pragma omp simd
+		for( int c=0; c<4; c++ ){ out[c] += ws[k]*gk[c]; }
+	}
+	return Vec3d{ out[0], out[1], out[2] };
+}
+
+// ========== Cubic B-spline interpolation
+
+// periodic cubic B-spline prefilter ( recursive filter of M. Unser, IEEE Signal Process. Mag. 16, 22 (1999) ) applied in place to a line of n points with "ncomp" contiguous components each,
+// converts sampled values to coefficients of the interpolating cubic B-spline
+inline void prefilterBsplineLine( int n, int stride, int ncomp, double * c ){
+    const double z   = sqrt(3.0) - 2.0;
+    const double izn = 1/( 1 - pow(z,n) );
+    const int    nj  = ( n < 40 ) ? n : 40;     // z^40 ~ 1e-23, further terms do not contribute
+    for(int ic=0; ic<ncomp; ic++){
+        double * ci = c + ic;
+        // causal filter
+        double sum = ci[0]; double zk = z;
+        for(int j=1; j<nj; j++){ sum += ci[(n-j)*stride]*zk; zk*=z; }
+        ci[0] = sum*izn;
+        for(int k=1; k<n; k++){ ci[k*stride] += ci[(k-1)*stride]*z; }
+        // anti-causal filter
+        sum = ci[(n-1)*stride]; zk = z;
+        for(int j=1; j<nj; j++){ sum += ci[(j-1)*stride]*zk; zk*=z; }
+        ci[(n-1)*stride] = -z*izn*sum;
+        for(int k=n-2; k>=0; k--){ ci[k*stride] = z*( ci[(k+1)*stride] - ci[k*stride] ); }
+        for(int k=0; k<n; k++){ ci[k*stride] *= 6; }
+    }
+}
+
+// convert 3D periodic grid [nz,ny,nx,ncomp] of sampled values to cubic B-spline coefficients in place
+inline void prefilterBspline3D( const Vec3i& n, int ncomp, double * c ){
+    const int nxy = n.x*n.y;
+    #pragma omp parallel for collapse(2)
+    for(int iz=0; iz<n.z; iz++){ for(int iy=0; iy<n.y; iy++){ prefilterBsplineLine( n.x, ncomp,       ncomp, c + (iz*nxy + iy*n.x)*ncomp ); } }
+    #pragma omp parallel for collapse(2)
+    for(int iz=0; iz<n.z; iz++){ for(int ix=0; ix<n.x; ix++){ prefilterBsplineLine( n.y, n.x*ncomp, ncomp, c + (iz*nxy + ix    )*ncomp ); } }
+    #pragma omp parallel for collapse(2)
+    for(int iy=0; iy<n.y; iy++){ for(int ix=0; ix<n.x; ix++){ prefilterBsplineLine( n.z, nxy*ncomp, ncomp, c + (iy*n.x + ix    )*ncomp ); } }
+}
+
+// periodic indexes of the 4 points supporting cubic B-spline along one axis, returns fractional coordinate t in [0,1)
+inline double Bspline_index( double r, int n, int * is ){
+    int off = n<<3; int i = r + off; double t = r - i + off; i = i%n;
+    is[0] = (i+n-1)%n; is[1] = i; is[2] = (i+1)%n; is[3] = (i+2)%n;
+    return t;
+}
+
+// weights of cubic B-spline for points i-1, i, i+1, i+2
+inline void Bspline_basis( double t, double * ws ){
+    double mt = 1-t; double t2 = t*t; double t3 = t2*t;
+    ws[0] = mt*mt*mt*(1.0/6); ws[1] = ( 3*t3 - 6*t2 + 4 )*(1.0/6); ws[2] = ( -3*t3 + 3*t2 + 3*t + 1 )*(1.0/6); ws[3] = t3*(1.0/6);
+}
+
+// derivatives of cubic B-spline weights with respect to t
+inline void Bspline_dbasis( double t, double * ds ){
+    double mt = 1-t; double t2 = t*t;
+    ds[0] = -0.5*mt*mt; ds[1] = 1.5*t2 - 2*t; ds[2] = -1.5*t2 + t + 0.5; ds[3] = 0.5*t2;
+}
+
+// interpolation of vector force-field Vec3d[ix,iy,iz] from cubic B-spline coefficients in periodic boundary condition
+inline Vec3d interpolate3DvecBspline( const Vec3d * coefs, const Vec3i& n, const Vec3d& r ){
+    int ix[4],iy[4],iz[4]; double wx[4],wy[4],wz[4];
+    Bspline_basis( Bspline_index( r.x, n.x, ix ), wx );
+    Bspline_basis( Bspline_index( r.y, n.y, iy ), wy );
+    Bspline_basis( Bspline_index( r.z, n.z, iz ), wz );
+    const int nxy = n.x*n.y;
+    Vec3d out = Vec3dZero;
+    for(int kz=0; kz<4; kz++){
+        for(int ky=0; ky<4; ky++){
+            const Vec3d * row = coefs + iz[kz]*nxy + iy[ky]*n.x;
+            const double wyz  = wz[kz]*wy[ky];
+            for(int kx=0; kx<4; kx++){ out.add_mul( row[ix[kx]], wyz*wx[kx] ); }
+        }
+    }
+    return out;
+}
+
+// interpolation of scalar field double[ix,iy,iz] from cubic B-spline coefficients in periodic boundary condition, returns value and its gradient with respect to grid coordinates
+inline double interpolate3DgradBspline( const double * coefs, const Vec3i& n, const Vec3d& r, Vec3d& grad ){
+    int ix[4],iy[4],iz[4]; double wx[4],wy[4],wz[4],dx[4],dy[4],dz[4];
+    double tx = Bspline_index( r.x, n.x, ix ); Bspline_basis( tx, wx ); Bspline_dbasis( tx, dx );
+    double ty = Bspline_index( r.y, n.y, iy ); Bspline_basis( ty, wy ); Bspline_dbasis( ty, dy );
+    double tz = Bspline_index( r.z, n.z, iz ); Bspline_basis( tz, wz ); Bspline_dbasis( tz, dz );
+    const int nxy = n.x*n.y;
+    double E = 0; grad = Vec3dZero;
+    for(int kz=0; kz<4; kz++){
+        for(int ky=0; ky<4; ky++){
+            const double * row = coefs + iz[kz]*nxy + iy[ky]*n.x;
+            double c=0, cdx=0;
+            for(int kx=0; kx<4; kx++){ double ci = row[ix[kx]]; c += ci*wx[kx]; cdx += ci*dx[kx]; }
+            E      += c  *wy[ky]*wz[kz];
+            grad.x += cdx*wy[ky]*wz[kz];
+            grad.y += c  *dy[ky]*wz[kz];
+            grad.z += c  *wy[ky]*dz[kz];
+        }
+    }
+    return E;
+}
+
 // iterate over field
 template< void FUNC( int ibuff, const Vec3d& pos_, void * args ) >
 void interateGrid3D( const Vec3d& pos0, const Vec3i& n, const Mat3d& dCell, void * args ){
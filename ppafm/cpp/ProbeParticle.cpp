@@ -35,6 +35,15 @@ GridShape gridShape;
 Vec3d   * gridF = NULL;       // pointer to data    ( 3D vector array [nx,ny,nz,3] )
 double  * gridE = NULL;       // pointer to data    ( 3D scalar array [nx,ny,nz]   )
 
+int       gridF_layout = 0;     // layout used to interpolate forces during relaxation: 0 - gridF directly (double), 1 - padded float32 RGBA copy gridF4, 2 - cubic B-spline coefficients gridFB, 3 - gradient of cubic B-spline gridEB
+float   * gridF4       = NULL;  // padded float32 RGBA copy of gridF ( 4D array [nz+1,ny+1,nx+1,4] ), owned by C++
+Vec3i     gridF4_n     = {0,0,0};
+Vec3d   * gridFB       = NULL;  // cubic B-spline coefficients fitted to gridF ( 3D vector array [nz,ny,nx,3] ), owned by C++
+Vec3i     gridFB_n     = {0,0,0};
+double  * gridEB       = NULL;  // cubic B-spline coefficients fitted to gridE ( 3D scalar array [nz,ny,nx] ), owned by C++
+Vec3i     gridEB_n     = {0,0,0};
+bool      gridF_dirty  = true;  // gridF4 / gridFB / gridEB have to be rebuilt from gridF / gridE before next interpolation
+
 int      natoms       = 0;
 double   Morse_alpha  = 0;
 int      nCoefPerAtom = 0;
@@ -279,11 +288,84 @@ inline void evalCell( int ibuff, const Vec3d& rProbe, void * args ){
 
 // ========== Interpolations
 
+// rebuild padded float32 copy of gridF
+void makeGridF4(){
+    const Vec3i n = gridShape.n;
+    if( (gridF4==NULL) || (gridF4_n.x!=n.x) || (gridF4_n.y!=n.y) || (gridF4_n.z!=n.z) ){
+        free( gridF4 );
+        gridF4   = (float*)malloc( sizeof(float)*4*(n.x+1)*(n.y+1)*(n.z+1) );
+        gridF4_n = n;
+    }
+    int nx = n.x; int nxy = n.x*n.y;
+    #pragma omp parallel for collapse(2)
+    for( int iz=0; iz<=n.z; iz++ ){
+        for( int iy=0; iy<=n.y; iy++ ){
+            float * out = gridF4 + 4*( iz*(n.y+1) + iy )*(n.x+1);
+            for( int ix=0; ix<=n.x; ix++ ){
+                const Vec3d& f = gridF[ i3D( ix%n.x, iy%n.y, iz%n.z ) ];
+                out[0] = f.x; out[1] = f.y; out[2] = f.z; out[3] = 0.0f;
+                out += 4;
+            }
+        }
+    }
+}
+
+// fit cubic B-spline coefficients to gridF
+void makeGridFB(){
+    const Vec3i n = gridShape.n;
+    const int ntot = n.x*n.y*n.z;
+    if( (gridFB==NULL) || (gridFB_n.x!=n.x) || (gridFB_n.y!=n.y) || (gridFB_n.z!=n.z) ){
+        delete [] gridFB;
+        gridFB   = new Vec3d[ntot];
+        gridFB_n = n;
+    }
+    for( int i=0; i<ntot; i++ ){ gridFB[i] = gridF[i]; }
+    prefilterBspline3D( n, 3, (double*)gridFB );
+}
+
+// fit cubic B-spline coefficients to gridE
+void makeGridEB(){
+    const Vec3i n = gridShape.n;
+    const int ntot = n.x*n.y*n.z;
+    if( (gridEB==NULL) || (gridEB_n.x!=n.x) || (gridEB_n.y!=n.y) || (gridEB_n.z!=n.z) ){
+        delete [] gridEB;
+        gridEB   = new double[ntot];
+        gridEB_n = n;
+    }
+    for( int i=0; i<ntot; i++ ){ gridEB[i] = gridE[i]; }
+    prefilterBspline3D( n, 1, gridEB );
+}
+
+// rebuild the grid used for interpolation of forces if it is derived from gridF or gridE and not up to date; must be called outside of parallel regions
+void syncGridF(){
+    if( (gridF_layout==0) || (!gridF_dirty) ) return;
+    switch( gridF_layout ){
+        case 1: if( gridF==NULL ){ return; } makeGridF4(); break;
+        case 2: if( gridF==NULL ){ return; } makeGridFB(); break;
+        case 3: if( gridE==NULL ){ return; } makeGridEB(); break;
+    }
+    gridF_dirty = false;
+}
+
+// interpolate force from surface at grid coordinates rGrid using the selected force-field layout
+inline Vec3d interpolateGridF( const Vec3d& rGrid ){
+    switch( gridF_layout ){
+        case 1: return interpolate3DvecPadF4  ( gridF4, gridShape.n, rGrid );
+        case 2: return interpolate3DvecBspline( gridFB, gridShape.n, rGrid );
+        case 3: {
+            Vec3d g; interpolate3DgradBspline( gridEB, gridShape.n, rGrid, g );   // gradient with respect to grid coordinates
+            Vec3d f; f.set_lincomb( -g.x, -g.y, -g.z, gridShape.diCell.a, gridShape.diCell.b, gridShape.diCell.c );
+            return f;
+        }
+    }
+    return interpolate3DvecWrap( gridF, gridShape.n, rGrid );
+}
+
 inline void getPPforce( const Vec3d& rTip, const Vec3d& r, Vec3d& f, TIP::SplineParams *splineParams ){
     Vec3d rGrid,drTip;
     rGrid.set( r.dot( gridShape.diCell.a ), r.dot( gridShape.diCell.b ), r.dot( gridShape.diCell.c ) );     // transform position from cartesian world coordinates to coordinates along which Force-Field data are sampled ( non-orthogonal cell )
     drTip.set_sub( r, rTip );                                                             // vector between Probe-particle and tip apex
-    f.set    ( interpolate3DvecWrap( gridF, gridShape.n, rGrid ) );                          // force from surface, interpolated from Force-Field data array
+    f.set    ( interpolateGridF( rGrid ) );                                                  // force from surface, interpolated from Force-Field data array
     if( splineParams ){
         f.add( forceRSpline( drTip, splineParams ) );                   // force from tip - radial component spline
     }else{
@@ -337,21 +419,31 @@ DLLEXPORT void setFIRE( double finc, double fdec, double falpha ){
 // set pointer to force field array ( the array is usually allocated in python, we can flexibely switch betweeen different precomputed forcefields )
 DLLEXPORT void setFF_Fpointer( double * gridF_ ){
     gridF = (Vec3d *)gridF_;
+    gridF_dirty = true;
+}
+
+// select layout used for interpolation of forces: 0 - trilinear from gridF directly (double), 1 - trilinear from padded float32 RGBA copy of gridF, 2 - cubic B-spline fitted to gridF, 3 - gradient of cubic B-spline fitted to gridE
+DLLEXPORT void setFF_layout( int layout ){
+    gridF_layout = layout;
+    gridF_dirty = true;
 }
 
 // set pointer to force field array ( the array is usually allocated in python, we can flexibely switch betweeen different precomputed forcefields )
 DLLEXPORT void setFF_Epointer( double * gridE_ ){
     gridE = gridE_;
+    gridF_dirty = true;
 }
 
 // set force field array pointer to NULL
 DLLEXPORT void deleteFF_Fpointer(){
     gridF = NULL;
+    gridF_dirty = true;
 }
 
 // set energy array pointer to NULL
 DLLEXPORT void deleteFF_Epointer(){
     gridE = NULL;
+    gridF_dirty = true;
 }
 
 // set forcefield grid dimension "n"
@@ -394,13 +486,107 @@ DLLEXPORT void getInPoints_LJ( int npoints, double * points_, double * FEs, int
 }
 
 
+// Sort atoms into a uniform grid of cubic cells spanning the bounding box of the atoms. The cell size is at least min_size,
+// and is increased if needed so that the number of cells stays proportional to the number of atoms.
+// Atoms in cell ic are cell_atoms[cell_start[ic] : cell_start[ic+1]].
+struct CellList{
+    Vec3d  pmin;
+    Vec3i  n;
+    double size;
+    int*   cell_start = NULL;
+    int*   cell_atoms = NULL;
+
+    inline int cellIndex( double x, int nx, double x0 ) const {
+        int i = (int)((x - x0) / size);
+        return (i < 0) ? 0 : ( (i >= nx) ? nx - 1 : i );
+    }
+
+    void build( int natoms, const Vec3d* ps, double min_size ){
+        Vec3d pmax = ps[0];
+        pmin = ps[0];
+        for(int i=1; i<natoms; i++){
+            pmin.x = fmin(pmin.x, ps[i].x); pmin.y = fmin(pmin.y, ps[i].y); pmin.z = fmin(pmin.z, ps[i].z);
+            pmax.x = fmax(pmax.x, ps[i].x); pmax.y = fmax(pmax.y, ps[i].y); pmax.z = fmax(pmax.z, ps[i].z);
+        }
+        size = min_size;
+        while( true ){
+            n.x = (int)((pmax.x - pmin.x) / size) + 1;
+            n.y = (int)((pmax.y - pmin.y) / size) + 1;
+            n.z = (int)((pmax.z - pmin.z) / size) + 1;
+            if( n.x * (double)n.y * n.z <= 8.0 * natoms + 64 ) break;
+            size *= 2;
+        }
+        int ncell = n.x * n.y * n.z;
+        int* cell_of = new int[natoms];
+        cell_start   = new int[ncell + 1];
+        cell_atoms   = new int[natoms];
+        for(int ic=0; ic<=ncell; ic++){ cell_start[ic] = 0; }
+        for(int i=0; i<natoms; i++){
+            cell_of[i] = ( cellIndex(ps[i].z, n.z, pmin.z) * n.y + cellIndex(ps[i].y, n.y, pmin.y) ) * n.x + cellIndex(ps[i].x, n.x, pmin.x);
+            cell_start[cell_of[i] + 1]++;
+        }
+        for(int ic=0; ic<ncell; ic++){ cell_start[ic + 1] += cell_start[ic]; }
+        int* fill = new int[ncell];
+        for(int ic=0; ic<ncell; ic++){ fill[ic] = cell_start[ic]; }
+        for(int i=0; i<natoms; i++){ cell_atoms[fill[cell_of[i]]++] = i; }
+        delete [] fill;
+        delete [] cell_of;
+    }
+
+    ~CellList(){
+        delete [] cell_start;
+        delete [] cell_atoms;
+    }
+};
+
+// Grimme-D3 coordination number of atom ia. Pairs farther apart than cutoff are skipped using the cell list,
+// or all pairs are summed if cells is NULL.
+inline double coordinationNumberD3( int ia, const int* elems, const double* r_cov, double k1, double k12, double cutoff, const CellList* cells ){
+    const Vec3d pos = Ratoms[ia];
+    const double r_cov_elem = r_cov[elems[ia] - 1];
+    double cn = 0;
+    if( cells == NULL ){
+        for (int j = 0; j < natoms; j++) {
+            if (j == ia) continue; // No self-interaction for coordination number
+            double d = (Ratoms[j] - pos).norm();
+            double r = r_cov[elems[j] - 1] + r_cov_elem;
+            cn += 1.0 / (1.0 + exp(k12 * r / d + k1));
+        }
+        return cn;
+    }
+    const double cut2 = cutoff * cutoff;
+    const Vec3i& n = cells->n;
+    int ix0 = cells->cellIndex(pos.x - cutoff, n.x, cells->pmin.x), ix1 = cells->cellIndex(pos.x + cutoff, n.x, cells->pmin.x);
+    int iy0 = cells->cellIndex(pos.y - cutoff, n.y, cells->pmin.y), iy1 = cells->cellIndex(pos.y + cutoff, n.y, cells->pmin.y);
+    int iz0 = cells->cellIndex(pos.z - cutoff, n.z, cells->pmin.z), iz1 = cells->cellIndex(pos.z + cutoff, n.z, cells->pmin.z);
+    for (int iz = iz0; iz <= iz1; iz++) {
+        for (int iy = iy0; iy <= iy1; iy++) {
+            for (int ix = ix0; ix <= ix1; ix++) {
+                int ic = ( iz * n.y + iy ) * n.x + ix;
+                for (int jc = cells->cell_start[ic]; jc < cells->cell_start[ic + 1]; jc++) {
+                    int j = cells->cell_atoms[jc];
+                    if (j == ia) continue;
+                    double d2 = (Ratoms[j] - pos).norm2();
+                    if (d2 > cut2) continue;
+                    double r = r_cov[elems[j] - 1] + r_cov_elem;
+                    cn += 1.0 / (1.0 + exp(k12 * r / sqrt(d2) + k1));
+                }
+            }
+        }
+    }
+    return cn;
+}
+
 DLLEXPORT void computeD3Coeffs(
-    const int natoms_, const double *rs, const int *elems, const double *r_cov, const double *r_cut, const double *ref_cn,
-    const double *ref_c6, const double *r4r2, const double *k, const double *params, const int elem_pp, double *d3_coeffs
+    const int natoms_, const double *rs, const int *elems, const double *r_cov, const double *ref_cn,
+    const double *c6_pp, const double *r4r2, const double *k, const double *params, const int elem_pp, const double cn_cutoff, double *d3_coeffs
 ) {
+    // c6_pp has shape (MAX_D3_ELEM, MAX_REF_CN) and holds the reference C6 coefficients of each element with the probe particle,
+    // already contracted with the normalized gaussian weights of the probe particle reference coordination numbers.
 
     natoms = natoms_;
     Ratoms = (Vec3d*)rs;
+    if (natoms == 0) return;
 
     const double k1  = k[0];
     const double k2  = k[1];
@@ -412,79 +598,46 @@ DLLEXPORT void computeD3Coeffs(
     const double a1 = params[2];
     const double a2 = params[3];
 
-    float L[MAX_REF_CN * MAX_REF_CN];
+    const int pp_ind = elem_pp - 1;
 
-    // Compute reference C6 weights for the probe particle
-    int pp_ind = elem_pp - 1;
-    double L_pp[MAX_REF_CN];
-    int i;
-    for (i = 0; i < MAX_REF_CN; i++) {
-        double pp_cn = ref_cn[pp_ind * MAX_REF_CN + i];
-        if (pp_cn >= 0.0f) { // Values less that 0 zero are invalid and should not be counted.
-            L_pp[i] = exp(k3 * pp_cn * pp_cn);
-        }
+    CellList cells;
+    CellList* pcells = NULL;
+    if (cn_cutoff > 0) {
+        cells.build(natoms, Ratoms, cn_cutoff);
+        pcells = &cells;
     }
-    int max_ref_pp = i;
-
 
+    #pragma omp parallel for schedule(static)
     for (int ia = 0; ia < natoms; ia++) { // Loop over all atoms
 
-        const Vec3d pos = Ratoms[ia];
         const int elem_ind = elems[ia] - 1;
-        const double r_cov_elem = r_cov[elem_ind];
 
         // Compute the coordination number for this atom
-        double cn = 0;
-        for (int j = 0; j < natoms; j++) {
-            if (j == ia) continue; // No self-interaction for coordination number
-            double d = (Ratoms[j] - pos).norm();
-            double r = r_cov[elems[j] - 1] + r_cov_elem;
-            cn += 1.0f / (1.0f + exp(k12 * r / d + k1));
-        }
+        double cn = coordinationNumberD3(ia, elems, r_cov, k1, k12, cn_cutoff, pcells);
 
-        // Compute gaussian weights and normalization factor for all of the reference
-        // coordination numbers.
+        // Compute C6 coefficient as a linear combination of reference C6 values weighted by gaussians
+        // of the distance to the reference coordination numbers
         double norm = 0;
-        int a, b;
+        double c6 = 0;
+        int a;
         for (a = 0; a < MAX_REF_CN; a++) {
             double ref_cn_a = ref_cn[elem_ind * MAX_REF_CN + a];
-            if (ref_cn_a < 0.0f) break; // Invalid values after this
+            if (ref_cn_a < 0.0) break; // Invalid values after this
             double diff_cn_a = ref_cn_a - cn;
             double L_a = exp(k3 * diff_cn_a * diff_cn_a);
-            for (b = 0; b < max_ref_pp; b++) {
-                double L_ab = L_a * L_pp[b];
-                norm += L_ab;
-                L[a * MAX_REF_CN + b] = L_ab;
-            }
+            norm += L_a;
+            c6   += L_a * c6_pp[elem_ind * MAX_REF_CN + a];
         }
         int max_ref_a = a;
 
         // If the coordination number is so high that the gaussian weights are all zero,
         // then we put all of the weight on the highest reference coordination number.
         if (norm == 0) {
-            int a_ind = (max_ref_a - 1) * MAX_REF_CN;
-            for (b = 0; b < max_ref_pp; b++) {
-                double L_ab = L_pp[b];
-                norm += L_ab;
-                L[a_ind + b] = L_ab;
-            }
+            c6 = c6_pp[elem_ind * MAX_REF_CN + max_ref_a - 1];
+        } else {
+            c6 /= norm;
         }
 
-        // Compute C6 coefficient as a linear combination of reference C6 values
-        int n_zw = MAX_REF_CN * MAX_REF_CN;
-        int n_yzw = MAX_D3_ELEM * n_zw;
-        int pair_ind = elem_ind * n_yzw + pp_ind * n_zw;  // ref_c6 shape = (MAX_D3_ELEM, MAX_D3_ELEM, MAX_REF_CN, MAX_REF_CN)
-        double c6 = 0;
-        for (int a = 0; a < max_ref_a; a++) {
-            int a_ind = a * MAX_REF_CN;
-            for (int b = 0; b < max_ref_pp; b++) {
-                int L_ind = a_ind + b;
-                int c6_ind = pair_ind + L_ind;
-                c6 += L[L_ind] * ref_c6[c6_ind];
-            }
-        }
-        c6 /= norm;
-
         // The C8 coefficient is inferred from the C6 coefficient
         double qq = 3 * r4r2[elem_ind] * r4r2[pp_ind];
         double c8 = qq * c6;
@@ -508,6 +661,7 @@ DLLEXPORT void computeD3Coeffs(
 DLLEXPORT void getLennardJonesFF( int natoms_, double * Ratoms_, double * cLJs ){
     natoms=natoms_; Ratoms=(Vec3d*)Ratoms_; nCoefPerAtom = 2;
     Vec3d r0; r0.set(0.0,0.0,0.0);
+    gridF_dirty = true;
     //interateGrid3D < evalCell < addAtom_LJ  > >( r0, gridShape.n, gridShape.dCell, cLJs );
     interateGrid3D_omp < evalCell < addAtom_LJ  > >( r0, gridShape.n, gridShape.dCell, cLJs );
 }
@@ -515,6 +669,7 @@ DLLEXPORT void getLennardJonesFF( int natoms_, double * Ratoms_, double * cLJs )
 DLLEXPORT void getVdWFF( int natoms_, double * Ratoms_, double * cLJs ){
     natoms=natoms_; Ratoms=(Vec3d*)Ratoms_; nCoefPerAtom = 2;
     Vec3d r0; r0.set(0.0,0.0,0.0);
+    gridF_dirty = true;
     //interateGrid3D < evalCell < addAtom_VdW  > >( r0, gridShape.n, gridShape.dCell, cLJs );
     interateGrid3D_omp < evalCell < addAtom_VdW  > >( r0, gridShape.n, gridShape.dCell, cLJs );
 
@@ -523,6 +678,7 @@ DLLEXPORT void getVdWFF( int natoms_, double * Ratoms_, double * cLJs ){
 DLLEXPORT void getDFTD3FF(int natoms_, double * Ratoms_, double *d3_coeffs){
     natoms = natoms_; Ratoms = (Vec3d*)Ratoms_; nCoefPerAtom = 4;
     Vec3d r0; r0.set(0.0,0.0,0.0);
+    gridF_dirty = true;
     //interateGrid3D < evalCell < addAtom_DFTD3  > >( r0, gridShape.n, gridShape.dCell, d3_coeffs );
     interateGrid3D_omp < evalCell < addAtom_DFTD3  > >( r0, gridShape.n, gridShape.dCell, d3_coeffs );
 
@@ -531,6 +687,7 @@ DLLEXPORT void getDFTD3FF(int natoms_, double * Ratoms_, double *d3_coeffs){
 DLLEXPORT void getMorseFF( int natoms_, double * Ratoms_, double * REs, double alpha ){
     natoms=natoms_; Ratoms=(Vec3d*)Ratoms_; nCoefPerAtom = 2; Morse_alpha = alpha;
     Vec3d r0; r0.set(0.0,0.0,0.0);
+    gridF_dirty = true;
     //interateGrid3D < evalCell < addAtom_Morse > >( r0, gridShape.n, gridShape.dCell, REs );
     interateGrid3D_omp < evalCell < addAtom_Morse > >( r0, gridShape.n, gridShape.dCell, REs );
 }
@@ -540,6 +697,7 @@ DLLEXPORT void getMorseFF( int natoms_, double * Ratoms_, double * REs, double a
 DLLEXPORT void getCoulombFF( int natoms_, double * Ratoms_, double * kQQs, int kind ){
     natoms=natoms_; Ratoms=(Vec3d*)Ratoms_; nCoefPerAtom = 1;
     Vec3d r0; r0.set(0.0,0.0,0.0);
+    gridF_dirty = true;
     //printf(" kind %i \n", kind );
     switch(kind){
         //case 0: interateGrid3D < evalCell < foo  > >( r0, gridShape.n, gridShape.dCell, kQQs_ );
@@ -578,6 +736,7 @@ DLLEXPORT void getVdWFF_RE( int natoms_, double * Ratoms_, double * REs, int kin
     //printf( "DEBUG getVdWFF_RE(kind=%i,ADamp=%g) \n", kind, ADamp_ );
     natoms=natoms_; Ratoms=(Vec3d*)Ratoms_; nCoefPerAtom = 2;
     Vec3d r0; r0.set(0.0,0.0,0.0);
+    gridF_dirty = true;
     //if(ADamp>0){ ADamp = ADamp_; }
     switch(kind){
         //case 0: if(ADamp_>0){ ADamp_Const = ADamp_; }; E=addAtom_VdW      ( dR, fout, coefs ); break;
@@ -631,6 +790,7 @@ DLLEXPORT void getDensityR4spline( int natoms_, double * Ratoms_, double * cRAs
 // for efficiency, starting position of ProbeParticle in new point (next postion of Tip) is derived from relaxed postion of ProbeParticle from previous point
 // there are several strategies how to do it which are choosen by parameter probeStart
 DLLEXPORT int relaxTipStroke( int probeStart, int relaxAlg, int nstep, double * rTips_, double * rs_, double * fs_, TIP::SplineParams *splineParams ){
+    syncGridF();
     Vec3d * rTips = (Vec3d*) rTips_;
     Vec3d * rs    = (Vec3d*) rs_;
     Vec3d * fs    = (Vec3d*) fs_;
@@ -664,7 +824,7 @@ DLLEXPORT int relaxTipStroke( int probeStart, int relaxAlg, int nstep, double *
         Vec3d rGrid;
         rGrid.set( rProbe.dot( gridShape.diCell.a ), rProbe.dot( gridShape.diCell.b ), rProbe.dot( gridShape.diCell.c ) );
         rs[i].set( rProbe                               );
-        fs[i].set( interpolate3DvecWrap( gridF, gridShape.n, rGrid ) );
+        fs[i].set( interpolateGridF( rGrid ) );
         // count some statistics about number of iterations required; just for testing
         itrsum += itr;
         //itrmin  = ( itr < itrmin ) ? itr : itrmin;
@@ -680,6 +840,7 @@ DLLEXPORT int relaxTipStroke( int probeStart, int relaxAlg, int nstep, double *
 // there are several strategies how to do it which are choosen by parameter probeStart
 DLLEXPORT int relaxTipStrokes_omp( int nx, int ny, int probeStart, int relaxAlg, int nstep, double * rTips_, double * rs_, double * fs_, TIP::SplineParams *splineParams ){
     printf( "relaxTipStrokes_omp()  nx %i ny %i nstep %i \n", nx, ny, nstep );
+    syncGridF();
     int ndone=0;
     #pragma omp parallel for collapse(2) shared( nx, ny, probeStart, relaxAlg, nstep, rTips_, rs_, fs_, ndone )
     for (int ix=0; ix<nx; ix++){
@@ -699,6 +860,21 @@ DLLEXPORT int relaxTipStrokes_omp( int nx, int ny, int probeStart, int relaxAlg,
     return 0;
 }
 
+// evaluate dynamical matrix of probe particle at position rPP for tip position rTip by finite differences of total force
+void evalDynMat( double ddisp, const Vec3d& rTip, Vec3d rPP, Mat3d& dynmat, TIP::SplineParams *sp, bool bSymmetrize ){
+    Vec3d f1,f2;
+    // eval dynamical matrix    D_xy = df_y/dx    = ( f(r0+dx).y - f(r0-dx).y ) / (2*dx)
+    rPP.x-=ddisp; getPPforce( rTip, rPP, f1, sp ); rPP.x+=2*ddisp; getPPforce( rTip, rPP, f2, sp );  rPP.x-=ddisp; dynmat.a.set_sub(f2,f1); dynmat.a.mul(-0.5/ddisp);
+    rPP.y-=ddisp; getPPforce( rTip, rPP, f1, sp ); rPP.y+=2*ddisp; getPPforce( rTip, rPP, f2, sp );  rPP.y-=ddisp; dynmat.b.set_sub(f2,f1); dynmat.b.mul(-0.5/ddisp);
+    rPP.z-=ddisp; getPPforce( rTip, rPP, f1, sp ); rPP.z+=2*ddisp; getPPforce( rTip, rPP, f2, sp );  rPP.z-=ddisp; dynmat.c.set_sub(f2,f1); dynmat.c.mul(-0.5/ddisp);
+    if( !bSymmetrize ) return;
+    // symmetrize - to make sure that our symmetric matrix solver work properly
+    double tmp;
+    tmp = 0.5*(dynmat.xy + dynmat.yx); dynmat.xy = tmp; dynmat.yx = tmp;
+    tmp = 0.5*(dynmat.yz + dynmat.zy); dynmat.yz = tmp; dynmat.zy = tmp;
+    tmp = 0.5*(dynmat.zx + dynmat.xz); dynmat.zx = tmp; dynmat.xz = tmp;
+}
+
 DLLEXPORT void stiffnessMatrix( double ddisp, int which, int n, double * rTips_, double * rPPs_, double * eigenvals_, double * evec1_, double * evec2_, double * evec3_, TIP::SplineParams *sp ){
     //printf( "C++ stiffnessMatrix() n=%i \n", n );
     Vec3d * rTips     = (Vec3d*) rTips_;
@@ -707,27 +883,21 @@ DLLEXPORT void stiffnessMatrix( double ddisp, int which, int n, double * rTips_,
     Vec3d * evec1     = (Vec3d*) evec1_;
     Vec3d * evec2     = (Vec3d*) evec2_;
     Vec3d * evec3     = (Vec3d*) evec3_;
+    syncGridF();
     //printf( "C++ stiffnessMatrix() gridShape.n(%i,%i,%i) \n", gridShape.n.x, gridShape.n.y, gridShape.n.z  );
     //printf( "C++ stiffnessMatrix() gridF=%li \n", (long)gridF  );
     //Vec3d gf=gridF[0];                                        printf( "gridF[0 ] (%g,%g,%g) \n",gf.x,gf.y,gf.z );
     //gf=gridF[ gridShape.n.x*gridShape.n.y*gridShape.n.z -1 ]; printf( "gridF[-1] (%g,%g,%g) \n",gf.x,gf.y,gf.z);
     //Vec3d pmin,pmax; pmin.set( 1e+300, 1e+300, 1e+300 ); pmax.set( -1e+300, -1e+300, -1e+300 );
     for(int i=0; i<n; i++){
-        Vec3d rTip,rPP,f1,f2;
+        Vec3d rTip,rPP;
         rTip.set( rTips[i] );
         rPP.set ( rPPs[i]  );
         Mat3d dynmat;
         //pmin.setIfLower(rPP); pmax.setIfGreater(rPP);
-        // eval dynamical matrix    D_xy = df_y/dx    = ( f(r0+dx).y - f(r0-dx).y ) / (2*dx)
-        rPP.x-=ddisp; getPPforce( rTip, rPP, f1, sp ); rPP.x+=2*ddisp; getPPforce( rTip, rPP, f2, sp );  rPP.x-=ddisp; dynmat.a.set_sub(f2,f1); dynmat.a.mul(-0.5/ddisp);
-        rPP.y-=ddisp; getPPforce( rTip, rPP, f1, sp ); rPP.y+=2*ddisp; getPPforce( rTip, rPP, f2, sp );  rPP.y-=ddisp; dynmat.b.set_sub(f2,f1); dynmat.b.mul(-0.5/ddisp);
-        rPP.z-=ddisp; getPPforce( rTip, rPP, f1, sp ); rPP.z+=2*ddisp; getPPforce( rTip, rPP, f2, sp );  rPP.z-=ddisp; dynmat.c.set_sub(f2,f1); dynmat.c.mul(-0.5/ddisp);
-        // symmetrize - to make sure that our symmetric matrix solver work properly
-        double tmp;
-        tmp = 0.5*(dynmat.xy + dynmat.yx); dynmat.xy = tmp; dynmat.yx = tmp;
-        tmp = 0.5*(dynmat.yz + dynmat.zy); dynmat.yz = tmp; dynmat.zy = tmp;
-        tmp = 0.5*(dynmat.zx + dynmat.xz); dynmat.zx = tmp; dynmat.xz = tmp;
+        evalDynMat( ddisp, rTip, rPP, dynmat, sp, true );
         // solve mat
+        double tmp;
         Vec3d evals; dynmat.eigenvals( evals ); Vec3d temp;
         double eval_check = evals.a * evals.b * evals.c;
         //if( fabs(eval_check) < 1e-16 ){  };
@@ -748,6 +918,32 @@ DLLEXPORT void stiffnessMatrix( double ddisp, int which, int n, double * rTips_,
    // printf( "C++ stiffnessMatrix() DONE! pmin(%g,%g,%g) pmax(%g,%g,%g) \n", pmin.x, pmin.y, pmin.z, pmax.x, pmax.y, pmax.z );
 }
 
+// evaluate full non-symmetrized dynamical matrices (3x3, row-major, dynmat[i][j] = -dF_j/dr_i) of probe particle in "n" positions "rPPs_" for tip positions "rTips_"
+DLLEXPORT void dynamicalMatrices( double ddisp, int n, double * rTips_, double * rPPs_, double * dynmats_, TIP::SplineParams *sp ){
+    Vec3d * rTips   = (Vec3d*) rTips_;
+    Vec3d * rPPs    = (Vec3d*) rPPs_;
+    Mat3d * dynmats = (Mat3d*) dynmats_;
+    syncGridF();
+    #pragma omp parallel for
+    for(int i=0; i<n; i++){
+        evalDynMat( ddisp, rTips[i], rPPs[i], dynmats[i], sp, false );
+    }
+}
+
+// interpolate forces from surface in "n" cartesian positions "rs_" at once using the selected force-field layout, results are stored in "fs_"
+DLLEXPORT void interpolateForces( int n, double * rs_, double * fs_ ){
+    Vec3d * rs = (Vec3d*) rs_;
+    Vec3d * fs = (Vec3d*) fs_;
+    syncGridF();
+    #pragma omp parallel for
+    for(int i=0; i<n; i++){
+        const Vec3d& r = rs[i];
+        Vec3d rGrid;
+        rGrid.set( r.dot( gridShape.diCell.a ), r.dot( gridShape.diCell.b ), r.dot( gridShape.diCell.c ) );
+        fs[i] = interpolateGridF( rGrid );
+    }
+}
+
 DLLEXPORT void subsample_uniform_spline( double x0, double dx, int n, double * ydys, int m, double * xs_, double * ys_ ){
     double denom = 1/dx;
     for( int j=0; j<m; j++ ){
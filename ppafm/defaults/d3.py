@@ -186,8 +186,15 @@ Factor in exponent of Gaussian weight function in reference coordination number
 calculation for Grimme-D3.
 """
 
+CN_CUTOFF = 25 * 0.5291772109217
+"""
+Cut-off distance for pairs of atoms in the coordination number calculation for Grimme-D3. Same as the default
+25 bohr in the original implementation. Units are Ångströms.
+"""
+
 _REF_C6 = None
 _R0_AB = None
+_C6_PP = {}
 
 
 def load_ref_c6():
@@ -226,6 +233,26 @@ def load_R0():
     return _R0_AB
 
 
+def load_ref_c6_pp(elem_pp):
+    """
+    Get the reference C6 coefficients of all elements paired with the probe particle. The probe particle is assumed
+    to have coordination number zero, so the weights of its reference coordination numbers are fixed and can be
+    contracted into the C6 table ahead of time. The tables are cached per probe particle element.
+
+    Arguments:
+        elem_pp: int. Atomic number of the probe particle.
+
+    Returns:
+        c6_pp: numpy.ndarray of shape (94, 5). C6 coefficients for the reference coordination numbers in :data:`REF_CN`
+            of each element. Units are eV*Å^6.
+    """
+    if elem_pp not in _C6_PP:
+        pp_cn = REF_CN[elem_pp - 1]
+        L_pp = np.where(pp_cn >= 0, np.exp(-K3 * pp_cn**2), 0.0)
+        _C6_PP[elem_pp] = load_ref_c6()[:, elem_pp - 1] @ L_pp / L_pp.sum()
+    return _C6_PP[elem_pp]
+
+
 # fmt: off
 DF_DEFAULT_PARAMS = {
     'PBE'     : {'s6': 1.000, 's8': 0.7875, 'a1':  0.4289, 'a2': 4.4407},
@@ -30,7 +30,7 @@ def getSize(inp_axis, dims, sampleSize):
 
 def getMGrid(dims, dd):
     "returns coordinate arrays X, Y, Z"
-    (dx, dy, dz) = dd
+    dx, dy, dz = dd
     nDim = [dims[2], dims[1], dims[0]]
     XYZ = np.mgrid[0 : nDim[0], 0 : nDim[1], 0 : nDim[2]].astype(float)
     # fmt: off
@@ -312,6 +312,8 @@ def potential2forces_mem(V, lvec, nDim, sigma=0.7, rho=None, multipole=None, doF
         if verbose > 0:
             print("--- prepare Force transforms ---")
         zetaX, zetaY, zetaZ, detLmatInv = getForceTransform(sampleSize, dims, dd, X, Y, Z)
+    else:
+        detLmatInv = np.abs(np.linalg.det(getNormalizedBasisMatrix(sampleSize).getI()))
     del X, Y, Z
     E = None
     Fx = None
@@ -343,7 +345,7 @@ def potential2forces_mem(V, lvec, nDim, sigma=0.7, rho=None, multipole=None, doF
         Fz = np.real(np.fft.ifftn(zetaZ * convFFT))
         del zetaZ
         gc.collect()
-    if verbose > 0:
+    if verbose > 0 and doForce:
         print("Fz.max(), Fz.min() = ", Fz.max(), Fz.min())
     return Fx, Fy, Fz, E
 
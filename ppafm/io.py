@@ -3,11 +3,12 @@
 import copy
 import os
 import re
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
 
 import numpy as np
 
 from . import elements
-from .GridUtils import readNumsUpTo
 
 bohrRadius2angstroem = 0.5291772109217
 Hartree2eV = 27.211396132
@@ -296,36 +297,50 @@ def loadNPYGeom(fname):
     return [e, x, y, z, q], nDim, lvec
 
 
-def loadAtomsCUBE(fname):
-    bohrRadius2angstroem = 0.5291772109217  # find a good place for this
+def _readCUBEHeader(filein):
+    """
+    Read the header of a cube file from a file opened in binary mode and leave the file at the start of the volumetric data.
+
+    Returns:
+        atoms: list [e, x, y, z, q]. Elements, coordinates in angstroms, and zero charges of the atoms.
+        lvec: np.ndarray of shape (4, 3). Origin and cell vectors of the grid in angstroms.
+        nDim: np.ndarray of shape (3,). Number of voxels along each axis in (x, y, z) order.
+    """
+    # First two lines of the header are comments
+    filein.readline()
+    filein.readline()
+    # The third line has the number of atoms included in the file followed by the position of the origin of the volumetric data.
+    sth0 = filein.readline().split()
+    # The next three lines give the number of voxels along each axis (x, y, z) followed by the axis vector
+    sth1 = filein.readline().split()
+    sth2 = filein.readline().split()
+    sth3 = filein.readline().split()
+    nDim = np.array([int(sth1[0]), int(sth2[0]), int(sth3[0])])
+    lvec = np.zeros((4, 3))
+    for jj in range(3):
+        lvec[0, jj] = float(sth0[jj + 1]) * bohrRadius2angstroem
+        lvec[1, jj] = float(sth1[jj + 1]) * nDim[0] * bohrRadius2angstroem
+        lvec[2, jj] = float(sth2[jj + 1]) * nDim[1] * bohrRadius2angstroem
+        lvec[3, jj] = float(sth3[jj + 1]) * nDim[2] * bohrRadius2angstroem
     e = []
     x = []
     y = []
     z = []
     q = []
-    f = open(fname)
-    # First two lines of the header are comments
-    f.readline()
-    f.readline()
-    # The third line has the number of atoms included in the file followed by the position of the origin of the volumetric data.
-    sth0 = f.readline().split()
-    # The next three lines give the number of voxels along each axis (x, y, z) followed by the axis vector
-    f.readline().split()
-    f.readline().split()
-    f.readline().split()
-
-    # origin = [float(sth0[1]), float(sth0[2]), float(sth0[3])]
-    nlines = int(sth0[0])
-    for i in range(nlines):
-        l = f.readline().split()
-        r = [float(l[2]), float(l[3]), float(l[4])]
-        x.append(r[0] * bohrRadius2angstroem)
-        y.append(r[1] * bohrRadius2angstroem)
-        z.append(r[2] * bohrRadius2angstroem)
+    for i in range(int(sth0[0])):
+        l = filein.readline().split()
+        x.append(float(l[2]) * bohrRadius2angstroem)
+        y.append(float(l[3]) * bohrRadius2angstroem)
+        z.append(float(l[4]) * bohrRadius2angstroem)
         e.append(int(l[0]))
         q.append(0.0)
-    f.close()
-    return [e, x, y, z, q]
+    return [e, x, y, z, q], lvec, nDim
+
+
+def loadAtomsCUBE(fname):
+    with open(fname, "rb") as f:
+        atoms, _, _ = _readCUBEHeader(f)
+    return atoms
 
 
 def primcoords2Xsf(iZs, xyzs, lvec):
@@ -358,51 +373,15 @@ def primcoords2Xsf(iZs, xyzs, lvec):
 
 
 def loadCellCUBE(fname):
-    bohrRadius2angstroem = 0.5291772109217  # find a good place for this
-    f = open(fname)
-    # First two lines of the header are comments
-    f.readline()
-    f.readline()
-    # The third line has the number of atoms included in the file followed by the position of the origin of the volumetric data.
-    line = f.readline().split()
-    int(line[0])
-    c0 = [float(s) for s in line[1:4]]
-
-    # The next three lines give the number of voxels along each axis (x, y, z) followed by the axis vector
-    line = f.readline().split()
-    n1 = int(line[0])
-    c1 = [float(s) for s in line[1:4]]
-
-    line = f.readline().split()
-    n2 = int(line[0])
-    c2 = [float(s) for s in line[1:4]]
-
-    line = f.readline().split()
-    n3 = int(line[0])
-    c3 = [float(s) for s in line[1:4]]
-
-    cell0 = [c0[0] * bohrRadius2angstroem, c0[1] * bohrRadius2angstroem, c0[2] * bohrRadius2angstroem]
-    cell1 = [c1[0] * n1 * bohrRadius2angstroem, c1[1] * n1 * bohrRadius2angstroem, c1[2] * n1 * bohrRadius2angstroem]
-    cell2 = [c2[0] * n2 * bohrRadius2angstroem, c2[1] * n2 * bohrRadius2angstroem, c2[2] * n2 * bohrRadius2angstroem]
-    cell3 = [c3[0] * n3 * bohrRadius2angstroem, c3[1] * n3 * bohrRadius2angstroem, c3[2] * n3 * bohrRadius2angstroem]
-    f.close()
-    return [cell0, cell1, cell2, cell3]
+    with open(fname, "rb") as f:
+        _, lvec, _ = _readCUBEHeader(f)
+    return lvec.tolist()
 
 
 def loadNCUBE(fname):
-    bohrRadius2angstroem = 0.5291772109217  # find a good place for this
-    f = open(fname)
-    # First two lines of the header are comments
-    f.readline()
-    f.readline()
-    # The third line has the number of atoms included in the file followed by the position of the origin of the volumetric data.
-    f.readline().split()
-    # The next three lines give the number of voxels along each axis (x, y, z) followed by the axis vector
-    sth1 = f.readline().split()
-    sth2 = f.readline().split()
-    sth3 = f.readline().split()
-    f.close()
-    return [int(sth1[0]), int(sth2[0]), int(sth3[0])]
+    with open(fname, "rb") as f:
+        _, _, nDim = _readCUBEHeader(f)
+    return nDim.tolist()
 
 
 def loadGeometry(fname=None, format=None, parameters=None):
@@ -429,14 +408,15 @@ def loadGeometry(fname=None, format=None, parameters=None):
     else:
         format = format.lower()  # prevent format from being case sensitive, e.g. "XYZ" and "xyz" should be the same
 
-    xyzs = Zs = qs = None
+    xyzs = Zs = qs = atoms = nDim = None
     if format == "xyz":
         xyzs, Zs, qs, comment = loadXYZ(fname)
         lvec = parseLvecASE(comment)
     elif format == "cube":
-        atoms = loadAtomsCUBE(fname)
-        lvec = loadCellCUBE(fname)
-        nDim = loadNCUBE(fname)
+        with open(fname, "rb") as f:
+            atoms, lvec, nDim = _readCUBEHeader(f)
+        lvec = lvec.tolist()
+        nDim = nDim.tolist()
     elif format == "xsf":
         atoms, nDim, lvec = loadXSFGeom(fname)
     elif format == "npy":
@@ -452,6 +432,11 @@ def loadGeometry(fname=None, format=None, parameters=None):
         else:
             raise ValueError("ERROR!!! Unknown format %s of input geometry." % (format))
 
+    return _completeGeometry(xyzs, Zs, qs, atoms, nDim, lvec, parameters)
+
+
+def _completeGeometry(xyzs, Zs, qs, atoms, nDim, lvec, parameters):
+    """Unify the geometry returned by the different loaders and fill in the missing grid parameters in :func:`loadGeometry`."""
     if xyzs is not None:
         # Some of the load functions return the result in a different form. Really the return values should be unified.
         assert Zs is not None, "Somehow loaded xyzs without Zs"
@@ -514,6 +499,62 @@ def loadGeometry(fname=None, format=None, parameters=None):
     return atoms, nDim, lvec
 
 
+def loadGeometryAndGrid(fname=None, format=None, parameters=None, xyz_order=False, verbose=True):
+    """
+    Load the geometry and the data grid from a .cube or .xsf file in a single pass over the file.
+
+    This is equivalent to calling :func:`loadGeometry` followed by :func:`loadCUBE` or :func:`loadXSF`,
+    but the file is opened and parsed only once.
+
+    Arguments:
+        fname: str. Path to the file.
+        format: str or None. 'cube' or 'xsf'. Determined from the file extension if None.
+        parameters: :class:`.PpafmParameters`. Parameters updated with the grid as in :func:`loadGeometry`.
+        xyz_order: bool. Return the data grid in (x, y, z) order instead of (z, y, x).
+        verbose: bool. Print information about the loading.
+
+    Returns:
+        atoms, nDim, lvec: Geometry as returned by :func:`loadGeometry`.
+        grid: tuple (data, lvec, nDim, head). Data grid as returned by :func:`loadCUBE` or :func:`loadXSF`.
+    """
+    if fname is None:
+        raise ValueError("Please provide the name of the file with coordinates")
+    if parameters is None:
+        raise ValueError("Please provide the parameters dictionary here")
+    data, lvec, nDim, head, atoms = loadGridFile(fname, format=format, xyz_order=xyz_order, verbose=verbose)
+    if atoms is None:
+        raise ValueError(f"No PRIMCOORD section with the geometry in file `{fname}`.")
+    atoms_nDim = nDim[::-1]  # loadGeometry has the grid size in (x, y, z) order
+    grid = (data, lvec, nDim, head)
+    atoms, atoms_nDim, atoms_lvec = _completeGeometry(None, None, None, atoms, list(atoms_nDim), lvec.tolist(), parameters)
+    return atoms, atoms_nDim, atoms_lvec, grid
+
+
+def loadGridFile(fname, format=None, xyz_order=False, verbose=True):
+    """
+    Load a data grid and the atoms from a .cube or .xsf file in a single pass over the file.
+
+    Arguments:
+        fname: str. Path to the file.
+        format: str or None. 'cube' or 'xsf'. Determined from the file extension if None.
+        xyz_order: bool. Return the data grid in (x, y, z) order instead of (z, y, x).
+        verbose: bool. Print information about the loading.
+
+    Returns:
+        data, lvec, nDim, head: Data grid as returned by :func:`loadCUBE` or :func:`loadXSF`.
+        atoms: list [e, x, y, z, q] or None. Atoms in the file. None if an xsf file has no PRIMCOORD section.
+    """
+    if not format:
+        format = os.path.splitext(fname)[1][1:]
+    format = format.lower()
+    if format == "cube":
+        return _loadCUBE(fname, xyz_order=xyz_order, verbose=verbose)
+    elif format == "xsf":
+        return _loadXSF(fname, xyz_order=xyz_order, verbose=verbose)
+    else:
+        raise ValueError(f"Unsupported format `{format}` of grid file `{fname}`. Should be 'cube' or 'xsf'.")
+
+
 def parseLvecASE(comment):
     """
     Try to parse the lattice vectors in an xyz file comment line according to the extended xyz
@@ -583,52 +624,98 @@ BEGIN_BLOCK_DATAGRID_3D
 """
 
 
+def _writeGridData(fileout, data):
+    """
+    Write a data grid of shape (nz, ny, nx) as (nz + 1) * (ny + 1) * (nx + 1) values, one per line, since the first and
+    the last point in XSF in every direction is the same. The values are formatted one z-slice at a time straight from
+    the (possibly strided) input array, so only one slice is ever copied.
+    """
+    data = np.asarray(data)
+    nz, ny, nx = data.shape
+    iy = np.arange(ny + 1) % ny
+    ix = np.arange(nx + 1) % nx
+    fmt = "%10.5e\n" * ((ny + 1) * (nx + 1))
+    for iz in range(nz + 1):
+        slab = data[iz % nz][iy][:, ix]
+        fileout.write(fmt % tuple(slab.ravel().tolist()))
+
+
 def saveXSF(fname, data, lvec=None, dd=None, head=XSF_HEAD_DEFAULT, verbose=1):
     if verbose > 0:
         print("Saving xsf", fname)
-    fileout = open(fname, "w")
     if lvec is None:
         if dd is None:
             dd = [1.0, 1.0, 1.0]
         lvec = _orthoLvec(data.shape, dd)
-    for line in head:
-        fileout.write(line)
-    nDim = np.shape(data)
-    _writeArr(fileout, (nDim[2] + 1, nDim[1] + 1, nDim[0] + 1))
-    _writeArr2D(fileout, lvec)
-    data2 = np.zeros(np.array(nDim) + 1)
-    # These crazy 3 lines are here since the first and the last cube in XSF in every direction is the same
-    data2[:-1, :-1, :-1] = data
-    data2[-1, :, :] = data2[0, :, :]
-    data2[:, -1, :] = data2[:, 0, :]
-    data2[:, :, -1] = data2[:, :, 0]
-    for r in data2.flat:
-        fileout.write("%10.5e\n" % r)
-    fileout.write("   END_DATAGRID_3D\n")
-    fileout.write("END_BLOCK_DATAGRID_3D\n")
-
+    with open(fname, "w") as fileout:
+        for line in head:
+            fileout.write(line)
+        nDim = np.shape(data)
+        _writeArr(fileout, (nDim[2] + 1, nDim[1] + 1, nDim[0] + 1))
+        _writeArr2D(fileout, lvec)
+        _writeGridData(fileout, data)
+        fileout.write("   END_DATAGRID_3D\n")
+        fileout.write("END_BLOCK_DATAGRID_3D\n")
+
+
+def _readXSFHeader(filein):
+    """
+    Read the header of an xsf file from a file opened in binary mode up to and including the grid origin and cell vectors,
+    and leave the file at the start of the data grid.
 
-def loadXSF(fname, xyz_order=False, verbose=True):
-    filein = open(fname)
-    startline, head = _readUpTo(filein, "BEGIN_DATAGRID_3D")  # startline - number of the line with DATAGRID_3D_. Dinensions are located in the next line
+    Returns:
+        head: list of str. Header lines up to and including the line with BEGIN_DATAGRID_3D.
+        nDim: np.ndarray of shape (3,). Number of grid points in (z, y, x) order including the periodic copies.
+        lvec: np.ndarray of shape (4, 3). Origin and cell vectors of the grid.
+    """
+    head = []
+    while True:
+        line = filein.readline()
+        if not line:
+            raise ValueError("No BEGIN_DATAGRID_3D in xsf file.")
+        head.append(line.decode())
+        if "BEGIN_DATAGRID_3D" in head[-1]:
+            break
     nDim = [int(iii) for iii in filein.readline().split()]  # reading 1 line with dimensions
     nDim.reverse()
     nDim = np.array(nDim)
     lvec = _readmat(filein, 4)  # reading 4 lines where 1st line is origin of datagrid and 3 next lines are the cell vectors
-    filein.close()
-    if verbose:
-        print("nDim xsf (= nDim + [1,1,1] ):", nDim)
-    if verbose:
-        print("io | Load " + fname + " using readNumsUpTo ")
-    F = readNumsUpTo(fname, nDim.astype(np.int32).copy(), startline + 5)
+    return head, nDim, lvec
+
+
+def _readGridData(filein, nDim, fname):
+    """Read nDim[0] * nDim[1] * nDim[2] whitespace-separated numbers from the current position of an open file."""
+    n = int(np.prod(nDim))
+    F = np.fromfile(filein, dtype=np.float64, count=n, sep=" ")
+    if F.size != n:
+        raise ValueError(f"Expected {n} values in the data grid of file `{fname}`, but found only {F.size}.")
+    return F.reshape(nDim)
+
+
+def _loadXSF(fname, xyz_order=False, verbose=True):
+    """Load an xsf file in one pass. Returns the same values as :func:`loadXSF` and the atoms in the PRIMCOORD section."""
+    with open(fname, "rb") as filein:
+        head, nDim, lvec = _readXSFHeader(filein)
+        if verbose:
+            print("nDim xsf (= nDim + [1,1,1] ):", nDim)
+        if verbose:
+            print("io | Load " + fname)
+        F = _readGridData(filein, nDim, fname)
     if verbose:
         print("io | Done")
-    FF = np.reshape(F, nDim)[:-1, :-1, :-1]
+    FF = F[:-1, :-1, :-1]
     if xyz_order:
         FF = FF.transpose((2, 1, 0))
     # FF is not C_CONTIGUOUS without copy
     FF = FF.copy()
-    return FF, lvec, nDim - 1, head
+    Zs, Rs = getFromHead_PRIMCOORD(head)
+    atoms = None if Zs is None else [list(Zs), list(Rs[:, 0]), list(Rs[:, 1]), list(Rs[:, 2]), [0] * len(Zs)]
+    return FF, lvec, nDim - 1, head, atoms
+
+
+def loadXSF(fname, xyz_order=False, verbose=True):
+    FF, lvec, nDim, head, _ = _loadXSF(fname, xyz_order=xyz_order, verbose=verbose)
+    return FF, lvec, nDim, head
 
 
 def getFromHead_PRIMCOORD(head):
@@ -651,36 +738,18 @@ def getFromHead_PRIMCOORD(head):
 # =================== Cube
 
 
-def loadCUBE(fname, xyz_order=False, verbose=True):
-    filein = open(fname)
-    # First two lines of the header are comments
-    filein.readline()
-    filein.readline()
-    # The third line has the number of atoms included in the file followed by the position of the origin of the volumetric data.
-    sth0 = filein.readline().split()
-    # The next three lines give the number of voxels along each axis (x, y, z) followed by the axis vector
-    sth1 = filein.readline().split()
-    sth2 = filein.readline().split()
-    sth3 = filein.readline().split()
-    filein.close()
-    nDim = np.array([int(sth1[0]), int(sth2[0]), int(sth3[0])])
-    lvec = np.zeros((4, 3))
-    for jj in range(3):
-        lvec[0, jj] = float(sth0[jj + 1]) * bohrRadius2angstroem
-        lvec[1, jj] = float(sth1[jj + 1]) * int(sth1[0]) * bohrRadius2angstroem  # bohr_radius ?
-        lvec[2, jj] = float(sth2[jj + 1]) * int(sth2[0]) * bohrRadius2angstroem
-        lvec[3, jj] = float(sth3[jj + 1]) * int(sth3[0]) * bohrRadius2angstroem
-
-    if verbose:
-        print("io | Load " + fname + " using readNumsUpTo")
-    noline = 6 + int(sth0[0])
-    F = readNumsUpTo(fname, nDim.astype(np.int32).copy(), noline)
+def _loadCUBE(fname, xyz_order=False, verbose=True):
+    """Load a cube file in one pass. Returns the same values as :func:`loadCUBE` and the atoms as in :func:`loadAtomsCUBE`."""
+    with open(fname, "rb") as filein:
+        atoms, lvec, nDim = _readCUBEHeader(filein)
+        if verbose:
+            print("io | Load " + fname)
+        FF = _readGridData(filein, nDim, fname)
     if verbose:
-        print("io | np.shape(F): ", np.shape(F))
+        print("io | np.shape(F): ", np.shape(FF))
     if verbose:
         print("io | nDim: ", nDim)
 
-    FF = np.reshape(F, nDim)
     if not xyz_order:
         FF = FF.transpose((2, 1, 0)).copy()  # Transposition of the array to have the same order of data as in XSF file
 
@@ -690,6 +759,11 @@ def loadCUBE(fname, xyz_order=False, verbose=True):
     head.append("g98_3D_unknown \n")
     head.append("DATAGRID_3D_g98Cube \n")
     FF *= Hartree2eV
+    return FF, lvec, nDim, head, atoms
+
+
+def loadCUBE(fname, xyz_order=False, verbose=True):
+    FF, lvec, nDim, head, _ = _loadCUBE(fname, xyz_order=xyz_order, verbose=verbose)
     return FF, lvec, nDim, head
 
 
@@ -727,7 +801,20 @@ def saveWSxM_3D(prefix, data, extent, slices=None):
 # ================ Npy
 
 
-def saveNpy(fname, data, lvec, atomic_info):
+def _savez(fname, dtype=None, compress=False, **arrays):
+    """
+    Save arrays into an npz archive. The grid data is cast to ``dtype`` if given. Arrays that are not contiguous are
+    written in chunks by numpy without a full contiguous copy.
+    """
+    if dtype is not None:
+        arrays = {key: np.asarray(value, dtype=dtype) if key in ("data", "FF") else value for key, value in arrays.items()}
+    if compress:
+        np.savez_compressed(fname, **arrays)
+    else:
+        np.savez(fname, **arrays)
+
+
+def saveNpy(fname, data, lvec, atomic_info, dtype=None, compress=False):
     """
     Function for saving scalar grid data, together with its lattice_vector and information about original atoms and the original lattice vector (lvec0) in numpy format
 
@@ -736,8 +823,10 @@ def saveNpy(fname, data, lvec, atomic_info):
         data: np.ndarray of shape (n_z, n_y, n_x) with scallar data
         lvec: np.ndarray of shape (4, 3). Lattice vector of the data
         atomic_info: tuple of shape (2). First part is [e, x, y, z] of atoms, the second is lvec of the atoms from the original geometry file, named as lvec0;
+        dtype: np.dtype or None. If not None, the data is saved with this data type, e.g. np.float32 to halve the file size.
+        compress: bool. Whether to compress the npz archive.
     """
-    np.savez(fname + ".npz", data=data, lvec=lvec, atoms=atomic_info[0], lvec0=atomic_info[1])
+    _savez(fname + ".npz", dtype=dtype, compress=compress, data=data, lvec=lvec, atoms=atomic_info[0], lvec0=atomic_info[1])
 
 
 def loadNpy(fname):
@@ -756,7 +845,7 @@ def loadNpy(fname):
     data = tmp_input["data"]
     lvec = tmp_input["lvec"]
     atomic_info = (tmp_input["atoms"], tmp_input["lvec0"])
-    return data.copy(), lvec, atomic_info
+    return np.ascontiguousarray(data, dtype=np.float64), lvec, atomic_info
     # necessary for being 'C_CONTINUOS'
 
 
@@ -806,12 +895,14 @@ def loadVecFieldNpy(fname, FF=None):
 
 
 def saveVecFieldXsf(fname, FF, lvec, head=XSF_HEAD_DEFAULT):
-    saveXSF(fname + "_x.xsf", FF[:, :, :, 0], lvec, head=head)
-    saveXSF(fname + "_y.xsf", FF[:, :, :, 1], lvec, head=head)
-    saveXSF(fname + "_z.xsf", FF[:, :, :, 2], lvec, head=head)
+    # The components go into separate files, so they are written concurrently
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        futures = [executor.submit(saveXSF, fname + f"_{c}.xsf", FF[:, :, :, i], lvec, head=head) for i, c in enumerate("xyz")]
+        for future in futures:
+            future.result()
 
 
-def saveVecFieldNpy(fname, FF, lvec, atomic_info):
+def saveVecFieldNpy(fname, FF, lvec, atomic_info, dtype=None, compress=False):
     """
     Function for saving vector grid data, together with its lattice_vector and information about original atoms and the original lattice vector (lvec0) in numpy format.
 
@@ -820,8 +911,10 @@ def saveVecFieldNpy(fname, FF, lvec, atomic_info):
         FF: np.array of shape(nz, ny, nx, 3) with volumetric (vector data) we want to load.
         lvec: np.array of shape(4,3) with lattice vector of the volumetric data.
         atomic_info: tuple of shape (2) with 2 np.arrays, one is np.array([e,x,y,z]) with atoms positions and the second one is np.array(lvec0) of shape (4,3) with saved information about lattice vector.
+        dtype: np.dtype or None. If not None, the data is saved with this data type, e.g. np.float32 to halve the file size.
+        compress: bool. Whether to compress the npz archive.
     """
-    np.savez(fname + ".npz", FF=FF, lvec=lvec, atoms=atomic_info[0], lvec0=atomic_info[1])
+    _savez(fname + ".npz", dtype=dtype, compress=compress, FF=FF, lvec=lvec, atoms=atomic_info[0], lvec0=atomic_info[1])
 
 
 def limit_vec_field(FF, Fmax=100.0):
@@ -839,7 +932,7 @@ def limit_vec_field(FF, Fmax=100.0):
     FF[:, :, :, 2].flat[mask] *= Fmax / FR[mask]
 
 
-def save_vec_field(fname, data, lvec, data_format="xsf", head=XSF_HEAD_DEFAULT, atomic_info=None):
+def save_vec_field(fname, data, lvec, data_format="xsf", head=XSF_HEAD_DEFAULT, atomic_info=None, dtype=None, compress=False):
     """
     Saving vector fields into xsf, or npy
 
@@ -850,12 +943,14 @@ def save_vec_field(fname, data, lvec, data_format="xsf", head=XSF_HEAD_DEFAULT,
         data_format: string "xsf" or "npy"
         head: string header of the XSF file
         atomic_info: tuple of shape (2) with 2 np.arrays - one is np.array([e,x,y,z]) with atoms positions and the second one is np.array(lvec) of shape (4,3) with saved information about lattice vector.
+        dtype: np.dtype or None. Data type of the saved data for the npy format. Ignored for xsf.
+        compress: bool. Whether to compress the data for the npy format. Ignored for xsf.
     """
     if data_format == "xsf":
         saveVecFieldXsf(fname, data, lvec, head=head)
     elif data_format == "npy":
         atomic_info = atomic_info if atomic_info is not None else (np.zeros((4, 1)), lvec)
-        saveVecFieldNpy(fname, data, lvec, atomic_info)
+        saveVecFieldNpy(fname, data, lvec, atomic_info, dtype=dtype, compress=compress)
     else:
         print("I cannot save this format!")
 
@@ -884,13 +979,13 @@ def load_vec_field(fname, data_format="xsf"):
         ndim = data.shape
     else:
         print("I cannot load this format!")
-    return data.copy(), lvec, ndim, atomic_info_or_head
+    return np.array(data, dtype=np.float64, order="C"), lvec, ndim, atomic_info_or_head
 
 
 # =============== Scalar Fields
 
 
-def save_scal_field(fname, data, lvec, data_format="xsf", head=XSF_HEAD_DEFAULT, atomic_info=None):
+def save_scal_field(fname, data, lvec, data_format="xsf", head=XSF_HEAD_DEFAULT, atomic_info=None, dtype=None, compress=False):
     """
     Saving scalar fields into xsf, or npy
 
@@ -901,12 +996,14 @@ def save_scal_field(fname, data, lvec, data_format="xsf", head=XSF_HEAD_DEFAULT,
         data_format: str "xsf" or "npy".
         head: string header of the XSF file
         atomic_info: tuple of shape (2) with 2 np.arrays - one is np.array([e,x,y,z]) with atoms positions and the second one is np.array(lvec) of shape (4,3) with saved information about lattice vector.
+        dtype: np.dtype or None. Data type of the saved data for the npy format. Ignored for xsf.
+        compress: bool. Whether to compress the data for the npy format. Ignored for xsf.
     """
     if data_format == "xsf":
         saveXSF(fname + ".xsf", data, lvec, head=head)
     elif data_format == "npy":
         atomic_info = atomic_info if atomic_info is not None else (np.zeros((4, 1)), lvec)
-        saveNpy(fname, data, lvec, atomic_info)
+        saveNpy(fname, data, lvec, atomic_info, dtype=dtype, compress=compress)
     else:
         print("I cannot save this format!")
 
@@ -939,6 +1036,206 @@ def load_scal_field(fname, data_format="xsf"):
     return data.copy(), lvec, ndim, atomic_info_or_head
 
 
+# =============== Lazy fields
+
+
+class LazyField:
+    """
+    Scalar or vector field stored in a file that is read only as far as it is indexed. Indexing along the first (z) axis
+    reads only the requested z-slices from the file, which is useful for looking at a few heights of a large scan.
+    The result of indexing is a new float64 np.ndarray, except when indexing a single slice. The most recently indexed
+    single slice is kept in memory as a read-only array, so repeated indexing of the same slice does not read the file again.
+
+    Arguments:
+        read: callable. read(i0, i1) returns the slices i0 to i1 - 1 as np.ndarray.
+        shape: tuple of int. Shape of the whole field, (nz, ny, nx) for scalar fields or (nz, ny, nx, 3) for vector fields.
+    """
+
+    def __init__(self, read, shape):
+        self._read_slices = read
+        self.shape = tuple(shape)
+        self._last = None
+
+    @property
+    def ndim(self):
+        return len(self.shape)
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __array__(self, dtype=None, copy=None):
+        return np.asarray(self[:], dtype=dtype)
+
+    def _read(self, i0, i1):
+        return np.array(self._read_slices(i0, i1), dtype=np.float64)
+
+    def _read_slice(self, iz):
+        if self._last is None or self._last[0] != iz:
+            data = self._read(iz, iz + 1)[0]
+            data.flags.writeable = False
+            self._last = (iz, data)
+        return self._last[1]
+
+    def __getitem__(self, key):
+        if not isinstance(key, tuple):
+            key = (key,)
+        iz, rest = key[0], key[1:]
+        if isinstance(iz, (int, np.integer)):
+            if iz < 0:
+                iz += len(self)
+            if not (0 <= iz < len(self)):
+                raise IndexError(f"Index {key[0]} is out of bounds for axis 0 with size {len(self)}")
+            return self._read_slice(iz)[rest]
+        if isinstance(iz, slice):
+            inds = range(*iz.indices(len(self)))
+            if len(inds) == 0:
+                return np.empty((0,) + self.shape[1:])[(slice(None),) + rest]
+            i0, i1 = min(inds), max(inds) + 1
+            data = self._read(i0, i1)
+            if inds.step != 1:
+                data = data[np.array(inds) - i0]
+        else:
+            data = np.stack([self[i] for i in iz])
+        return data[(slice(None),) + rest]
+
+
+def _npzMember(fname, key):
+    """
+    Get an array in an npz archive as a read-only memory map if the array is stored uncompressed, or otherwise load it
+    into memory.
+    """
+    with zipfile.ZipFile(fname) as archive:
+        info = archive.getinfo(key + ".npy")
+    if info.compress_type != zipfile.ZIP_STORED:
+        with np.load(fname) as data:
+            return data[key]
+    with open(fname, "rb") as f:
+        # Skip the local file header of the archive member
+        f.seek(info.header_offset)
+        local_header = f.read(30)
+        f.seek(info.header_offset + 30 + int.from_bytes(local_header[26:28], "little") + int.from_bytes(local_header[28:30], "little"))
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+        offset = f.tell()
+    return np.memmap(fname, dtype=dtype, mode="r", offset=offset, shape=shape, order="F" if fortran_order else "C")
+
+
+def _skipTokens(filein, n, chunk_size=2**20):
+    """Advance an open binary file past the next n whitespace-separated tokens without parsing them."""
+    while n > 0:
+        pos = filein.tell()
+        chunk = filein.read(chunk_size)
+        if not chunk:
+            raise ValueError("Unexpected end of file.")
+        if len(chunk) == chunk_size:
+            # Leave a token cut by the end of the chunk for the next chunk
+            chunk = chunk[: re.search(rb"\S*$", chunk).start()]
+            if not chunk:
+                filein.seek(pos)
+                chunk_size *= 2
+                continue
+        n_chunk = len(chunk.split())
+        if n_chunk < n:
+            n -= n_chunk
+            filein.seek(pos + len(chunk))
+        else:
+            for i, match in enumerate(re.finditer(rb"\S+", chunk)):
+                if i == n - 1:
+                    filein.seek(pos + match.end())
+                    break
+            n = 0
+
+
+class _XSFSlices:
+    """
+    Reads ranges of z-slices from the data grid of an xsf file. The byte offsets of the slices in the file are found
+    by skipping over the values without parsing them and are remembered for later reads.
+    """
+
+    def __init__(self, fname):
+        self.fname = fname
+        with open(fname, "rb") as filein:
+            self.head, nDim, self.lvec = _readXSFHeader(filein)
+            self._offsets = {0: filein.tell()}
+        self.nDim = nDim - 1
+        self._plane = nDim[1] * nDim[2]
+
+    def _offset(self, filein, iz):
+        if iz not in self._offsets:
+            iz_known = max(i for i in self._offsets if i < iz)
+            filein.seek(self._offsets[iz_known])
+            _skipTokens(filein, (iz - iz_known) * self._plane)
+            self._offsets[iz] = filein.tell()
+        return self._offsets[iz]
+
+    def __call__(self, i0, i1):
+        with open(self.fname, "rb") as filein:
+            filein.seek(self._offset(filein, i0))
+            F = _readGridData(filein, (i1 - i0, self.nDim[1] + 1, self.nDim[2] + 1), self.fname)
+        return F[:, :-1, :-1]
+
+
+def open_scal_field(fname, data_format="xsf"):
+    """
+    Open a scalar field saved by :func:`save_scal_field` without reading the data grid. Same as :func:`load_scal_field`,
+    except that the data is returned as a :class:`LazyField` that reads z-slices of the data from the file only when indexed.
+    Npy files saved without compression are memory-mapped. Cube files are read completely.
+
+    Arguments:
+        fname: str. Name of the npz or xsf file without the extension.
+        data_format: str. "xsf", "npy", or "cube".
+
+    Returns:
+        data: LazyField or np.ndarray of shape (nz, ny, nx).
+        lvec: np.ndarray of shape (4, 3). Lattice vectors of the data.
+        ndim: tuple of length 3. Shape of the data.
+        atomic_info_or_head: tuple or list of str. Same as in :func:`load_scal_field`.
+    """
+    if data_format == "xsf":
+        reader = _XSFSlices(fname + ".xsf")
+        return LazyField(reader, reader.nDim), reader.lvec, reader.nDim, reader.head
+    elif data_format == "npy":
+        data = _npzMember(fname + ".npz", "data")
+        with np.load(fname + ".npz") as tmp_input:
+            lvec = tmp_input["lvec"]
+            atomic_info = (tmp_input["atoms"], tmp_input["lvec0"])
+        return LazyField(lambda i0, i1: data[i0:i1], data.shape), lvec, data.shape, atomic_info
+    return load_scal_field(fname, data_format=data_format)
+
+
+def open_vec_field(fname, data_format="xsf"):
+    """
+    Open a vector field saved by :func:`save_vec_field` without reading the data grid. Same as :func:`load_vec_field`,
+    except that the data is returned as a :class:`LazyField` that reads z-slices of the data from the file(s) only when indexed.
+    Npy files saved without compression are memory-mapped.
+
+    Arguments:
+        fname: str. Name of the npz or xsf file without the extension.
+        data_format: str. "xsf" or "npy".
+
+    Returns:
+        data: LazyField of shape (nz, ny, nx, 3).
+        lvec: np.ndarray of shape (4, 3). Lattice vectors of the data.
+        ndim: tuple of length 3 or 4. Shape of the data.
+        atomic_info_or_head: tuple or list of str. Same as in :func:`load_vec_field`.
+    """
+    if data_format == "xsf":
+        readers = [_XSFSlices(fname + f"_{c}.xsf") for c in "xyz"]
+        shape = tuple(readers[0].nDim) + (3,)
+        data = LazyField(lambda i0, i1: np.stack([reader(i0, i1) for reader in readers], axis=-1), shape)
+        return data, readers[0].lvec, readers[0].nDim, readers[0].head
+    elif data_format == "npy":
+        FF = _npzMember(fname + ".npz", "FF")
+        with np.load(fname + ".npz") as tmp_input:
+            lvec = tmp_input["lvec"]
+            atomic_info = (tmp_input["atoms"], tmp_input["lvec0"])
+        return LazyField(lambda i0, i1: FF[i0:i1], FF.shape), lvec, FF.shape, atomic_info
+    return load_vec_field(fname, data_format=data_format)
+
+
 # ================ POV-Ray
 
 DEFAULT_POV_HEAD_NO_CAM = """
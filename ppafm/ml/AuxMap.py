@@ -23,6 +23,12 @@ class AuxMapBase:
         zmin: float. Deepest coordinate that is still included. Top is defined to be at 0.
     """
 
+    fusable = True
+    """Whether the map can be evaluated with the atoms shared with other maps in an :class:`AuxMapEvaluator`."""
+
+    shared_projector = None
+    """Projector holding the atom buffers shared by the maps in an :class:`AuxMapEvaluator`. Set only during the evaluation."""
+
     def __init__(self, scan_dim, scan_window, zmin=None):
         if not FFcl.oclu:
             raise RuntimeError("OpenCL context not initialized. Initialize with ocl.field.init before creating an AuxMap object.")
@@ -41,17 +47,31 @@ class AuxMapBase:
             xyzqs[:, :3] = np.dot(xyzqs[:, :3] - xyz_center, rot.T) + xyz_center
         return self.eval(xyzqs, Zs, pot, rot)
 
+    def get_coefs(self, Zs):
+        if self.shared_projector is not None:
+            return self.shared_projector.coefs
+        return self.projector.makeCoefsZR(Zs, elements.ELEMENTS)
+
+    def get_bonds(self, xyzqs, Zs):
+        if self.shared_projector is not None:
+            return self.shared_projector.bonds2atoms
+        return np.array(findBonds_(xyzqs[:, :3], Zs.astype(np.int32), 1.2, ELEMENTS=elements.ELEMENTS), dtype=np.int32)
+
     def prepare_projector(self, xyzqs, Zs, pos0, bonds2atoms=None, elem_channels=None):
         rot = np.eye(3)
-        coefs = self.projector.makeCoefsZR(Zs.astype(np.int32), elements.ELEMENTS)
-        self.projector.tryReleaseBuffers()
-        self.projector.prepareBuffers(
-            xyzqs.astype(np.float32),
-            self.scan_dim[:2] + (self.nChan,),
-            coefs=coefs,
-            bonds2atoms=bonds2atoms,
-            elem_channels=elem_channels,
-        )
+        if self.shared_projector is not None:
+            # The atoms were already uploaded once for all of the maps
+            self.projector.shareAtomBuffers(self.shared_projector, self.scan_dim[:2] + (self.nChan,), elem_channels=elem_channels)
+        else:
+            coefs = self.projector.makeCoefsZR(Zs.astype(np.int32), elements.ELEMENTS)
+            self.projector.tryReleaseBuffers()
+            self.projector.prepareBuffers(
+                xyzqs.astype(np.float32),
+                self.scan_dim[:2] + (self.nChan,),
+                coefs=coefs,
+                bonds2atoms=bonds2atoms,
+                elem_channels=elem_channels,
+            )
         return oclr.preparePossRot(
             self.scan_dim,
             pos0,
@@ -76,7 +96,7 @@ class vdwSpheres(AuxMapBase):
         self.projector.Rpp = Rpp
 
     def eval(self, xyzqs, Zs, pot=None, rot=None):
-        coefs = self.projector.makeCoefsZR(Zs, elements.ELEMENTS)
+        coefs = self.get_coefs(Zs)
         pos0 = [0, 0, (xyzqs[:, 2] + coefs[:, 3]).max() + self.projector.Rpp]
         poss = self.prepare_projector(xyzqs, Zs, pos0)
         return self.projector.run_evalSpheres(poss=poss, tipRot=oclr.mat3x3to4f(np.eye(3)))[:, :, 0]
@@ -117,7 +137,7 @@ class AtomicDisks(AuxMapBase):
             raise ValueError(f"Unknown diskMode {diskMode}. Should be either sphere or center")
 
     def eval(self, xyzqs, Zs, pot=None, rot=None):
-        coefs = self.projector.makeCoefsZR(Zs, elements.ELEMENTS)
+        coefs = self.get_coefs(Zs)
         coords_sphere = xyzqs[:, 2] + coefs[:, 3] + self.projector.Rpp
         offset = coords_sphere.max() - xyzqs[:, 2].max() + self.offset
         pos0 = [0, 0, coords_sphere.max()]
@@ -139,6 +159,8 @@ class HeightMap(AuxMapBase):
         iso: float. The value of the isosurface.
     """
 
+    fusable = False
+
     def __init__(self, scanner, zmin=-2.0, iso=0.1):
         self.scanner = scanner
         self.zrange = -zmin
@@ -171,6 +193,8 @@ class ESMap(AuxMapBase):
         iso: float. The value of the isosurface.
     """
 
+    fusable = False
+
     def __init__(self, scanner, zmin=-2.0, iso=0.1):
         self.scanner = scanner
         self.zrange = -zmin
@@ -218,6 +242,11 @@ class ESMapConstant(AuxMapBase):
         self.vdW_cutoff = vdW_cutoff
         self.projector.Rpp = Rpp
 
+    @property
+    def fusable(self):
+        # The vdW cutoff mask is applied on the host, so the output has to be ready before eval returns
+        return not self.vdW_cutoff
+
     def eval(self, xyzqs, Zs=None, pot=None, rot=np.eye(3)):
         pos0 = [0, 0, xyzqs[:, 2].max() + self.height]
         if pot:
@@ -235,7 +264,7 @@ class ESMapConstant(AuxMapBase):
 
         if self.vdW_cutoff:
             self.nChan = 1  # Projector needs only one channel for vdW Spheres
-            coefs = self.projector.makeCoefsZR(Zs, elements.ELEMENTS)
+            coefs = self.get_coefs(Zs)
             pos0 = [0, 0, (xyzqs[:, 2] + coefs[:, 3]).max() + self.projector.Rpp]
             poss = self.prepare_projector(xyzqs, Zs, pos0)
             vdW = self.projector.run_evalSpheres(poss=poss, tipRot=oclr.mat3x3to4f(np.eye(3)))[:, :, 0]
@@ -277,7 +306,7 @@ class MultiMapSpheres(AuxMapBase):
         self.bOccl = bOccl
 
     def eval(self, xyzqs, Zs, pot=None, rot=None):
-        coefs = self.projector.makeCoefsZR(Zs, elements.ELEMENTS)
+        coefs = self.get_coefs(Zs)
         pos0 = [0, 0, (xyzqs[:, 2] + coefs[:, 3]).max() + self.projector.Rpp]
         poss = self.prepare_projector(xyzqs, Zs, pos0)
         return self.projector.run_evalMultiMapSpheres(
@@ -335,7 +364,7 @@ class MultiMapSpheresElements(AuxMapBase):
         return elem_channels
 
     def eval(self, xyzqs, Zs, pot=None, rot=None):
-        coefs = self.projector.makeCoefsZR(Zs, elements.ELEMENTS)
+        coefs = self.get_coefs(Zs)
         elem_channels = self.get_elem_channels(Zs)
         pos0 = [0, 0, (xyzqs[:, 2] + coefs[:, 3]).max() + self.projector.Rpp]
         poss = self.prepare_projector(xyzqs, Zs, pos0, elem_channels=elem_channels)
@@ -380,10 +409,7 @@ class Bonds(AuxMapBase):
 
     def eval(self, xyzqs, Zs, pot=None, rot=None):
         pos0 = [0, 0, xyzqs[:, 2].max()]
-        bonds2atoms = np.array(
-            findBonds_(xyzqs[:, :3], Zs.astype(np.int32), 1.2, ELEMENTS=elements.ELEMENTS),
-            dtype=np.int32,
-        )
+        bonds2atoms = self.get_bonds(xyzqs, Zs)
         poss = self.prepare_projector(xyzqs, Zs, pos0, bonds2atoms=bonds2atoms)
         return self.projector.run_evalBondEllipses(poss=poss, tipRot=oclr.mat3x3to4f(np.eye(3)))[:, :, 0]
 
@@ -423,14 +449,96 @@ class AtomRfunc(AuxMapBase):
 
     def eval(self, xyzqs, Zs, pot=None, rot=None):
         pos0 = [0, 0, xyzqs[:, 2].max()]
-        bonds2atoms = np.array(
-            findBonds_(xyzqs[:, :3], Zs.astype(np.int32), 1.2, ELEMENTS=elements.ELEMENTS),
-            dtype=np.int32,
-        )
+        bonds2atoms = self.get_bonds(xyzqs, Zs)
         poss = self.prepare_projector(xyzqs, Zs, pos0, bonds2atoms=bonds2atoms)
         return self.projector.run_evalAtomRfunc(poss=poss, tipRot=oclr.mat3x3to4f(np.eye(3)))[:, :, 0]
 
 
+class AuxMapEvaluator:
+    """
+    Evaluate several AuxMaps for a sequence of samples with fewer round trips to the OpenCL device.
+
+    Calling each AuxMap separately uploads the atoms and allocates new device buffers for every map, and waits for
+    the result of every map before starting the next one. Here the atoms, the atom coefficients, and the bonds are
+    computed and uploaded once per sample and shared by all of the maps, the position and output buffers of each map
+    stay on the device between samples, and the outputs are copied back without blocking. The samples are queued with
+    :meth:`enqueue`, and :meth:`finish` waits for all of them at once, so a whole batch needs only a single
+    synchronization with the device.
+
+    Maps that are not :attr:`AuxMapBase.fusable`, i.e. :class:`HeightMap` and :class:`ESMap`, which use the state of the
+    scanner, and :class:`ESMapConstant` with a vdW cutoff, are evaluated immediately in :meth:`enqueue` as usual.
+
+    Arguments:
+        aux_maps: list of :class:`AuxMapBase`. AuxMaps to evaluate.
+    """
+
+    def __init__(self, aux_maps):
+        if not FFcl.oclu:
+            raise RuntimeError("OpenCL context not initialized. Initialize with ocl.field.init before creating an AuxMapEvaluator object.")
+        self.aux_maps = aux_maps
+        self.projector = FFcl.AtomProcjetion()
+        self._pending = []
+
+    def __call__(self, xyzqs, Zs, pot=None, rot=np.eye(3)):
+        """
+        Evaluate all of the AuxMaps for one sample. The arguments are the same as for :class:`AuxMapBase`.
+
+        Returns:
+            Ys: list of np.ndarray. The output of each AuxMap.
+        """
+        if self._pending:
+            raise RuntimeError("There are enqueued samples that have not been finished.")
+        self.enqueue(xyzqs, Zs, pot, rot)
+        return self.finish()[0]
+
+    def enqueue(self, xyzqs, Zs, pot=None, rot=np.eye(3)):
+        """
+        Start evaluating all of the AuxMaps for one sample without waiting for the results.
+        The arguments are the same as for :class:`AuxMapBase`.
+        """
+        assert xyzqs.shape[1] == 4
+        xyzqs = xyzqs.copy()
+        xyz_center = xyzqs[:, :3].mean(axis=0)
+        xyzqs[:, :3] = np.dot(xyzqs[:, :3] - xyz_center, rot.T) + xyz_center
+
+        fused = [aux_map.fusable for aux_map in self.aux_maps]
+        if any(fused):
+            coefs = self.projector.makeCoefsZR(Zs.astype(np.int32), elements.ELEMENTS)
+            bonds2atoms = None
+            if any(f and isinstance(aux_map, (Bonds, AtomRfunc)) for f, aux_map in zip(fused, self.aux_maps)):
+                bonds2atoms = np.array(findBonds_(xyzqs[:, :3], Zs.astype(np.int32), 1.2, ELEMENTS=elements.ELEMENTS), dtype=np.int32)
+            # The buffers of the previous sample can still be in use by queued kernels, so they are not released explicitly
+            self.projector.prepareAtomBuffers(xyzqs.astype(np.float32), coefs=coefs, bonds2atoms=bonds2atoms)
+
+        Ys = []
+        for f, aux_map in zip(fused, self.aux_maps):
+            if f:
+                aux_map.shared_projector = self.projector
+                aux_map.projector.blocking = False
+                try:
+                    Ys.append(aux_map.eval(xyzqs, Zs, pot, rot))
+                finally:
+                    aux_map.shared_projector = None
+                    aux_map.projector.blocking = True
+            else:
+                Ys.append(aux_map.eval(xyzqs, Zs, pot, rot))
+
+        # Keep the inputs alive until the device is done with them
+        self._pending.append((Ys, xyzqs, pot))
+
+    def finish(self):
+        """
+        Wait for the evaluation of all enqueued samples.
+
+        Returns:
+            Ys: list of lists of np.ndarray. The outputs of each AuxMap for each sample in the order they were enqueued.
+        """
+        self.projector.queue.finish()
+        Ys = [Ys_ for Ys_, _, _ in self._pending]
+        self._pending = []
+        return Ys
+
+
 aux_map_dict = {
     "vdwSpheres": vdwSpheres,
     "AtomicDisks": AtomicDisks,
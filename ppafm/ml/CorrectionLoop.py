@@ -14,6 +14,8 @@ see:  https://mega.nz/#!KLoilKIB!NxxCRQ814xtCXfjy7mPFfmJTOL9TaTHbmPKSxn_0sFs
 
 """
 
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 
 import matplotlib
 import numpy as np
@@ -33,6 +35,21 @@ from .Corrector import Corrector, Molecule, Mutator
 verbose = 0
 bRunTime = False
 
+# Simulator of the current worker process of CorrectionLoop.simulatePopulation
+_worker_simulator = None
+
+
+def _init_worker(simulator_factory):
+    global _worker_simulator
+    _worker_simulator = simulator_factory()
+
+
+def _simulate_worker(xyzs, Zs, qs):
+    if hasattr(_worker_simulator, "evalUpdate"):
+        # The candidates of a worker are mutations of the same molecule, so consecutive ones differ only by a few atoms
+        return _worker_simulator.evalUpdate(xyzs, Zs, qs)
+    return _worker_simulator(xyzs, Zs, qs)
+
 
 # ========================================================================
 class Sequence:
@@ -303,7 +320,33 @@ class CorrectorTrainer(Generator.InverseAFMtrainer):
 
 
 class CorrectionLoop:
-    def __init__(self, relaxator, simulator, atoms, bonds, corrector):
+    """
+    Loop which iteratively mutates a molecule and accepts the mutations that improve the match between the simulated and
+    the reference AFM images.
+
+    If the corrector has ``nPopulation > 1``, every iteration simulates a whole population of candidate mutations. The
+    candidates are simulated one after another with ``simulator``, or with ``nWorkers > 1`` in parallel in a pool of
+    worker processes. An :class:`.AFMulator` can't be shared between threads or processes, because its OpenCL buffers and
+    the force field of the C++ core are not safe to use concurrently, so each worker process creates its own simulator by
+    calling ``simulator_factory``. Call :meth:`close` to shut down the worker processes when the loop is done.
+
+    Arguments:
+        relaxator: Geometry relaxation engine.
+        simulator: Callable ``simulator(xyzs, Zs, qs)`` returning the AFM images, e.g. :class:`.AFMulator`.
+        atoms: AuxMap for atoms.
+        bonds: AuxMap for bonds.
+        corrector: :class:`.Corrector`.
+        simulator_factory: Callable or None. Function without arguments that returns a simulator with the same settings as
+            ``simulator``. Has to be picklable, e.g. a module-level function or a :func:`functools.partial` of one.
+            Required if ``nWorkers > 1``.
+        nWorkers: int. Number of worker processes for simulating populations of candidates.
+        mp_context: Multiprocessing context for the worker processes or None. Defaults to the ``'spawn'`` context, because
+            the OpenCL context of the parent process can't be used in forked processes.
+    """
+
+    def __init__(self, relaxator, simulator, atoms, bonds, corrector, simulator_factory=None, nWorkers=1, mp_context=None):
+        if (nWorkers > 1) and (simulator_factory is None):
+            raise ValueError("A simulator_factory is required for simulating with more than one worker.")
         self.rotMat = np.array([[1.0, 0, 0], [0.0, 1.0, 0], [0.0, 0, 1.0]])
         self.logAFMdataName = None
         self.logImgName = None
@@ -315,13 +358,24 @@ class CorrectionLoop:
         self.atoms = atoms
         self.bonds = bonds
         self.corrector = corrector
+        self.simulator_factory = simulator_factory
+        self.nWorkers = nWorkers
+        self.mp_context = mp_context
+        self.pool = None
         self.xyzLogName = None
 
     def init(self):
         pass
 
+    def close(self):
+        """Shut down the worker processes."""
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
     def startLoop(self, molecule, atomMap, bondMap, lvecMap, AFMRef):
         self.molecule = molecule
+        self.population = [molecule]
         self.atomMap = atomMap
         self.bondMap = bondMap
         self.mapLvec = lvecMap
@@ -349,7 +403,46 @@ class CorrectionLoop:
             plt.savefig(self.logImgName + ("_%03i.png" % itr), bbox_inches="tight")
             plt.close()
 
+    def simulatePopulation(self, mols):
+        """
+        Simulate AFM images for a population of candidate molecules.
+
+        Arguments:
+            mols: list of :class:`.Molecule`. Candidate molecules.
+
+        Returns:
+            AFMss: list of np.ndarray. AFM images for each of the candidates.
+        """
+        if self.nWorkers > 1:
+            if self.pool is None:
+                mp_context = self.mp_context or multiprocessing.get_context("spawn")
+                self.pool = ProcessPoolExecutor(self.nWorkers, mp_context=mp_context, initializer=_init_worker, initargs=(self.simulator_factory,))
+            # Contiguous chunks of candidates, so that each worker simulates its candidates back to back
+            chunksize = -(-len(mols) // self.nWorkers)
+            return list(self.pool.map(_simulate_worker, [m.xyzs for m in mols], [m.Zs for m in mols], [m.qs for m in mols], chunksize=chunksize))
+        if hasattr(self.simulator, "evalUpdate"):
+            # The candidates are all mutations of the same molecule, so consecutive ones differ only by a few atoms
+            return [self.simulator.evalUpdate(m.xyzs, m.Zs, m.qs) for m in mols]
+        return [self.simulator(m.xyzs, m.Zs, m.qs) for m in mols]
+
+    def iterationPopulation(self, itr=0):
+        AFMss = self.simulatePopulation(self.population)
+        sw = self.simulator.scan_window
+        Err, self.population = self.corrector.try_improve_population(self.population, AFMss, self.AFMRef, sw, itr=itr)
+        self.molecule = self.corrector.best_mol
+        if self.xyzLogFile is not None:
+            io.saveXYZ(
+                self.xyzLogFile,
+                self.molecule.xyzs,
+                self.molecule.Zs,
+                qs=self.molecule.qs,
+                comment=(f"CorrectionLoop.iteration [{itr}] "),
+            )
+        return Err
+
     def iteration(self, itr=0):
+        if self.corrector.nPopulation > 1:
+            return self.iterationPopulation(itr=itr)
         if self.xyzLogFile is not None:
             io.saveXYZ(
                 self.xyzLogFile,
@@ -360,7 +453,11 @@ class CorrectionLoop:
             )
         # Get AFM
         xyzs, qs, Zs = self.molecule.xyzs, self.molecule.qs, self.molecule.Zs
-        AFMs = self.simulator(xyzs, Zs, qs)
+        if hasattr(self.simulator, "evalUpdate"):
+            # The molecule differs from the previous iteration only by the latest mutation
+            AFMs = self.simulator.evalUpdate(xyzs, Zs, qs)
+        else:
+            AFMs = self.simulator(xyzs, Zs, qs)
         xyzqs = np.concatenate([xyzs, qs[:, None]], axis=1)
         # Get Atoms and Bonds AuxMaps
         AuxMaps = None
@@ -479,7 +576,7 @@ if __name__ == "__main__":
 
     parser = OptionParser()
     parser.add_option("-j", "--job", action="store", type="string", help="[train/loop]")
-    (options, args) = parser.parse_args()
+    options, args = parser.parse_args()
 
     print(" UNIT_TEST START : CorrectionLoop ... ")
 
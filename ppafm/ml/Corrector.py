@@ -193,7 +193,16 @@ def lowResErrorMap(Err3D):
 
 
 class Corrector:
-    def __init__(self):
+    """
+    Improve a molecule geometry by random mutations which are accepted if the simulated AFM images get closer to the reference.
+
+    Arguments:
+        nPopulation: int. Number of candidate mutations generated per iteration. With ``nPopulation > 1``, use
+            :meth:`try_improve_population` instead of :meth:`try_improve`.
+    """
+
+    def __init__(self, nPopulation=1):
+        self.nPopulation = nPopulation
         self.izPlot = -8
         self.logImgName = None
         self.xyzLogFile = None
@@ -260,22 +269,53 @@ class Corrector:
         print("xyzs2.shape ", xyzs2.shape)
         _saveXYZDebug(Zs2, xyzs2, "debug_genAtomWs.xyz", qs=([0.0] * (na0 + nps)), Rs=Rs)
 
-    def try_improve(self, molIn, AFMs, AFMRef, span, itr=0):
+    def _error(self, AFMs, AFMRef):
         AFMdiff = AFMs - AFMRef
         AFMdiff = blur(AFMdiff)
         AFMdiff = blur(AFMdiff)  # BLUR
         AFMdiff2 = AFMdiff**2
         Err = np.sqrt(AFMdiff2.sum())  # root mean square error
+        return Err, AFMdiff2
+
+    def _pareto_error(self, Err, AFMdiff2):
+        """Error penalized by the areas that got worse compared to the best structure, or None if the error is not lower."""
+        if self.best_E > Err:
+            ErrB, ErrW = paretoNorm_(self.best_diff, AFMdiff2)
+            Eworse = ErrW.sum()
+            ErrPar = Err + 2.0 * Eworse
+            print("\nmaybe better ? ", self.best_E, " <? ", ErrPar, " Eworse ", Eworse)
+            return ErrPar, Eworse
+        return None
+
+    def _set_best(self, molIn, AFMs, AFMRef, span, Err, AFMdiff2, itr):
+        ErrLo = lowResErrorMap(AFMdiff2).astype(np.float64)
+
+        self.debug_plot(itr, AFMdiff2, ErrLo, AFMs, AFMRef, Err)
+        self.best_mol = molIn
+        self.best_E = Err
+        self.best_diff = AFMdiff2
+        self.best_ErrMap = ErrLo
+        pot.setGridSize(ErrLo.shape, span[0], span[1])
+        pot.setGridPointer(ErrLo)
+        pot.init(self.best_mol.xyzs)
+        self.kT = 2.0e-5
+        self.best_ps = pot.genAtoms(npick=10, Rcov=0.7, kT=self.kT)
+        self.best_ps_i = 0
+        if self.xyzLogFile is not None:
+            self.best_mol.toXYZ(
+                self.xyzLogFile,
+                comment=("Corrector [%i] Err %g " % (itr, self.best_E)),
+            )
+
+    def try_improve(self, molIn, AFMs, AFMRef, span, itr=0):
+        Err, AFMdiff2 = self._error(AFMs, AFMRef)
 
         # ToDo : identify are of most difference and make random changes in that area
-        Eworse = 0
         bBetter = False
         if self.best_E is not None:
-            if self.best_E > Err:
-                ErrB, ErrW = paretoNorm_(self.best_diff, AFMdiff2)
-                Eworse = ErrW.sum()
-                ErrPar = Err + 2.0 * Eworse
-                print("\nmaybe better ? ", self.best_E, " <? ", ErrPar, " Eworse ", Eworse)
+            pareto = self._pareto_error(Err, AFMdiff2)
+            if pareto is not None:
+                ErrPar, Eworse = pareto
                 if self.best_E > ErrPar:  # check if some areas does not got worse
                     bBetter = True
                     print(
@@ -290,27 +330,52 @@ class Corrector:
                 print("*", end="", flush=True)
 
         if (self.best_E is None) or bBetter:
-            ErrLo = lowResErrorMap(AFMdiff2).astype(np.float64)
-
-            self.debug_plot(itr, AFMdiff2, ErrLo, AFMs, AFMRef, Err)
-            self.best_mol = molIn
-            self.best_E = Err
-            self.best_diff = AFMdiff2
-            self.best_ErrMap = ErrLo
-            pot.setGridSize(ErrLo.shape, span[0], span[1])
-            pot.setGridPointer(ErrLo)
-            pot.init(self.best_mol.xyzs)
-            self.kT = 2.0e-5
-            self.best_ps = pot.genAtoms(npick=10, Rcov=0.7, kT=self.kT)
-            self.best_ps_i = 0
-            if self.xyzLogFile is not None:
-                self.best_mol.toXYZ(
-                    self.xyzLogFile,
-                    comment=("Corrector [%i] Err %g " % (itr, self.best_E)),
-                )
+            self._set_best(molIn, AFMs, AFMRef, span, Err, AFMdiff2, itr)
         molOut = self.modifyStructure(self.best_mol)
         return Err, molOut
 
+    def try_improve_population(self, mols, AFMss, AFMRef, span, itr=0):
+        """
+        Population variant of :meth:`try_improve`. Out of a population of candidate structures, the one with the lowest
+        error, penalized by the areas that got worse (:func:`paretoNorm_`), is accepted if it is better than the best
+        structure so far. The next population of ``nPopulation`` candidates is then generated by mutating the best structure.
+
+        Arguments:
+            mols: list of :class:`Molecule`. Candidate structures.
+            AFMss: list of np.ndarray. Simulated AFM images of each of the candidates.
+            AFMRef: np.ndarray. Reference AFM images.
+            span: tuple of array-like. Scan window (start, end) of the AFM images.
+            itr: int. Iteration number used in logging.
+
+        Returns:
+            Err: float. Lowest error among the candidates.
+            molsOut: list of :class:`Molecule`. The next population of candidates.
+        """
+        errs = [self._error(AFMs, AFMRef) for AFMs in AFMss]
+        Errs = np.array([Err for Err, _ in errs])
+
+        ibest = None
+        if self.best_E is None:
+            ibest = int(np.argmin(Errs))
+        else:
+            ErrPars = np.full(len(mols), np.inf)
+            for i, (Err, AFMdiff2) in enumerate(errs):
+                pareto = self._pareto_error(Err, AFMdiff2)
+                if pareto is not None:
+                    ErrPars[i] = pareto[0]
+            i = int(np.argmin(ErrPars))
+            if self.best_E > ErrPars[i]:
+                ibest = i
+                print(f"[{itr}]SUCCESS : candidate {i}/{len(mols)} Err: {Errs[i]} best: {self.best_E} ErrPar: {ErrPars[i]}")
+            else:
+                print("*", end="", flush=True)
+
+        if ibest is not None:
+            Err, AFMdiff2 = errs[ibest]
+            self._set_best(mols[ibest], AFMss[ibest], AFMRef, span, Err, AFMdiff2, itr)
+        molsOut = [self.modifyStructure(self.best_mol) for _ in range(self.nPopulation)]
+        return Errs.min(), molsOut
+
 
 def _saveXYZDebug(es, xyzs, fname, qs, Rs):
     with open(fname, "w") as fout:
@@ -0,0 +1,347 @@
+import glob
+import json
+import os
+import random
+from collections import OrderedDict
+
+import numpy as np
+
+from .. import io
+
+
+class ShardWriter:
+    """
+    Write batches of machine learning samples into sharded compressed files on disk. Use together with :class:`ShardedDataset`
+    for reading the samples back.
+
+    The samples are buffered in memory until a shard is full, after which the shard is written into a ``.npz`` file in the
+    output directory. Each shard contains the arrays:
+
+        - ``'X'``: AFM images of shape ``(n_sample, n_tip, nx, ny, nz)``.
+        - ``'Y'``: AuxMap descriptors of shape ``(n_sample, n_auxmap, nx, ny)``.
+        - ``'sw'``: Scan windows of shape ``(n_sample, n_tip, 2, 3)``.
+        - ``'atoms'``: Atoms of all of the molecules concatenated into an array of shape ``(n_atoms_total, 5)``.
+        - ``'atom_offsets'``: Start indices of the molecules in ``'atoms'``, of shape ``(n_sample + 1,)``.
+
+    When the writer is closed, an index file ``index.npz`` with the entries ``'shard'``, ``'position'``, ``'mol_id'``,
+    ``'rot'``, and ``'sw'`` for every sample and a metadata file ``meta.json`` are written into the output directory.
+    The writer can be used as a context manager, in which case it is closed automatically.
+
+    Arguments:
+        out_dir: str. Path to the output directory. Created if it does not exist.
+        samples_per_shard: int. Number of samples in each shard.
+        compress: bool. Whether to compress the shards.
+        dtype: np.dtype. Data type of the saved AFM images and AuxMap descriptors.
+        tips: list of int or None. Atomic numbers of the AFM tips. Saved in the metadata.
+    """
+
+    def __init__(self, out_dir, samples_per_shard=1000, compress=True, dtype=np.float32, tips=None):
+        self.out_dir = out_dir
+        self.samples_per_shard = samples_per_shard
+        self.compress = compress
+        self.dtype = dtype
+        self.tips = tips
+        os.makedirs(out_dir, exist_ok=True)
+        self._buffer = []
+        self._index = {"shard": [], "position": [], "mol_id": [], "rot": [], "sw": []}
+        self._n_shards = 0
+        self._closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __len__(self):
+        return len(self._index["shard"]) + len(self._buffer)
+
+    def add_batch(self, Xs, Ys, mols, sws, rots=None, mol_ids=None):
+        """
+        Add a batch of samples. The arguments are in the same format as returned by :class:`.GeneratorAFMtrainer`.
+
+        Arguments:
+            Xs: np.ndarray of shape (n_batch, n_tip, nx, ny, nz). AFM images.
+            Ys: np.ndarray of shape (n_batch, n_auxmap, nx, ny). AuxMap descriptors.
+            mols: list of np.ndarray of shape (n_atoms, 5). Molecules.
+            sws: np.ndarray of shape (n_batch, n_tip, 2, 3). Scan windows.
+            rots: np.ndarray of shape (n_batch, 3, 3) or None. Rotations of the molecules. Defaults to identity.
+            mol_ids: list of int or None. Identifiers of the molecules. Defaults to the running sample index.
+        """
+        if self._closed:
+            raise RuntimeError("Cannot add samples to a closed ShardWriter.")
+        for i in range(len(mols)):
+            rot = np.eye(3) if rots is None else rots[i]
+            mol_id = len(self) if mol_ids is None else mol_ids[i]
+            self._buffer.append((Xs[i], Ys[i], mols[i], sws[i], rot, mol_id))
+            if len(self._buffer) >= self.samples_per_shard:
+                self._write_shard()
+
+    def _write_shard(self):
+        if len(self._buffer) == 0:
+            return
+        Xs, Ys, mols, sws, rots, mol_ids = zip(*self._buffer)
+        atom_offsets = np.cumsum([0] + [len(mol) for mol in mols])
+        shard = {
+            "X": np.stack(Xs).astype(self.dtype, copy=False),
+            "Y": np.stack(Ys).astype(self.dtype, copy=False),
+            "sw": np.stack(sws),
+            "atoms": np.concatenate(mols, axis=0),
+            "atom_offsets": atom_offsets,
+        }
+        path = os.path.join(self.out_dir, _shard_name(self._n_shards))
+        if self.compress:
+            np.savez_compressed(path, **shard)
+        else:
+            np.savez(path, **shard)
+        self._index["shard"] += [self._n_shards] * len(mols)
+        self._index["position"] += list(range(len(mols)))
+        self._index["mol_id"] += list(mol_ids)
+        self._index["rot"] += list(rots)
+        self._index["sw"] += list(sws)
+        self._n_shards += 1
+        self._buffer = []
+
+    def close(self):
+        """Write the remaining samples and the index. Does nothing if the writer is already closed."""
+        if self._closed:
+            return
+        self._write_shard()
+        index = {key: np.array(value) for key, value in self._index.items()}
+        np.savez(os.path.join(self.out_dir, "index.npz"), **index)
+        meta = {
+            "n_samples": len(index["shard"]),
+            "n_shards": self._n_shards,
+            "samples_per_shard": self.samples_per_shard,
+            "tips": None if self.tips is None else [int(t) for t in self.tips],
+        }
+        with open(os.path.join(self.out_dir, "meta.json"), "w") as f:
+            json.dump(meta, f, indent=4)
+        self._closed = True
+
+
+class ShardedDataset:
+    """
+    Random-access reader for samples written by :class:`ShardWriter`. Indexing returns single samples ``(X, Y, mol, sw)``,
+    and :meth:`batches` iterates over batches in the same format as :class:`.GeneratorAFMtrainer`.
+
+    Only a bounded number of decompressed shards are kept in memory at a time. Reading the samples in order, or shuffled
+    with :meth:`batches`, loads every shard only once per epoch.
+
+    Arguments:
+        data_dir: str. Directory with the shards and the index.
+        max_cached_shards: int. Maximum number of shards kept in memory.
+    """
+
+    def __init__(self, data_dir, max_cached_shards=2):
+        self.data_dir = data_dir
+        self.max_cached_shards = max_cached_shards
+        with np.load(os.path.join(data_dir, "index.npz")) as index:
+            self.index = {key: index[key] for key in index.files}
+        with open(os.path.join(data_dir, "meta.json")) as f:
+            self.meta = json.load(f)
+        self._cache = OrderedDict()
+
+    def __len__(self):
+        return len(self.index["shard"])
+
+    def _load_shard(self, i_shard):
+        if i_shard in self._cache:
+            self._cache.move_to_end(i_shard)
+            return self._cache[i_shard]
+        with np.load(os.path.join(self.data_dir, _shard_name(i_shard))) as f:
+            shard = {key: f[key] for key in f.files}
+        self._cache[i_shard] = shard
+        while len(self._cache) > self.max_cached_shards:
+            self._cache.popitem(last=False)
+        return shard
+
+    def __getitem__(self, i):
+        """
+        Get one sample.
+
+        Arguments:
+            i: int. Index of the sample.
+
+        Returns:
+            X: np.ndarray of shape (n_tip, nx, ny, nz). AFM images.
+            Y: np.ndarray of shape (n_auxmap, nx, ny). AuxMap descriptors.
+            mol: np.ndarray of shape (n_atoms, 5). Molecule.
+            sw: np.ndarray of shape (n_tip, 2, 3). Scan windows.
+        """
+        if i < 0:
+            i += len(self)
+        if not (0 <= i < len(self)):
+            raise IndexError(f"Sample index {i} out of range for dataset of size {len(self)}")
+        shard = self._load_shard(int(self.index["shard"][i]))
+        pos = int(self.index["position"][i])
+        start, end = shard["atom_offsets"][pos], shard["atom_offsets"][pos + 1]
+        return shard["X"][pos], shard["Y"][pos], shard["atoms"][start:end], shard["sw"][pos]
+
+    def batches(self, batch_size=30, shuffle=False):
+        """
+        Iterate over the dataset in batches.
+
+        With shuffling, the order of the shards and the order of the samples within each shard are randomized, so that the
+        shards are still read sequentially.
+
+        Arguments:
+            batch_size: int. Number of samples per batch. The last batch can be smaller.
+            shuffle: bool. Whether to shuffle the samples.
+
+        Yields:
+            Xs: np.ndarray of shape (n_batch, n_tip, nx, ny, nz). AFM images.
+            Ys: np.ndarray of shape (n_batch, n_auxmap, nx, ny). AuxMap descriptors.
+            mols: list of np.ndarray of shape (n_atoms, 5). Molecules.
+            sws: np.ndarray of shape (n_batch, n_tip, 2, 3). Scan windows.
+        """
+        shard_ids = list(np.unique(self.index["shard"]))
+        if shuffle:
+            random.shuffle(shard_ids)
+        order = []
+        for i_shard in shard_ids:
+            inds = list(np.nonzero(self.index["shard"] == i_shard)[0])
+            if shuffle:
+                random.shuffle(inds)
+            order += inds
+        for start in range(0, len(order), batch_size):
+            samples = [self[i] for i in order[start : start + batch_size]]
+            Xs, Ys, mols, sws = zip(*samples)
+            yield np.stack(Xs), np.stack(Ys), list(mols), np.stack(sws)
+
+
+class MoleculeDatabase:
+    """
+    Packed on-disk store of molecules for loading large numbers of molecules in bulk without parsing one file per molecule.
+
+    The database directory contains the files:
+
+        - ``atoms.npy``: Atoms of all of the molecules concatenated into an array of shape ``(n_atoms_total, 5)`` with
+          ``[x, y, z, charge, element]`` for each atom, as in the molecules of :class:`.InverseAFMtrainer`.
+        - ``atom_offsets.npy``: Start indices of the molecules in ``atoms.npy``, of shape ``(n_mol + 1,)``.
+        - ``names.json``: Names of the molecules, e.g. the names of the xyz files they were converted from.
+
+    The arrays are memory-mapped, so opening the database is fast regardless of its size and only the molecules that are
+    accessed are read from disk. Create a database with :meth:`write` or convert xyz files with :meth:`from_xyz_files`
+    or :meth:`from_xyz_dir`.
+
+    Iterating over the database yields sample dicts with the entries ``'xyzs'``, ``'Zs'``, ``'qs'``, and ``'mol_id'``, where
+    the molecule identifier is the index of the molecule in the database, so the database can be used directly as the
+    ``sample_generator`` of :class:`.GeneratorAFMtrainer`. It can also be given as the ``paths`` of :class:`.InverseAFMtrainer`.
+
+    Arguments:
+        db_dir: str. Path to the database directory.
+        mmap: bool. Whether to memory-map the atoms instead of reading them into memory.
+        shuffle: bool. Whether to iterate over the molecules in a random order. The order is different on every iteration.
+    """
+
+    def __init__(self, db_dir, mmap=True, shuffle=False):
+        self.db_dir = db_dir
+        self.shuffle = shuffle
+        self.atoms = np.load(os.path.join(db_dir, "atoms.npy"), mmap_mode="r" if mmap else None)
+        self.atom_offsets = np.load(os.path.join(db_dir, "atom_offsets.npy"))
+        with open(os.path.join(db_dir, "names.json")) as f:
+            self.names = json.load(f)
+
+    def __len__(self):
+        return len(self.atom_offsets) - 1
+
+    def get_atoms(self, i):
+        """
+        Get the atoms of one molecule.
+
+        Arguments:
+            i: int. Index of the molecule.
+
+        Returns:
+            atoms: np.ndarray of shape (n_atoms, 5). Read-only view with ``[x, y, z, charge, element]`` for each atom.
+        """
+        if i < 0:
+            i += len(self)
+        if not (0 <= i < len(self)):
+            raise IndexError(f"Molecule index {i} out of range for database of size {len(self)}")
+        return self.atoms[self.atom_offsets[i] : self.atom_offsets[i + 1]]
+
+    def __getitem__(self, i):
+        """
+        Get a sample dict for one molecule.
+
+        Arguments:
+            i: int. Index of the molecule.
+
+        Returns:
+            sample_dict: dict with entries ``'xyzs'`` (np.ndarray of shape (n_atoms, 3)), ``'Zs'`` (np.ndarray of shape (n_atoms,)),
+            ``'qs'`` (np.ndarray of shape (n_atoms,)), and ``'mol_id'`` (int).
+        """
+        atoms = self.get_atoms(i)
+        mol_id = i if i >= 0 else i + len(self)
+        return {"xyzs": np.array(atoms[:, :3]), "Zs": atoms[:, 4].astype(np.int32), "qs": np.array(atoms[:, 3]), "mol_id": mol_id}
+
+    def __iter__(self):
+        order = list(range(len(self)))
+        if self.shuffle:
+            random.shuffle(order)
+        for i in order:
+            yield self[i]
+
+    @classmethod
+    def write(cls, out_dir, molecules, names=None):
+        """
+        Write molecules into a new database.
+
+        Arguments:
+            out_dir: str. Path to the database directory. Created if it does not exist.
+            molecules: Iterable of tuples (xyzs, Zs, qs) with np.ndarray of shapes (n_atoms, 3), (n_atoms,), and (n_atoms,).
+            names: list of str or None. Names of the molecules. Defaults to the indices of the molecules.
+
+        Returns:
+            db: :class:`MoleculeDatabase`. The written database.
+        """
+        os.makedirs(out_dir, exist_ok=True)
+        atoms = [np.concatenate([xyzs, np.asarray(qs)[:, None], np.asarray(Zs)[:, None]], axis=1) for xyzs, Zs, qs in molecules]
+        atom_offsets = np.cumsum([0] + [len(a) for a in atoms])
+        atoms = np.concatenate(atoms, axis=0) if len(atoms) > 0 else np.zeros((0, 5))
+        if names is None:
+            names = [str(i) for i in range(len(atom_offsets) - 1)]
+        elif len(names) != len(atom_offsets) - 1:
+            raise ValueError(f"Got {len(names)} names for {len(atom_offsets) - 1} molecules.")
+        np.save(os.path.join(out_dir, "atoms.npy"), atoms.astype(np.float64, copy=False))
+        np.save(os.path.join(out_dir, "atom_offsets.npy"), atom_offsets.astype(np.int64))
+        with open(os.path.join(out_dir, "names.json"), "w") as f:
+            json.dump([str(name) for name in names], f)
+        return cls(out_dir)
+
+    @classmethod
+    def from_xyz_files(cls, paths, out_dir):
+        """
+        Convert xyz files into a database. The molecules are named by the file names without the extension.
+
+        Arguments:
+            paths: list of str. Paths to the xyz files.
+            out_dir: str. Path to the database directory.
+
+        Returns:
+            db: :class:`MoleculeDatabase`. The written database.
+        """
+        molecules = (io.loadXYZ(path)[:3] for path in paths)
+        names = [os.path.splitext(os.path.basename(path))[0] for path in paths]
+        return cls.write(out_dir, molecules, names=names)
+
+    @classmethod
+    def from_xyz_dir(cls, xyz_dir, out_dir):
+        """
+        Convert all of the xyz files in a directory into a database, in the alphabetical order of the file names.
+
+        Arguments:
+            xyz_dir: str. Path to the directory with the xyz files.
+            out_dir: str. Path to the database directory.
+
+        Returns:
+            db: :class:`MoleculeDatabase`. The written database.
+        """
+        paths = sorted(glob.glob(os.path.join(glob.escape(str(xyz_dir)), "*.xyz")))
+        return cls.from_xyz_files(paths, out_dir)
+
+
+def _shard_name(i_shard):
+    return f"shard_{i_shard:05d}.npz"
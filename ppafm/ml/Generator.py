@@ -6,6 +6,8 @@ import numpy as np
 from .. import common as PPU
 from .. import io
 from ..ocl import field as FFcl
+from .AuxMap import AuxMapEvaluator
+from .Dataset import MoleculeDatabase, ShardWriter
 
 
 class InverseAFMtrainer:
@@ -24,8 +26,10 @@ class InverseAFMtrainer:
     Arguments:
         afmulator: An instance of AFMulator.
         auxmaps: list of :class:`.AuxMapBase`.
-        paths: list of paths to xyz files of molecules. The molecules are saved to the "molecules" attribute
-               in np.ndarrays of shape (num_atoms, 5) with [x, y, z, charge, element] for each atom.
+        paths: list of paths to xyz files of molecules or a :class:`.MoleculeDatabase`. The molecules are saved to the
+               "molecules" attribute in np.ndarrays of shape (num_atoms, 5) with [x, y, z, charge, element] for each atom.
+               With a database, the molecules are read-only views into it, which are copied only when they are used.
+               The rotations of the molecules relative to the input coordinates are saved to the "molecule_rots" attribute.
         batch_size: int. Number of samples per batch.
         distAbove: float. Tip-sample distance parameter.
         iZPPs: list of ints. Elements for AFM tips. Image is produced with every tip for each sample.
@@ -69,6 +73,7 @@ class InverseAFMtrainer:
             self.on_batch_start()
 
             mols = []
+            rots = []
             Xs = [[] for _ in range(len(self.iZPPs))]
             Ys = [[] for _ in range(len(self.aux_maps))]
             batch_size = min(self.batch_size, len(self.molecules) - self.counter)
@@ -82,7 +87,10 @@ class InverseAFMtrainer:
 
                 # Load molecule
                 mol = self.molecules[self.counter]
+                if not mol.flags.writeable:
+                    mol = mol.copy()  # Molecule from a database
                 mols.append(mol)
+                rots.append(self.molecule_rots[self.counter])
                 self.xyzs = mol[:, :3]
                 self.qs = mol[:, 3]
                 self.Zs = mol[:, 4].astype(np.int32)
@@ -141,6 +149,8 @@ class InverseAFMtrainer:
             for i in range(len(self.aux_maps)):
                 Ys[i] = np.stack(Ys[i], axis=0)
 
+            self.batch_rots = np.array(rots)
+
             if self.bRuntime:
                 print(f"Batch runtime [s]: {time.time() - batch_start}")
 
@@ -159,14 +169,43 @@ class InverseAFMtrainer:
         """
         return int(np.floor(len(self.molecules) / self.batch_size))
 
+    def write_shards(self, out_dir, samples_per_shard=1000, compress=True, dtype=np.float32):
+        """
+        Generate all of the samples and write them into sharded files on disk. See :class:`.ShardWriter`.
+
+        The rotation of each sample is the rotation applied to the molecule in the rotation augmentations.
+
+        Arguments:
+            out_dir: str. Path to the output directory.
+            samples_per_shard: int. Number of samples in each shard.
+            compress: bool. Whether to compress the shards.
+            dtype: np.dtype. Data type of the saved AFM images and AuxMap descriptors.
+
+        Returns:
+            n_samples: int. Number of written samples.
+        """
+        sw = np.array(self.afmulator.scan_window)
+        with ShardWriter(out_dir, samples_per_shard=samples_per_shard, compress=compress, dtype=dtype, tips=self.iZPPs) as writer:
+            for Xs, Ys, mols in self:
+                Xs = np.stack(Xs, axis=1)
+                Ys = np.stack(Ys, axis=1)
+                sws = np.tile(sw, (len(mols), len(self.iZPPs), 1, 1))
+                mol_ids = list(range(self.counter - len(mols), self.counter))
+                writer.add_batch(Xs, Ys, mols, sws, rots=self.batch_rots, mol_ids=mol_ids)
+        return len(writer)
+
     def read_xyzs(self):
         """
         Read molecule xyz files from selected paths.
         """
-        self.molecules = []
-        for path in self.paths:
-            xyzs, Zs, qs, _ = io.loadXYZ(path)
-            self.molecules.append(np.concatenate([xyzs, qs[:, None], Zs[:, None]], axis=1))
+        if isinstance(self.paths, MoleculeDatabase):
+            self.molecules = [self.paths.get_atoms(i) for i in range(len(self.paths))]
+        else:
+            self.molecules = []
+            for path in self.paths:
+                xyzs, Zs, qs, _ = io.loadXYZ(path)
+                self.molecules.append(np.concatenate([xyzs, qs[:, None], Zs[:, None]], axis=1))
+        self.molecule_rots = [np.eye(3)] * len(self.molecules)
 
     def handle_positions(self):
         """
@@ -193,7 +232,10 @@ class InverseAFMtrainer:
         """
         Shuffle list of molecules.
         """
-        random.shuffle(self.molecules)
+        order = list(range(len(self.molecules)))
+        random.shuffle(order)
+        self.molecules = [self.molecules[i] for i in order]
+        self.molecule_rots = [self.molecule_rots[i] for i in order]
 
     def augment_with_rotations(self, rotations):
         """
@@ -203,13 +245,16 @@ class InverseAFMtrainer:
             rotations: list of np.ndarray. Rotation matrices.
         """
         molecules = self.molecules
+        molecule_rots = self.molecule_rots
         self.molecules = []
-        for mol in molecules:
+        self.molecule_rots = []
+        for mol, mol_rot in zip(molecules, molecule_rots):
             xyzs = mol[:, :3]
             qs = mol[:, 3]
             Zs = mol[:, 4]
-            for xyzs_rot in rotate(xyzs, rotations):
+            for xyzs_rot, rot in zip(rotate(xyzs, rotations), rotations):
                 self.molecules.append(np.concatenate([xyzs_rot, qs[:, None], Zs[:, None]], axis=1))
+                self.molecule_rots.append(np.dot(rot, mol_rot))
 
     def augment_with_rotations_entropy(self, rotations, n_best_rotations=30):
         """
@@ -220,14 +265,17 @@ class InverseAFMtrainer:
             n_best_rotations: int. Only the first n_best_rotations with the highest "entropy" will be taken.
         """
         molecules = self.molecules
+        molecule_rots = self.molecule_rots
         self.molecules = []
-        for mol in molecules:
+        self.molecule_rots = []
+        for mol, mol_rot in zip(molecules, molecule_rots):
             xyzs = mol[:, :3]
             qs = mol[:, 3]
             Zs = mol[:, 4]
             rots = sortRotationsByEntropy(mol[:, :3], rotations)[:n_best_rotations]
-            for xyzs_rot in rotate(xyzs, rots):
+            for xyzs_rot, rot in zip(rotate(xyzs, rots), rots):
                 self.molecules.append(np.concatenate([xyzs_rot, qs[:, None], Zs[:, None]], axis=1))
+                self.molecule_rots.append(np.dot(rot, mol_rot))
 
     def randomize_tip(self, max_tilt=0.5):
         """
@@ -321,6 +369,8 @@ class GeneratorAFMtrainer:
         - ``mols``: List of length ``batch_size`` of atomic coordinates, atomic numbers, and charges as an ``np.ndarray`` of shape ``(n_atoms, 5)``.
         - ``sws``: Scan window bounds as an ``np.ndarray`` of shape ``(batch_size, n_tip, 2, 3)``.
 
+    The generated samples can also be written to disk with :meth:`write_shards`.
+
     Arguments:
         afmulator: An instance of AFMulator.
         auxmaps: list of :class:`.AuxMapBase`.
@@ -427,6 +477,7 @@ class GeneratorAFMtrainer:
         self.sample_dict = {}
         self.sample_iterator = iter(self.sample_generator)
         self.iteration_done = False
+        self.sample_count = 0
         return self
 
     def __next__(self):
@@ -439,8 +490,12 @@ class GeneratorAFMtrainer:
         # We gather the samples in these lists
         mols = []
         Xs = []
-        Ys = []
         sws = []
+        rots = []
+        mol_ids = []
+
+        # The AuxMaps of the whole batch are computed on the device with a single synchronization at the end
+        aux_map_evaluator = AuxMapEvaluator(self.aux_maps)
 
         if self.bRuntime:
             batch_start = time.perf_counter()
@@ -450,7 +505,6 @@ class GeneratorAFMtrainer:
                 sample_start = time.perf_counter()
 
             Xs_ = []
-            Ys_ = []
             sws_ = []
 
             # Load the next sample, if available
@@ -470,6 +524,8 @@ class GeneratorAFMtrainer:
             self.xyzs_rot = np.dot(xyzs - xyz_center, rot.T) + xyz_center
             mol = np.concatenate([self.xyzs_rot, qs[:, None], Zs[:, None]], axis=1)
             mols.append(mol)
+            rots.append(rot)
+            mol_ids.append(self.mol_id)
 
             # Make sure the molecule is in right position
             self.handle_positions()
@@ -523,15 +579,13 @@ class GeneratorAFMtrainer:
                 qs = self.sample_dict["qs"]
                 pot = None
             xyzqs = np.concatenate([xyzs, qs[:, None]], axis=1)
-            for i, aux_map in enumerate(self.aux_maps):
-                if self.bRuntime:
-                    aux_start = time.perf_counter()
-                Ys_.append(aux_map(xyzqs, Zs, pot, rot))
-                if self.bRuntime:
-                    print(f"AuxMap {i} runtime [s]: {time.perf_counter() - aux_start}")
+            if self.bRuntime:
+                aux_start = time.perf_counter()
+            aux_map_evaluator.enqueue(xyzqs, Zs, pot, rot)
+            if self.bRuntime:
+                print(f"AuxMap enqueue runtime [s]: {time.perf_counter() - aux_start}")
 
             Xs.append(Xs_)
-            Ys.append(Ys_)
             sws.append(sws_)
 
             if self.bRuntime:
@@ -540,9 +594,17 @@ class GeneratorAFMtrainer:
         if len(mols) == 0:  # Sample iterator was empty
             raise StopIteration
 
+        if self.bRuntime:
+            aux_start = time.perf_counter()
+        Ys = aux_map_evaluator.finish()
+        if self.bRuntime:
+            print(f"AuxMap finish runtime [s]: {time.perf_counter() - aux_start}")
+
         Xs = np.array(Xs)
         Ys = np.array(Ys)
         sws = np.array(sws)
+        self.batch_rots = np.array(rots)
+        self.batch_mol_ids = mol_ids
 
         if self.bRuntime:
             print(f"Batch runtime [s]: {time.perf_counter() - batch_start}")
@@ -552,6 +614,10 @@ class GeneratorAFMtrainer:
     def _load_next_sample(self):
         sample_dict = next(self.sample_iterator)
 
+        # Optional molecule identifier, which is not an argument to the simulation
+        self.mol_id = sample_dict.pop("mol_id", self.sample_count)
+        self.sample_count += 1
+
         # Check that the contents of the sample dict are sufficient for the chosen simulation type
         if self.sim_type == "lj":
             sample_dict["qs"] = np.zeros((len(sample_dict["Zs"]),), dtype=np.float32)
@@ -576,7 +642,13 @@ class GeneratorAFMtrainer:
             sample_dict["rot"] = np.eye(3)
 
         if self.density_cutoff is not None:
-            sample_dict["rho_sample"] = sample_dict["rho_sample"].clamp(maximum=self.density_cutoff, in_place=False)
+            rho_sample = sample_dict["rho_sample"]
+            clamp = lambda rho: rho.clamp(maximum=self.density_cutoff, in_place=False)
+            if hasattr(self.afmulator.forcefield, "sample_cache"):
+                # Clamp only once when the same sample is repeated in several orientations
+                sample_dict["rho_sample"] = self.afmulator.forcefield.sample_cache.get(rho_sample, ("clamp", self.density_cutoff), clamp)
+            else:
+                sample_dict["rho_sample"] = clamp(rho_sample)
 
         return sample_dict
 
@@ -589,6 +661,28 @@ class GeneratorAFMtrainer:
             raise RuntimeError("Cannot infer the number of batches because sample generator does not have length attribute.")
         return int(np.floor(len(self.sample_generator) / self.batch_size))
 
+    def write_shards(self, out_dir, samples_per_shard=1000, compress=True, dtype=np.float32):
+        """
+        Generate all of the samples and write them into sharded files on disk, so that the simulations only have to be run once.
+        The files can be read with :class:`.ShardedDataset`. See :class:`.ShardWriter` for the file format.
+
+        The index of the samples includes the molecule identifier, which is taken from the optional ``'mol_id'`` entry of the
+        sample dicts, or otherwise is the running index of the sample.
+
+        Arguments:
+            out_dir: str. Path to the output directory.
+            samples_per_shard: int. Number of samples in each shard.
+            compress: bool. Whether to compress the shards.
+            dtype: np.dtype. Data type of the saved AFM images and AuxMap descriptors.
+
+        Returns:
+            n_samples: int. Number of written samples.
+        """
+        with ShardWriter(out_dir, samples_per_shard=samples_per_shard, compress=compress, dtype=dtype, tips=self.iZPPs) as writer:
+            for Xs, Ys, mols, sws in self:
+                writer.add_batch(Xs, Ys, mols, sws, rots=self.batch_rots, mol_ids=self.batch_mol_ids)
+        return len(writer)
+
     def handle_positions(self):
         """
         Shift scan window laterally to center on the molecule.
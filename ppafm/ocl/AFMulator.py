@@ -1,19 +1,29 @@
 #!/usr/bin/python3
 
+import copy
 import os
 import time
 import warnings
+import weakref
 
 import numpy as np
 
 from .. import common, elements, io
 from ..PPPlot import plotImages
+from . import cpu_backend
 from . import field as FFcl
 from . import oclUtils as oclu
 from . import relax as oclr
-from .field import ElectronDensity, HartreePotential, MultipoleTipDensity, TipDensity
+from .field import (
+    DataGrid,
+    ElectronDensity,
+    HartreePotential,
+    MultipoleTipDensity,
+    TipDensity,
+)
 
 VALID_SIZES = np.array([16, 32, 64, 128, 192, 256, 384, 512, 768, 1024, 1536, 2048])
+FFT_SIZES = np.array(sorted(2**i * 3**j * 5**k for i in range(12) for j in range(7) for k in range(5) if 16 <= 2**i * 3**j * 5**k <= 2048))
 
 
 class AFMulator:
@@ -64,6 +74,25 @@ class AFMulator:
         colorscale: str. Colorscale for output images.
         minimize_memory: bool. Release device memory as soon as it's not needed. Can help save some memory, but can also make
             the simulation significantly slower when run in a loop where parameters change between iterations.
+        backend: 'opencl' or 'cpu'. Compute backend. 'opencl' runs the simulation on an OpenCL device. 'cpu' computes the force
+            field with the C++ core and a multithreaded FFT, and relaxes the probe particle with the OpenMP C++ relaxation,
+            so no OpenCL device is needed. Tilted tips are not supported on the 'cpu' backend.
+        reuse_ff: bool. Skip the force field computation in :meth:`eval` when none of the inputs of the force field have
+            changed since the previous call, e.g. when only the tip stiffness, tipR0 (with a fixed lvec), or df_steps
+            changed. Off by default, so that every call to :meth:`eval` recomputes the force field. The numbers of reused
+            and recomputed force fields in :meth:`eval` are counted in :attr:`ff_cache_hits` and :attr:`ff_cache_misses`.
+        grid_sizes: None, 'fft', or array of ints. Allowed numbers of force field grid points along each lattice vector.
+            The grid dimensions are rounded up to the nearest allowed size and the lattice vectors are extended
+            accordingly, keeping the grid spacing at 1 / pixPerAngstrome, so that scan windows and lattice vectors of
+            slightly different sizes share the same grid shape. This avoids reallocating the force field buffers,
+            reinterpolating the tip density, and compiling new FFTs when the grid changes, e.g. during training data
+            generation. 'fft' uses all sizes between 16 and 2048 that are products of 2, 3, and 5. If None, the grid
+            is rounded up to :data:`VALID_SIZES` when lvec is inferred from the scan window, and an explicitly given
+            lvec is used as is.
+        sample_pyramid: bool. Downsample sample Hartree potentials and electron densities that are finer than the force
+            field grid before interpolating them onto the force field grid. Faster and uses less device memory for
+            large samples, at the cost of a small approximation. Only used on the 'opencl' backend.
+            See :class:`.ForceField_LJC`.
     """
 
     bMergeConv = False  # Should we use merged kernel relaxStrokesTilted_convZ or two separated kernells  ( relaxStrokesTilted, convolveZ  )
@@ -103,13 +132,23 @@ class AFMulator:
         kCantilever=1800,
         colorscale="gray",
         minimize_memory=False,
+        backend="opencl",
+        reuse_ff=False,
+        grid_sizes=None,
+        sample_pyramid=False,
     ):
-        if not FFcl.oclu or not oclr.oclu:
-            oclu.init_env()
-
-        self.forcefield = FFcl.ForceField_LJC()
+        self.backend = backend
+        if backend == "opencl":
+            if not FFcl.oclu or not oclr.oclu:
+                oclu.init_env()
+            self.forcefield = FFcl.ForceField_LJC(sample_pyramid=sample_pyramid)
+            self.scanner = oclr.RelaxedScanner()
+        elif backend == "cpu":
+            self.forcefield = cpu_backend.ForceField_CPU()
+            self.scanner = cpu_backend.RelaxedScanner_CPU()
+        else:
+            raise ValueError(f"Unknown backend `{backend}`. Should be 'opencl' or 'cpu'.")
 
-        self.scanner = oclr.RelaxedScanner()
         self.scanner.relax_params = np.array(self.relaxParams, dtype=np.float32)
         self.scanner.stiffness = np.array(tipStiffness, dtype=np.float32) / -common.eVA_Nm
 
@@ -125,8 +164,14 @@ class AFMulator:
         self.d3_params = d3_params
         self.lj_vdw_damp = lj_vdw_damp
         self.sample_lvec = None
+        self._update_settings = None
         self.colorscale = colorscale
         self.minimize_memory = minimize_memory
+        self.reuse_ff = reuse_ff
+        self.ff_cache_hits = 0
+        self.ff_cache_misses = 0
+        self._ff_fingerprint = None
+        self.grid_sizes = FFT_SIZES if isinstance(grid_sizes, str) and grid_sizes == "fft" else grid_sizes
 
         self.setScanWindow(scan_window, scan_dim, df_steps)
         self.setLvec(lvec, pixPerAngstrome)
@@ -163,15 +208,296 @@ class AFMulator:
         """
         if self.bRuntime:
             t0 = time.perf_counter()
-        self.prepareFF(xyzs, Zs, qs, rho_sample, sample_lvec, rot, rot_center, REAs)
+        if self.reuse_ff and self.isFFCurrent(xyzs, Zs, qs, rho_sample, sample_lvec, rot, rot_center, REAs):
+            if self.verbose > 0:
+                print("AFMulator.eval: Reusing force field")
+            self.ff_cache_hits += 1
+        else:
+            self.ff_cache_misses += 1
+            self.prepareFF(xyzs, Zs, qs, rho_sample, sample_lvec, rot, rot_center, REAs)
+            # The tip density may be reinitialized in prepareFF, so the fingerprint is taken afterwards
+            self._ff_fingerprint = self._get_ff_fingerprint(xyzs, Zs, qs, rho_sample, sample_lvec, rot, rot_center, REAs)
         self.prepareScanner()
         X = self.evalAFM(X)
+        if self.backend == "opencl" and self.forcefield._update_state is not None:
+            self._update_settings = copy.deepcopy(self._get_update_settings())
+        else:
+            self._update_settings = None
         if plot_to_dir:
             self.plot_images(X, outdir=plot_to_dir)
         if self.bRuntime:
             print("runtime(AFMulator.eval) [s]: ", time.perf_counter() - t0)
         return X
 
+    def eval_scan_only(self, X=None, plot_to_dir=None):
+        """
+        Evaluate AFM image using the force field from the previous call to :meth:`eval` or :meth:`evalUpdate`.
+
+        Only the scan is redone, so this can be used after changing the parameters that do not affect the force field,
+        such as the tip stiffness, df_steps, or the cantilever parameters. The force field grid (lvec and pixPerAngstrome)
+        should not be changed in between.
+
+        Arguments:
+            X: np.ndarray of shape (self.scan_dim[0], self.scan_dim[1], self.scan_dim[2]-self.df_steps+1)).
+               Array where AFM image will be saved. If None, will be created automatically.
+            plot_to_dir: str or None. If not None, plot the generated AFM images to this directory.
+
+        Returns:
+            X: np.ndarray. Output AFM images. If input X is not None, this is the same array object as X with values overwritten.
+        """
+        FF = self.forcefield.FF if self.backend == "cpu" else self.forcefield.cl_FE
+        if FF is None:
+            raise RuntimeError("No force field to scan. Run AFMulator.eval first.")
+        if self.bRuntime:
+            t0 = time.perf_counter()
+        self.prepareScanner()
+        X = self.evalAFM(X)
+        if plot_to_dir:
+            self.plot_images(X, outdir=plot_to_dir)
+        if self.bRuntime:
+            print("runtime(AFMulator.eval_scan_only) [s]: ", time.perf_counter() - t0)
+        return X
+
+    def eval_sweep(self, tipStiffnesses, df_steps):
+        """
+        Evaluate AFM images for all combinations of several tip stiffnesses and oscillation amplitudes using the force field
+        from the previous call to :meth:`eval` or :meth:`evalUpdate`.
+
+        The probe particle is relaxed for all of the stiffnesses in one pass, and each of the relaxed force stacks is
+        convolved with the df weights of all of the amplitudes in one pass, without copying the intermediate forces to the host.
+        So that the images for all amplitudes have the same size, the weights are zero-padded to the length of the largest
+        amplitude, and the images for each amplitude are the same as the first scan_dim[2] - max(df_steps) + 1 images
+        from :meth:`eval` with the same settings.
+
+        Arguments:
+            tipStiffnesses: array of shape (n_stiffness, 4). Harmonic spring constants (x, y, z, r) in N/m.
+            df_steps: list of ints of length n_amplitude. Numbers of steps in z convolution.
+
+        Returns:
+            X: np.ndarray of shape (n_stiffness, n_amplitude, scan_dim[0], scan_dim[1], scan_dim[2] - max(df_steps) + 1).
+                Output AFM images.
+        """
+        FF = self.forcefield.FF if self.backend == "cpu" else self.forcefield.cl_FE
+        if FF is None:
+            raise RuntimeError("No force field to scan. Run AFMulator.eval first.")
+        if self.bRuntime:
+            t0 = time.perf_counter()
+
+        weights = []
+        for n in df_steps:
+            if n <= 0 or n > self.scan_dim[2]:
+                raise ValueError(f"df_steps should be between 1 and scan_dim[2]({self.scan_dim[2]}), but got {n}.")
+            w = common.get_simple_df_weight(n, dz=self.dz) * common.eVA_Nm * self.f0Cantilever / self.kCantilever
+            weights.append(w)
+        WZconvs = np.zeros((len(weights), max(len(w) for w in weights)), dtype=np.float32)
+        for w, W in zip(weights, WZconvs):
+            W[: len(w)] = w
+        stiffnesses = np.array(tipStiffnesses, dtype=np.float32).reshape(-1, 4) / -common.eVA_Nm
+
+        self.prepareScanner()
+        X = self.scanner.run_relaxStrokesTilted_sweep(stiffnesses, WZconvs)
+
+        if self.bRuntime:
+            print("runtime(AFMulator.eval_sweep) [s]: ", time.perf_counter() - t0)
+
+        return X
+
+    def eval_tiled(self, xyzs, Zs, qs, rho_sample=None, sample_lvec=None, rot=np.eye(3), rot_center=None, REAs=None, tile_dim=(64, 64), halo=2.0, X=None):
+        """
+        Prepare and evaluate AFM image in tiles, so that the force field is never made for the whole scan window at once.
+
+        The scan window is split into tiles of at most tile_dim scan points in x and y. For each tile, a force field grid
+        is inferred from the scan window of the tile with a margin of halo angstroms on each side in x and y, as in
+        :meth:`setLvec`, and the tile is scanned as in :meth:`eval` and copied into the full image. The device memory used
+        for the force field thus depends on the size of the tiles instead of the size of the whole scan window.
+        The images are the same as those from :meth:`eval` as long as the halo is wide enough that the force field near
+        the edges of each tile does not depend on the force field grid boundaries, e.g. due to the circular
+        cross-correlation with the tip density when using a Hartree potential.
+
+        After the evaluation, the scan window and the force field lattice vectors are restored to the values they had
+        before, and the force field is released, so :meth:`eval_scan_only` can not be used until the next :meth:`eval`.
+
+        Arguments:
+            xyzs, Zs, qs, rho_sample, sample_lvec, rot, rot_center, REAs: See :meth:`eval`.
+            tile_dim: tuple of two ints. Maximum number of scan points in x and y in each tile.
+            halo: float. Width of the margin of the force field grid around the scan window of each tile in x and y in angstroms.
+            X: np.ndarray of shape (self.scan_dim[0], self.scan_dim[1], self.scan_dim[2]-self.df_steps+1)).
+               Array where AFM image will be saved. If None, will be created automatically.
+
+        Returns:
+            X: np.ndarray. Output AFM images. If input X is not None, this is the same array object as X with values overwritten.
+        """
+        if self.bRuntime:
+            t0 = time.perf_counter()
+
+        scan_window, scan_dim, lvec = self.scan_window, tuple(self.scan_dim), self.lvec
+        X_shape = scan_dim[:2] + (scan_dim[2] - len(self.dfWeight) + 1,)
+        if X is None:
+            X = np.empty(X_shape, dtype=np.float32)
+        elif X.shape != X_shape:
+            raise ValueError(f"Expected an array of shape {X_shape} for storing AFM image, but got an array of shape {X.shape} instead.")
+        if rot_center is None:
+            rot_center = xyzs.mean(axis=0)
+
+        start = np.array(scan_window[0][:2], dtype=np.float64)
+        step = (np.array(scan_window[1][:2]) - start) / np.maximum(np.array(scan_dim[:2]) - 1, 1)
+        sizes = VALID_SIZES if self.grid_sizes is None else self.grid_sizes
+        try:
+            for i0 in range(0, scan_dim[0], tile_dim[0]):
+                for j0 in range(0, scan_dim[1], tile_dim[1]):
+                    i1 = min(i0 + tile_dim[0], scan_dim[0])
+                    j1 = min(j0 + tile_dim[1], scan_dim[1])
+                    tile_start = start + step * [i0, j0]
+                    tile_end = start + step * [i1 - 1, j1 - 1]
+                    tile_window = ((tile_start[0], tile_start[1], scan_window[0][2]), (tile_end[0], tile_end[1], scan_window[1][2]))
+                    self.setScanWindow(tile_window, (i1 - i0, j1 - j0, scan_dim[2]))
+                    self.setLvec(get_lvec(tile_window, pad=(halo, halo, 3.0), tipR0=self.tipR0, pixPerAngstrome=self.pixPerAngstrome, sizes=sizes))
+                    if self.verbose > 0:
+                        print(f"AFMulator.eval_tiled: tile x {i0}-{i1}, y {j0}-{j1}, grid {self.forcefield.nDim[:3]}")
+                    X[i0:i1, j0:j1] = self.eval(xyzs, Zs, qs, rho_sample, sample_lvec, rot, rot_center, REAs)
+        finally:
+            self.setScanWindow(scan_window, scan_dim)
+            self.setLvec(lvec)
+            # The force field of the last tile does not match the restored grid, so it is released to not be scanned by
+            # eval_scan_only. The buffers for the full grid are then only allocated if the full grid is used again.
+            self.forcefield.tryReleaseBuffers()
+            self._old_nDim = np.zeros(4)
+            self._ff_fingerprint = None
+
+        if self.bRuntime:
+            print("runtime(AFMulator.eval_tiled) [s]: ", time.perf_counter() - t0)
+
+        return X
+
+    def isFFCurrent(self, xyzs, Zs, qs, rho_sample=None, sample_lvec=None, rot=np.eye(3), rot_center=None, REAs=None):
+        """
+        Check whether the current force field was computed by :meth:`eval` with the same inputs, so that it can be reused.
+        See :meth:`eval` for input arguments.
+
+        The force field is considered unchanged when the sample (atoms, charges, REAs, rotation, grids), the force field grid
+        and settings (cell list, cutoff, sample pyramid), and the tip (probe particle type, charges, densities) are the same
+        as before. Grids are compared by identity and :attr:`.DataGrid.version`, so modifying a grid in place with
+        :meth:`.DataGrid.update_array` is detected.
+        """
+        if self._ff_fingerprint is None:
+            return False
+        return self._get_ff_fingerprint(xyzs, Zs, qs, rho_sample, sample_lvec, rot, rot_center, REAs) == self._ff_fingerprint
+
+    def _get_ff_fingerprint(self, xyzs, Zs, qs, rho_sample, sample_lvec, rot, rot_center, REAs):
+        """Values that determine the force field computed by :meth:`prepareFF`."""
+        if rot_center is None:
+            rot_center = xyzs.mean(axis=0)
+        values = [
+            xyzs,
+            Zs,
+            qs,
+            rho_sample,
+            sample_lvec,
+            rot,
+            rot_center,
+            REAs,
+            self.iZPP,
+            self.lvec,
+            self.forcefield.nDim,
+            self.npbc,
+            self.sample_lvec,
+            self.forcefield.Qs,
+            self.forcefield.QZs,
+            self.forcefield.rho,
+            self.forcefield.rho_delta,
+            getattr(self.forcefield, "use_cell_list", False),
+            getattr(self.forcefield, "cutoff", None),
+            getattr(self.forcefield, "sample_pyramid", False),
+            self.A_pauli,
+            self.B_pauli,
+            self.typeParams,
+            self.fdbm_vdw_type,
+            self.d3_params,
+            self.lj_vdw_damp,
+        ]
+        return tuple(_fingerprint_value(v) for v in values)
+
+    def evalUpdate(self, xyzs, Zs, qs, REAs=None, X=None):
+        """
+        Evaluate AFM image of a molecule that differs from the molecule in the previous call to :meth:`eval` or
+        :meth:`evalUpdate` only by a few atoms, e.g. after a single move of a :class:`.Mutator`.
+
+        Instead of regenerating the whole force field, only the contributions of the atoms that were moved, added, or removed
+        are updated with :meth:`.ForceField_LJC.updateFF`, and the probe particle is relaxed again only on the scan rows
+        within the cutoff distance (``self.forcefield.cutoff``) of the changed atoms. With ``use_cell_list=True`` in the
+        force field, the result is the same as with :meth:`eval`, except for rounding errors. Without the cell list the
+        force field is still exact, but the long-range tails of the changes are not relaxed beyond the cutoff distance.
+
+        Falls back to :meth:`eval` when the previous simulation was not done with point charges on the OpenCL backend
+        or when any of the simulation parameters have changed since. The rotation of the previous simulation is reused.
+
+        Arguments:
+            xyzs: np.ndarray of shape (num_atoms, 3). Positions of atoms in x, y, and z.
+            Zs: np.ndarray of shape (num_atoms,). Elements of atoms.
+            qs: np.ndarray of shape (num_atoms,) or None. Charges of atoms. If None, then no electrostatics are used.
+            REAs: np.ndarray of shape (num_atoms, 4). Lennard Jones interaction parameters. Calculated automatically if None.
+            X: np.ndarray of shape (self.scan_dim[0], self.scan_dim[1], self.scan_dim[2]-self.df_steps+1)).
+               Array where AFM image will be saved. If None, will be created automatically.
+
+        Returns:
+            X: np.ndarray. Output AFM images. If input X is not None, this is the same array object as X with values overwritten.
+        """
+        if (
+            (self._update_settings is None)
+            or not ((qs is None) or isinstance(qs, np.ndarray))
+            or (self.forcefield._update_state is None)
+            or not _settings_equal(self._update_settings, self._get_update_settings())
+        ):
+            return self.eval(xyzs, Zs, qs, REAs=REAs, X=X)
+
+        if self.bRuntime:
+            t0 = time.perf_counter()
+
+        self._ff_fingerprint = None
+        if qs is None:
+            qs = np.zeros(len(Zs))
+        Zs, xyzs, qs, cLJs, REAs = self._prepareAtoms(xyzs, Zs, qs, REAs)
+        rot, rot_center = self._ff_rot
+        changed_xyzs = self.forcefield.updateFF(xyzs, cLJs, qs=qs, rot=rot, rot_center=rot_center, bFinish=False)
+
+        # Scan rows within the cutoff of the changed atoms. The probe particle can be displaced laterally from the tip
+        # by at most about the length of the tip.
+        if len(changed_xyzs) > 0:
+            xs = np.linspace(self.scan_window[0][0], self.scan_window[1][0], self.scan_dim[0])
+            margin = self.forcefield.cutoff + np.linalg.norm(self.tipR0)
+            inds = np.nonzero((xs >= changed_xyzs[:, 0].min() - margin) & (xs <= changed_xyzs[:, 0].max() + margin))[0]
+            rows = (inds[0], inds[-1] + 1) if len(inds) > 0 else (0, 0)
+        else:
+            rows = (0, 0)
+
+        self.prepareScanner()
+        X = self.evalAFM(X, rows=rows)
+
+        if self.bRuntime:
+            print("runtime(AFMulator.evalUpdate) [s]: ", time.perf_counter() - t0)
+
+        return X
+
+    def _get_update_settings(self):
+        """Simulation parameters that have to stay the same for :meth:`evalUpdate`."""
+        return dict(
+            iZPP=self.iZPP,
+            lvec=self.lvec,
+            nDim=self.forcefield.nDim,
+            scan_window=self.scan_window,
+            scan_dim=self.scan_dim,
+            dfWeight=self.dfWeight,
+            tipR0=self.tipR0,
+            stiffness=self.scanner.stiffness,
+            relax_params=self.scanner.relax_params,
+            Qs=self.forcefield.Qs,
+            QZs=self.forcefield.QZs,
+            npbc=self.npbc,
+            sample_lvec=self.sample_lvec,
+            typeParams=self.typeParams,
+            bMergeConv=self.bMergeConv,
+        )
+
     def __call__(self, *args, **kwargs):
         """
         Makes object callable. See :meth:`eval` for input arguments.
@@ -184,7 +510,10 @@ class AFMulator:
     # ========= Setup =========
 
     def setLvec(self, lvec=None, pixPerAngstrome=None):
-        """Set forcefield lattice vectors. If lvec is not given it is inferred from the scan window."""
+        """
+        Set forcefield lattice vectors. If lvec is not given it is inferred from the scan window.
+        The grid is padded to the allowed sizes in :attr:`grid_sizes`, if set.
+        """
 
         if self.bRuntime:
             t0 = time.perf_counter()
@@ -192,9 +521,10 @@ class AFMulator:
         if pixPerAngstrome is not None:
             self.pixPerAngstrome = pixPerAngstrome
         if lvec is not None:
-            self.lvec = lvec
+            self.lvec = lvec if self.grid_sizes is None else pad_lvec(lvec, self.pixPerAngstrome, sizes=self.grid_sizes)
         else:
-            self.lvec = get_lvec(self.scan_window, tipR0=self.tipR0, pixPerAngstrome=self.pixPerAngstrome)
+            sizes = VALID_SIZES if self.grid_sizes is None else self.grid_sizes
+            self.lvec = get_lvec(self.scan_window, tipR0=self.tipR0, pixPerAngstrome=self.pixPerAngstrome, sizes=sizes)
 
         # Remember old grid size
         if hasattr(self.forcefield, "nDim"):
@@ -273,7 +603,10 @@ class AFMulator:
             if self.verbose > 0:
                 print("AFMulator.setRho: Preparing buffers")
             if not np.allclose(B_pauli, 1.0):
-                rho_power = self.rho.power_positive(p=self.B_pauli, in_place=False)
+                if self.backend == "cpu":
+                    rho_power = cpu_backend.power_positive(self.rho, p=self.B_pauli)
+                else:
+                    rho_power = self.rho.power_positive(p=self.B_pauli, in_place=False)
                 if self.minimize_memory:
                     self.rho.release()  # Let's not keep the original array in device memory to minimize memory foot print
                 self.rho = rho_power
@@ -287,7 +620,8 @@ class AFMulator:
                 self.forcefield.rho.release()
                 self.forcefield.rho = None
         if self.bRuntime:
-            self.forcefield.queue.finish()
+            if self.backend == "opencl":
+                self.forcefield.queue.finish()
             print("runtime(AFMulator.setRho) [s]: ", time.perf_counter() - t0)
 
     def setBPauli(self, B_pauli=1.0):
@@ -351,6 +685,9 @@ class AFMulator:
         if self.bRuntime:
             t0 = time.perf_counter()
 
+        # The force field is recomputed here, so it can only be reused by eval after it has fingerprinted the new inputs
+        self._ff_fingerprint = None
+
         # Check if the scan window extends over any non-periodic boundaries and issue a warning if it does
         self.check_scan_window()
 
@@ -404,17 +741,11 @@ class AFMulator:
         if (method != "fdbm") and (not np.allclose(self.B_pauli, 1.0)):
             warnings.warn(f"Not using FDBM, but tip density exponent is {self.B_pauli}! This is probably not what you want to do!")
 
-        npbc = self.npbc if self.sample_lvec is not None else (0, 0, 0)
-
         if rot_center is None:
             rot_center = xyzs.mean(axis=0)
+        self._ff_rot = (rot, rot_center)
 
-        # Get Lennard-Jones parameters and apply periodic boundary conditions to atoms
-        if REAs is None:
-            REAs = common.getAtomsREA(self.iZPP, Zs, self.typeParams, alphaFac=-1.0)
-        cLJs = common.REA2LJ(REAs)
-        if sum(npbc) > 0:
-            Zs, xyzs, qs, cLJs, REAs = common.PBCAtoms3D_np(Zs, xyzs, qs, cLJs, REAs, self.sample_lvec, npbc=npbc)
+        Zs, xyzs, qs, cLJs, REAs = self._prepareAtoms(xyzs, Zs, qs, REAs)
 
         # Compute force field
         self.forcefield.makeFF(
@@ -444,6 +775,16 @@ class AFMulator:
         if self.bRuntime:
             print("runtime(AFMulator.prepareFF) [s]: ", time.perf_counter() - t0)
 
+    def _prepareAtoms(self, xyzs, Zs, qs, REAs=None):
+        """Get Lennard-Jones parameters and apply periodic boundary conditions to atoms."""
+        npbc = self.npbc if self.sample_lvec is not None else (0, 0, 0)
+        if REAs is None:
+            REAs = common.getAtomsREA(self.iZPP, Zs, self.typeParams, alphaFac=-1.0)
+        cLJs = common.REA2LJ(REAs)
+        if sum(npbc) > 0:
+            Zs, xyzs, qs, cLJs, REAs = common.PBCAtoms3D_np(Zs, xyzs, qs, cLJs, REAs, self.sample_lvec, npbc=npbc)
+        return Zs, xyzs, qs, cLJs, REAs
+
     def prepareScanner(self):
         """Prepare scanner. Run after preparing force field."""
 
@@ -451,7 +792,10 @@ class AFMulator:
             t0 = time.perf_counter()
 
         # Copy forcefield array to scanner buffer
-        self.scanner.updateFEin(self.forcefield.cl_FE)
+        if self.backend == "cpu":
+            self.scanner.updateFEin(self.forcefield.FF)
+        else:
+            self.scanner.updateFEin(self.forcefield.cl_FE)
 
         # Subtract origin, because OpenCL kernel for tip relaxation does not take the origin of the FF box into account
         self.pos0 = np.array([0, 0, self.scan_window[1][2]]) - self.lvec[0]
@@ -462,13 +806,15 @@ class AFMulator:
         if self.bRuntime:
             print("runtime(AFMulator.prepareScanner) [s]: ", time.perf_counter() - t0)
 
-    def evalAFM(self, X=None):
+    def evalAFM(self, X=None, rows=None):
         """
         Evaluate AFM image. Run after preparing force field and scanner.
 
         Arguments:
             X: np.ndarray of shape (self.scan_dim[0], self.scan_dim[1], self.scan_dim[2]-self.df_steps+1)).
                Array where AFM image will be saved. If None, will be created automatically.
+            rows: tuple (i0, i1) or None. If not None, only the scan rows i0 <= i < i1 along the first scan dimension are
+                evaluated, and the rest of the image is the same as in the previous evaluation.
 
         Returns:
             X: np.ndarray. Output AFM images. If input X is not None, this is the same array object as X with values overwritten.
@@ -477,11 +823,12 @@ class AFMulator:
         if self.bRuntime:
             t0 = time.perf_counter()
 
+        kwargs = {} if rows is None else {"rows": rows}
         if self.bMergeConv:
-            FEout = self.scanner.run_relaxStrokesTilted_convZ()
+            FEout = self.scanner.run_relaxStrokesTilted_convZ(**kwargs)
         else:
-            self.scanner.run_relaxStrokesTilted(bCopy=False, bFinish=False)
-            FEout = self.scanner.run_convolveZ()
+            self.scanner.run_relaxStrokesTilted(bCopy=False, bFinish=False, **kwargs)
+            FEout = self.scanner.run_convolveZ(**kwargs)
 
         if X is None:
             X = FEout[:, :, :, 2].copy()
@@ -722,13 +1069,79 @@ def _get_params(file_path):
     return afmulator_params, sample_lvec
 
 
-def get_lvec(scan_window, pad=(2.0, 2.0, 3.0), tipR0=(0.0, 0.0, 3.0), pixPerAngstrome=10):
+def _settings_equal(settings1, settings2):
+    if settings1.keys() != settings2.keys():
+        return False
+    for key in settings1:
+        v1, v2 = settings1[key], settings2[key]
+        if (v1 is None) or (v2 is None):
+            if (v1 is None) != (v2 is None):
+                return False
+        elif not np.array_equal(np.asarray(v1, dtype=object), np.asarray(v2, dtype=object)):
+            return False
+    return True
+
+
+def _fingerprint_value(v):
+    if isinstance(v, DataGrid):
+        # Compare grids by identity and version like in the sample cache. The weak reference does not keep the grid alive,
+        # and it only compares equal to the reference of the same grid, so a new grid that reuses the id does not match.
+        return (id(v), v.version, weakref.ref(v))
+    if isinstance(v, np.ndarray):
+        return (v.shape, v.dtype.str, v.tobytes())
+    if isinstance(v, (list, tuple)):
+        return tuple(_fingerprint_value(x) for x in v)
+    if isinstance(v, dict):
+        return tuple((k, _fingerprint_value(x)) for k, x in v.items())
+    return v
+
+
+def get_grid_size(n, sizes=VALID_SIZES):
+    """
+    Round a number of grid points up to the nearest allowed size.
+
+    Arguments:
+        n: int. Number of grid points.
+        sizes: np.ndarray of ints. Allowed sizes in ascending order.
+
+    Returns:
+        n_padded: int. Smallest allowed size that is at least n.
+    """
+    sizes = np.asarray(sizes)
+    larger = sizes[sizes >= n]
+    if len(larger) == 0:
+        raise ValueError(f"Grid size {n} is larger than the largest allowed grid size {sizes[-1]}.")
+    return int(larger[0])
+
+
+def pad_lvec(lvec, pixPerAngstrome=10, sizes=FFT_SIZES):
+    """
+    Extend force field lattice vectors so that the number of grid points along each vector is an allowed size.
+    The origin and the grid spacing of 1 / pixPerAngstrome are kept the same.
+
+    Arguments:
+        lvec: np.ndarray of shape (4, 3). Origin and the lattice vectors of the force field grid.
+        pixPerAngstrome: int. Number of grid points per angstrom.
+        sizes: np.ndarray of ints. Allowed numbers of grid points in ascending order.
+
+    Returns:
+        lvec_padded: np.ndarray of shape (4, 3). Origin and the extended lattice vectors.
+    """
+    lvec = np.array(lvec, dtype=np.float64)
+    for i in range(1, 4):
+        length = np.linalg.norm(lvec[i])
+        n = get_grid_size(int(round(pixPerAngstrome * length)), sizes)
+        lvec[i] *= n / (pixPerAngstrome * length)
+    return lvec
+
+
+def get_lvec(scan_window, pad=(2.0, 2.0, 3.0), tipR0=(0.0, 0.0, 3.0), pixPerAngstrome=10, sizes=VALID_SIZES):
     pad = np.array(pad)
     tipR0 = np.array(tipR0)
     center = (np.array(scan_window[0]) + np.array(scan_window[1])) / 2
     box_size = (np.array(scan_window[1]) - np.array(scan_window[0])) + 2 * pad
     nDim = (pixPerAngstrome * box_size).round().astype(np.int32)
-    nDim = np.array([VALID_SIZES[VALID_SIZES >= d][0] for d in nDim])
+    nDim = np.array([get_grid_size(d, sizes) for d in nDim])
     box_size = nDim / pixPerAngstrome
     origin = center - box_size / 2 - tipR0
     # fmt: off
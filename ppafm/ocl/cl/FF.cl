@@ -422,6 +422,59 @@ __kernel void evalLJC_QZs_noPos(
     FE[iG] = fe;
 }
 
+// Update the force field of evalLJC_QZs_noPos after a few of the atoms have changed. Grid points inside the box
+// box0 <= (i, j, k) < box1 are recomputed from all of the atoms, and at the grid points outside of the box only the
+// contributions of the changed atoms are added. The changed atoms should have negated charges and Lennard-Jones
+// parameters for the atoms that were removed. Launch with a 3D global size covering the whole grid.
+__kernel void updateLJC_QZs_noPos(
+    const int nAtoms,           // Number of atoms
+    __global float4* atoms,     // Atom positions and charges
+    __global float2* cLJs,      // Lennard-Jones parameters for atoms
+    const int nDelta,           // Number of changed atoms
+    __global float4* dAtoms,    // Positions and charges of changed atoms
+    __global float2* dcLJs,     // Lennard-Jones parameters of changed atoms
+    __global float4* FE,        // Forcefield grid
+    int4 nGrid,                 // Grid size
+    float4 grid_origin,         // Real-space origin of grid
+    float4 grid_stepA,          // Real-space step sizes of grid lattice vectors
+    float4 grid_stepB,
+    float4 grid_stepC,
+    int4 box0,                  // Start indices of the recomputed box
+    int4 box1,                  // End indices of the recomputed box
+    float4 Qs,                  // Tip charges
+    float4 QZs                  // Tip charge positions on z axis relative to PP
+){
+    const int i = get_global_id(0);
+    const int j = get_global_id(1);
+    const int k = get_global_id(2);
+    if ((i >= nGrid.x) || (j >= nGrid.y) || (k >= nGrid.z)) return;
+
+    const bool inBox = (i >= box0.x) && (j >= box0.y) && (k >= box0.z) && (i < box1.x) && (j < box1.y) && (k < box1.z);
+    const int n = inBox ? nAtoms : nDelta;
+    __global float4* as = inBox ? atoms : dAtoms;
+    __global float2* cs = inBox ? cLJs  : dcLJs;
+
+    const float3 pos = grid_origin.xyz + grid_stepA.xyz*i + grid_stepB.xyz*j + grid_stepC.xyz*k;
+    Qs *= COULOMB_CONST;
+
+    float4 fe = (float4) (0.0f, 0.0f, 0.0f, 0.0f);
+    for (int ia = 0; ia < n; ia++) {
+        float4 xyzq = as[ia];
+        fe += getLJ     ( xyzq.xyz, cs[ia], pos );
+        fe += getCoulomb( xyzq, pos+(float3)(0,0,QZs.x) ) * Qs.x;
+        fe += getCoulomb( xyzq, pos+(float3)(0,0,QZs.y) ) * Qs.y;
+        fe += getCoulomb( xyzq, pos+(float3)(0,0,QZs.z) ) * Qs.z;
+        fe += getCoulomb( xyzq, pos+(float3)(0,0,QZs.w) ) * Qs.w;
+    }
+
+    const int ind = i + nGrid.x * (j + nGrid.y * k);
+    if (inBox) {
+        FE[ind] = fe;
+    } else {
+        FE[ind] += fe;
+    }
+}
+
 __kernel void evalLJC(
     int nAtoms,
     __global float4*   atoms,
@@ -853,6 +906,265 @@ __kernel void addDFTD3_BJ(
 
 }
 
+// ================ Cell-list (spatially binned) variants of the force field kernels
+//
+// The atoms are binned on the host into a regular cartesian cell grid (see ForceField_LJC.prepareCellList).
+// cell_atoms holds the atom indices sorted by the linear cell index ix + nCell.x*(iy + nCell.y*iz) and
+// cell_start[ic]...cell_start[ic+1] is the range of cell_atoms belonging to cell ic. Consequently, the atoms
+// of a contiguous row of cells along x are also contiguous in cell_atoms.
+//
+// The kernels are launched on a 3D range over the grid (x, y, z). Each work group covers a box of grid points,
+// finds the cells that overlap the bounding box of its grid points expanded by the cutoff radius, and loads the atoms
+// of those cells in tiles into local memory. Only the atoms within the cutoff radius contribute to the force field.
+// Local work group size can be at most 64.
+
+// Find the range of cells [c0, c1] that can contain atoms within distance rcut from the grid points of this work group.
+void groupCellRange(
+    int4 nGrid, float3 grid_origin, float3 grid_stepA, float3 grid_stepB, float3 grid_stepC,
+    int4 nCell, float4 cell_origin, float rcut, int3* c0, int3* c1
+){
+    int3 g0 = (int3)(get_global_id(0) - get_local_id(0), get_global_id(1) - get_local_id(1), get_global_id(2) - get_local_id(2));
+    int3 g1 = (int3)(get_local_size(0), get_local_size(1), get_local_size(2)) + g0 - 1;
+    g1 = min(g1, nGrid.xyz - 1);
+    float3 pmin = (float3)( INFINITY);
+    float3 pmax = (float3)(-INFINITY);
+    for (int ic = 0; ic < 8; ic++) {
+        float3 p = grid_origin
+            + grid_stepA * ((ic & 1) ? g1.x : g0.x)
+            + grid_stepB * ((ic & 2) ? g1.y : g0.y)
+            + grid_stepC * ((ic & 4) ? g1.z : g0.z);
+        pmin = fmin(pmin, p);
+        pmax = fmax(pmax, p);
+    }
+    *c0 = max(convert_int3_sat_rtn((pmin - rcut - cell_origin.xyz) * cell_origin.w), 0);
+    *c1 = min(convert_int3_sat_rtn((pmax + rcut - cell_origin.xyz) * cell_origin.w), nCell.xyz - 1);
+}
+
+// Van der Waals force and energy of a single atom. See addvdW for the damping methods.
+float4 getvdW(float3 dp, float2 cLJ, float2 RE, int damp_method) {
+    float r2 = dot(dp, dp);
+    if (damp_method == -1) {
+        float ir2 = 1.0f / (r2 + R2SAFE);
+        float ir6 = ir2 * ir2 * ir2;
+        float E = -cLJ.x * ir6;
+        return (float4)(6.0f * E * ir2 * dp, E);
+    } else if (damp_method == 0) {
+        float r8 = r2 * r2 * r2 * r2;
+        return (float4)(-6.0f * cLJ.x / (r8 + ADamp_Const * cLJ.x) * dp, 0.0f);
+    }
+    float iR2 = 1.0f / (RE.x * RE.x);
+    float u2 = r2 * iR2;
+    float u4 = u2 * u2;
+    float D, dD, ADamp;
+    if (damp_method == 1) {
+        float step = (float)(u2 < 1);
+        D = (1.0f - u2) * step;
+        dD = -2.0f * step;
+        ADamp = ADamp_R2;
+    } else if (damp_method == 2) {
+        float de = (1 - u2) * (float)(u2 < 1);
+        D = de * de;
+        dD = -4 * de;
+        ADamp = ADamp_R4;
+    } else if (damp_method == 3) {
+        float de2 = 1 / (u2 + R2SAFE);
+        D = de2 * de2;
+        dD = -4 * de2 * D;
+        ADamp = ADamp_invR4;
+    } else {
+        float de2 = 1 / (u2 + R2SAFE);
+        D = de2 * de2 * de2 * de2;
+        dD = -8 * de2 * D;
+        ADamp = ADamp_invR8;
+    }
+    float e = 1.0f / (u4 * u2 + D * ADamp);
+    float E = -2.0f * RE.y * e;
+    return (float4)((E * e * (6.0f * u4 + dD * ADamp) * iR2) * dp, E);
+}
+
+// Grimme-D3 force and energy of a single atom with Becke-Johnson damping. See addDFTD3_BJ.
+float4 getDFTD3_BJ(float3 dp, float4 coeff) {
+    float r2 = dot(dp, dp);
+    float r4 = r2 * r2;
+    float r6 = r4 * r2;
+    float r8 = r6 * r2;
+    float d6 = 1.0f / (r6 + coeff.z);
+    float d8 = 1.0f / (r8 + coeff.w);
+    float E6 = -coeff.x * d6;
+    float E8 = -coeff.y * d8;
+    float F6 = E6 * d6 * 6 * r4;
+    float F8 = E8 * d8 * 8 * r6;
+    return (float4)((F6 + F8) * dp, E6 + E8);
+}
+
+// Common header for the cell-list kernels: grid indices, grid point position, and cell range of the work group.
+#define CELL_KERNEL_SETUP                                                                                   \
+    const int iL = get_local_id(0) + get_local_size(0) * (get_local_id(1) + get_local_size(1) * get_local_id(2)); \
+    const int nL = get_local_size(0) * get_local_size(1) * get_local_size(2);                              \
+    const int i = get_global_id(0);                                                                        \
+    const int j = get_global_id(1);                                                                        \
+    const int k = get_global_id(2);                                                                        \
+    const bool inside = (i < nGrid.x) && (j < nGrid.y) && (k < nGrid.z);                                   \
+    const int ind = i + nGrid.x * (j + nGrid.y * k);                                                       \
+    const float3 pos = grid_origin.xyz + grid_stepA.xyz*i + grid_stepB.xyz*j + grid_stepC.xyz*k;           \
+    const float rcut2 = rcut * rcut;                                                                       \
+    int3 c0, c1;                                                                                           \
+    groupCellRange(nGrid, grid_origin.xyz, grid_stepA.xyz, grid_stepB.xyz, grid_stepC.xyz,                 \
+        nCell, cell_origin, rcut, &c0, &c1);
+
+// Loop over tiles of atoms in the cells of the work group. Inside the loop body, the atoms of the current tile are
+// in local memory at indices [0, nj) and the global atom index of the tile entry is available in ATOM_INDEX(ja).
+// LOAD(jl, ia) copies the data of atom ia into local slot jl.
+#define FOR_CELL_TILES(LOAD, BODY)                                                                         \
+    for (int cz = c0.z; cz <= c1.z; cz++) {                                                                \
+        for (int cy = c0.y; cy <= c1.y; cy++) {                                                            \
+            int row = nCell.x * (cy + nCell.y * cz);                                                       \
+            int start = cell_start[row + c0.x];                                                            \
+            int end = cell_start[row + c1.x + 1];                                                          \
+            for (int i0 = start; i0 < end; i0 += nL) {                                                     \
+                if (i0 + iL < end) {                                                                       \
+                    int ia = cell_atoms[i0 + iL];                                                          \
+                    LOAD(iL, ia)                                                                           \
+                }                                                                                          \
+                barrier(CLK_LOCAL_MEM_FENCE);                                                              \
+                int nj = min(nL, end - i0);                                                                \
+                for (int ja = 0; ja < nj; ja++) {                                                          \
+                    BODY                                                                                   \
+                }                                                                                          \
+                barrier(CLK_LOCAL_MEM_FENCE);                                                              \
+            }                                                                                              \
+        }                                                                                                  \
+    }
+
+// Cell-list variant of evalLJC_QZs_noPos. Both the Lennard-Jones and the Coulomb interactions are truncated at rcut.
+__kernel void evalLJC_QZs_noPos_cells(
+    __global float4* atoms,     // Atom positions and charges
+    __global float2* cLJs,      // Lennard-Jones parameters for atoms
+    __global int* cell_start,   // Start index of each cell in cell_atoms, size nCell.x*nCell.y*nCell.z + 1
+    __global int* cell_atoms,   // Atom indices sorted by cell
+    __global float4* FE,        // Forcefield grid
+    int4 nGrid,                 // Grid size
+    float4 grid_origin,         // Real-space origin of grid
+    float4 grid_stepA,          // Real-space step sizes of grid lattice vectors
+    float4 grid_stepB,
+    float4 grid_stepC,
+    int4 nCell,                 // Number of cells in each direction
+    float4 cell_origin,         // Real-space origin of the cell grid (xyz) and inverse cell size (w)
+    float rcut,                 // Cutoff radius
+    float4 Qs,                  // Tip charges
+    float4 QZs                  // Tip charge positions on z axis relative to PP
+){
+    __local float4 LATOMS[64];
+    __local float2 LCLJS [64];
+    CELL_KERNEL_SETUP
+    Qs *= COULOMB_CONST;
+    float4 fe = (float4) (0.0f, 0.0f, 0.0f, 0.0f);
+    #define LOAD(jl, ia) LATOMS[jl] = atoms[ia]; LCLJS[jl] = cLJs[ia];
+    FOR_CELL_TILES(LOAD,
+        float4 xyzq = LATOMS[ja];
+        float3 dp = pos - xyzq.xyz;
+        if (dot(dp, dp) < rcut2) {
+            fe += getLJ     ( xyzq.xyz, LCLJS[ja], pos );
+            fe += getCoulomb( xyzq, pos+(float3)(0,0,QZs.x) ) * Qs.x;
+            fe += getCoulomb( xyzq, pos+(float3)(0,0,QZs.y) ) * Qs.y;
+            fe += getCoulomb( xyzq, pos+(float3)(0,0,QZs.z) ) * Qs.z;
+            fe += getCoulomb( xyzq, pos+(float3)(0,0,QZs.w) ) * Qs.w;
+        }
+    )
+    #undef LOAD
+    if (inside) FE[ind] = fe;
+}
+
+// Cell-list variant of addLJ.
+__kernel void addLJ_cells(
+    __global float4* atoms,     // Atom positions
+    __global float2* cLJs,      // Lennard-Jones parameters for atoms
+    __global int* cell_start,   // Start index of each cell in cell_atoms
+    __global int* cell_atoms,   // Atom indices sorted by cell
+    __global float4* FE,        // Forcefield grid
+    int4 nGrid,                 // Grid size
+    float4 grid_origin,         // Real-space origin of grid
+    float4 grid_stepA,          // Real-space step sizes of grid lattice vectors
+    float4 grid_stepB,
+    float4 grid_stepC,
+    int4 nCell,                 // Number of cells in each direction
+    float4 cell_origin,         // Real-space origin of the cell grid (xyz) and inverse cell size (w)
+    float rcut                  // Cutoff radius
+){
+    __local float4 LATOMS[64];
+    __local float2 LCLJS [64];
+    CELL_KERNEL_SETUP
+    float4 fe = (float4) (0.0f, 0.0f, 0.0f, 0.0f);
+    #define LOAD(jl, ia) LATOMS[jl] = atoms[ia]; LCLJS[jl] = cLJs[ia];
+    FOR_CELL_TILES(LOAD,
+        float3 dp = pos - LATOMS[ja].xyz;
+        if (dot(dp, dp) < rcut2) fe += getLJ(LATOMS[ja].xyz, LCLJS[ja], pos);
+    )
+    #undef LOAD
+    if (inside) FE[ind] += fe;
+}
+
+// Cell-list variant of addvdW.
+__kernel void addvdW_cells(
+    __global float4* atoms,     // Atom positions
+    __global float2* cLJs,      // Lennard-Jones parameters in AB form
+    __global float4* REAs,      // Lennard-Jones parameters in RE form
+    __global int* cell_start,   // Start index of each cell in cell_atoms
+    __global int* cell_atoms,   // Atom indices sorted by cell
+    __global float4* FE,        // Forcefield grid
+    int4 nGrid,                 // Grid size
+    float4 grid_origin,         // Real-space origin of grid
+    float4 grid_stepA,          // Real-space step sizes of grid lattice vectors
+    float4 grid_stepB,
+    float4 grid_stepC,
+    int4 nCell,                 // Number of cells in each direction
+    float4 cell_origin,         // Real-space origin of the cell grid (xyz) and inverse cell size (w)
+    float rcut,                 // Cutoff radius
+    int damp_method             // Type of damping to use. -1: no damping, 0: constant, 1: R2, 2: R4, 3: invR4, 4: invR8
+){
+    __local float4 LATOMS[64];
+    __local float4 LPARS [64];
+    CELL_KERNEL_SETUP
+    float4 fe = (float4) (0.0f, 0.0f, 0.0f, 0.0f);
+    #define LOAD(jl, ia) LATOMS[jl] = atoms[ia]; LPARS[jl] = (damp_method < 1) ? (float4)(cLJs[ia], 0.0f, 0.0f) : REAs[ia];
+    FOR_CELL_TILES(LOAD,
+        float3 dp = pos - LATOMS[ja].xyz;
+        if (dot(dp, dp) < rcut2) fe += getvdW(dp, LPARS[ja].xy, LPARS[ja].xy, damp_method);
+    )
+    #undef LOAD
+    if (inside) FE[ind] += fe;
+}
+
+// Cell-list variant of addDFTD3_BJ. The cutoff is min(rcut, sqrt(R2_D3_CUTOFF)).
+__kernel void addDFTD3_BJ_cells(
+    __global float4* atoms,     // Atom positions
+    __global float4* coeff,     // The C6, C8, and R0_6, R0_8 parameters for each atom (pre-scaled)
+    __global int* cell_start,   // Start index of each cell in cell_atoms
+    __global int* cell_atoms,   // Atom indices sorted by cell
+    __global float4* FE,        // Forcefield grid
+    int4 nGrid,                 // Grid size
+    float4 grid_origin,         // Real-space origin of grid
+    float4 grid_stepA,          // Real-space step sizes of grid lattice vectors
+    float4 grid_stepB,
+    float4 grid_stepC,
+    int4 nCell,                 // Number of cells in each direction
+    float4 cell_origin,         // Real-space origin of the cell grid (xyz) and inverse cell size (w)
+    float rcut                  // Cutoff radius
+){
+    __local float4 LATOMS[64];
+    __local float4 LCOEFF[64];
+    rcut = min(rcut, sqrt(R2_D3_CUTOFF));
+    CELL_KERNEL_SETUP
+    float4 fe = (float4) (0.0f, 0.0f, 0.0f, 0.0f);
+    #define LOAD(jl, ia) LATOMS[jl] = atoms[ia]; LCOEFF[jl] = coeff[ia];
+    FOR_CELL_TILES(LOAD,
+        float3 dp = pos - LATOMS[ja].xyz;
+        if (dot(dp, dp) <= rcut2) fe += getDFTD3_BJ(dp, LCOEFF[ja]);
+    )
+    #undef LOAD
+    if (inside) FE[ind] += fe;
+}
+
 // Compute Lennard Jones force field at grid points and add to it the electrostatic force
 // from an electric field precomputed from a Hartree potential. The output buffer is
 // written in Fortran memory layout in order to be compatible with OpenCL image
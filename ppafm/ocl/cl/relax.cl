@@ -388,9 +388,11 @@ __kernel void relaxStrokesTilted_debug(
 }
 
 
-__kernel void relaxStrokesTilted(
+// Relax the probe particle along one tilted stroke of nz points starting at tipPos, and write the tip-rotated forces to
+// FEs[iz] and the probe particle positions to paths[iz]. paths may be 0 when the positions are not needed.
+inline void relaxStrokeTilted(
     __read_only image3d_t  imgIn,
-    __global  float4*      points,
+    float3 tipPos,
     __global  float4*      FEs,
     __global  float4*      paths,
     float4 dinvA,
@@ -409,7 +411,6 @@ __kernel void relaxStrokesTilted(
     const float3 dTip   = tipC.xyz * tipC.w;
     float4 dpos0_=dpos0; dpos0_.xyz= rotMatT( dpos0_.xyz , tipA.xyz, tipB.xyz, tipC.xyz );
 
-    float3 tipPos = points[get_global_id(0)].xyz;
     float3 pos    = tipPos.xyz + dpos0_.xyz;
 
     float dt      = relax_params.x;
@@ -419,8 +420,6 @@ __kernel void relaxStrokesTilted(
     float dtmin = dtmax*0.1f;
     float damp0 = damp;
 
-    //if( (get_global_id(0)==0) ){     float4 fe = interpFE( pos, dinvA.xyz, dinvB.xyz, dinvC.xyz, imgIn );  printf( " pos (%g,%g,%g) feImg(%g,%g,%g,%g) \n", pos.x, pos.y, pos.z, fe.x,fe.y,fe.z,fe.w );}
-
     for(int iz=0; iz<nz; iz++){
         float4 fe;
         float3 v   = 0.0f;
@@ -447,22 +446,39 @@ __kernel void relaxStrokesTilted(
             if(dot(f,f)<F2CONV) break;
         }
 
-        if(1){ // output tip-rotated force
-            float4 fe_  = fe;
-            int ind = get_global_id(0)*nz + iz;
-            fe_.xyz = rotMat( fe.xyz, tipA.xyz, tipB.xyz, tipC.xyz );
-            fe_.w   = fe.w;
-            FEs[ind] = fe_;
-            paths[ind] = (float4)(pos, 0.0f);
-        }else{ // output molecule-rotated force
-            FEs[get_global_id(0)*nz + iz] = fe;
-            //FEs[get_global_id(0)*nz + iz].xyz = pos;
-        }
+        // output tip-rotated force
+        float4 fe_  = fe;
+        fe_.xyz = rotMat( fe.xyz, tipA.xyz, tipB.xyz, tipC.xyz );
+        FEs[iz] = fe_;
+        if( paths ) paths[iz] = (float4)(pos, 0.0f);
+
         tipPos += dTip.xyz;
         pos    += dTip.xyz;
     }
 }
 
+__kernel void relaxStrokesTilted(
+    __read_only image3d_t  imgIn,
+    __global  float4*      points,
+    __global  float4*      FEs,
+    __global  float4*      paths,
+    float4 dinvA,
+    float4 dinvB,
+    float4 dinvC,
+    float4 tipA,
+    float4 tipB,
+    float4 tipC,
+    float4 stiffness,
+    float4 dpos0,
+    float4 relax_params,
+    float4 surfFF,
+    int nz
+){
+    const int ioff = get_global_id(0)*nz;
+    relaxStrokeTilted( imgIn, points[get_global_id(0)].xyz, FEs + ioff, paths + ioff,
+        dinvA, dinvB, dinvC, tipA, tipB, tipC, stiffness, dpos0, relax_params, surfFF, nz );
+}
+
 
 
 __kernel void relaxStrokesTilted_convZ(
@@ -607,6 +623,60 @@ __kernel void convolveZ(
     }
 }
 
+// Same as relaxStrokesTilted, but for several tip stiffnesses at once. The second global index selects the stiffness,
+// and the forces for stiffness ik are written to FEs[ (ik*nxy + i)*nz + iz ] where i is the stroke index.
+__kernel void relaxStrokesTilted_sweep(
+    __read_only image3d_t  imgIn,
+    __global  float4*      points,
+    __global  float4*      FEs,
+    __global  float4*      stiffnesses,
+    float4 dinvA,
+    float4 dinvB,
+    float4 dinvC,
+    float4 tipA,
+    float4 tipB,
+    float4 tipC,
+    float4 dpos0,
+    float4 relax_params,
+    float4 surfFF,
+    int nz
+){
+
+    const int    nxy       = get_global_size(0);
+    const int    ik        = get_global_id(1);
+    const float4 stiffness = stiffnesses[ik];
+    const int    ioff      = (ik*nxy + get_global_id(0))*nz;
+    relaxStrokeTilted( imgIn, points[get_global_id(0)].xyz, FEs + ioff, 0,
+        dinvA, dinvB, dinvC, tipA, tipB, tipC, stiffness, dpos0, relax_params, surfFF, nz );
+}
+
+// Convolve the z-component of the relaxed forces from relaxStrokesTilted_sweep with nw weight masks in one pass. The global
+// size is the number of strokes nxy times the number of stiffnesses. Each weight mask is zero-padded to nzin-nzout+1 points.
+// The result for stiffness ik, mask iw, and stroke i is written to Fout[ ((ik*nw + iw)*nxy + i)*nzout + izo ].
+__kernel void convolveZ_sweep(
+    __global  float4* Fin,
+    __global  float*  Fout,
+    __constant  float*  weighs,
+    const int nzin, const int nzout, const int nw, const int nxy
+){
+    const int ioffi = get_global_id(0)*nzin;
+    const int ik    = get_global_id(0)/nxy;
+    const int i     = get_global_id(0)%nxy;
+    const int nzw   = nzin-nzout+1;
+
+    for(int iw=0; iw<nw; iw++){
+        const int ioffo = ((ik*nw + iw)*nxy + i)*nzout;
+        const int ioffw = iw*nzw;
+        for(int izo=0; izo<nzout; izo++){
+            float fz = 0.0f;
+            for(int jz=0; jz<nzw; jz++){
+                fz += Fin[ ioffi + izo + jz ].z * weighs[ ioffw + jz ];
+            }
+            Fout[ ioffo + izo ] = fz;
+        }
+    }
+}
+
 __kernel void izoZ(
     __global  float4* Fin,
     __global  float*  zMap,
@@ -0,0 +1,610 @@
+#!/usr/bin/python
+
+"""
+CPU counterparts of the OpenCL force field and scanner classes used by :class:`.AFMulator`.
+
+The force field is computed with the C++ kernels in :mod:`ppafm.core` (``getLennardJonesFF``, ``getCoulombFF``,
+``getVdWFF_RE``, ``getDFTD3FF``), the FFT cross-correlations for Hartree potentials and electron densities
+are done with a multithreaded FFT on the host, and the probe-particle relaxation uses ``relaxTipStrokes_omp``.
+No OpenCL device is required.
+"""
+
+import itertools
+import time
+
+import numpy as np
+
+from .. import common, core
+from ..defaults import d3
+from .field import ElectronDensity, HartreePotential, TipDensity
+from .relax import DEFAULT_relax_params, DEFAULT_stiffness
+
+try:
+    from scipy import fft as _fft
+
+    FFT_KWARGS = {"workers": -1}  # Use all available cores
+except ModuleNotFoundError:
+    from numpy import fft as _fft
+
+    FFT_KWARGS = {}
+
+verbose = 0
+bRuntime = False
+
+
+def interp_periodic(array, lvec, pos):
+    """
+    Trilinear interpolation of grid values at arbitrary points. Uses periodic boundary conditions.
+    Same as the ``linearInterpB`` function in the OpenCL code.
+
+    Arguments:
+        array: np.ndarray of shape (nx, ny, nz) or (nx, ny, nz, n_components). Grid values.
+        lvec: np.ndarray of shape (4, 3). Unit cell boundaries of the grid.
+        pos: np.ndarray of shape (..., 3). Cartesian positions of points to interpolate at.
+
+    Returns:
+        values: np.ndarray of shape pos.shape[:-1] + array.shape[3:]. Interpolated values.
+    """
+    shape = np.array(array.shape[:3])
+    T = np.linalg.inv(lvec[1:] / shape[:, None])
+    coord = np.dot(pos - lvec[0], T)
+    ijk0 = np.floor(coord)
+    d = coord - ijk0
+    ijk0 = ijk0.astype(np.int64) % shape
+    ijk1 = (ijk0 + 1) % shape
+    values = 0
+    for corner in itertools.product((0, 1), repeat=3):
+        inds = tuple(ijk1[..., i] if c else ijk0[..., i] for i, c in enumerate(corner))
+        w = np.prod([d[..., i] if c else 1 - d[..., i] for i, c in enumerate(corner)], axis=0)
+        if array.ndim == 4:
+            w = w[..., None]
+        values = values + w * array[inds]
+    return values
+
+
+def interp_grid(grid, lvec_new, shape_new, rot=np.eye(3), rot_center=np.zeros(3)):
+    """
+    Interpolate data grid values onto another grid. Uses periodic boundary conditions.
+    See :meth:`.DataGrid.interp_at`.
+
+    Arguments:
+        grid: :class:`.DataGrid`. Grid to interpolate.
+        lvec_new: array-like of shape (4, 3). Unit cell boundaries for new grid.
+        shape_new: array-like of length 3. New grid shape.
+        rot: np.ndarray of shape (3, 3). Rotation matrix to apply.
+        rot_center: np.ndarray of shape (3,). Point around which rotation is performed.
+
+    Returns:
+        grid_out: Same type as grid. New data grid with result.
+    """
+    lvec_new = np.array(lvec_new)
+    pos = _grid_points(lvec_new, shape_new)
+    pos = rot_center + np.dot(pos - rot_center, rot.T)
+    array = interp_periodic(grid.array, grid.lvec, pos)
+    return _grid_type(grid)(array, lvec_new)
+
+
+def interp_tip_grid(grid, lvec_new, shape_new):
+    """
+    Interpolate tip density onto a new grid. The tip is assumed to be centered on the origin and the origins of
+    the grids are ignored. See :meth:`.TipDensity.interp_at`.
+
+    Arguments:
+        grid: :class:`.TipDensity`. Tip density to interpolate.
+        lvec_new: array-like of shape (4, 3). Unit cell boundaries for new grid.
+        shape_new: array-like of length 3. New grid shape.
+
+    Returns:
+        grid_out: :class:`.TipDensity`. New tip density grid.
+    """
+    lvec_new = np.array(lvec_new)
+    if np.allclose(grid.lvec[1:], lvec_new[1:]) and np.allclose(grid.shape[:3], shape_new[:3]):
+        return TipDensity(grid.array, lvec_new)
+    # Past half-way point in the target grid we need to wrap around
+    ijk = [np.arange(n) for n in shape_new[:3]]
+    for i, n in zip(ijk, shape_new):
+        i[i > n // 2] -= n
+    ijk = np.stack(np.meshgrid(*ijk, indexing="ij"), axis=-1)
+    pos = np.dot(ijk, lvec_new[1:] / np.array(shape_new[:3])[:, None])
+    # If we go beyond half-way in the input lattice, we pad with zeros
+    frac = np.dot(pos, np.linalg.inv(grid.lvec[1:]))
+    lvec_in = np.concatenate([np.zeros((1, 3)), grid.lvec[1:]], axis=0)
+    array = interp_periodic(grid.array, lvec_in, pos)
+    array[(np.abs(frac) > 0.5).any(axis=-1)] = 0.0
+    return TipDensity(array, lvec_new)
+
+
+def power_positive(grid, p=1.2, normalize=True):
+    """
+    Raise every positive element in the grid into a power. Negative values are set to zero.
+    See :meth:`.DataGrid.power_positive`.
+
+    Arguments:
+        grid: :class:`.DataGrid`. Input grid.
+        p: float. Power to rise to.
+        normalize: bool. Whether to normalize the values such that the total sum of the values
+            in the array remains unchanged after eliminating the negative values.
+
+    Returns:
+        grid_out: Same type as grid. New data grid with result.
+    """
+    array = grid.array
+    array_pos = np.maximum(array, 0)
+    if normalize:
+        scale = array.sum(dtype=np.float64) / array_pos.sum(dtype=np.float64)
+        assert scale > 0, "Normalizing scaling factor should be positive."
+        scale = scale**p
+    else:
+        scale = 1.0
+    return _grid_type(grid)(scale * array_pos**p, grid.lvec)
+
+
+def grad_periodic(array, step):
+    """
+    Centered finite difference gradient with periodic boundary conditions. See :meth:`.DataGrid.grad`.
+
+    Arguments:
+        array: np.ndarray of shape (nx, ny, nz). Scalar field.
+        step: array-like of length 3. Grid step sizes in x, y, and z directions.
+
+    Returns:
+        grad: np.ndarray of shape (nx, ny, nz, 3). Partial derivatives in x, y, and z directions.
+    """
+    return np.stack([(np.roll(array, -1, axis=i) - np.roll(array, 1, axis=i)) / (2 * step[i]) for i in range(3)], axis=-1)
+
+
+def _grid_type(grid):
+    # Subclasses of TipDensity, such as MultipoleTipDensity, construct their own array, so return plain TipDensity for them
+    return TipDensity if isinstance(grid, TipDensity) else type(grid)
+
+
+def _grid_points(lvec, shape):
+    ijk = np.stack(np.meshgrid(*[np.arange(n) for n in shape[:3]], indexing="ij"), axis=-1)
+    return lvec[0] + np.dot(ijk, lvec[1:] / np.array(shape[:3])[:, None])
+
+
+class FFTCrossCorrelationCPU:
+    """
+    Do circular cross-correlation of sample Hartree potential or electron density with tip charge
+    density via FFT on the host. Uses the multithreaded scipy.fft if it is available, and otherwise numpy.fft.
+    See :class:`.FFTCrossCorrelation`.
+
+    Arguments:
+        rho: :class:`.TipDensity`. Tip charge density.
+    """
+
+    def __init__(self, rho):
+        self.shape = rho.array.shape
+        self._set_rho(rho)
+
+    def _set_rho(self, rho):
+        self.rho = rho
+        self.rho_hat = np.conj(_fft.rfftn(rho.array, **FFT_KWARGS))
+
+    def correlate(self, array, scale=1):
+        """
+        Cross-correlate input array with tip charge density.
+
+        Arguments:
+            array: :class:`.DataGrid`. Sample potential/density to cross-correlate with tip density. Has to be the same shape as rho.
+            scale: float. Additional scaling factor for the output.
+
+        Returns:
+            E: np.ndarray. Result of cross-correlation.
+        """
+        if bRuntime:
+            t0 = time.perf_counter()
+        assert array.shape == self.shape, f"array shape {array.shape} does not match rho array shape {self.shape}"
+        array_hat = _fft.rfftn(array.array, **FFT_KWARGS)
+        E = _fft.irfftn(array_hat * self.rho_hat, s=self.shape, **FFT_KWARGS)
+        E *= scale * self.rho.cell_vol
+        if bRuntime:
+            print("runtime(FFTCrossCorrelationCPU.correlate) [s]: ", time.perf_counter() - t0)
+        return E
+
+
+class ForceField_CPU:
+    """
+    Force field on a grid computed on the CPU. Has the same interface as :class:`.ForceField_LJC` as far as it is used
+    by :class:`.AFMulator`.
+
+    The force field is stored in the arrays ``FF`` of shape (nz, ny, nx, 3) and ``E`` of shape (nz, ny, nx) in
+    double precision, which is the layout expected by the C++ kernels in :mod:`ppafm.core`.
+    """
+
+    verbose = 0
+
+    def __init__(self):
+        self.ctx = None
+        self.FF = None
+        self.E = None
+        self.pot = None
+        self.rho = None
+        self.rho_delta = None
+        self.rho_sample = None
+
+    def initSampling(self, lvec, pixPerAngstrome=10, nDim=None):
+        if nDim is None:
+            nDim = common.genFFSampling(lvec, pixPerAngstrome=pixPerAngstrome)
+        self.nDim = np.array([nDim[0], nDim[1], nDim[2], 4], dtype=np.int32)
+        self.setLvec(lvec)
+
+    def setLvec(self, lvec):
+        self.lvec0 = np.zeros(4, dtype=np.float32)
+        self.lvec = np.zeros((3, 4), dtype=np.float32)
+        self.lvec0[:3] = lvec[0, :3]
+        self.lvec[:, :3] = lvec[1:4, :3]
+        self.lvec_full = np.array(lvec, dtype=np.float64)
+
+    def setQs(self, Qs=[100, -200, 100, 0], QZs=[0.1, 0, -0.1, 0]):
+        if (len(Qs) != 4) or (len(QZs) != 4):
+            raise ValueError("Qs and Qzs must have length 4")
+        self.Qs = np.array(Qs, dtype=np.float32)
+        self.QZs = np.array(QZs, dtype=np.float32)
+
+    def setPP(self, Z_pp):
+        """Set the atomic number of the probe particle. Required for calculating DFT-D3 parameters."""
+        self.iZPP = np.int32(Z_pp)
+
+    def prepareBuffers(self, atoms=None, cLJs=None, REAs=None, Zs=None, bDirect=False, pot=None, rho=None, rho_delta=None, rho_sample=None, minimize_memory=False, **kwargs):
+        """Store the inputs for the force field calculation and prepare the tip density FFTs."""
+
+        if atoms is not None:
+            self.atoms = np.array(atoms, dtype=np.float64)
+        if cLJs is not None:
+            self.cLJs = np.ascontiguousarray(cLJs, dtype=np.float64)
+        if REAs is not None:
+            self.REAs = np.ascontiguousarray(REAs, dtype=np.float64)
+        if Zs is not None:
+            self.Zs = np.array(Zs, dtype=np.int32)
+        if (self.FF is None) and not bDirect:
+            shape = tuple(self.nDim[2::-1])
+            self.FF = np.zeros(shape + (3,))
+            self.E = np.zeros(shape)
+        if pot is not None:
+            assert isinstance(pot, HartreePotential), "pot should be a HartreePotential object"
+            self.pot = pot
+        if rho is not None:
+            assert isinstance(rho, TipDensity), "rho should be a TipDensity object"
+            self.rho = interp_tip_grid(rho, self.lvec_full, self.nDim[:3])
+            self.fft_corr = FFTCrossCorrelationCPU(self.rho)
+        if rho_delta is not None:
+            assert isinstance(rho_delta, TipDensity), "rho_delta should be a TipDensity object"
+            self.rho_delta = interp_tip_grid(rho_delta, self.lvec_full, self.nDim[:3])
+            self.fft_corr_delta = FFTCrossCorrelationCPU(self.rho_delta)
+        if rho_sample is not None:
+            assert isinstance(rho_sample, ElectronDensity), "rho_sample should be an ElectronDensity object"
+            self.rho_sample = rho_sample
+
+    def tryReleaseBuffers(self):
+        self.FF = None
+        self.E = None
+
+    def downloadFF(self, FE=None):
+        """
+        Get the force field array.
+
+        Arguments:
+            FE: np.ndarray or None. Array where output force field is copied to. If None,
+                will be created automatically.
+
+        Returns:
+            FE: np.ndarray of shape (nx, ny, nz, 4). Force field and energy.
+        """
+        if FE is None:
+            FE = np.empty(tuple(self.nDim[:3]) + (4,), dtype=np.float32)
+        FE[..., :3] = self.FF.transpose(2, 1, 0, 3)
+        FE[..., 3] = self.E.T
+        return FE
+
+    def _set_grid(self):
+        core.setFF_shape(self.FF.shape, self.lvec_full)
+        core.setFF_Fpointer(self.FF)
+        core.setFF_Epointer(self.E)
+
+    def _atoms_grid(self, shift=(0.0, 0.0, 0.0)):
+        """Atom positions relative to the grid origin, which the C++ kernels require."""
+        return np.ascontiguousarray(self.atoms[:, :3] - self.lvec0[:3] - np.array(shift))
+
+    def _set_from_energy(self, E):
+        """Set force field as the negative gradient of an energy on the grid."""
+        if (self.lvec[:, :3] != np.diag(np.diag(self.lvec[:, :3]))).any():
+            raise NotImplementedError(
+                "Forcefield calculation via FFT for non-rectangular grids is not implemented. " "Note that the forcefield grid does not need to match the Hartree potential grid."
+            )
+        step = np.diag(self.lvec[:, :3]) / self.nDim[:3]
+        self.FF[:] = -grad_periodic(E, step).transpose(2, 1, 0, 3)
+        self.E[:] = E.T
+
+    def _grid_matches(self, grid):
+        return np.allclose(self.lvec_full, grid.lvec) and np.allclose(grid.shape[:3], self.nDim[:3])
+
+    def addLJ(self):
+        self._set_grid()
+        core.getLennardJonesFF(self._atoms_grid(), self.cLJs)
+
+    def addCoulomb(self):
+        """Add electrostatic force from atom point charges on the tip point charges ``Qs`` at ``QZs``."""
+        self._set_grid()
+        for Q, QZ in zip(self.Qs, self.QZs):
+            if Q == 0:
+                continue
+            # The tip charge is at pos + QZ, so shifting the atoms by -QZ gives the same distance vectors
+            kQQs = np.ascontiguousarray(self.atoms[:, 3] * common.CoulombConst * Q)
+            core.getCoulombFF(self._atoms_grid(shift=(0.0, 0.0, QZ)), kQQs, kind=0)
+
+    def addvdW(self, damp_method=0):
+        self._set_grid()
+        if damp_method == 0:
+            core.getVdWFF(self._atoms_grid(), self.cLJs)
+        elif damp_method in [1, 2, 3, 4]:
+            core.getVdWFF_RE(self._atoms_grid(), self.REAs, kind=damp_method)
+        else:
+            raise NotImplementedError(f"vdW damping method {damp_method} is not implemented on the CPU.")
+
+    def add_dftd3(self, params="PBE"):
+        if not hasattr(self, "iZPP"):
+            raise RuntimeError("Probe particle atomic number not set. Set it before DFT-D3 calculation using setPP()")
+        coeffs = core.computeD3Coeffs(self.atoms[:, :3], self.Zs, self.iZPP, d3.get_df_params(params))
+        self._set_grid()
+        core.getDFTD3FF(self._atoms_grid(), coeffs)
+
+    def calc_force_hartree_point_charges(self):
+        """Electrostatic force from the tip point charges ``Qs`` at ``QZs`` in the electric field of the Hartree potential."""
+        if self._grid_matches(self.pot):
+            pot = self.pot
+        else:
+            pot = interp_grid(self.pot, self.lvec_full, self.nDim[:3])
+        step = np.diag(self.lvec[:, :3]) / self.nDim[:3]
+        if (self.lvec[:, :3] != np.diag(np.diag(self.lvec[:, :3]))).any():
+            raise NotImplementedError("Electric field from a Hartree potential for non-rectangular grids is not implemented on the CPU.")
+        E_field = np.concatenate([-grad_periodic(pot.array, step), pot.array[..., None]], axis=-1)
+        pos = _grid_points(self.lvec_full, self.nDim)
+        FE = 0
+        for Q, QZ in zip(self.Qs, self.QZs):
+            if Q == 0:
+                continue
+            FE = FE + Q * interp_periodic(E_field, self.lvec_full, pos + np.array([0.0, 0.0, QZ]))
+        if not isinstance(FE, np.ndarray):
+            FE = np.zeros(tuple(self.nDim[:3]) + (4,))
+        self.FF[:] = FE[..., :3].transpose(2, 1, 0, 3)
+        self.E[:] = FE[..., 3].T
+
+    def calc_force_hartree(self, rot=np.eye(3), rot_center=np.zeros(3)):
+        """Electrostatic force from the Hartree potential cross-correlated with the tip charge density. See :meth:`.ForceField_LJC.calc_force_hartree`."""
+        pot = interp_grid(self.pot, self.lvec_full, self.nDim[:3], rot=rot, rot_center=rot_center)
+        E = self.fft_corr.correlate(pot)
+        self._set_from_energy(E)
+
+    def calc_force_fdbm(self, A=18.0, B=1.0, rot=np.eye(3), rot_center=np.zeros(3)):
+        """Electrostatic and Pauli force in the full density-based model. See :meth:`.ForceField_LJC.calc_force_fdbm`."""
+        if self._grid_matches(self.pot) and np.allclose(rot, np.eye(3)):
+            pot = self.pot
+        else:
+            pot = interp_grid(self.pot, self.lvec_full, self.nDim[:3], rot=rot, rot_center=rot_center)
+        if self._grid_matches(self.rho_sample) and np.allclose(rot, np.eye(3)):
+            rho_sample = self.rho_sample
+        else:
+            rho_sample = interp_grid(self.rho_sample, self.lvec_full, self.nDim[:3], rot=rot, rot_center=rot_center)
+        E = self.fft_corr_delta.correlate(pot, scale=-1.0)  # scale=-1.0, because the electron density has positive sign.
+        if not np.allclose(B, 1.0):
+            rho_sample = power_positive(rho_sample, p=B)
+        E += A * self.fft_corr.correlate(rho_sample)
+        self._set_from_energy(E)
+
+    def makeFF(
+        self,
+        xyzs,
+        cLJs,
+        REAs=None,
+        Zs=None,
+        method="point-charge",
+        FE=None,
+        qs=None,
+        pot=None,
+        rho_sample=None,
+        rho=None,
+        rho_delta=None,
+        A=18.0,
+        B=1.0,
+        fdbm_vdw_type="D3",
+        d3_params="PBE",
+        lj_vdw_damp=2,
+        rot=np.eye(3),
+        rot_center=np.zeros(3),
+        bRelease=True,
+        bCopy=True,
+        bFinish=True,
+        **kwargs,
+    ):
+        """
+        Generate the force field for a tip-sample interaction. Takes the same arguments as :meth:`.ForceField_LJC.makeFF`,
+        except for the OpenCL-specific ones which are ignored.
+
+        Returns:
+            FE: np.ndarray if ``bCopy==True`` or ``None`` otherwise. Calculated force field and energy.
+        """
+
+        if bRuntime:
+            t0 = time.perf_counter()
+
+        if not hasattr(self, "nDim") or not hasattr(self, "lvec"):
+            raise RuntimeError("Forcefield position is not initialized. Initialize with initSampling.")
+
+        # Rotate atoms
+        xyzs = xyzs.copy()
+        xyzs -= rot_center
+        xyzs = np.dot(xyzs, rot.T)
+        xyzs += rot_center
+        rot_ff = np.linalg.inv(rot)  # Force field rotation is in opposite direction to atoms
+
+        if qs is None:
+            qs = np.zeros(len(xyzs))
+        self.prepareBuffers(np.concatenate([xyzs, qs[:, None]], axis=1), cLJs, REAs=REAs, Zs=Zs, pot=pot, rho=rho, rho_delta=rho_delta, rho_sample=rho_sample)
+        self.FF[:] = 0
+        self.E[:] = 0
+
+        if method == "point-charge":
+            self.addLJ()
+            if not np.allclose(qs, 0):
+                self.addCoulomb()
+
+        elif method == "hartree":
+            if self.rho is None:
+                if not np.allclose(rot, np.eye(3)):
+                    raise NotImplementedError("Force field calculation with rotation for Hartree potential with " "point charges tip density is not implemented.")
+                self.calc_force_hartree_point_charges()
+            else:
+                self.calc_force_hartree(rot=rot_ff, rot_center=rot_center)
+            self.addLJ()
+
+        elif method == "fdbm":
+            self.calc_force_fdbm(A=A, B=B, rot=rot_ff, rot_center=rot_center)
+            if fdbm_vdw_type == "D3":
+                self.add_dftd3(params=d3_params)
+            elif fdbm_vdw_type == "LJ":
+                self.addvdW(damp_method=lj_vdw_damp)
+            else:
+                raise ValueError(f"Invalid vdw type `{fdbm_vdw_type}`")
+
+        else:
+            raise ValueError(f"Unknown method for force field calculation: `{method}`.")
+
+        FE = self.downloadFF(FE) if bCopy else None
+        if bRelease:
+            self.tryReleaseBuffers()
+        if bRuntime:
+            print("runtime(ForceField_CPU.makeFF.tot) [s]: ", time.perf_counter() - t0)
+
+        return FE
+
+
+class RelaxedScanner_CPU:
+    """
+    Probe-particle relaxation on the CPU using the C++ ``relaxTipStrokes_omp``. Has the same interface as
+    :class:`.RelaxedScanner` as far as it is used by :class:`.AFMulator`. Only untilted tips are supported.
+    """
+
+    verbose = 0
+
+    def __init__(self):
+        self.stiffness = DEFAULT_stiffness.copy()
+        self.relax_params = DEFAULT_relax_params.copy()
+        self.zstep = 0.1
+        self.start = (-5.0, -5.0)
+        self.end = (5.0, 5.0)
+        self.FEin = None
+        self.WZconv = None
+
+    def prepareBuffers(self, lvec=None, scan_dim=None, nDimConv=None, nDimConvOut=None, **kwargs):
+        if lvec is not None:
+            self.lvec = np.array(lvec, dtype=np.float64)
+        if scan_dim is not None:
+            self.scan_dim = tuple(scan_dim)
+            if nDimConv is not None:
+                self.nDimConv = nDimConv
+                self.nDimConvOut = nDimConvOut
+
+    def updateBuffers(self, FEin=None, lvec=None, WZconv=None):
+        if FEin is not None:
+            self.updateFEin(FEin)
+        if lvec is not None:
+            self.lvec = np.array(lvec, dtype=np.float64)
+        if WZconv is not None:
+            self.WZconv = np.array(WZconv, dtype=np.float32)
+
+    def updateFEin(self, FEin, bFinish=False):
+        """Set the force field to relax in. Array of shape (nz, ny, nx, 3) as in :attr:`ForceField_CPU.FF`."""
+        self.FEin = FEin
+
+    def tryReleaseBuffers(self):
+        self.FEin = None
+
+    def preparePosBasis(self, start=(-5.0, -5.0), end=(5.0, 5.0)):
+        self.start = start
+        self.end = end
+        self.xs = np.linspace(start[0], end[0], self.scan_dim[0])
+        self.ys = np.linspace(start[1], end[1], self.scan_dim[1])
+
+    def setScanRot(self, pos0, rot=None, zstep=None, tipR0=[0.0, 0.0, 4.0]):
+        if rot is not None and not np.allclose(rot, np.eye(3)):
+            raise NotImplementedError("Tilted tips are not implemented on the CPU.")
+        if zstep:
+            self.zstep = zstep
+        self.pos0 = np.array(pos0, dtype=np.float64)
+        self.tipR0 = np.array(tipR0, dtype=np.float64)
+        rTips = np.empty(self.scan_dim + (3,))
+        rTips[:, :, :, 0] = self.pos0[0] + self.xs[:, None, None]
+        rTips[:, :, :, 1] = self.pos0[1] + self.ys[None, :, None]
+        rTips[:, :, :, 2] = self.pos0[2] - self.zstep * np.arange(self.scan_dim[2])[None, None, :]
+        self.rTips = rTips
+        return rTips
+
+    def run_relaxStrokesTilted(self, FEout=None, bCopy=True, bFinish=True, **kwargs):
+        """Relax the probe particle at all scan positions. Returns the force array of shape scan_dim + (4,)."""
+
+        if bRuntime:
+            t0 = time.perf_counter()
+
+        stiffness = self.stiffness.astype(np.float64)
+        rPP0 = np.array([self.tipR0[0], self.tipR0[1], 0.0])
+        core.setFF_shape(self.FEin.shape, self.lvec)
+        core.setFF_Fpointer(self.FEin)
+        core.setTip(lRadial=self.tipR0[2], kRadial=stiffness[3], rPP0=rPP0, kSpring=stiffness[:3].copy())
+
+        self.paths = np.zeros(self.rTips.shape)
+        fs = np.zeros(self.rTips.shape)
+        core.relaxTipStrokes_omp(self.rTips, self.paths, fs)
+
+        if FEout is None:
+            FEout = np.zeros(self.scan_dim + (4,), dtype=np.float32)
+        FEout[..., :3] = fs
+        self.FEout = FEout
+
+        if bRuntime:
+            print("runtime(RelaxedScanner_CPU.run_relaxStrokesTilted) [s]: ", time.perf_counter() - t0)
+
+        return FEout
+
+    def run_convolveZ(self, FEconv=None):
+        """Convolve the relaxed force along z with the weights WZconv."""
+        nzw = len(self.WZconv)
+        if FEconv is None:
+            FEconv = np.zeros(self.scan_dim[:2] + (self.nDimConvOut, 4), dtype=np.float32)
+        FEconv[:] = 0
+        for jz in range(nzw):
+            FEconv += self.FEout[:, :, jz : jz + self.nDimConvOut] * self.WZconv[jz]
+        return FEconv
+
+    def run_relaxStrokesTilted_sweep(self, stiffnesses, WZconvs, nz=None):
+        """Relax for several stiffnesses and convolve with several weight masks. See :meth:`.RelaxedScanner.run_relaxStrokesTilted_sweep`."""
+        stiffnesses = np.asarray(stiffnesses, dtype=np.float32).reshape(-1, 4)
+        WZconvs = np.asarray(WZconvs, dtype=np.float32)
+        nzout = self.scan_dim[2] - WZconvs.shape[1] + 1
+        if nzout < 1:
+            raise ValueError(f"Weight masks of length {WZconvs.shape[1]} are longer than the {self.scan_dim[2]} scan steps in z.")
+        FEconv = np.zeros((len(stiffnesses), len(WZconvs)) + self.scan_dim[:2] + (nzout,), dtype=np.float32)
+        stiffness = self.stiffness
+        try:
+            for ik, k in enumerate(stiffnesses):
+                self.stiffness = k
+                Fz = self.run_relaxStrokesTilted()[..., 2]
+                for iw, w in enumerate(WZconvs):
+                    for jz in range(len(w)):
+                        FEconv[ik, iw] += Fz[:, :, jz : jz + nzout] * w[jz]
+        finally:
+            self.stiffness = stiffness
+        return FEconv
+
+    def run_relaxStrokesTilted_convZ(self):
+        self.run_relaxStrokesTilted()
+        return self.run_convolveZ()
+
+    def downloadPaths(self):
+        """
+        Get probe particle path array.
+
+        Returns:
+            paths: np.ndarray of shape scan_dim + (3,). xyz positions of probe particle at all scan points.
+        """
+        return self.paths + self.lvec[0]
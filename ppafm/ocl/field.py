@@ -3,6 +3,8 @@
 import os
 import time
 import warnings
+import weakref
+from collections import Counter, OrderedDict
 
 import numpy as np
 import pyopencl as cl
@@ -24,6 +26,8 @@ except ModuleNotFoundError:
     fft_available = False
 
 DEFAULT_FD_STEP = 0.05
+CELL_LIST_LOCAL_SIZE = (4, 4, 4)  # Work group size (x, y, z) for the cell-list kernels. Total size can be at most 64.
+UPDATE_BOX_MARGIN = 4.0  # Margin in Ångströms around changed atoms in which ForceField_LJC.updateFF recomputes the force field
 
 cl_program = None
 oclu = None
@@ -147,7 +151,8 @@ class DataGrid:
         self.lvec = np.array(lvec)
         self.origin = self.lvec[0]
         assert self.lvec.shape == (4, 3), f"lvec should have shape (4, 3), but has shape {lvec.shape}"
-        self.ctx = ctx or oclu.ctx
+        self.ctx = ctx or (oclu.ctx if oclu else None)
+        self.version = 0  # Incremented whenever the values change, so that cached derived grids can be invalidated
 
     @property
     def step(self):
@@ -197,6 +202,7 @@ class DataGrid:
         self._array = array
         self.lvec = lvec
         self.shape = tuple(array.shape)
+        self.version += 1
 
     def release(self, keep_on_host=True):
         """Release device buffer.
@@ -227,18 +233,17 @@ class DataGrid:
 
         file_path = str(file_path)
         if file_path.endswith(".cube"):
-            data, lvec, _, _ = io.loadCUBE(file_path, xyz_order=True, verbose=False)
-            Zs, x, y, z, _ = io.loadAtomsCUBE(file_path)
+            data, lvec, _, _, atoms = io.loadGridFile(file_path, format="cube", xyz_order=True, verbose=False)
         elif file_path.endswith(".xsf"):
-            data, lvec, _, _ = io.loadXSF(file_path, xyz_order=True, verbose=False)
-            try:
-                (Zs, x, y, z, _), _, _ = io.loadXSFGeom(file_path)
-            except ValueError:
-                warnings.warn(f"Could not read geometry from {file_path} in DataGrid.from_file.")
-                Zs = np.zeros(1)
-                x = y = z = np.zeros((1, 1))
+            data, lvec, _, _, atoms = io.loadGridFile(file_path, format="xsf", xyz_order=True, verbose=False)
         else:
             raise ValueError(f"Unsupported file format in file `{file_path}`")
+        if atoms is not None:
+            Zs, x, y, z, _ = atoms
+        else:
+            warnings.warn(f"Could not read geometry from {file_path} in DataGrid.from_file.")
+            Zs = np.zeros(1)
+            x = y = z = np.zeros((1, 1))
 
         if not np.allclose(scale, 1.0):
             data *= scale
@@ -248,7 +253,7 @@ class DataGrid:
 
         return data, xyzs, Zs
 
-    def to_file(self, file_path, clamp=None):
+    def to_file(self, file_path, clamp=None, dtype=None, compress=False):
         """
         Save data grid to file(s).
 
@@ -258,29 +263,56 @@ class DataGrid:
             file_path: str. Path to saved file. For a 4D data grid, letters x, y, z, w are appended
                 to the file path for each component, respectively.
             clamp: float or None. If not None, all values greater than this are clamped to this value.
+            dtype: np.dtype or None. Data type of the saved data for .npy files, e.g. np.float32.
+            compress: bool. Whether to compress .npy files.
         """
         file_head, ext = os.path.splitext(file_path)
         if ext not in [".xsf", ".npy"]:
             raise ValueError(f"Unsupported file extension `{ext}` for saving data grid.")
         ext = ext[1:]
-        array = self.array.copy()
+        save_kwargs = {"data_format": ext, "dtype": dtype, "compress": compress}
+        # The array only needs to be copied if it is modified. The transposes below are views that are written as is.
+        array = self.array.copy() if clamp else self.array
         if len(self.shape) == 3:
             if clamp:
                 array[array > clamp] = clamp
-            io.save_scal_field(file_head, array.T, self.lvec, data_format=ext)
+            io.save_scal_field(file_head, array.T, self.lvec, **save_kwargs)
         if len(self.shape) == 4:
             assert self.shape[3] == 4, "Wrong number of components"
             if clamp:
                 io.limit_vec_field(array, Fmax=clamp)
                 array[:, :, :, 3][array[:, :, :, 3] > clamp] = clamp
             array = array.transpose(2, 1, 0, 3)
-            io.save_vec_field(file_head, array[:, :, :, :3], self.lvec, data_format=ext)
-            io.save_scal_field(file_head + "_w", array[:, :, :, 3], self.lvec, data_format=ext)
+            io.save_vec_field(file_head, array[:, :, :, :3], self.lvec, **save_kwargs)
+            io.save_scal_field(file_head + "_w", array[:, :, :, 3], self.lvec, **save_kwargs)
+
+    def downsample(self, axes=(0, 1, 2)):
+        """
+        Halve the resolution of the grid along the specified axes. The grid is low-pass filtered with the periodic
+        binomial filter [1/4, 1/2, 1/4] before taking every other point, so that frequencies that the coarser grid can
+        not represent are damped instead of aliased. The grid points that are kept stay at the same positions and the
+        lattice vectors do not change. The computation is done on the host.
+
+        Arguments:
+            axes: tuple of ints. Axes to downsample. Each of the axes should have an even number of points.
+
+        Returns:
+            grid_out: same type as self. New downsampled data grid.
+        """
+        array = self.array
+        for axis in axes:
+            if array.shape[axis] % 2 != 0:
+                raise ValueError(f"Cannot downsample axis {axis} with an odd number of points {array.shape[axis]}.")
+            array = 0.5 * array + 0.25 * (np.roll(array, 1, axis=axis) + np.roll(array, -1, axis=axis))
+            array = array[(slice(None),) * axis + (slice(None, None, 2),)]
+        array_type = type(self)  # This way so inherited classes return their own class type
+        return array_type(array, lvec=self.lvec, ctx=self.ctx)
 
     def _prepare_same_size_output_grid(self, array_in, in_place):
         if in_place:
             grid_out = self
             self._array = None  # The current host array will be wrong after operation, so reset it
+            self.version += 1
         else:
             array_out = cl.Buffer(self.ctx, cl.mem_flags.READ_WRITE, size=array_in.size)
             array_type = type(self)  # This way so inherited classes return their own class type
@@ -705,29 +737,28 @@ class MultipoleTipDensity(TipDensity):
         return rho.astype(np.float32)
 
 
-class FFTCrossCorrelation:
+class FFTPlan:
     """
-    Do circular cross-correlation of sample Hartree potential or electron density with tip charge
-    density via FFT.
+    Compiled forward and inverse FFTs for cross-correlating real-valued grids of a fixed shape,
+    and the work buffer for the spectrum of the sample grid. Usually obtained from :class:`FFTPlanCache`.
 
     Arguments:
-        rho: :class:`TipDensity`. Tip charge density.
-        queue: pyopencl.CommandQueue. OpenCL queue on which operations are performed.
-            Defaults to oclu.queue.
+        shape: tuple of int. Shape of the real-valued grids.
+        queue: pyopencl.CommandQueue. OpenCL queue on which the FFTs are performed.
+        dtype: np.dtype. Data type of the real-valued grids. Only np.float32 is supported.
     """
 
-    def __init__(self, rho, queue=None):
+    def __init__(self, shape, queue, dtype=np.float32):
         if not fft_available:
             raise RuntimeError("Cannot do FFT because reikna is not installed.")
-        self.shape = rho.array.shape
-        self.queue = queue or oclu.queue
-        self.ctx = self.queue.context
+        if np.dtype(dtype) != np.float32:
+            raise ValueError(f"Only float32 FFTs are supported, but got dtype `{np.dtype(dtype)}`")
+        self.shape = tuple(int(n) for n in shape)
+        self.queue = queue
+        self.ctx = queue.context
         self.nbytes = 0
         self._make_transforms()
         self._make_fft()
-        self._set_rho(rho)
-        if verbose > 0:
-            print(f"FFTCrossCorrelation.nbytes {self.nbytes}")
 
     # https://github.com/fjarri/reikna/issues/57
     def _make_transforms(self):
@@ -777,8 +808,7 @@ class FFTCrossCorrelation:
         thr = ocl_api().Thread(self.queue)
         size = 8 * np.prod(self.shape)
         self.pot_hat_cl = cl.Buffer(self.ctx, cl.mem_flags.READ_WRITE, size=size)
-        self.rho_hat_cl = cl.Buffer(self.ctx, cl.mem_flags.READ_WRITE, size=size)
-        self.nbytes += 2 * size
+        self.nbytes += size
 
         fft_f = FFT(self.r2c.output)
         fft_f.parameter.input.connect(self.r2c, self.r2c.output, new_input=self.r2c.input)
@@ -790,7 +820,130 @@ class FFTCrossCorrelation:
         self.fft_i = fft_i.compile(thr)
 
         if bRuntime:
-            print("runtime(FFTCrossCorrelation._make_fft) [s]: ", time.perf_counter() - t0)
+            print("runtime(FFTPlan._make_fft) [s]: ", time.perf_counter() - t0)
+
+
+class FFTPlanCache:
+    """
+    Least-recently-used cache of compiled FFT plans used by :class:`FFTCrossCorrelation`.
+
+    Compiling the reikna FFTs is slow compared to the cross-correlation itself, and the force field is recreated for
+    a new grid shape every time the molecule size or the scan window changes, e.g. in :class:`.GeneratorAFMtrainer`.
+    The compiled forward and inverse FFTs, together with the work buffer for the sample spectrum, are therefore
+    shared between all cross-correlations with the same grid shape, data type, and command queue, so that a new tip
+    density only requires computing its spectrum.
+
+    Arguments:
+        max_bytes: int. Maximum total size of the work buffers of the cached plans in device memory. The least recently
+            used plans are dropped from the cache when the limit is exceeded. Set to 0 to disable caching.
+    """
+
+    def __init__(self, max_bytes=2**30):
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self.max_bytes = max_bytes
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def max_bytes(self):
+        """Maximum total size of the cached plans in bytes. Setting a smaller value drops plans immediately."""
+        return self._max_bytes
+
+    @max_bytes.setter
+    def max_bytes(self, max_bytes):
+        self._max_bytes = max_bytes
+        self._evict()
+
+    def get(self, shape, queue, dtype=np.float32):
+        """
+        Get a compiled FFT plan for a grid shape, or compile it if it's not in the cache.
+
+        If the device runs out of memory while making the plan, the cached plans are dropped and the plan is made again.
+
+        Arguments:
+            shape: tuple of int. Shape of the real-valued grids.
+            queue: pyopencl.CommandQueue. OpenCL queue on which the FFTs are performed.
+            dtype: np.dtype. Data type of the real-valued grids. Only np.float32 is supported.
+
+        Returns:
+            plan: :class:`FFTPlan`. The compiled plan. May be shared with other cross-correlations.
+        """
+        # The cached plan holds a reference to the queue, so the id of the queue cannot be reused while the entry exists
+        key = (id(queue), tuple(int(n) for n in shape), np.dtype(dtype).str)
+        plan = self._entries.get(key)
+        if plan is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return plan
+
+        self.misses += 1
+        try:
+            plan = FFTPlan(shape, queue, dtype)
+        except cl.MemoryError:
+            self.clear()
+            plan = FFTPlan(shape, queue, dtype)
+        if plan.nbytes > self.max_bytes:
+            return plan
+        self._entries[key] = plan
+        self.nbytes += plan.nbytes
+        self._evict()
+
+        return plan
+
+    def _remove(self, key):
+        # The work buffer is freed when the plan is garbage collected. It is not released explicitly here,
+        # because the plan can still be in use by existing cross-correlations.
+        plan = self._entries.pop(key)
+        self.nbytes -= plan.nbytes
+
+    def _evict(self):
+        while self.nbytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+
+    def clear(self):
+        """Drop all cached plans."""
+        while self._entries:
+            self._remove(next(iter(self._entries)))
+
+
+fft_plan_cache = FFTPlanCache()
+
+
+class FFTCrossCorrelation:
+    """
+    Do circular cross-correlation of sample Hartree potential or electron density with tip charge
+    density via FFT.
+
+    The compiled FFTs are taken from an :class:`FFTPlanCache`, so creating a cross-correlation for a grid shape
+    that has been used before only computes the spectrum of the tip density.
+
+    Arguments:
+        rho: :class:`TipDensity`. Tip charge density.
+        queue: pyopencl.CommandQueue. OpenCL queue on which operations are performed.
+            Defaults to oclu.queue.
+        plan_cache: :class:`FFTPlanCache` or None. Cache of compiled FFTs. Defaults to the process-wide :data:`fft_plan_cache`.
+    """
+
+    def __init__(self, rho, queue=None, plan_cache=None):
+        if not fft_available:
+            raise RuntimeError("Cannot do FFT because reikna is not installed.")
+        self.shape = rho.array.shape
+        self.queue = queue or oclu.queue
+        self.ctx = self.queue.context
+        plan_cache = plan_cache if plan_cache is not None else fft_plan_cache
+        self.plan = plan_cache.get(self.shape, self.queue)
+        self.fft_f = self.plan.fft_f
+        self.fft_i = self.plan.fft_i
+        self.pot_hat_cl = self.plan.pot_hat_cl
+        self.nbytes = 8 * int(np.prod(self.shape))
+        self.rho_hat_cl = cl.Buffer(self.ctx, cl.mem_flags.READ_WRITE, size=self.nbytes)
+        self._set_rho(rho)
+        if verbose > 0:
+            print(f"FFTCrossCorrelation.nbytes {self.nbytes}")
 
     def _set_rho(self, rho):
         self.rho = rho
@@ -840,15 +993,133 @@ class FFTCrossCorrelation:
         return E
 
 
+class SampleGridCache:
+    """
+    Least-recently-used cache of device grids derived from sample grids.
+
+    When the same sample is simulated in several orientations, e.g. with rotation augmentation, only the sampling grid
+    of the force field changes between the orientations. Grids that do not depend on the orientation, like the Hartree
+    potential uploaded to the device or the sample electron density raised to the Pauli exponent, are stored here
+    and reused, so they are only computed once per sample. The entries are tied to the identity and the
+    :attr:`DataGrid.version` of the source grid, so modifying the source grid or creating a new one invalidates them.
+
+    Arguments:
+        max_bytes: int. Maximum total size of the cached grids in device memory. The least recently used
+            grids are dropped from the cache when the limit is exceeded. Set to 0 to disable caching.
+    """
+
+    def __init__(self, max_bytes=2**30):
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self.max_bytes = max_bytes
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def max_bytes(self):
+        """Maximum total size of the cached grids in bytes. Setting a smaller value drops grids immediately."""
+        return self._max_bytes
+
+    @max_bytes.setter
+    def max_bytes(self, max_bytes):
+        self._max_bytes = max_bytes
+        self._evict()
+
+    def get(self, source, key, make):
+        """
+        Get a cached grid derived from a source grid, or make it if it's not in the cache.
+
+        Arguments:
+            source: :class:`DataGrid`. Grid from which the cached grid is derived.
+            key: hashable. Identifies the type of the derived grid, including any parameters used to make it.
+            make: Callable. Called as ``make(source)`` to make the derived grid on a cache miss. Should return a new
+                :class:`DataGrid` on the device that is not referenced anywhere else.
+
+        Returns:
+            grid: :class:`DataGrid`. The derived grid. Owned by the cache, so it should not be released by the caller.
+        """
+        cache_key = (id(source), source.version, key)
+        entry = self._entries.get(cache_key)
+        if entry is not None and entry[0]() is source:
+            self._entries.move_to_end(cache_key)
+            self.hits += 1
+            return entry[1]
+
+        self.misses += 1
+        grid = make(source)
+        nbytes = 4 * int(np.prod(grid.shape))
+        if nbytes > self.max_bytes:
+            return grid
+        if entry is not None:
+            self._remove(cache_key)  # The id of a deleted grid got reused
+        self._entries[cache_key] = (weakref.ref(source), grid, nbytes)
+        self.nbytes += nbytes
+        self._evict()
+
+        return grid
+
+    def _remove(self, cache_key):
+        # The device buffer is freed when the grid is garbage collected. It is not released explicitly here,
+        # because the grid can still be in use by the caller.
+        _, _, nbytes = self._entries.pop(cache_key)
+        self.nbytes -= nbytes
+
+    def _evict(self):
+        # Entries whose source has been deleted or modified can never be hit again
+        for cache_key in [k for k, (ref, _, _) in self._entries.items() if ref() is None or ref().version != k[1]]:
+            self._remove(cache_key)
+        while self.nbytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+
+    def clear(self):
+        """Drop all cached grids."""
+        while self._entries:
+            self._remove(next(iter(self._entries)))
+
+
 class ForceField_LJC:
-    """Evaluate Lennard-Jones based force fields on an OpenCL device."""
+    """
+    Evaluate Lennard-Jones based force fields on an OpenCL device.
+
+    By default, every grid point interacts with every atom. With ``use_cell_list=True``, the atoms are instead binned
+    into a cell list and only the atoms within the distance ``cutoff`` of a grid point are taken into account
+    in the point-charge, Lennard-Jones, vdW, and DFT-D3 force fields. This makes the cost scale with the local density of
+    atoms instead of the total number of atoms, which pays off for large systems, e.g. slabs with periodic copies of atoms.
+    Note that with the cell list also the Coulomb interaction of point charges is truncated at the cutoff.
+
+    The sample Hartree potential and electron density used in the Hartree and FDBM force fields are kept on the device
+    in a :class:`SampleGridCache` between calls, so that simulating the same sample in several orientations only
+    uploads the grids and computes the Pauli density power once.
+
+    With ``sample_pyramid=True``, sample grids that are finer than the force field grid are first downsampled with
+    :meth:`DataGrid.downsample` to the coarsest level of a resolution pyramid whose grid spacing is still at most the
+    spacing of the force field grid. The downsampled grids are smaller on the device and interpolating them onto the
+    force field grid does not alias the high frequencies of the original grid. The levels are computed once per sample
+    and kept in the sample cache. Note that the Pauli density power in the FDBM is then taken after the downsampling,
+    which makes the force field an approximation of the full-resolution one.
+
+    Arguments:
+        use_cell_list: bool. Whether to use the cell list for evaluating the atom-wise interactions.
+        cutoff: float. Cutoff radius in Ångströms for the interactions when using the cell list.
+        cell_size: float or None. Size of the cubic cells in the cell list. If None, half of the cutoff is used.
+        sample_cache_bytes: int. Maximum device memory in bytes used for caching sample grids. Set to 0 to disable the cache.
+        sample_pyramid: bool. Whether to downsample sample grids that are finer than the force field grid.
+    """
 
     verbose = 0
 
-    def __init__(self):
+    def __init__(self, use_cell_list=False, cutoff=20.0, cell_size=None, sample_cache_bytes=2**30, sample_pyramid=False):
         self.ctx = oclu.ctx
         self.queue = oclu.queue
         self.d3_params = D3Params(self.ctx)
+        self.use_cell_list = use_cell_list
+        self.cutoff = cutoff
+        self.cell_size = cell_size
+        self.cl_cell_start = None
+        self.cl_cell_atoms = None
         self.cl_poss = None
         self.cl_FE = None
         self.cl_Efield = None
@@ -856,6 +1127,9 @@ class ForceField_LJC:
         self.rho = None
         self.rho_delta = None
         self.rho_sample = None
+        self.sample_cache = SampleGridCache(sample_cache_bytes)
+        self.sample_pyramid = sample_pyramid
+        self._update_state = None
 
     def initSampling(self, lvec, pixPerAngstrome=10, nDim=None):
         if nDim is None:
@@ -926,6 +1200,8 @@ class ForceField_LJC:
             atoms = atoms.astype(np.float32)
             self.cl_atoms = cl.Buffer(self.ctx, mf.READ_ONLY | mf.COPY_HOST_PTR, hostbuf=atoms)
             nbytes += atoms.nbytes
+            if self.use_cell_list:
+                nbytes += self.prepareCellList(atoms)
         if cLJs is not None:
             cLJs = cLJs.astype(np.float32)
             self.cl_cLJs = cl.Buffer(self.ctx, mf.READ_ONLY | mf.COPY_HOST_PTR, hostbuf=cLJs)
@@ -951,7 +1227,8 @@ class ForceField_LJC:
         if pot is not None:
             assert isinstance(pot, HartreePotential), "pot should be a HartreePotential object"
             self.pot = pot
-            self.pot.cl_array  # Accessing the cl_array attribute copies the pot to the device
+            if self.sample_cache.max_bytes <= 0:
+                self.pot.cl_array  # Accessing the cl_array attribute copies the pot to the device
         if E_field:
             self.cl_Efield = cl.Buffer(self.ctx, mf.READ_WRITE, size=4 * np.prod(self.nDim))
             nbytes += 4 * np.prod(self.nDim)
@@ -960,11 +1237,9 @@ class ForceField_LJC:
             self.rho = rho
             if not (np.allclose(self.rho.lvec, lvec) and np.allclose(self.rho.shape, self.nDim[:3])):
                 self.rho = self.rho.interp_at(lvec, self.nDim[:3])
-            if hasattr(self, "fft_corr") and np.allclose(self.rho.shape, self.fft_corr.shape):
-                # We have an existing FFT prepared and it has the same shape as the new one, so we only need to update the array.
-                self.fft_corr._set_rho(self.rho)
-            else:
-                self.fft_corr = FFTCrossCorrelation(self.rho)
+            # The compiled FFTs are reused from the plan cache, so only the tip spectrum is computed here. A new object is made
+            # instead of updating the existing one, because it may still be held elsewhere, e.g. for another tip in GeneratorAFMtrainer.
+            self.fft_corr = FFTCrossCorrelation(self.rho)
             if minimize_memory:
                 self.rho.release()  # We don't actually need this on device, only the FFT array
         if rho_delta is not None:
@@ -972,18 +1247,14 @@ class ForceField_LJC:
             self.rho_delta = rho_delta
             if not (np.allclose(self.rho_delta.lvec, lvec) and np.allclose(self.rho_delta.shape, self.nDim[:3])):
                 self.rho_delta = self.rho_delta.interp_at(lvec, self.nDim[:3])
-            # self.fft_corr_delta = FFTCrossCorrelation(self.rho_delta)
-            if hasattr(self, "fft_corr_delta") and np.allclose(self.rho_delta.shape, self.fft_corr_delta.shape):
-                # We have an existing FFT prepared and it has the same shape as the new one, so we only need to update the array.
-                self.fft_corr_delta._set_rho(self.rho_delta)
-            else:
-                self.fft_corr_delta = FFTCrossCorrelation(self.rho_delta)
+            self.fft_corr_delta = FFTCrossCorrelation(self.rho_delta)
             if minimize_memory:
                 self.rho_delta.release()  # We don't actually need this on device, only the FFT array
         if rho_sample is not None:
             assert isinstance(rho_sample, ElectronDensity), "rho_sample should be an ElectronDensity object"
             self.rho_sample = rho_sample
-            self.rho_sample.cl_array
+            if self.sample_cache.max_bytes <= 0:
+                self.rho_sample.cl_array
 
         if self.verbose > 0:
             print("ForceField_LJC.prepareBuffers.nbytes", nbytes)
@@ -999,11 +1270,82 @@ class ForceField_LJC:
         oclu.updateBuffer(atoms, self.cl_atoms)
         oclu.updateBuffer(cLJs, self.cl_cLJs)
         oclu.updateBuffer(poss, self.cl_poss)
+        if (atoms is not None) and self.use_cell_list:
+            self.prepareCellList(atoms)
+
+    def prepareCellList(self, atoms):
+        """
+        Bin atoms into a regular grid of cubic cells and upload the cell list to the device.
+
+        The atom indices are sorted by the linear index of the cell ``ix + nx*(iy + ny*iz)`` and saved into ``cl_cell_atoms``.
+        The atoms in cell ``ic`` are in the range ``cell_start[ic]...cell_start[ic+1]`` of the sorted indices.
+
+        Arguments:
+            atoms: np.ndarray of shape ``(n_atoms, 3+)``. Atom xyz positions in the first three columns.
+
+        Returns:
+            nbytes: int. Number of bytes allocated on the device.
+        """
+
+        if bRuntime:
+            t0 = time.perf_counter()
+
+        cell_size = self.cell_size or 0.5 * self.cutoff
+        xyzs = np.asarray(atoms, dtype=np.float64)[:, :3]
+        if len(xyzs) > 0:
+            p_min = xyzs.min(axis=0)
+            p_max = xyzs.max(axis=0)
+        else:
+            p_min = p_max = np.zeros(3)
+        n_cell = np.floor((p_max - p_min) / cell_size).astype(np.int32) + 1
+        inds = np.minimum(np.floor((xyzs - p_min) / cell_size).astype(np.int32), n_cell - 1)
+        cell_inds = inds[:, 0] + n_cell[0] * (inds[:, 1] + n_cell[1] * inds[:, 2])
+        cell_atoms = np.argsort(cell_inds, kind="stable").astype(np.int32)
+        cell_start = np.zeros(n_cell.prod() + 1, dtype=np.int32)
+        cell_start[1:] = np.cumsum(np.bincount(cell_inds, minlength=n_cell.prod()))
+
+        self.nCell = np.append(n_cell, 0).astype(np.int32)
+        self.cell_origin = np.append(p_min, 1.0 / cell_size).astype(np.float32)
+
+        self._releaseCellList()
+        mf = cl.mem_flags
+        if len(cell_atoms) == 0:
+            cell_atoms = np.zeros(1, dtype=np.int32)  # Zero-size buffers are not allowed
+        self.cl_cell_start = cl.Buffer(self.ctx, mf.READ_ONLY | mf.COPY_HOST_PTR, hostbuf=cell_start)
+        self.cl_cell_atoms = cl.Buffer(self.ctx, mf.READ_ONLY | mf.COPY_HOST_PTR, hostbuf=cell_atoms)
+
+        if self.verbose > 0:
+            print(f"ForceField_LJC.prepareCellList: nCell {n_cell}, cell_size {cell_size}, max atoms per cell {np.diff(cell_start).max()}")
+        if bRuntime:
+            print("runtime(ForceField_LJC.prepareCellList) [s]: ", time.perf_counter() - t0)
+
+        return cell_start.nbytes + cell_atoms.nbytes
+
+    def _releaseCellList(self):
+        try:
+            self.cl_cell_start.release()
+            self.cl_cell_atoms.release()
+        except:
+            pass
+        self.cl_cell_start = None
+        self.cl_cell_atoms = None
+
+    def _cell_list_args(self, local_size):
+        """Global and local work sizes, and the common arguments for the cell-list kernels."""
+        if self.cl_cell_start is None:
+            raise RuntimeError("Cell list not initialized. Set use_cell_list=True before calling prepareBuffers.")
+        local_size = tuple(local_size)
+        if len(local_size) != 3:
+            local_size = CELL_LIST_LOCAL_SIZE
+        global_size = tuple(makeDivisibleUp(int(n), l) for n, l in zip(self.nDim[:3], local_size))
+        grid_args = (self.nDim, self.lvec0, self.dlvec[0], self.dlvec[1], self.dlvec[2], self.nCell, self.cell_origin, np.float32(self.cutoff))
+        return global_size, local_size, grid_args
 
     def tryReleaseBuffers(self):
         """Release all device buffers."""
         if self.verbose > 0:
             print(" ForceField_LJC.tryReleaseBuffers ")
+        self._releaseCellList()
         try:
             self.cl_atoms.release()
             self.cl_atoms = None
@@ -1140,26 +1482,41 @@ class ForceField_LJC:
             FE = np.zeros(ns, dtype=np.float32)
             if self.verbose > 0:
                 print("FE.shape", FE.shape, self.nDim)
-        ntot = self.nDim[0] * self.nDim[1] * self.nDim[2]
-        ntot = makeDivisibleUp(ntot, local_size[0])  # TODO: - we should make sure it does not overflow
-        global_size = (ntot,)  # TODO make sure divisible by local_size
-        if bRuntime:
-            print("runtime(ForceField_LJC.run_evalLJC_QZs_noPos.pre) [s]: ", time.time() - t0)
-        # fmt: off
-        cl_program.evalLJC_QZs_noPos(self.queue, global_size, local_size,
-            self.nAtoms,
-            self.cl_atoms,
-            self.cl_cLJs,
-            self.cl_FE,
-            self.nDim,
-            self.lvec0,
-            self.dlvec[0],
-            self.dlvec[1],
-            self.dlvec[2],
-            self.Qs,
-            self.QZs
-        )
-        # fmt: on
+        if self.use_cell_list:
+            global_size, local_size, grid_args = self._cell_list_args(local_size)
+            # fmt: off
+            cl_program.evalLJC_QZs_noPos_cells(self.queue, global_size, local_size,
+                self.cl_atoms,
+                self.cl_cLJs,
+                self.cl_cell_start,
+                self.cl_cell_atoms,
+                self.cl_FE,
+                *grid_args,
+                self.Qs,
+                self.QZs
+            )
+            # fmt: on
+        else:
+            ntot = self.nDim[0] * self.nDim[1] * self.nDim[2]
+            ntot = makeDivisibleUp(ntot, local_size[0])  # TODO: - we should make sure it does not overflow
+            global_size = (ntot,)  # TODO make sure divisible by local_size
+            if bRuntime:
+                print("runtime(ForceField_LJC.run_evalLJC_QZs_noPos.pre) [s]: ", time.time() - t0)
+            # fmt: off
+            cl_program.evalLJC_QZs_noPos(self.queue, global_size, local_size,
+                self.nAtoms,
+                self.cl_atoms,
+                self.cl_cLJs,
+                self.cl_FE,
+                self.nDim,
+                self.lvec0,
+                self.dlvec[0],
+                self.dlvec[1],
+                self.dlvec[2],
+                self.Qs,
+                self.QZs
+            )
+            # fmt: on
         if bCopy:
             cl.enqueue_copy(self.queue, FE, self.cl_FE)
         if bFinish:
@@ -1322,6 +1679,10 @@ class ForceField_LJC:
         Arguments:
             local_size: tuple of a single int. Size of local work group on device.
         """
+        if self.use_cell_list:
+            global_size, local_size, grid_args = self._cell_list_args(local_size)
+            cl_program.addLJ_cells(self.queue, global_size, local_size, self.cl_atoms, self.cl_cLJs, self.cl_cell_start, self.cl_cell_atoms, self.cl_FE, *grid_args)
+            return
         local_size = (min(local_size[0], 64),)
         global_size = [int(np.ceil(np.prod(self.nDim[:3]) / local_size[0]) * local_size[0])]
         # fmt: off
@@ -1345,6 +1706,22 @@ class ForceField_LJC:
             damp_method: int. Type of damping to use. -1: no damping, 0: constant, 1: R2, 2: R4, 3: invR4, 4: invR8.
             local_size: tuple of a single int. Size of local work group on device.
         """
+        if self.use_cell_list:
+            global_size, local_size, grid_args = self._cell_list_args(local_size)
+            REAs = self.cl_REAs if damp_method >= 1 else None
+            # fmt: off
+            cl_program.addvdW_cells(self.queue, global_size, local_size,
+                self.cl_atoms,
+                self.cl_cLJs,
+                REAs,
+                self.cl_cell_start,
+                self.cl_cell_atoms,
+                self.cl_FE,
+                *grid_args,
+                np.int32(damp_method)
+            )
+            # fmt: on
+            return
         local_size = (min(local_size[0], 64),)
         global_size = [int(np.ceil(np.prod(self.nDim[:3]) / local_size[0]) * local_size[0])]
         # fmt: off
@@ -1424,24 +1801,71 @@ class ForceField_LJC:
         if bRuntime:
             self.queue.finish()
             print("runtime(ForceField_LJC.add_dftd3.get_params) [s]: ", time.perf_counter() - t0)
-        global_size = [int(np.ceil(np.prod(self.nDim[:3]) / local_size[0]) * local_size[0])]
-        # fmt: off
-        cl_program.addDFTD3_BJ(self.queue, global_size, local_size,
-            self.nAtoms,
-            self.cl_atoms,
-            self.cl_cD3,
-            self.cl_FE,
-            self.nDim,
-            self.lvec0,
-            self.dlvec[0],
-            self.dlvec[1],
-            self.dlvec[2]
-        )
-        # fmt: on
+        if self.use_cell_list:
+            global_size, local_size, grid_args = self._cell_list_args(local_size)
+            cl_program.addDFTD3_BJ_cells(self.queue, global_size, local_size, self.cl_atoms, self.cl_cD3, self.cl_cell_start, self.cl_cell_atoms, self.cl_FE, *grid_args)
+        else:
+            global_size = [int(np.ceil(np.prod(self.nDim[:3]) / local_size[0]) * local_size[0])]
+            # fmt: off
+            cl_program.addDFTD3_BJ(self.queue, global_size, local_size,
+                self.nAtoms,
+                self.cl_atoms,
+                self.cl_cD3,
+                self.cl_FE,
+                self.nDim,
+                self.lvec0,
+                self.dlvec[0],
+                self.dlvec[1],
+                self.dlvec[2]
+            )
+            # fmt: on
         if bRuntime:
             self.queue.finish()
             print("runtime(ForceField_LJC.add_dftd3) [s]: ", time.perf_counter() - t0)
 
+    def _pyramid_axes(self, grid):
+        """
+        Get the axes to downsample on each level of the resolution pyramid of a sample grid, so that the grid spacing
+        of the last level is still at most the smallest grid spacing of the force field grid.
+        """
+        ff_step = (np.linalg.norm(self.lvec[:, :3], axis=1) / self.nDim[:3]).min()
+        step = np.linalg.norm(grid.lvec[1:], axis=1) / np.array(grid.shape[:3])
+        shape = np.array(grid.shape[:3])
+        levels = []
+        while True:
+            axes = tuple(int(i) for i in range(3) if shape[i] % 2 == 0 and 2 * step[i] <= ff_step * (1 + 1e-6))
+            if not axes:
+                break
+            levels.append(axes)
+            step[list(axes)] *= 2
+            shape[list(axes)] //= 2
+        return levels
+
+    def _sample_grid(self, grid, power=None, local_size=(32,)):
+        """
+        Get a sample grid on the device, optionally raised to a power with :meth:`DataGrid.power_positive`, and downsampled
+        to the coarsest sufficient resolution if :attr:`sample_pyramid` is set. The result is taken from the sample cache
+        when possible, and should not be modified or released.
+        """
+        levels = tuple(self._pyramid_axes(grid)) if self.sample_pyramid else ()
+
+        def make(source):
+            for axes in levels:
+                source = source.downsample(axes)
+            buf = cl.Buffer(self.ctx, cl.mem_flags.READ_WRITE, size=4 * int(np.prod(source.shape)))
+            cl.enqueue_copy(self.queue, buf, source.array if source._cl_array is None else source.cl_array)
+            grid_out = type(source)(buf, source.lvec, shape=source.shape, ctx=self.ctx)
+            if power is not None:
+                grid_out.power_positive(p=power, in_place=True, local_size=local_size, queue=self.queue)
+            return grid_out
+
+        if self.sample_cache.max_bytes <= 0:
+            if levels:
+                return make(grid)
+            return grid if power is None else grid.power_positive(p=power, in_place=False, local_size=local_size, queue=self.queue)
+
+        return self.sample_cache.get(grid, ("power", power, levels), make)
+
     def calc_force_hartree(self, FE=None, rot=np.eye(3), rot_center=np.zeros(3), local_size=(32,), bCopy=True, bFinish=True):
         """
         Calculate force field for LJ + Hartree cross-correlated with tip density via FFT.
@@ -1469,7 +1893,8 @@ class ForceField_LJC:
 
         # Interpolate Hartree potential onto the correct grid
         lvec = np.concatenate([self.lvec0[None, :3], self.lvec[:, :3]], axis=0)
-        pot = self.pot.interp_at(lvec, self.nDim[:3], rot=rot, rot_center=rot_center, local_size=local_size, queue=self.queue)
+        pot = self._sample_grid(self.pot, local_size=local_size)
+        pot = pot.interp_at(lvec, self.nDim[:3], rot=rot, rot_center=rot_center, local_size=local_size, queue=self.queue)
 
         if bRuntime:
             print("runtime(ForceField_LJC.calc_force_hartree.interpolate) [s]: ", time.perf_counter() - t0)
@@ -1535,18 +1960,20 @@ class ForceField_LJC:
                 "Forcefield calculation via FFT for non-rectangular grids is not implemented. " "Note that the forcefield grid does not need to match the Hartree potential grid."
             )
 
+        # Get the orientation-independent sample grids. The power for the Pauli density is taken on the sample grid
+        # before the interpolation, so that it can be reused for all orientations of the sample.
+        pot = self._sample_grid(self.pot, local_size=local_size)
+        rho_sample = self._sample_grid(self.rho_sample, power=None if np.allclose(B, 1.0) else B, local_size=local_size)
+
         # Interpolate sample Hartree potential and electron density onto the correct grid
         lvec = np.concatenate([self.lvec0[None, :3], self.lvec[:, :3]], axis=0)
-        pot_lvec_same = np.allclose(lvec, self.pot.lvec) and np.allclose(self.pot.shape, self.nDim[:3])
-        rho_sample_lvec_same = np.allclose(lvec, self.rho_sample.lvec) and np.allclose(self.rho_sample.shape, self.nDim[:3])
+        no_rot = np.allclose(rot, np.eye(3))
+        pot_lvec_same = np.allclose(lvec, pot.lvec) and np.allclose(pot.shape, self.nDim[:3]) and no_rot
+        rho_sample_lvec_same = np.allclose(lvec, rho_sample.lvec) and np.allclose(rho_sample.shape, self.nDim[:3]) and no_rot
         if not pot_lvec_same:
-            pot = self.pot.interp_at(lvec, self.nDim[:3], rot=rot, rot_center=rot_center, local_size=local_size, queue=self.queue)
-        else:
-            pot = self.pot
+            pot = pot.interp_at(lvec, self.nDim[:3], rot=rot, rot_center=rot_center, local_size=local_size, queue=self.queue)
         if not rho_sample_lvec_same:
-            rho_sample = self.rho_sample.interp_at(lvec, self.nDim[:3], rot=rot, rot_center=rot_center, local_size=local_size, queue=self.queue)
-        else:
-            rho_sample = self.rho_sample
+            rho_sample = rho_sample.interp_at(lvec, self.nDim[:3], rot=rot, rot_center=rot_center, local_size=local_size, queue=self.queue)
 
         if bRuntime:
             self.queue.finish()
@@ -1558,8 +1985,6 @@ class ForceField_LJC:
             pot.release(keep_on_host=False)
 
         # Cross-correlate sample electron density and tip electron density for Pauli energy
-        if not np.allclose(B, 1.0):
-            rho_sample = rho_sample.power_positive(p=B, in_place=False)
         E_pauli = self.fft_corr.correlate(rho_sample)
         if not rho_sample_lvec_same:
             rho_sample.release(keep_on_host=False)
@@ -1701,7 +2126,7 @@ class ForceField_LJC:
             print("runtime(ForceField_LJC.makeFF.pre) [s]: ", time.perf_counter() - t0)
 
         if method == "point-charge":
-            if np.allclose(self.atoms[:, -1], 0):  # No charges
+            if np.allclose(self.atoms[:, -1], 0) and not self.use_cell_list:  # No charges
                 FF = self.run_evalLJ_noPos()
             else:
                 FF = self.run_evalLJC_QZs_noPos(FE=FE, local_size=(32,), bCopy=bCopy, bFinish=bFinish)
@@ -1732,6 +2157,12 @@ class ForceField_LJC:
         else:
             raise ValueError(f"Unknown method for force field calculation: `{method}`.")
 
+        # Remember the atoms for incremental updates with updateFF
+        if method == "point-charge" and not bRelease:
+            self._update_state = dict(atoms=self.atoms.astype(np.float32), cLJs=np.asarray(cLJs, dtype=np.float32), Qs=self.Qs.copy(), QZs=self.QZs.copy(), nDim=self.nDim.copy())
+        else:
+            self._update_state = None
+
         if bRelease:
             self.tryReleaseBuffers()
         if bRuntime:
@@ -1739,6 +2170,138 @@ class ForceField_LJC:
 
         return FF
 
+    def updateFF(self, xyzs, cLJs, qs=None, rot=np.eye(3), rot_center=np.zeros(3), box_margin=UPDATE_BOX_MARGIN, bFinish=True):
+        """
+        Update the point-charge force field after some of the atoms have been moved, added, or removed since the previous
+        call to :meth:`makeFF` with ``method='point-charge'`` and ``bRelease=False``, or to this method.
+
+        The atoms that changed are found by comparing the new atoms to the previous ones. The force field is recomputed from
+        all of the atoms only in a box around the changed atoms, and outside of the box only the contributions of the changed
+        atoms are added. The box extends ``box_margin`` around the atoms, so that the large values close to the atom cores
+        are never subtracted. The cost of the update outside of the box is proportional to the number of changed atoms
+        instead of the total number of atoms. With ``use_cell_list=True``, the interactions are truncated at the cutoff,
+        so the box extends ``cutoff`` around the atoms and the force field outside of it does not change at all. The box is
+        then recomputed with the cell list, so that the update costs at most as much as :meth:`makeFF` even when the box
+        covers most of the grid.
+
+        The force field stays in device memory. Use :meth:`downloadFF` to copy it to the host.
+
+        Arguments:
+            xyzs: np.ndarray of shape ``(n_atoms, 3)``. xyz positions of all of the atoms after the change.
+            cLJs: np.ndarray of shape ``(n_atoms, 2)``. Lennard-Jones interaction parameters in AB form for each atom.
+            qs: np.ndarray of shape ``(n_atoms,)`` or None. Point charges of atoms.
+            rot: np.ndarray of shape ``(3, 3)``. Rotation matrix applied to the atom coordinates. Should be the same as
+                in the call to :meth:`makeFF`.
+            rot_center: np.ndarray of shape ``(3,)``. Point around which rotation is performed.
+            box_margin: float. Margin in Ångströms of the recomputed box around the changed atoms when not using the cell list.
+            bFinish: Bool. Whether to wait for execution to finish.
+
+        Returns:
+            changed_xyzs: np.ndarray of shape ``(n_changed, 3)``. Positions of the removed and added atoms after the rotation.
+        """
+
+        if bRuntime:
+            t0 = time.perf_counter()
+
+        state = self._update_state
+        if (state is None) or (self.cl_FE is None):
+            raise RuntimeError("No force field to update. Compute the force field first with makeFF(method='point-charge', bRelease=False).")
+        if not (np.array_equal(state["Qs"], self.Qs) and np.array_equal(state["QZs"], self.QZs) and np.array_equal(state["nDim"], self.nDim)):
+            raise RuntimeError("The tip charges or the grid have changed since the force field was computed. Recompute it with makeFF.")
+
+        # Rotate atoms and find the ones that changed
+        xyzs = np.dot(xyzs - rot_center, rot.T) + rot_center
+        if qs is None:
+            qs = np.zeros(len(xyzs))
+        atoms = np.concatenate([xyzs, qs[:, None]], axis=1).astype(np.float32)
+        cLJs = np.asarray(cLJs, dtype=np.float32)
+        new = np.concatenate([atoms, cLJs], axis=1)
+        old = np.concatenate([state["atoms"], state["cLJs"]], axis=1)
+        removed = _unmatched_rows(old, new)
+        added = _unmatched_rows(new, old)
+        delta = np.concatenate([old[removed], new[added]], axis=0)
+        delta[: len(removed), [3, 4, 5]] *= -1  # Removed atoms contribute with negated charges and LJ parameters
+        changed_xyzs = delta[:, :3].astype(np.float64)
+
+        self.atoms = atoms
+        self._update_state = dict(state, atoms=atoms, cLJs=cLJs)
+        if len(delta) == 0:
+            return changed_xyzs
+        self.prepareBuffers(atoms, cLJs)
+
+        # Box of grid indices around the changed atoms
+        margin = self.cutoff if self.use_cell_list else box_margin
+        T = np.linalg.inv(self.dlvec[:, :3])
+        inds = (changed_xyzs - self.lvec0[:3]) @ T
+        ext = margin * np.linalg.norm(T, axis=0)
+        box0 = np.clip(np.floor(inds.min(axis=0) - ext), 0, self.nDim[:3]).astype(np.int32)
+        box1 = np.clip(np.ceil(inds.max(axis=0) + ext) + 1, 0, self.nDim[:3]).astype(np.int32)
+
+        if self.use_cell_list:
+            # Outside of the box nothing changes, and inside of it the force field is recomputed from the atoms in the
+            # nearby cells. Work groups extending past the end of the box also only recompute the force field.
+            local_size = CELL_LIST_LOCAL_SIZE
+            _, _, grid_args = self._cell_list_args(local_size)
+            global_size = tuple(makeDivisibleUp(int(n), l) for n, l in zip(box1 - box0, local_size))
+            if min(box1 - box0) > 0:
+                # fmt: off
+                cl_program.evalLJC_QZs_noPos_cells(self.queue, global_size, local_size,
+                    self.cl_atoms,
+                    self.cl_cLJs,
+                    self.cl_cell_start,
+                    self.cl_cell_atoms,
+                    self.cl_FE,
+                    *grid_args,
+                    self.Qs,
+                    self.QZs,
+                    global_offset=tuple(int(i) for i in box0),
+                )
+                # fmt: on
+        else:
+            mf = cl.mem_flags
+            cl_delta_atoms = cl.Buffer(self.ctx, mf.READ_ONLY | mf.COPY_HOST_PTR, hostbuf=np.ascontiguousarray(delta[:, :4]))
+            cl_delta_cLJs = cl.Buffer(self.ctx, mf.READ_ONLY | mf.COPY_HOST_PTR, hostbuf=np.ascontiguousarray(delta[:, 4:]))
+            # fmt: off
+            cl_program.updateLJC_QZs_noPos(self.queue, tuple(int(n) for n in self.nDim[:3]), None,
+                self.nAtoms,
+                self.cl_atoms,
+                self.cl_cLJs,
+                np.int32(len(delta)),
+                cl_delta_atoms,
+                cl_delta_cLJs,
+                self.cl_FE,
+                self.nDim,
+                self.lvec0,
+                self.dlvec[0],
+                self.dlvec[1],
+                self.dlvec[2],
+                np.append(box0, 0).astype(np.int32),
+                np.append(box1, 0).astype(np.int32),
+                self.Qs,
+                self.QZs,
+            )
+            # fmt: on
+
+        if bFinish:
+            self.queue.finish()
+        if bRuntime:
+            print("runtime(ForceField_LJC.updateFF) [s]: ", time.perf_counter() - t0)
+
+        return changed_xyzs
+
+
+def _unmatched_rows(a, b):
+    """Indices of the rows in ``a`` that have no exactly equal row in ``b``. Repeated rows are matched one to one."""
+    counts = Counter(row.tobytes() for row in b)
+    inds = []
+    for i, row in enumerate(a):
+        key = row.tobytes()
+        if counts[key] > 0:
+            counts[key] -= 1
+        else:
+            inds.append(i)
+    return np.array(inds, dtype=np.int64)
+
 
 class AtomProcjetion:
     """
@@ -1761,6 +2324,9 @@ class AtomProcjetion:
     tgWidth = 0.1  #  tangens of angle for limiting rendered area for SphereCaps
     Rfunc = None
 
+    blocking = True  #  wait for the output to be copied to the host in run_* methods; if False, the caller must finish the queue before reading the output
+    shared_atoms = False  #  the atom buffers are owned by another projector, see shareAtomBuffers
+
     def __init__(self):
         self.ctx = oclu.ctx
         self.queue = oclu.queue
@@ -1789,19 +2355,40 @@ class AtomProcjetion:
         if verbose > 0:
             print("AtomProcjetion.prepareBuffers prj_dim", prj_dim)
         self.prj_dim = prj_dim
+        mf = cl.mem_flags
+        nbytes = self.prepareAtomBuffers(atoms, coefs=coefs, bonds2atoms=bonds2atoms)
+        self._prepareRfunc(Rfunc)
+
+        npostot = prj_dim[0] * prj_dim[1]
+
+        bsz = np.dtype(np.float32).itemsize * npostot
+        self.cl_poss = cl.Buffer(self.ctx, mf.READ_ONLY, bsz * 4)
+        nbytes += bsz * 4  # float4
+        self.cl_Eout = cl.Buffer(self.ctx, mf.WRITE_ONLY, bsz * prj_dim[2])
+        nbytes += bsz  # float
+
+        self.cl_itypes = cl.Buffer(self.ctx, mf.READ_ONLY, 200 * np.dtype(np.int32).itemsize)
+        nbytes += bsz  # float
+
+        if elem_channels:
+            elem_channels = np.array(elem_channels).astype(np.int32)
+            self.cl_elem_channels = cl.Buffer(self.ctx, mf.READ_ONLY | mf.COPY_HOST_PTR, hostbuf=elem_channels)
+            nbytes += elem_channels.nbytes
+
+        if verbose > 0:
+            print("AtomProcjetion.prepareBuffers.nbytes ", nbytes)
+
+    def prepareAtomBuffers(self, atoms, coefs=None, bonds2atoms=None):
+        """
+        allocate GPU buffers for atoms, atomic coeficients and bonds, and upload them to GPU
+        """
         nbytes = 0
+        self.shared_atoms = False
         self.nAtoms = np.int32(len(atoms))
         mf = cl.mem_flags
         self.cl_atoms = cl.Buffer(self.ctx, mf.READ_ONLY | mf.COPY_HOST_PTR, hostbuf=atoms)
         nbytes += atoms.nbytes
 
-        if (Rfunc is not None) or (self.Rfunc is not None):
-            if Rfunc is None:
-                Rfunc = self.Rfunc
-            self.Rfunc = Rfunc
-            Rfunc = Rfunc.astype(np.float32, copy=False)
-            self.cl_Rfunc = cl.Buffer(self.ctx, mf.READ_ONLY | mf.COPY_HOST_PTR, hostbuf=Rfunc)
-
         if bonds2atoms is not None:
             self.nBonds = np.int32(len(bonds2atoms))
             bondPoints = np.empty((self.nBonds, 8), dtype=np.float32)
@@ -1817,27 +2404,56 @@ class AtomProcjetion:
             coefs[:, 0] = 1.0  # amplitude
             coefs[:, 1] = 0.1  # width
 
+        self.coefs = coefs
         self.cl_coefs = cl.Buffer(self.ctx, mf.READ_ONLY | mf.COPY_HOST_PTR, hostbuf=coefs)
         nbytes += coefs.nbytes
 
-        npostot = prj_dim[0] * prj_dim[1]
+        return nbytes
 
-        bsz = np.dtype(np.float32).itemsize * npostot
-        self.cl_poss = cl.Buffer(self.ctx, mf.READ_ONLY, bsz * 4)
-        nbytes += bsz * 4  # float4
-        self.cl_Eout = cl.Buffer(self.ctx, mf.WRITE_ONLY, bsz * prj_dim[2])
-        nbytes += bsz  # float
+    def shareAtomBuffers(self, other, prj_dim, elem_channels=None):
+        """
+        use the atom buffers already uploaded to GPU by another projector instead of uploading the atoms again;
+        buffers for positions and output are kept between calls as long as prj_dim does not change
+        """
+        mf = cl.mem_flags
+        if not self.shared_atoms or self.prj_dim != prj_dim:
+            npostot = prj_dim[0] * prj_dim[1]
+            bsz = np.dtype(np.float32).itemsize * npostot
+            self.cl_poss = cl.Buffer(self.ctx, mf.READ_ONLY, bsz * 4)
+            self.cl_Eout = cl.Buffer(self.ctx, mf.WRITE_ONLY, bsz * prj_dim[2])
+        self.prj_dim = prj_dim
+        self.shared_atoms = True
 
-        self.cl_itypes = cl.Buffer(self.ctx, mf.READ_ONLY, 200 * np.dtype(np.int32).itemsize)
-        nbytes += bsz  # float
+        self.nAtoms = other.nAtoms
+        self.cl_atoms = other.cl_atoms
+        self.coefs = other.coefs
+        self.cl_coefs = other.cl_coefs
+        if hasattr(other, "cl_bondPoints"):
+            self.nBonds = other.nBonds
+            self.bondPoints = other.bondPoints
+            self.bonds2atoms = other.bonds2atoms
+            self.cl_bondPoints = other.cl_bondPoints
+
+        if getattr(self, "cl_Rfunc", None) is None:
+            self._prepareRfunc()
 
         if elem_channels:
             elem_channels = np.array(elem_channels).astype(np.int32)
             self.cl_elem_channels = cl.Buffer(self.ctx, mf.READ_ONLY | mf.COPY_HOST_PTR, hostbuf=elem_channels)
-            nbytes += elem_channels.nbytes
 
-        if verbose > 0:
-            print("AtomProcjetion.prepareBuffers.nbytes ", nbytes)
+    def _prepareRfunc(self, Rfunc=None):
+        if (Rfunc is not None) or (self.Rfunc is not None):
+            if Rfunc is None:
+                Rfunc = self.Rfunc
+            self.Rfunc = Rfunc
+            Rfunc = Rfunc.astype(np.float32, copy=False)
+            self.cl_Rfunc = cl.Buffer(self.ctx, cl.mem_flags.READ_ONLY | cl.mem_flags.COPY_HOST_PTR, hostbuf=Rfunc)
+
+    def _copy_out(self, Eout):
+        cl.enqueue_copy(self.queue, Eout, self.cl_Eout, is_blocking=self.blocking)
+        if self.blocking:
+            self.queue.finish()
+        return Eout
 
     def updateBuffers(self, atoms=None, coefs=None, poss=None):
         """
@@ -1878,6 +2494,10 @@ class AtomProcjetion:
         """
         if verbose > 0:
             print(" AtomProjection.releaseBuffers ")
+        if self.shared_atoms:
+            # The atom buffers belong to another projector, so only drop the references
+            self.cl_atoms = self.cl_coefs = None
+            self.shared_atoms = False
         try:
             self.cl_atoms.release()
         except:
@@ -1919,9 +2539,7 @@ class AtomProcjetion:
             self.cl_Eout
         )
         # fmt: on
-        cl.enqueue_copy(self.queue, Eout, self.cl_Eout)
-        self.queue.finish()
-        return Eout
+        return self._copy_out(Eout)
 
     def run_evaldisks(self, poss=None, Eout=None, tipRot=None, offset=0.0, local_size=(32,)):
         """
@@ -1956,9 +2574,7 @@ class AtomProcjetion:
             self.tipRot[2]
         )
         # fmt: on
-        cl.enqueue_copy(self.queue, Eout, self.cl_Eout)
-        self.queue.finish()
-        return Eout
+        return self._copy_out(Eout)
 
     def run_evaldisks_occlusion(self, poss=None, Eout=None, tipRot=None, local_size=(32,)):
         """
@@ -1993,9 +2609,7 @@ class AtomProcjetion:
             self.tipRot[2]
         )
         # fmt: on
-        cl.enqueue_copy(self.queue, Eout, self.cl_Eout)
-        self.queue.finish()
-        return Eout
+        return self._copy_out(Eout)
 
     def run_evalSpheres(self, poss=None, Eout=None, tipRot=None, local_size=(32,)):
         """
@@ -2028,9 +2642,7 @@ class AtomProcjetion:
             self.tipRot[2]
         )
         # fmt: on
-        cl.enqueue_copy(self.queue, Eout, self.cl_Eout)
-        self.queue.finish()
-        return Eout
+        return self._copy_out(Eout)
 
     def run_evalSphereCaps(self, poss=None, Eout=None, tipRot=None, local_size=(32,)):
         """
@@ -2065,9 +2677,7 @@ class AtomProcjetion:
             self.tipRot[2]
         )
         # fmt: on
-        cl.enqueue_copy(self.queue, Eout, self.cl_Eout)
-        self.queue.finish()
-        return Eout
+        return self._copy_out(Eout)
 
     def run_evalQdisks(self, poss=None, Eout=None, tipRot=None, local_size=(32,)):
         """
@@ -2098,9 +2708,7 @@ class AtomProcjetion:
             self.tipRot[2]
         )
         # fmt: on
-        cl.enqueue_copy(self.queue, Eout, self.cl_Eout)
-        self.queue.finish()
-        return Eout
+        return self._copy_out(Eout)
 
     def run_evalMultiMapSpheres(self, poss=None, Eout=None, tipRot=None, bOccl=0, Rmin=1.4, Rstep=0.1, local_size=(32,)):
         """
@@ -2135,9 +2743,7 @@ class AtomProcjetion:
             np.float32(Rstep)
         )
         # fmt: on
-        cl.enqueue_copy(self.queue, Eout, self.cl_Eout)
-        self.queue.finish()
-        return Eout
+        return self._copy_out(Eout)
 
     def run_evalMultiMapSpheresElements(self, poss=None, Eout=None, tipRot=None, bOccl=0, local_size=(32,)):
         """
@@ -2171,9 +2777,7 @@ class AtomProcjetion:
             np.int32(self.prj_dim[2]),
         )
         # fmt: on
-        cl.enqueue_copy(self.queue, Eout, self.cl_Eout)
-        self.queue.finish()
-        return Eout
+        return self._copy_out(Eout)
 
     def run_evalSpheresType(self, poss=None, Eout=None, tipRot=None, bOccl=0, local_size=(32,)):
         """
@@ -2207,9 +2811,7 @@ class AtomProcjetion:
             np.int32(bOccl),
         )
         # fmt: on
-        cl.enqueue_copy(self.queue, Eout, self.cl_Eout)
-        self.queue.finish()
-        return Eout
+        return self._copy_out(Eout)
 
     def run_evalBondEllipses(self, poss=None, Eout=None, tipRot=None, local_size=(32,)):
         """
@@ -2242,9 +2844,7 @@ class AtomProcjetion:
             self.tipRot[2]
         )
         # fmt: on
-        cl.enqueue_copy(self.queue, Eout, self.cl_Eout)
-        self.queue.finish()
-        return Eout
+        return self._copy_out(Eout)
 
     def run_evalAtomRfunc(self, poss=None, Eout=None, tipRot=None, local_size=(32,)):
         """
@@ -2277,9 +2877,7 @@ class AtomProcjetion:
             self.tipRot[2]
         )
         # fmt: on
-        cl.enqueue_copy(self.queue, Eout, self.cl_Eout)
-        self.queue.finish()
-        return Eout
+        return self._copy_out(Eout)
 
     def run_evalCoulomb(self, poss=None, Eout=None, local_size=(32,)):
         """
@@ -2304,9 +2902,7 @@ class AtomProcjetion:
             self.cl_Eout,
         )
         # fmt: on
-        cl.enqueue_copy(self.queue, Eout, self.cl_Eout)
-        self.queue.finish()
-        return Eout
+        return self._copy_out(Eout)
 
     def run_evalHartreeGradient(self, pot, poss=None, Eout=None, h=None, rot=np.eye(3), rot_center=None, local_size=(32,)):
         """
@@ -2354,7 +2950,4 @@ class AtomProcjetion:
             np.float32(h),
         )
         # fmt: on
-        cl.enqueue_copy(self.queue, Eout, self.cl_Eout)
-        self.queue.finish()
-
-        return Eout
+        return self._copy_out(Eout)
@@ -107,13 +107,25 @@ class RelaxedScanner:
 
         self.surfFF = np.zeros(4, dtype=np.float32)
 
+        self.cl_ImgIn = None
         self.cl_atoms = None
         self.cl_zMap = None
         self.cl_feMap = None
 
+    def _prepareImgIn(self):
+        # The image for the force field is allocated only when the force field is copied into it, so that changing
+        # the grid several times in between scans, e.g. for each tile in AFMulator.eval_tiled, does not allocate images
+        # that are never used.
+        if self.cl_ImgIn is None:
+            self.image_format = cl.ImageFormat(cl.channel_order.RGBA, cl.channel_type.FLOAT)
+            self.cl_ImgIn = cl.Image(self.ctx, cl.mem_flags.READ_ONLY, self.image_format, shape=self.FEin_shape[:3], pitches=None, hostbuf=None, is_array=False, buffer=None)
+            if self.verbose > 0:
+                print("prepareBuffers made self.cl_ImgIn ", self.cl_ImgIn)
+
     def updateFEin(self, FEin_cl, bFinish=False):
         if verbose > 0:
             print(" updateFEin ", FEin_cl, self.cl_ImgIn, self.FEin_shape)
+        self._prepareImgIn()
         if bFinish:
             self.queue.finish()
         cl.enqueue_copy(queue=self.queue, src=FEin_cl, dest=self.cl_ImgIn, offset=0, origin=(0, 0, 0), region=self.FEin_shape[:3])
@@ -166,10 +178,7 @@ class RelaxedScanner:
         else:
             if FEin_shape is not None:
                 self.FEin_shape = FEin_shape
-                self.image_format = cl.ImageFormat(cl.channel_order.RGBA, cl.channel_type.FLOAT)
-                self.cl_ImgIn = cl.Image(self.ctx, mf.READ_ONLY, self.image_format, shape=FEin_shape[:3], pitches=None, hostbuf=None, is_array=False, buffer=None)
-                if self.verbose > 0:
-                    print("prepareBuffers made self.cl_ImgIn ", self.cl_ImgIn)
+                self.cl_ImgIn = None  # Allocated in _prepareImgIn
             if FEin_cl is not None:
                 self.updateFEin(FEin_cl)
                 self.FEin_cl = FEin_cl
@@ -212,7 +221,8 @@ class RelaxedScanner:
     def releaseBuffers(self):
         if self.verbose > 0:
             print("tryReleaseBuffers self.cl_ImgIn ", self.cl_ImgIn)
-        self.cl_ImgIn.release()
+        if self.cl_ImgIn is not None:
+            self.cl_ImgIn.release()
         self.cl_poss.release()
         self.cl_FEout.release()
         if self.cl_zMap is not None:
@@ -285,6 +295,7 @@ class RelaxedScanner:
             region = region[::-1]
             if self.verbose > 0:
                 print("region : ", region)
+            self._prepareImgIn()
             cl.enqueue_copy(self.queue, self.cl_ImgIn, FEin, origin=(0, 0, 0), region=region)
         if WZconv is not None:
             cl.enqueue_copy(self.queue, self.cl_WZconv, WZconv)
@@ -343,17 +354,33 @@ class RelaxedScanner:
         self.queue.finish()
         return FEout
 
-    def run_relaxStrokesTilted(self, FEout=None, FEin=None, lvec=None, nz=None, bCopy=True, bFinish=True):
+    def _stroke_range(self, rows):
+        """
+        Global size and offset for running a kernel on the strokes in the scan rows ``rows[0] <= i < rows[1]``
+        along the first scan dimension, or on all of the strokes if ``rows`` is None.
+        """
+        if rows is None:
+            return (int(self.scan_dim[0] * self.scan_dim[1]),), None
+        i0, i1 = max(rows[0], 0), min(rows[1], self.scan_dim[0])
+        return (int(max(i1 - i0, 0) * self.scan_dim[1]),), (int(i0 * self.scan_dim[1]),)
+
+    def run_relaxStrokesTilted(self, FEout=None, FEin=None, lvec=None, nz=None, bCopy=True, bFinish=True, rows=None):
         """
         calculate force on relaxing probe particle approaching from particular direction
+
+        If ``rows`` is a tuple ``(i0, i1)``, only the strokes in the scan rows ``i0 <= i < i1`` are relaxed,
+        and the rest of the output keeps its previous values.
         """
         if nz is None:
             nz = self.scan_dim[2]
         if bCopy and (FEout is None):
             FEout = np.empty(self.scan_dim + (4,), dtype=np.float32)
         self.updateBuffers(FEin=FEin, lvec=lvec)
+        global_size, global_offset = self._stroke_range(rows)
+        if global_size[0] == 0:
+            return self._finish_run(self.cl_FEout, FEout, bCopy, bFinish)
         # fmt: off
-        cl_program.relaxStrokesTilted(self.queue, ( int(self.scan_dim[0]*self.scan_dim[1]),), None,
+        cl_program.relaxStrokesTilted(self.queue, global_size, None,
             self.cl_ImgIn,
             self.cl_poss,
             self.cl_FEout,
@@ -368,18 +395,24 @@ class RelaxedScanner:
             self.dpos0Tip,
             self.relax_params,
             self.surfFF,
-            np.int32(nz)
+            np.int32(nz),
+            global_offset=global_offset,
         )
         # fmt: on
+        return self._finish_run(self.cl_FEout, FEout, bCopy, bFinish)
+
+    def _finish_run(self, cl_out, out, bCopy=True, bFinish=True):
         if bCopy:
-            cl.enqueue_copy(self.queue, FEout, self.cl_FEout)
+            cl.enqueue_copy(self.queue, out, cl_out)
         if bFinish:
             self.queue.finish()
-        return FEout
+        return out
 
-    def run_relaxStrokesTilted_convZ(self, FEconv=None, FEin=None, lvec=None, nz=None):
+    def run_relaxStrokesTilted_convZ(self, FEconv=None, FEin=None, lvec=None, nz=None, rows=None):
         """
         calculate force on relaxing probe particle approaching from particular direction
+
+        If ``rows`` is a tuple ``(i0, i1)``, only the strokes in the scan rows ``i0 <= i < i1`` are relaxed.
         """
         if nz is None:
             nz = self.scan_dim[2]
@@ -389,8 +422,11 @@ class RelaxedScanner:
             else:
                 FEconv = self.prepareFEConv()
         self.updateBuffers(FEin=FEin, lvec=lvec)
+        global_size, global_offset = self._stroke_range(rows)
+        if global_size[0] == 0:
+            return self._finish_run(self.cl_FEconv, FEconv)
         # fmt: off
-        cl_program.relaxStrokesTilted_convZ(self.queue, ( int(self.scan_dim[0]*self.scan_dim[1]),), None,
+        cl_program.relaxStrokesTilted_convZ(self.queue, global_size, None,
             self.cl_ImgIn,
             self.cl_poss,
             self.cl_WZconv,
@@ -406,11 +442,10 @@ class RelaxedScanner:
             self.relax_params,
             self.surfFF,
             np.int32(nz), np.int32(self.nDimConvOut),
+            global_offset=global_offset,
         )
         # fmt: on
-        cl.enqueue_copy(self.queue, FEconv, self.cl_FEconv)
-        self.queue.finish()
-        return FEconv
+        return self._finish_run(self.cl_FEconv, FEconv)
 
     def run_getFEinStrokes(self, FEout=None, FEconv=None, FEin=None, lvec=None, nz=None, WZconv=None, bDoConv=False):
         """
@@ -470,9 +505,11 @@ class RelaxedScanner:
         self.queue.finish()
         return FEout
 
-    def run_convolveZ(self, FEconv=None, nz=None):
+    def run_convolveZ(self, FEconv=None, nz=None, rows=None):
         """
         convolve 3D forcefield in FEout with 1D weight mask WZconv
+
+        If ``rows`` is a tuple ``(i0, i1)``, only the strokes in the scan rows ``i0 <= i < i1`` are convolved.
         """
         if nz is None:
             nz = self.scan_dim[2]
@@ -481,16 +518,80 @@ class RelaxedScanner:
                 FEconv = self.FEconv
             else:
                 FEconv = self.prepareFEConv()
+        global_size, global_offset = self._stroke_range(rows)
+        if global_size[0] == 0:
+            return self._finish_run(self.cl_FEconv, FEconv)
         # fmt: off
-        cl_program.convolveZ(self.queue, ( int(self.scan_dim[0]*self.scan_dim[1]),), None,
+        cl_program.convolveZ(self.queue, global_size, None,
             self.cl_FEout,
             self.cl_FEconv,
             self.cl_WZconv,
-            np.int32(nz), np.int32(self.nDimConvOut)
+            np.int32(nz), np.int32(self.nDimConvOut),
+            global_offset=global_offset,
         )
         # fmt: on
-        cl.enqueue_copy(self.queue, FEconv, self.cl_FEconv)
+        return self._finish_run(self.cl_FEconv, FEconv)
+
+    def run_relaxStrokesTilted_sweep(self, stiffnesses, WZconvs, nz=None):
+        """
+        Relax the probe particle for several tip stiffnesses in one kernel launch, and convolve the z-force of each of the
+        relaxed stacks with several weight masks in one pass. Only the final result is copied to the host.
+
+        Arguments:
+            stiffnesses: np.ndarray of shape (n_stiffness, 4). Stiffnesses in the same units as :attr:`stiffness`.
+            WZconvs: np.ndarray of shape (n_weights, nzw). Convolution weight masks, zero-padded to a common length nzw.
+            nz: int or None. Number of scan steps in z. Defaults to scan_dim[2].
+
+        Returns:
+            FEconv: np.ndarray of shape (n_stiffness, n_weights, scan_dim[0], scan_dim[1], nz - nzw + 1). Convolved z-forces.
+        """
+        if nz is None:
+            nz = self.scan_dim[2]
+        stiffnesses = np.ascontiguousarray(stiffnesses, dtype=np.float32).reshape(-1, 4)
+        WZconvs = np.ascontiguousarray(WZconvs, dtype=np.float32)
+        nk, nw = len(stiffnesses), len(WZconvs)
+        nzout = nz - WZconvs.shape[1] + 1
+        if nzout < 1:
+            raise ValueError(f"Weight masks of length {WZconvs.shape[1]} are longer than the {nz} scan steps in z.")
+        nxy = int(self.scan_dim[0] * self.scan_dim[1])
+        FEconv = np.empty((nk, nw) + self.scan_dim[:2] + (nzout,), dtype=np.float32)
+
+        mf = cl.mem_flags
+        cl_stiffnesses = cl.Buffer(self.ctx, mf.READ_ONLY | mf.COPY_HOST_PTR, hostbuf=stiffnesses)
+        cl_WZconvs = cl.Buffer(self.ctx, mf.READ_ONLY | mf.COPY_HOST_PTR, hostbuf=WZconvs)
+        cl_FEsweep = cl.Buffer(self.ctx, mf.READ_WRITE, nk * nxy * nz * 4 * np.dtype(np.float32).itemsize)
+        cl_FEconv = cl.Buffer(self.ctx, mf.WRITE_ONLY, FEconv.nbytes)
+
+        # fmt: off
+        cl_program.relaxStrokesTilted_sweep(self.queue, (nxy, nk), None,
+            self.cl_ImgIn,
+            self.cl_poss,
+            cl_FEsweep,
+            cl_stiffnesses,
+            self.invCell[0],
+            self.invCell[1],
+            self.invCell[2],
+            self.tipRot[0],
+            self.tipRot[1],
+            self.tipRot[2],
+            self.dpos0Tip,
+            self.relax_params,
+            self.surfFF,
+            np.int32(nz),
+        )
+        cl_program.convolveZ_sweep(self.queue, (nk * nxy,), None,
+            cl_FEsweep,
+            cl_FEconv,
+            cl_WZconvs,
+            np.int32(nz), np.int32(nzout), np.int32(nw), np.int32(nxy),
+        )
+        # fmt: on
+        cl.enqueue_copy(self.queue, FEconv, cl_FEconv)
         self.queue.finish()
+
+        for buf in [cl_stiffnesses, cl_WZconvs, cl_FEsweep, cl_FEconv]:
+            buf.release()
+
         return FEconv
 
     def run_izoZ(self, zMap=None, iso=0.0, nz=None):
@@ -6,6 +6,34 @@ import numpy as np
 
 from ppafm.ocl.AFMulator import AFMulator
 
+# Benzene ring with an oxygen atom
+RING_XYZS = np.array([[0.0, 0.0, 0.0], [1.4, 0.0, 0.0], [2.1, 1.2, 0.0], [1.4, 2.4, 0.0], [0.0, 2.4, 0.0], [-0.7, 1.2, 0.0], [3.5, 1.2, 0.0]])
+RING_ZS = np.array([6, 6, 6, 6, 6, 6, 8])
+RING_QS = np.array([-0.1, 0.1, -0.1, 0.1, -0.1, 0.1, -0.2])
+
+
+def make_sample(offsets=((8.0, 8.0, 5.0),), seed=None):
+    """Copies of the ring shifted by each of the offsets. The charges are random if seed is not None."""
+    xyzs = np.concatenate([RING_XYZS + offset for offset in offsets])
+    Zs = np.tile(RING_ZS, len(offsets))
+    qs = np.tile(RING_QS, len(offsets)) if seed is None else np.random.default_rng(seed).uniform(-0.1, 0.1, len(Zs))
+    return xyzs, Zs, qs
+
+
+def make_sample_grids(xyzs, qs, shape=(90, 90, 60)):
+    """Smooth sample Hartree potential and electron density of gaussians at the atoms on a periodic grid."""
+    from ppafm.ocl.field import ElectronDensity, HartreePotential
+
+    lvec = np.array([[0.0, 0.0, 0.0], [18.0, 0.0, 0.0], [0.0, 18.0, 0.0], [0.0, 0.0, 12.0]])
+    X, Y, Z = np.meshgrid(*[np.arange(n) * lvec[i + 1, i] / n for i, n in enumerate(shape)], indexing="ij")
+    pot = np.zeros(shape)
+    rho_sample = np.zeros(shape)
+    for xyz, q in zip(xyzs, qs):
+        r2 = (X - xyz[0]) ** 2 + (Y - xyz[1]) ** 2 + (Z - xyz[2]) ** 2
+        pot += q * np.exp(-r2 / 2.0)
+        rho_sample += np.exp(-r2 / 0.8)
+    return HartreePotential(pot, lvec), ElectronDensity(rho_sample, lvec)
+
 
 def test_afmulator_save_load():
     afmulator_original = AFMulator(
@@ -54,3 +82,258 @@ def test_afmulator_save_load():
         assert np.allclose(afmulator.B_pauli, afmulator_original.B_pauli)
 
     os.remove(params_path)
+
+
+def test_afmulator_cpu_backend():
+    import ppafm.ocl.oclUtils as oclu
+    from ppafm.ocl.field import MultipoleTipDensity
+
+    oclu.init_env(i_platform=0)
+
+    xyzs, Zs, qs = make_sample()
+    pot, rho_sample = make_sample_grids(xyzs, qs)
+
+    params = dict(pixPerAngstrome=8, scan_dim=(32, 32, 20), scan_window=((4.0, 4.0, 11.0), (12.0, 12.0, 13.0)), df_steps=10, npbc=(0, 0, 0))
+    for method in ["point-charge", "hartree", "fdbm"]:
+        Xs = []
+        for backend in ["opencl", "cpu"]:
+            afmulator = AFMulator(backend=backend, rho={"dz2": -0.1} if method == "hartree" else None, **params)
+            if method == "point-charge":
+                X = afmulator(xyzs, Zs, qs)
+            elif method == "hartree":
+                X = afmulator(xyzs, Zs, pot)
+            else:
+                afmulator.setRho({"s": 1.0}, sigma=0.7)
+                afmulator.setRhoDelta(MultipoleTipDensity(afmulator.forcefield.lvec[:, :3], afmulator.forcefield.nDim[:3], sigma=0.7, multipole={"pz": 0.1}))
+                X = afmulator(xyzs, Zs, pot, rho_sample=rho_sample)
+            Xs.append(X)
+        assert Xs[1].shape == Xs[0].shape
+        scale = np.abs(Xs[0]).max()
+        diff = np.abs(Xs[1] - Xs[0])
+        # Isolated pixels can relax into a different minimum, so compare the bulk of the pixels
+        assert diff.mean() < 1e-3 * scale, method
+        assert np.percentile(diff, 99) < 1e-2 * scale, method
+
+
+def test_afmulator_grid_sizes():
+    from ppafm.ocl.AFMulator import FFT_SIZES, pad_lvec
+
+    # The padded grid has an allowed size along each lattice vector and keeps the origin and the grid spacing
+    lvec = np.array([[1.0, -2.0, 0.5], [12.34, 0.0, 0.0], [3.0, 11.0, 0.0], [0.0, 0.0, 7.77]])
+    lvec_padded = pad_lvec(lvec, pixPerAngstrome=10, sizes=FFT_SIZES)
+    assert np.allclose(lvec_padded[0], lvec[0])
+    for i in range(1, 4):
+        n = 10 * np.linalg.norm(lvec_padded[i])
+        assert np.isclose(n, round(n)) and round(n) in FFT_SIZES
+        assert np.allclose(np.cross(lvec_padded[i], lvec[i]), 0)
+        assert np.linalg.norm(lvec[i]) <= np.linalg.norm(lvec_padded[i])
+    assert np.allclose(pad_lvec(lvec_padded, pixPerAngstrome=10, sizes=FFT_SIZES), lvec_padded)
+
+    # Slightly different cells share the same grid shape
+    afmulator = AFMulator(pixPerAngstrome=10, lvec=lvec, grid_sizes="fft")
+    nDim = afmulator.forcefield.nDim.copy()
+    lvec[1:] *= 1.01
+    afmulator.setLvec(lvec)
+    assert np.allclose(afmulator.forcefield.nDim, nDim)
+    assert all(n in FFT_SIZES for n in nDim[:3])
+
+
+def test_afmulator_sample_cache():
+    import ppafm.ocl.oclUtils as oclu
+    from ppafm.ocl.field import MultipoleTipDensity, TipDensity
+
+    oclu.init_env(i_platform=0)
+
+    xyzs, Zs, qs = make_sample()
+    pot, rho_sample = make_sample_grids(xyzs, qs)
+
+    angles = [0.0, 0.3, 1.2]
+    rots = [np.array([[np.cos(a), -np.sin(a), 0.0], [np.sin(a), np.cos(a), 0.0], [0.0, 0.0, 1.0]]) for a in angles]
+    rot_center = xyzs.mean(axis=0)
+
+    params = dict(pixPerAngstrome=8, scan_dim=(32, 32, 20), scan_window=((4.0, 4.0, 11.0), (12.0, 12.0, 13.0)), df_steps=10, npbc=(0, 0, 0), B_pauli=1.2)
+    Xs = {}
+    for cache_bytes in [0, 2**30]:
+        afmulator = AFMulator(reuse_ff=False, **params)
+        afmulator.forcefield.sample_cache.max_bytes = cache_bytes
+        lvec_ff, shape_ff = afmulator.forcefield.lvec[:, :3], afmulator.forcefield.nDim[:3]
+        rho_tip = MultipoleTipDensity(lvec_ff, shape_ff, sigma=0.7, multipole={"s": 1.0})
+        afmulator.setRho(TipDensity(rho_tip.array, rho_tip.lvec), B_pauli=1.2)
+        afmulator.setRhoDelta(MultipoleTipDensity(lvec_ff, shape_ff, sigma=0.7, multipole={"pz": 0.1}))
+        Xs[cache_bytes] = [afmulator(xyzs, Zs, pot, rho_sample=rho_sample, rot=rot, rot_center=rot_center) for rot in rots]
+
+    # The potential and the density power are computed once and reused for the other orientations
+    cache = afmulator.forcefield.sample_cache
+    assert (cache.misses, cache.hits) == (2, 4)
+    assert len(cache) == 2
+    assert cache.nbytes == 4 * (pot.array.size + rho_sample.array.size)
+    for X_cached, X_uncached in zip(Xs[2**30], Xs[0]):
+        assert np.allclose(X_cached, X_uncached, atol=1e-6 * np.abs(X_uncached).max())
+
+    # Changing the sample invalidates the cached grids
+    rho_sample.update_array(rho_sample.array * 1.1, rho_sample.lvec)
+    afmulator(xyzs, Zs, pot, rho_sample=rho_sample)
+    assert (cache.misses, cache.hits) == (3, 5)
+    assert len(cache) == 2
+
+    # Least recently used grids are dropped when the cache is full
+    cache.max_bytes = 4 * pot.array.size
+    assert len(cache) == 1
+    afmulator(xyzs, Zs, pot, rho_sample=rho_sample)
+    assert cache.misses >= 4
+    assert len(cache) == 1
+    assert cache.nbytes <= cache.max_bytes
+
+
+def test_afmulator_sample_pyramid():
+    import ppafm.ocl.oclUtils as oclu
+
+    oclu.init_env(i_platform=0)
+
+    # The sample grid has twice the resolution of the force field grid
+    xyzs, Zs, qs = make_sample()
+    xyzs, Zs, qs = xyzs[:6], Zs[:6], qs[:6]
+    pot, _ = make_sample_grids(xyzs, qs, shape=(180, 180, 120))
+
+    params = dict(pixPerAngstrome=5, scan_dim=(32, 32, 20), scan_window=((4.0, 4.0, 11.0), (12.0, 12.0, 13.0)), df_steps=10, npbc=(0, 0, 0), rho={"dz2": -0.1})
+    X_full = AFMulator(**params)(xyzs, Zs, pot)
+    afmulator = AFMulator(**params, sample_pyramid=True)
+    X_pyramid = afmulator(xyzs, Zs, pot)
+
+    # The potential is stored downsampled on the device and gives nearly the same images
+    cache = afmulator.forcefield.sample_cache
+    assert cache.nbytes == 4 * pot.array.size // 8
+    scale = np.abs(X_full).max()
+    assert np.abs(X_pyramid - X_full).mean() < 1e-2 * scale
+
+
+def test_afmulator_eval_tiled():
+    import ppafm.ocl.oclUtils as oclu
+
+    oclu.init_env(i_platform=0)
+
+    xyzs, Zs, qs = make_sample(offsets=((6.0, 6.0, 5.0), (12.0, 14.0, 5.0)), seed=0)
+
+    params = dict(pixPerAngstrome=8, scan_dim=(48, 40, 20), scan_window=((2.0, 2.0, 10.0), (18.0, 18.0, 12.0)), df_steps=10, npbc=(0, 0, 0))
+    X_ref = AFMulator(**params)(xyzs, Zs, qs)
+
+    # Tiles of unequal sizes, including partial tiles at the edges
+    afmulator = AFMulator(**params)
+    lvec = afmulator.lvec.copy()
+    X_tiled = afmulator.eval_tiled(xyzs, Zs, qs, tile_dim=(20, 16), halo=3.0)
+    assert X_tiled.shape == X_ref.shape
+    scale = np.abs(X_ref).max()
+    diff = np.abs(X_tiled - X_ref)
+    assert diff.mean() < 1e-3 * scale
+    assert np.percentile(diff, 99) < 1e-2 * scale
+
+    # The full force field grid and scan window are restored afterwards
+    assert afmulator.scan_dim == params["scan_dim"]
+    assert np.allclose(afmulator.lvec, lvec)
+    assert np.allclose(afmulator(xyzs, Zs, qs), X_ref)
+
+
+def test_afmulator_eval_update():
+    import ppafm.ocl.oclUtils as oclu
+
+    oclu.init_env(i_platform=0)
+
+    xyzs, Zs, qs = make_sample(offsets=((6.0, 6.0, 5.0), (12.0, 14.0, 5.0)), seed=0)
+
+    # Move one atom, then add one, then remove two
+    xyzs_moved = xyzs.copy()
+    xyzs_moved[3] += [0.2, -0.1, 0.1]
+    mols = [
+        (xyzs_moved, Zs, qs),
+        (np.append(xyzs_moved, [[4.0, 6.0, 5.2]], axis=0), np.append(Zs, 1), np.append(qs, 0.05)),
+        (xyzs_moved[2:], Zs[2:], qs[2:]),
+    ]
+
+    params = dict(pixPerAngstrome=8, scan_dim=(48, 48, 20), scan_window=((2.0, 2.0, 10.0), (18.0, 18.0, 12.0)), df_steps=10, npbc=(0, 0, 0))
+    for use_cell_list in [False, True]:
+        afmulator = AFMulator(**params)
+        afmulator.forcefield.use_cell_list = use_cell_list
+        afmulator.forcefield.cutoff = 4.0 if use_cell_list else 20.0
+        afmulator(xyzs, Zs, qs)
+        for xyzs_, Zs_, qs_ in mols:
+            X_update = afmulator.evalUpdate(xyzs_, Zs_, qs_)
+            FE_update = afmulator.forcefield.downloadFF()
+            afmulator_ref = AFMulator(**params)
+            afmulator_ref.forcefield.use_cell_list = use_cell_list
+            afmulator_ref.forcefield.cutoff = afmulator.forcefield.cutoff
+            X_ref = afmulator_ref(xyzs_, Zs_, qs_)
+            FE_ref = afmulator_ref.forcefield.downloadFF()
+
+            # Compare force fields away from the atom cores
+            mask = np.abs(FE_ref[..., 3]) < 10.0
+            assert np.allclose(FE_update[mask], FE_ref[mask], atol=1e-4, rtol=1e-4), use_cell_list
+
+            scale = np.abs(X_ref).max()
+            diff = np.abs(X_update - X_ref)
+            assert diff.mean() < 1e-3 * scale
+            assert np.percentile(diff, 99) < 1e-2 * scale
+
+    # Changing the settings in between falls back to a full evaluation
+    afmulator.setQs([-0.1, 0.2, -0.1, 0], [0.1, 0, -0.1, 0])
+    X_update = afmulator.evalUpdate(*mols[0])
+    X_ref = afmulator(*mols[0])
+    assert np.allclose(X_update, X_ref)
+
+
+def test_afmulator_reuse_ff():
+    import ppafm.ocl.oclUtils as oclu
+
+    oclu.init_env(i_platform=0)
+
+    xyzs, Zs, qs = make_sample()
+
+    params = dict(pixPerAngstrome=8, scan_dim=(32, 32, 20), scan_window=((4.0, 4.0, 11.0), (12.0, 12.0, 13.0)), df_steps=10, npbc=(0, 0, 0))
+    afmulator = AFMulator(reuse_ff=True, **params)
+    afmulator_ref = AFMulator(**params)
+
+    # Scanner-only changes reuse the force field
+    afmulator(xyzs, Zs, qs)
+    for stiffness, df_steps in [((0.4, 0.4, 0.0, 20.0), 10), ((0.25, 0.25, 0.0, 30.0), 6)]:
+        for a in [afmulator, afmulator_ref]:
+            a.setStiffness(stiffness)
+            a.setScanWindow(df_steps=df_steps)
+        X = afmulator(xyzs, Zs, qs)
+        assert np.allclose(X, afmulator_ref(xyzs, Zs, qs))
+    assert (afmulator.ff_cache_misses, afmulator.ff_cache_hits) == (1, 2)
+    assert np.allclose(afmulator.eval_scan_only(), X)
+    assert afmulator.ff_cache_hits == 2
+
+    # Changing the sample or the tip recomputes the force field
+    xyzs_moved = xyzs.copy()
+    xyzs_moved[0, 2] += 0.1
+    afmulator(xyzs_moved, Zs, qs)
+    afmulator.setQs([-0.1, 0.2, -0.1, 0], [0.1, 0, -0.1, 0])
+    afmulator(xyzs_moved, Zs, qs)
+    afmulator.forcefield.use_cell_list = True
+    afmulator(xyzs_moved, Zs, qs)
+    assert (afmulator.ff_cache_misses, afmulator.ff_cache_hits) == (4, 2)
+    assert afmulator_ref.ff_cache_hits == 0
+
+
+def test_afmulator_eval_sweep():
+    import ppafm.ocl.oclUtils as oclu
+
+    oclu.init_env(i_platform=0)
+
+    xyzs, Zs, qs = make_sample()
+
+    stiffnesses = [(0.25, 0.25, 0.0, 30.0), (0.5, 0.5, 0.0, 20.0)]
+    df_steps = [4, 10]
+    params = dict(pixPerAngstrome=8, scan_dim=(32, 32, 20), scan_window=((4.0, 4.0, 11.0), (12.0, 12.0, 13.0)), npbc=(0, 0, 0))
+    for backend in ["opencl", "cpu"]:
+        afmulator = AFMulator(backend=backend, **params)
+        afmulator(xyzs, Zs, qs)
+        X_sweep = afmulator.eval_sweep(stiffnesses, df_steps)
+        nz = params["scan_dim"][2] - max(df_steps) + 1
+        assert X_sweep.shape == (len(stiffnesses), len(df_steps), 32, 32, nz)
+        for i, stiffness in enumerate(stiffnesses):
+            for j, n in enumerate(df_steps):
+                afmulator.setStiffness(stiffness)
+                afmulator.setScanWindow(df_steps=n)
+                X = afmulator.eval_scan_only()
+                assert np.allclose(X_sweep[i, j], X[:, :, :nz], atol=1e-5 * np.abs(X).max()), (backend, i, j)
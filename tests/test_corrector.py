@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+
+"""
+Test the population-based search of the Corrector and CorrectionLoop with a stub AFM simulator.
+"""
+
+import importlib
+import multiprocessing
+import sys
+import types
+
+import numpy as np
+
+
+def import_correction_loop(monkeypatch, candidate_positions, seed=0):
+    # SimplePot loads a development C++ library with graphics dependencies on import. Replace it with a stub that
+    # proposes new atom positions randomly out of a fixed set of candidates.
+    rng = np.random.default_rng(seed)
+    pot = types.ModuleType("ppafm.dev.SimplePot")
+    pot.setGridSize = lambda *args: None
+    pot.setGridPointer = lambda *args: None
+    pot.init = lambda *args: None
+    pot.genAtoms = lambda npick=10, **kwargs: candidate_positions[rng.integers(0, len(candidate_positions), npick)]
+    monkeypatch.setitem(sys.modules, "ppafm.dev.SimplePot", pot)
+    monkeypatch.delitem(sys.modules, "ppafm.ml.Corrector", raising=False)
+    monkeypatch.delitem(sys.modules, "ppafm.ml.CorrectionLoop", raising=False)
+    return importlib.import_module("ppafm.ml.CorrectionLoop")
+
+
+class StubSimulator:
+    """AFM images as a sum of gaussians at the atom positions."""
+
+    def __init__(self):
+        self.scan_window = ((0.0, 0.0, 4.0), (8.0, 8.0, 5.0))
+        self.n_calls = 0
+        xs = np.linspace(0, 8, 32)
+        zs = np.linspace(4, 5, 4)
+        self.grid = np.stack(np.meshgrid(xs, xs, zs, indexing="ij"), axis=-1)
+
+    def __call__(self, xyzs, Zs, qs):
+        self.n_calls += 1
+        d2 = ((self.grid[..., None, :] - xyzs) ** 2).sum(axis=-1)
+        return np.exp(-d2).sum(axis=-1)
+
+
+def test_population_search(monkeypatch):
+    xyzs = np.array([[2.0, 2.0, 3.0], [4.0, 3.0, 3.0], [5.5, 5.0, 3.0]])
+    missing = np.array([[3.0, 5.5, 3.0], [6.0, 2.5, 3.0]])
+    wrong = np.array([[1.0, 7.0, 3.0], [7.0, 7.0, 3.0], [1.0, 4.5, 3.0]])
+    CL = import_correction_loop(monkeypatch, np.concatenate([missing, wrong]))
+
+    simulator = StubSimulator()
+    AFMRef = simulator(np.concatenate([xyzs, missing]), None, None)
+    n_population = 4
+    corrector = CL.Corrector(nPopulation=n_population)
+    loop = CL.CorrectionLoop(None, simulator, None, None, corrector)
+    molecule = CL.Molecule(xyzs, np.full(len(xyzs), 6), np.zeros(len(xyzs)))
+    loop.startLoop(molecule, None, None, None, AFMRef)
+
+    best_Es = []
+    for itr in range(8):
+        population = loop.population
+        best_mol, best_E = corrector.best_mol, corrector.best_E
+        n_calls = simulator.n_calls
+        loop.iteration(itr)
+
+        # Every candidate is simulated once and the next population has the same size
+        assert simulator.n_calls == n_calls + len(population)
+        assert len(loop.population) == n_population
+
+        # A new best structure is one of the candidates and it has to be better than the previous best
+        if corrector.best_mol is not best_mol:
+            assert any(corrector.best_mol is mol for mol in population)
+            assert best_E is None or corrector.best_E < best_E
+        else:
+            assert corrector.best_E == best_E
+        assert loop.molecule is corrector.best_mol
+        best_Es.append(corrector.best_E)
+
+    assert np.all(np.diff(best_Es) <= 0)
+    assert best_Es[-1] < best_Es[0]
+
+
+def test_population_workers(monkeypatch):
+    xyzs = np.array([[2.0, 2.0, 3.0], [4.0, 3.0, 3.0], [5.5, 5.0, 3.0]])
+    candidates = np.array([[3.0, 5.5, 3.0], [6.0, 2.5, 3.0], [1.0, 7.0, 3.0]])
+    CL = import_correction_loop(monkeypatch, candidates)
+
+    # Each worker process creates its own simulator. The forked workers inherit the stubbed modules.
+    simulator = StubSimulator()
+    corrector = CL.Corrector(nPopulation=5)
+    loop = CL.CorrectionLoop(None, simulator, None, None, corrector, simulator_factory=StubSimulator, nWorkers=2, mp_context=multiprocessing.get_context("fork"))
+    loop.startLoop(CL.Molecule(xyzs, np.full(len(xyzs), 6), np.zeros(len(xyzs))), None, None, None, simulator(xyzs, None, None))
+    try:
+        for itr in range(3):
+            loop.iteration(itr)
+            assert len(loop.population) == 5
+
+            # The population is simulated in the workers, and the results are in the same order as the candidates
+            AFMss = loop.simulatePopulation(loop.population)
+            assert len(AFMss) == 5
+            for mol, AFMs in zip(loop.population, AFMss):
+                assert np.allclose(AFMs, simulator(mol.xyzs, mol.Zs, mol.qs))
+        assert simulator.n_calls == 1 + 3 * 5
+    finally:
+        loop.close()
+    assert loop.pool is None
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+
+"""
+Compare the C++ DFT-D3 coefficients to a direct numpy implementation, with and without the coordination number cutoff.
+"""
+
+import numpy as np
+
+import ppafm.core as core
+from ppafm.defaults import d3
+from ppafm.io import bohrRadius2angstroem
+
+
+def d3_coeffs_reference(xyzs, Zs, Z_pp, params):
+    d = np.linalg.norm(xyzs[:, None] - xyzs[None], axis=2)
+    np.fill_diagonal(d, 1.0)  # Avoid dividing by zero, the self-interaction is removed below
+    r = d3.R_COV[Zs - 1][:, None] + d3.R_COV[Zs - 1][None]
+    cn = 1 / (1 + np.exp(-d3.K1 * (d3.K2 * r / d - 1)))
+    np.fill_diagonal(cn, 0.0)
+    cn = cn.sum(axis=1)
+
+    ref_c6 = d3.load_ref_c6()
+    pp_cn = d3.REF_CN[Z_pp - 1]
+    coeffs = []
+    for z, c in zip(Zs, cn):
+        ref_cn = d3.REF_CN[z - 1]
+        L = np.exp(-d3.K3 * (ref_cn[:, None] - c) ** 2) * np.exp(-d3.K3 * pp_cn[None] ** 2)
+        L *= (ref_cn[:, None] >= 0) & (pp_cn[None] >= 0)
+        c6 = (L * ref_c6[z - 1, Z_pp - 1]).sum() / L.sum()
+        qq = 3 * d3.R4R2[z - 1] * d3.R4R2[Z_pp - 1]
+        R0 = params["a1"] * np.sqrt(qq) + params["a2"] * bohrRadius2angstroem
+        coeffs.append([params["s6"] * c6, params["s8"] * qq * c6, R0**6, R0**8])
+    return np.array(coeffs)
+
+
+def test_d3_coeffs():
+    rng = np.random.default_rng(0)
+    ix, iy, iz = np.meshgrid(np.arange(12), np.arange(12), np.arange(3), indexing="ij")
+    xyzs = np.stack([ix.ravel() * 1.5, iy.ravel() * 1.5, -iz.ravel() * 1.5], axis=1)
+    xyzs += rng.uniform(-0.2, 0.2, size=xyzs.shape)
+    Zs = rng.choice([1, 6, 7, 8], size=len(xyzs))
+    params = d3.get_df_params("PBE")
+
+    coeffs_ref = d3_coeffs_reference(xyzs, Zs, 8, params)
+
+    coeffs_all = core.computeD3Coeffs(xyzs, Zs, 8, params, cn_cutoff=0)
+    coeffs_cut = core.computeD3Coeffs(xyzs, Zs, 8, params)
+
+    assert np.allclose(coeffs_all, coeffs_ref, rtol=1e-10)
+    assert np.allclose(coeffs_cut, coeffs_ref, rtol=1e-4)
+
+    # Cutoff larger than the system is exact
+    coeffs_big = core.computeD3Coeffs(xyzs, Zs, 8, params, cn_cutoff=100.0)
+    assert np.allclose(coeffs_big, coeffs_all, rtol=1e-12)
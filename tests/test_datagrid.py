@@ -98,3 +98,58 @@ def test_add_mult():
     data_grid1.add_mult(data_grid2, scale=2.0, in_place=True)
 
     assert np.allclose(data_grid1.array, [2.0, 1.0, 4.0])
+
+
+def test_fft_plan_cache():
+
+    lvec = np.concatenate([np.zeros((1, 3)), 8 * np.eye(3)], axis=0)
+    sample = FFcl.HartreePotential(np.random.rand(16, 16, 16).astype(np.float32), lvec)
+    rho1 = FFcl.TipDensity(make_gaussian((16, 16, 16), lvec).astype(np.float32), lvec)
+    rho2 = FFcl.TipDensity(make_gaussian((16, 16, 16), 0.5 * lvec).astype(np.float32), lvec)
+
+    cache = FFcl.FFTPlanCache()
+    corr1 = FFcl.FFTCrossCorrelation(rho1, plan_cache=cache)
+    corr2 = FFcl.FFTCrossCorrelation(rho2, plan_cache=cache)
+
+    # The compiled FFTs are shared, but each tip keeps its own spectrum
+    assert (cache.misses, cache.hits) == (1, 1)
+    assert corr1.plan is corr2.plan
+    E1 = corr1.correlate(sample).array
+    E2 = corr2.correlate(sample).array
+    E1_ref = FFcl.FFTCrossCorrelation(rho1, plan_cache=FFcl.FFTPlanCache(max_bytes=0)).correlate(sample).array
+    assert np.allclose(E1, E1_ref, atol=1e-5 * np.abs(E1_ref).max())
+    assert not np.allclose(E1, E2)
+
+    # A new shape gets a new plan and the least recently used plan is dropped when the cache is full
+    rho3 = FFcl.TipDensity(make_gaussian((16, 16, 20), lvec).astype(np.float32), lvec)
+    cache.max_bytes = 8 * 16 * 16 * 20  # Fits only one of the plans
+    corr3 = FFcl.FFTCrossCorrelation(rho3, plan_cache=cache)
+    assert corr3.plan is not corr1.plan
+    assert len(cache) == 1
+    assert cache.nbytes == corr3.plan.nbytes
+    assert np.allclose(corr1.correlate(sample).array, E1)
+
+
+def test_downsample():
+
+    lvec = np.concatenate([np.zeros((1, 3)), np.diag([4.0, 6.0, 5.0])], axis=0)
+    x, y, z = np.meshgrid(*[np.arange(n) / n for n in (40, 60, 50)], indexing="ij")
+    smooth = np.cos(2 * np.pi * x) * np.sin(4 * np.pi * y) + np.cos(2 * np.pi * z)
+    nyquist = (-1.0) ** np.arange(40)[:, None, None] * np.ones((40, 60, 50))
+    grid = FFcl.HartreePotential(smooth + nyquist, lvec)
+
+    grid_down = grid.downsample(axes=(0, 2))
+    assert isinstance(grid_down, FFcl.HartreePotential)
+    assert grid_down.shape == (20, 60, 25)
+    assert np.allclose(grid_down.lvec, lvec)
+
+    # The highest frequency is removed, the mean is kept, and smooth features are only slightly damped
+    assert np.isclose(grid_down.array.mean(), grid.array.mean(), atol=1e-5)
+    assert np.allclose(grid_down.array, smooth[::2, :, ::2], atol=0.05)
+
+    try:
+        grid_down.downsample(axes=(2,))
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("Odd axis should not be downsampled")
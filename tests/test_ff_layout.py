@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+
+"""
+Compare force interpolation and relaxation using the alternative force field layouts to the default double layout.
+"""
+
+import os
+
+import numpy as np
+
+import ppafm.common as PPU
+import ppafm.core as core
+import ppafm.HighLevel as PPH
+import ppafm.io as io
+
+
+def make_ff(n=(60, 64, 64), seed=0):
+    rng = np.random.default_rng(seed)
+    nz, ny, nx = n
+    lvec = np.array([[0.0, 0.0, 0.0], [16.0, 0.0, 0.0], [0.0, 16.0, 0.0], [0.0, 0.0, 15.0]])
+    # Smooth periodic field with random phases
+    x, y, z = np.meshgrid(np.arange(nx) / nx, np.arange(ny) / ny, np.arange(nz) / nz, indexing="xy")
+    x, y, z = x.transpose(2, 0, 1), y.transpose(2, 0, 1), z.transpose(2, 0, 1)
+    FF = np.zeros((nz, ny, nx, 3))
+    for i in range(3):
+        for _ in range(4):
+            k = rng.integers(1, 4, size=3)
+            phase = rng.uniform(0, 2 * np.pi)
+            FF[..., i] += 0.01 * np.sin(2 * np.pi * (k[0] * x + k[1] * y + k[2] * z) + phase)
+    return FF, lvec
+
+
+def test_ff_layout_interpolation():
+    FF, lvec = make_ff()
+    core.setFF_shape(FF.shape[:3], lvec)
+    rng = np.random.default_rng(1)
+    rs = rng.uniform(-20.0, 40.0, size=(200000, 3))
+
+    fs = {}
+    for layout in ["double", "float32"]:
+        core.setFF_Fpointer(FF, layout=layout)
+        fs[layout] = core.interpolateForces(rs)
+
+    assert np.allclose(fs["float32"], fs["double"], rtol=1e-5, atol=1e-6)
+
+
+def test_ff_layout_relaxation():
+    FF, lvec = make_ff()
+    core.setFF_shape(FF.shape[:3], lvec)
+    core.setTip(lRadial=4.0, kRadial=20.0 / -PPU.eVA_Nm, rPP0=np.array([0.0, 0.0, 0.0]), kSpring=np.array([0.25, 0.25, 0.0]) / -PPU.eVA_Nm)
+
+    xs, ys, zs = np.linspace(0, 16, 40, endpoint=False), np.linspace(0, 16, 40, endpoint=False), np.linspace(12, 6, 30)
+    rTips = np.stack(np.meshgrid(xs, ys, zs, indexing="ij"), axis=-1).copy()
+
+    results = {}
+    for layout in ["double", "float32"]:
+        core.setFF_Fpointer(FF, layout=layout)
+        rs = np.zeros(rTips.shape)
+        fs = np.zeros(rTips.shape)
+        core.relaxTipStrokes_omp(rTips, rs, fs)
+        results[layout] = (rs, fs)
+
+    # Float rounding can tip the probe particle to another branch at a few bistable points, which then propagate along the stroke
+    rs_d, fs_d = results["double"]
+    rs_f, fs_f = results["float32"]
+    dr = np.linalg.norm(rs_f - rs_d, axis=-1)
+    df = np.linalg.norm(fs_f - fs_d, axis=-1)
+    assert np.median(dr) < 1e-5
+    assert np.mean(dr > 1e-2) < 0.01
+    assert np.mean(df > 1e-3) < 0.01
+
+
+def test_ff_layout_bspline():
+    # Coarse sampling (2 px/A) of a smooth periodic field
+    FF, lvec = make_ff(n=(30, 32, 32))
+    core.setFF_shape(FF.shape[:3], lvec)
+
+    # The B-spline interpolates the grid values exactly
+    nz, ny, nx, _ = FF.shape
+    iz, iy, ix = np.meshgrid(np.arange(nz), np.arange(ny), np.arange(nx), indexing="ij")
+    rs_grid = np.stack([ix * 16.0 / nx, iy * 16.0 / ny, iz * 15.0 / nz], axis=-1)
+    core.setFF_Fpointer(FF, layout="bspline")
+    assert np.allclose(core.interpolateForces(rs_grid), FF, atol=1e-10)
+
+    # Compare to the same field sampled at 4x higher resolution off the grid points
+    FF_fine, _ = make_ff(n=(120, 128, 128))
+    rng = np.random.default_rng(1)
+    iz, iy, ix = rng.integers(0, 120, size=2000), rng.integers(0, 128, size=2000), rng.integers(0, 128, size=2000)
+    ref = FF_fine[iz, iy, ix]
+    rs = np.stack([ix * 16.0 / 128, iy * 16.0 / 128, iz * 15.0 / 120], axis=-1)
+
+    errs = {}
+    for layout in ["double", "bspline"]:
+        core.setFF_Fpointer(FF, layout=layout)
+        errs[layout] = np.abs(core.interpolateForces(rs) - ref).max()
+    assert errs["bspline"] < 0.1 * errs["double"]
+
+
+def test_ff_layout_energy():
+    # Smooth periodic energy in a non-orthogonal cell and its analytic gradient
+    lvec = np.array([[0.0, 0.0, 0.0], [16.0, 0.0, 0.0], [4.0, 15.0, 0.0], [0.0, 1.0, 12.0]])
+    cell = lvec[1:]
+    ks = np.array([[1, 0, 1], [0, 2, 1], [1, 1, 0], [2, -1, 1]])
+    amps = np.array([0.3, 0.2, 0.1, 0.05])
+    phases = np.array([0.1, 1.3, 2.5, 4.0])
+
+    def energy(rs):
+        us = rs @ np.linalg.inv(cell)
+        return (amps * np.sin(2 * np.pi * us @ ks.T + phases)).sum(axis=-1)
+
+    def force(rs):
+        us = rs @ np.linalg.inv(cell)
+        dE_du = (amps * 2 * np.pi * np.cos(2 * np.pi * us @ ks.T + phases)) @ ks
+        return -dE_du @ np.linalg.inv(cell).T
+
+    nz, ny, nx = 36, 45, 48
+    iz, iy, ix = np.meshgrid(np.arange(nz), np.arange(ny), np.arange(nx), indexing="ij")
+    rs_grid = np.stack([ix / nx, iy / ny, iz / nz], axis=-1) @ cell
+    E = energy(rs_grid)
+    core.setFF_shape(E.shape, lvec)
+    core.setFF_Epointer(E)
+    core.setFF_layout("energy")
+
+    rng = np.random.default_rng(2)
+    rs = rng.uniform(-10.0, 30.0, size=(5000, 3))
+    fs = core.interpolateForces(rs)
+    fs_ref = force(rs)
+    assert np.allclose(fs, fs_ref, atol=1e-3 * np.abs(fs_ref).max())
+
+    core.deleteFF_Epointer()
+
+
+def test_ff_layout_energy_relaxation():
+    # Lennard-Jones force field of a few atoms computed in C++ with both the forces and the energy
+    xyzs = np.array([[6.1, 6.1, 2.1], [7.5, 6.1, 2.1], [6.8, 7.3, 2.1], [8.9, 7.1, 2.1], [5.3, 8.6, 2.1]])
+    Zs = np.array([6, 6, 7, 8, 1])
+    cLJs = PPU.REA2LJ(PPU.getAtomsREA(8, Zs, PPU.loadSpecies()))
+    lvec = np.array([[0.0, 0.0, 0.0], [14.0, 0.0, 0.0], [0.0, 14.0, 0.0], [0.0, 0.0, 12.0]])
+    n = (96, 112, 112)  # 8 px/A
+    FF = np.zeros(n + (3,))
+    E = np.zeros(n)
+    core.setFF_shape(n, lvec)
+    core.setFF_Fpointer(FF)
+    core.setFF_Epointer(E)
+    core.getLennardJonesFF(xyzs, cLJs)
+    io.limit_vec_field(FF, Fmax=10.0)
+    E[E > 10.0] = 10.0  # Same clamping as in HighLevel.computeLJ
+
+    core.setTip(lRadial=4.0, kRadial=20.0 / -PPU.eVA_Nm, rPP0=np.array([0.0, 0.0, 0.0]), kSpring=np.array([0.25, 0.25, 0.0]) / -PPU.eVA_Nm)
+    xs, ys, zs = np.linspace(3, 11, 30), np.linspace(3, 11, 30), np.linspace(11, 8, 20)
+    rTips = np.stack(np.meshgrid(xs, ys, zs, indexing="ij"), axis=-1).copy()
+
+    results = {}
+    for layout in ["bspline", "energy"]:
+        core.setFF_Fpointer(FF, layout=layout)
+        rs = np.zeros(rTips.shape)
+        fs = np.zeros(rTips.shape)
+        core.relaxTipStrokes_omp(rTips, rs, fs)
+        results[layout] = (rs, fs)
+
+    # Forces from the gradient of the energy should be consistent with the forces sampled directly,
+    # except for a few points where the probe particle is tipped to another branch
+    rs_f, fs_f = results["bspline"]
+    rs_e, fs_e = results["energy"]
+    dr = np.linalg.norm(rs_e - rs_f, axis=-1)
+    df = np.linalg.norm(fs_e - fs_f, axis=-1)
+    assert np.median(dr) < 1e-3
+    assert np.mean(dr > 1e-2) < 0.01
+    assert np.median(df) < 1e-3 * np.abs(fs_f).max()
+
+    core.deleteFF_Epointer()
+
+
+def test_computeElFF_energy_only():
+    lvec = np.array([[0.0, 0.0, 0.0], [12.0, 0.0, 0.0], [2.0, 11.0, 0.0], [0.0, 0.0, 10.0]])
+    nDim = np.array([40, 44, 48])
+    rng = np.random.default_rng(3)
+    V = rng.normal(size=tuple(nDim))
+
+    FF, E_ref = PPH.computeElFF(V, lvec, nDim, "s", computeVpot=True, sigma=0.7, deleteV=False)
+    FF_none, E = PPH.computeElFF(V, lvec, nDim, "s", sigma=0.7, deleteV=False, computeForce=False)
+    os.remove("rhoTip.xsf")
+
+    assert FF is not None and FF_none is None
+    assert np.allclose(E, E_ref)
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+
+"""
+Test the helpers for fitting the model parameters to reference force data.
+"""
+
+import numpy as np
+
+import ppafm.common as PPU
+import ppafm.core as core
+import ppafm.HighLevel as PPH
+
+
+def make_system():
+    xyzs = np.array([[6.1, 6.1, 2.1], [7.5, 6.1, 2.1], [6.8, 7.3, 2.1], [8.9, 7.1, 2.1], [5.3, 8.6, 2.1]])
+    Zs = np.array([6, 6, 7, 8, 1])
+    lvec = np.array([[-1.0, -1.0, 0.0], [14.0, 0.0, 0.0], [0.0, 14.0, 0.0], [0.0, 0.0, 12.0]])
+    parameters = PPU.PpafmParameters()
+    parameters.gridN = np.array([56, 56, 48])
+    parameters.gridA, parameters.gridB, parameters.gridC = lvec[1], lvec[2], lvec[3]
+    return xyzs, Zs, lvec, parameters
+
+
+def test_lj_basis():
+    xyzs, Zs, lvec, parameters = make_system()
+    FFparams = PPU.loadSpecies()
+    basis = PPH.computeLJBasis(Zs, xyzs, lvec, computeVpot=True, parameters=parameters)
+    assert sorted(basis.keys()) == [1, 6, 7, 8]
+
+    # Modify the parameters of some of the species and compare to the force field computed directly
+    FFparams["rmin"][5] *= 1.1
+    FFparams["epsilon"][7] *= 0.5
+    for iPP in [8, 54]:
+        FF_basis, V_basis = PPH.assembleLJFF(basis, iPP, FFparams, Fmax=None, Vmax=None)
+
+        FF_ref, V_ref = PPH.prepareArrays(None, True, parameters=parameters)
+        core.setFF_shape(FF_ref.shape[:3], lvec, parameters=parameters)
+        core.getLennardJonesFF(PPH.shift_positions(xyzs, -lvec[0]), PPU.getAtomsLJ(iPP, Zs, FFparams))
+        core.deleteFF_Fpointer()
+        core.deleteFF_Epointer()
+
+        # Compare away from the cores where the forces are large and are clamped anyway
+        mask = np.linalg.norm(FF_ref, axis=-1) < 10.0
+        assert np.allclose(FF_basis[mask], FF_ref[mask], rtol=1e-6, atol=1e-8)
+        assert np.allclose(V_basis[mask], V_ref[mask], rtol=1e-6, atol=1e-8)
+        del FF_ref, V_ref  # Garbage collection of the arrays resets the force field pointers
+
+    # Clamping is applied after the assembly
+    FF_basis, _ = PPH.assembleLJFF(basis, 8, FFparams, Fmax=10.0)
+    assert np.linalg.norm(FF_basis, axis=-1).max() <= 10.0 + 1e-8
+
+
+def test_relax_points():
+    xyzs, Zs, lvec, parameters = make_system()
+    basis = PPH.computeLJBasis(Zs, xyzs, lvec, parameters=parameters)
+    FFLJ, _ = PPH.assembleLJFF(basis, 8, PPU.loadSpecies())
+    parameters.scanMin = np.array([3.0, 3.0, 7.0])
+    parameters.scanMax = np.array([10.0, 10.0, 10.0])
+    parameters.scanStep = np.array([0.5, 0.5, 0.1])
+
+    # Reference relaxation on the full scan grid
+    fzs_grid, PPpos_grid, _, _ = PPH.perform_relaxation(lvec, FFLJ, parameters=parameters)
+    xTips, yTips, zTips, _ = PPU.prepareScanGrids(parameters)
+
+    # Random subset of the grid points, with several points on some of the strokes
+    rng = np.random.default_rng(0)
+    ix, iy, iz = rng.integers(0, len(xTips), 40), rng.integers(0, len(yTips), 40), rng.integers(0, len(zTips), 40)
+    ix, iy, iz = np.concatenate([ix, ix[:10]]), np.concatenate([iy, iy[:10]]), np.concatenate([iz, rng.integers(0, len(zTips), 10)])
+    points = np.stack([xTips[ix], yTips[iy], zTips[iz]], axis=1)
+    fs, PPpos, dfs = PPH.perform_relaxation_points(lvec, points, FFLJ, parameters=parameters)
+
+    assert fs.shape == PPpos.shape == (len(points), 3)
+    assert dfs is None
+    assert np.allclose(fs[:, 2], fzs_grid[iz, iy, ix], atol=1e-6)
+    assert np.allclose(PPpos, PPpos_grid[iz, iy, ix], atol=1e-6)
+
+
+def test_relaxation_sensitivities():
+    xyzs, Zs, lvec, parameters = make_system()
+    FFparams = PPU.loadSpecies()
+    basis = PPH.computeLJBasis(Zs, xyzs, lvec, parameters=parameters)
+    FFel = PPH.assembleLJFF(basis, 1, FFparams)[0] * 0.1  # Some smooth stand-in for the electrostatic force field
+    parameters.ffLayout = "bspline"
+    parameters.charge = -0.05
+    parameters.klat = 0.3
+    parameters.krad = 15.0
+    parameters.stiffness = [parameters.klat, parameters.klat, parameters.krad]
+    parameters.scanMax = np.array([10.0, 10.0, 10.0])
+    parameters.scanStep = np.array([0.1, 0.1, 0.1])
+    core.setRelax(maxIters=10000, convF=1e-8)
+
+    rng = np.random.default_rng(0)
+    points = np.concatenate([rng.uniform(4.0, 10.0, size=(20, 2)), rng.uniform(8.5, 9.5, size=(20, 1))], axis=1)
+
+    def forces(FFparams, parameters):
+        FFLJ, _ = PPH.assembleLJFF(basis, 8, FFparams)
+        return PPH.perform_relaxation_points(lvec, points, FFLJ, FFel=FFel, parameters=parameters)[0]
+
+    dFF_dR, dFF_dE = PPH.assembleLJFFDerivatives(basis, 8, FFparams, 6)
+    dFF_dR_pp, _ = PPH.assembleLJFFDerivatives(basis, 8, FFparams, 8)
+    FFLJ, _ = PPH.assembleLJFF(basis, 8, FFparams)
+    dFFs = {"charge": FFel, "R_C": dFF_dR, "E_C": dFF_dE, "R_O": dFF_dR_pp}
+    _, _, dfs = PPH.perform_relaxation_points(lvec, points, FFLJ, FFel=FFel, dFFs=dFFs, dTip=["klat", "krad"], parameters=parameters)
+
+    # Compare to central finite differences
+    def set_param(name, value):
+        FFparams_ = FFparams.copy()
+        parameters_ = parameters.model_copy(deep=True)
+        if name == "charge":
+            parameters_.charge = value
+        elif name == "klat":
+            parameters_.stiffness = [value, value, parameters.krad]
+        elif name == "krad":
+            parameters_.stiffness = [parameters.klat, parameters.klat, value]
+        elif name == "R_C":
+            FFparams_["rmin"][5] = value
+        elif name == "E_C":
+            FFparams_["epsilon"][5] = value
+        elif name == "R_O":
+            FFparams_["rmin"][7] = value
+        return FFparams_, parameters_
+
+    values = {
+        "charge": parameters.charge,
+        "klat": parameters.klat,
+        "krad": parameters.krad,
+        "R_C": FFparams["rmin"][5],
+        "E_C": FFparams["epsilon"][5],
+        "R_O": FFparams["rmin"][7],
+    }
+    for name, value in values.items():
+        h = 1e-3 * max(abs(value), 0.01)
+        df_fd = (forces(*set_param(name, value + h)) - forces(*set_param(name, value - h))) / (2 * h)
+        scale = np.abs(df_fd).max()
+        assert scale > 0
+        assert np.allclose(dfs[name], df_fd, atol=3e-2 * scale), name
+
+    core.setRelax()
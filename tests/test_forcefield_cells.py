@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+
+"""
+Compare the cell-list variants of the OpenCL force field kernels to the all-atoms kernels.
+"""
+
+import numpy as np
+
+import ppafm.common as PPU
+import ppafm.ocl.field as FFcl
+import ppafm.ocl.oclUtils as oclu
+
+
+def make_slab(n_xy, n_layers, a=2.5, seed=0):
+    rng = np.random.default_rng(seed)
+    ix, iy, iz = np.meshgrid(np.arange(n_xy), np.arange(n_xy), np.arange(n_layers), indexing="ij")
+    xyzs = np.stack([ix.ravel() * a, iy.ravel() * a, -iz.ravel() * a], axis=1).astype(np.float64)
+    xyzs += rng.uniform(-0.3, 0.3, size=xyzs.shape)
+    Zs = rng.choice([1, 6, 7, 8], size=len(xyzs))
+    qs = rng.uniform(-0.2, 0.2, size=len(xyzs))
+    return xyzs, Zs, qs
+
+
+def eval_ff(forcefield, atoms, cLJs, REAs, Zs, kind):
+    forcefield.prepareBuffers(atoms, cLJs, REAs=REAs, Zs=Zs)
+    forcefield.initialize()
+    if kind == "point-charge":
+        forcefield.run_evalLJC_QZs_noPos(bCopy=False, bFinish=False)
+    elif kind == "lj":
+        forcefield.addLJ()
+    elif kind == "d3":
+        forcefield.add_dftd3("PBE")
+    else:
+        forcefield.addvdW(damp_method=kind)
+    FF = forcefield.downloadFF()
+    forcefield.tryReleaseBuffers()
+    return FF
+
+
+def test_cell_list_parity():
+    oclu.init_env(i_platform=0)
+
+    xyzs, Zs, qs = make_slab(8, 2)
+    xyzs[:, 2] += 3.0
+    atoms = np.concatenate([xyzs, qs[:, None]], axis=1)
+    REAs = PPU.getAtomsREA(8, Zs, PPU.loadSpecies())
+    cLJs = PPU.REA2LJ(REAs)
+    lvec = np.array([[-2.0, -1.0, 4.0], [20.0, 0, 0], [2.0, 19.0, 0], [0, 0, 4.0]])
+
+    ff_ref = FFcl.ForceField_LJC()
+    ff_cell = FFcl.ForceField_LJC(use_cell_list=True, cutoff=40.0, cell_size=3.0)
+    for ff in [ff_ref, ff_cell]:
+        ff.initSampling(lvec, pixPerAngstrome=5)
+        ff.setQs()
+        ff.setPP(8)
+
+    # With a cutoff larger than the system, the results should match up to float rounding
+    for kind in ["point-charge", "lj", "d3", -1, 0, 1, 2, 3, 4]:
+        FF_ref = eval_ff(ff_ref, atoms, cLJs, REAs, Zs, kind)
+        FF_cell = eval_ff(ff_cell, atoms, cLJs, REAs, Zs, kind)
+        scale = np.abs(FF_ref).max()
+        assert np.allclose(FF_cell, FF_ref, rtol=1e-4, atol=1e-5 * scale), kind
+
+    # A finite cutoff only changes the far-field tail of the Lennard-Jones force
+    ff_cell.cutoff = 12.0
+    FF_ref = eval_ff(ff_ref, atoms, cLJs, REAs, Zs, "lj")
+    FF_cell = eval_ff(ff_cell, atoms, cLJs, REAs, Zs, "lj")
+    assert np.allclose(FF_cell[..., :3], FF_ref[..., :3], rtol=1e-2, atol=1e-3)
@@ -6,8 +6,16 @@ Unit tests for the machine learning generator that produces input/output pairs o
 
 import numpy as np
 
-from ppafm.ml.AuxMap import AtomicDisks
-from ppafm.ml.Generator import GeneratorAFMtrainer
+from ppafm.ml.AuxMap import (
+    AtomicDisks,
+    AuxMapEvaluator,
+    Bonds,
+    ESMapConstant,
+    MultiMapSpheresElements,
+    vdwSpheres,
+)
+from ppafm.ml.Dataset import MoleculeDatabase, ShardedDataset, ShardWriter
+from ppafm.ml.Generator import GeneratorAFMtrainer, InverseAFMtrainer
 from ppafm.ocl.AFMulator import AFMulator
 
 
@@ -52,3 +60,169 @@ def test_GeneratorAFMtrainer():
         assert sws.shape == (nb, 2, 2, 3)
 
     assert i_batch == 2
+
+
+def test_aux_map_evaluator():
+    import ppafm.ocl.oclUtils as oclu
+
+    oclu.init_env(i_platform=0)
+
+    scan = dict(scan_dim=(64, 64), scan_window=((-6, -6), (6, 6)))
+    aux_maps = [vdwSpheres(**scan), AtomicDisks(**scan), Bonds(**scan), MultiMapSpheresElements(**scan), ESMapConstant(**scan), ESMapConstant(**scan, vdW_cutoff=-2.0)]
+    evaluator = AuxMapEvaluator(aux_maps)
+
+    xyzs = np.array([[0.0, 0.0, 0.0], [1.4, 0.0, 0.0], [2.1, 1.2, 0.0], [1.4, 2.4, 0.0], [0.0, 2.4, 0.0], [-0.7, 1.2, 0.0], [3.2, 1.2, 0.3], [-1.8, 1.2, 0.0]])
+    Zs = np.array([6, 6, 6, 7, 6, 6, 8, 1])
+    qs = np.array([-0.1, 0.1, -0.1, 0.2, -0.1, 0.1, -0.2, 0.1])
+    rots = [np.eye(3), np.array([[1.0, 0.0, 0.0], [0.0, np.cos(0.3), -np.sin(0.3)], [0.0, np.sin(0.3), np.cos(0.3)]])]
+    samples = [(np.concatenate([xyzs + shift, qs[:, None]], axis=1), Zs, None, rot) for shift in [0.0, 0.5] for rot in rots]
+
+    # The maps of all of the samples evaluated together match the maps evaluated separately
+    for sample in samples:
+        evaluator.enqueue(*sample)
+    Ys_batch = evaluator.finish()
+    assert len(Ys_batch) == len(samples)
+    for sample, Ys in zip(samples, Ys_batch):
+        assert len(Ys) == len(aux_maps)
+        for aux_map, Y in zip(aux_maps, Ys):
+            Y_ref = aux_map(*sample)
+            assert Y.shape == Y_ref.shape
+            assert np.allclose(Y, Y_ref, atol=1e-6)
+
+    # A single sample
+    Ys = evaluator(*samples[0])
+    for Y, Y_ref in zip(Ys, Ys_batch[0]):
+        assert np.allclose(Y, Y_ref, atol=1e-6)
+
+
+def test_shards(tmp_path):
+    n_sample = 7
+    n_atoms = 6
+
+    def generator():
+        rng = np.random.default_rng(0)
+        for i in range(n_sample):
+            rot = np.linalg.qr(rng.normal(size=(3, 3)))[0]
+            yield {"xyzs": 10 * rng.random((n_atoms + i, 3)), "Zs": rng.integers(1, 16, n_atoms + i), "rot": rot, "mol_id": 100 + i}
+
+    afmulator = AFMulator(scan_dim=(32, 32, 20), scan_window=((0, 0, 5), (8, 8, 7)))
+    aux_maps = [AtomicDisks(scan_dim=(32, 32, 20), scan_window=((0, 0, 5), (8, 8, 7)))]
+    trainer = GeneratorAFMtrainer(afmulator, aux_maps, generator(), batch_size=3, iZPPs=[8, 54])
+
+    # Write the batches while also keeping them in memory for comparison
+    samples = []
+    rots = []
+    with ShardWriter(tmp_path / "data", samples_per_shard=3, compress=True, tips=[8, 54]) as writer:
+        for Xs, Ys, mols, sws in trainer:
+            writer.add_batch(Xs, Ys, mols, sws, rots=trainer.batch_rots, mol_ids=trainer.batch_mol_ids)
+            samples += list(zip(Xs, Ys, mols, sws))
+            rots += list(trainer.batch_rots)
+    assert len(writer) == n_sample
+
+    dataset = ShardedDataset(tmp_path / "data", max_cached_shards=1)
+    assert len(dataset) == n_sample
+    assert dataset.meta["n_shards"] == 3
+    assert dataset.meta["tips"] == [8, 54]
+    assert np.array_equal(dataset.index["mol_id"], np.arange(100, 100 + n_sample))
+    assert np.allclose(dataset.index["rot"], np.array(rots))
+
+    # Random access
+    for i in [5, 0, 6, 2, -1]:
+        X, Y, mol, sw = dataset[i]
+        X_ref, Y_ref, mol_ref, sw_ref = samples[i]
+        assert X.dtype == np.float32
+        assert np.allclose(X, X_ref, rtol=1e-6)
+        assert np.allclose(Y, Y_ref, rtol=1e-6)
+        assert np.allclose(mol, mol_ref)
+        assert np.allclose(sw, sw_ref)
+        assert np.allclose(sw, dataset.index["sw"][i])
+    assert len(dataset._cache) == 1
+
+    # Shuffled batches cover all of the samples exactly once
+    mol_sizes = []
+    for Xs, Ys, mols, sws in dataset.batches(batch_size=2, shuffle=True):
+        assert Xs.shape[1:] == (2, 32, 32, 11)
+        assert Ys.shape[1:] == (1, 32, 32)
+        assert sws.shape[1:] == (2, 2, 3)
+        mol_sizes += [len(mol) for mol in mols]
+    assert sorted(mol_sizes) == list(range(n_atoms, n_atoms + n_sample))
+
+    # Writing directly from the trainer
+    trainer = GeneratorAFMtrainer(afmulator, aux_maps, generator(), batch_size=4, iZPPs=[8])
+    assert trainer.write_shards(tmp_path / "data2", samples_per_shard=5) == n_sample
+    dataset = ShardedDataset(tmp_path / "data2")
+    assert len(dataset) == n_sample
+    assert dataset[3][0].shape == (1, 32, 32, 11)
+
+
+def test_InverseAFMtrainer_write_shards(tmp_path):
+    from ppafm.io import saveXYZ
+
+    rng = np.random.default_rng(0)
+    paths = []
+    for i in range(3):
+        path = str(tmp_path / f"mol_{i}.xyz")
+        saveXYZ(path, 3 * rng.random((4 + i, 3)), np.full(4 + i, 6), np.zeros(4 + i))
+        paths.append(path)
+
+    afmulator = AFMulator(scan_dim=(32, 32, 20), scan_window=((0, 0, 5), (8, 8, 7)))
+    aux_maps = [AtomicDisks(scan_dim=(32, 32, 20), scan_window=((0, 0, 5), (8, 8, 7)))]
+    trainer = InverseAFMtrainer(afmulator, aux_maps, paths, batch_size=4)
+    molecules = [mol.copy() for mol in trainer.molecules]
+
+    # The rotations of successive augmentations are composed, and they follow the molecules when shuffled
+    a = 0.4
+    rotations = [np.eye(3), np.array([[np.cos(a), -np.sin(a), 0.0], [np.sin(a), np.cos(a), 0.0], [0.0, 0.0, 1.0]])]
+    trainer.augment_with_rotations(rotations)
+    trainer.augment_with_rotations(rotations[1:])
+    trainer.shuffle_molecules()
+    assert len(trainer.molecule_rots) == len(trainer.molecules) == 6
+
+    assert trainer.write_shards(tmp_path / "data", samples_per_shard=4) == 6
+    dataset = ShardedDataset(tmp_path / "data")
+    assert len(dataset) == 6
+    n_rotated = 0
+    for i in range(len(dataset)):
+        rot = dataset.index["rot"][i]
+        mol = dataset[i][2]
+        n_rotated += np.allclose(rot, np.dot(rotations[1], rotations[1]))
+        # The molecule is the rotation of one of the input molecules, up to a translation
+        matches = [mol_ref for mol_ref in molecules if len(mol_ref) == len(mol)]
+        assert len(matches) == 1
+        xyzs_ref = np.dot(matches[0][:, :3], rot.T)
+        assert np.allclose(mol[:, :3] - mol[:, :3].mean(axis=0), xyzs_ref - xyzs_ref.mean(axis=0), atol=1e-5)
+    assert n_rotated == 3
+
+
+def test_molecule_database(tmp_path):
+    from ppafm.io import saveXYZ
+
+    rng = np.random.default_rng(0)
+    xyz_dir = tmp_path / "xyzs"
+    xyz_dir.mkdir()
+    mols = []
+    for i in range(5):
+        xyzs = 10 * rng.random((3 + i, 3))
+        Zs = rng.integers(1, 16, 3 + i)
+        qs = rng.random(3 + i) - 0.5
+        saveXYZ(str(xyz_dir / f"mol_{i}.xyz"), xyzs, Zs, qs)
+        mols.append((xyzs, Zs, qs))
+
+    db = MoleculeDatabase.from_xyz_dir(xyz_dir, tmp_path / "db")
+    db = MoleculeDatabase(tmp_path / "db")
+    assert len(db) == 5
+    assert db.names == [f"mol_{i}" for i in range(5)]
+    assert db.atoms.shape == (sum(len(Zs) for _, Zs, _ in mols), 5)
+
+    # Iteration yields sample dicts in order
+    for i, (sample, (xyzs, Zs, qs)) in enumerate(zip(db, mols)):
+        assert sample["mol_id"] == i
+        assert np.allclose(sample["xyzs"], xyzs)
+        assert np.array_equal(sample["Zs"], Zs)
+        assert np.allclose(sample["qs"], qs)
+        assert np.allclose(db.get_atoms(i), np.concatenate([xyzs, qs[:, None], Zs[:, None]], axis=1))
+    assert db[-1]["mol_id"] == 4
+
+    # Shuffled iteration covers every molecule once
+    db.shuffle = True
+    assert sorted(sample["mol_id"] for sample in db) == list(range(5))
@@ -94,3 +94,146 @@ def test_load_aims():
     assert np.allclose(lvec, np.array([[0.0, 0.0, 0.0], [4.0, 0.0, 0.0], [1.0, 5.0, 0.0], [0.0, 0.0, 6.0]]))
 
     os.remove(temp_file)
+
+
+def test_load_geometry_and_grid():
+    from ppafm import common
+    from ppafm.io import (
+        Hartree2eV,
+        bohrRadius2angstroem,
+        loadCUBE,
+        loadGeometry,
+        loadGeometryAndGrid,
+        loadXSF,
+        primcoords2Xsf,
+        saveXSF,
+    )
+
+    data = np.random.rand(4, 5, 6)  # (x, y, z)
+    Zs = [6, 8]
+    xyzs = np.array([[1.0, 2.0, 3.0], [2.0, 1.5, 3.5]])
+
+    # Cube file, lengths in bohr
+    cube_file = "io_test.cube"
+    with open(cube_file, "w") as f:
+        f.write("comment\ncomment\n")
+        f.write(f"{len(Zs)} 0.5 0.0 0.0\n")
+        for i, n in enumerate(data.shape):
+            step = np.zeros(3)
+            step[i] = 0.2
+            f.write(f"{n} {step[0]} {step[1]} {step[2]}\n")
+        for Z, xyz in zip(Zs, xyzs / bohrRadius2angstroem):
+            f.write(f"{Z} 0.0 {xyz[0]} {xyz[1]} {xyz[2]}\n")
+        for i, v in enumerate(data.flat):
+            f.write(f"{v:.8e}" + ("\n" if i % 6 == 5 else " "))
+
+    # Xsf file with the same data in (z, y, x) order
+    xsf_file = "io_test.xsf"
+    lvec = np.array([[0.5, 0.0, 0.0], [4.0, 0.0, 0.0], [0.0, 5.0, 0.0], [0.0, 0.0, 6.0]])
+    saveXSF(xsf_file, data.T, lvec, head=primcoords2Xsf(Zs, xyzs.T, lvec), verbose=0)
+
+    for fname, loader in [(cube_file, loadCUBE), (xsf_file, loadXSF)]:
+        atoms, nDim, lvec_geom, (F, lvec_grid, nDim_grid, head) = loadGeometryAndGrid(fname, parameters=common.PpafmParameters(), verbose=False)
+        atoms_ref, nDim_ref, lvec_ref = loadGeometry(fname, parameters=common.PpafmParameters())
+        F_ref, lvec_grid_ref, nDim_grid_ref, head_ref = loader(fname, verbose=False)
+        assert np.allclose(atoms, atoms_ref, atol=1e-5)
+        assert np.allclose(atoms[1:4], xyzs.T, atol=1e-5)
+        assert np.allclose(nDim, nDim_ref)
+        assert np.allclose(lvec_geom, lvec_ref)
+        assert np.allclose(F, F_ref)
+        assert np.allclose(lvec_grid, lvec_grid_ref)
+        assert np.allclose(nDim_grid, nDim_grid_ref)
+        assert head == head_ref
+        scale = Hartree2eV if fname == cube_file else 1.0
+        assert np.allclose(F, data.T * scale, rtol=1e-5)
+
+    os.remove(cube_file)
+    os.remove(xsf_file)
+
+
+def test_save_fields():
+    from ppafm.io import (
+        load_scal_field,
+        load_vec_field,
+        save_scal_field,
+        save_vec_field,
+    )
+
+    rng = np.random.default_rng(0)
+    lvec = np.array([[0.0, 0.0, 0.0], [4.0, 0.0, 0.0], [0.0, 5.0, 0.0], [0.0, 0.0, 6.0]])
+    FF = rng.uniform(-1, 1, size=(6, 7, 8, 4)).transpose(2, 1, 0, 3)[..., :3]  # Strided view as in DataGrid.to_file
+    F = FF[..., 2]
+
+    # Xsf values are written with periodic copies of the first points and with 6 significant digits
+    save_scal_field("io_test", F, lvec, data_format="xsf")
+    save_vec_field("io_test", FF, lvec, data_format="xsf")
+    F_, lvec_, nDim, _ = load_scal_field("io_test", data_format="xsf")
+    FF_, _, _, _ = load_vec_field("io_test", data_format="xsf")
+    assert np.allclose(F_, F, rtol=1e-5, atol=1e-5)
+    assert np.allclose(FF_, FF, rtol=1e-5, atol=1e-5)
+    assert np.allclose(lvec_, lvec)
+    assert np.allclose(nDim, F.shape)
+    with open("io_test.xsf") as f:
+        lines = f.readlines()
+    i0 = [i for i, line in enumerate(lines) if "BEGIN_DATAGRID_3D" in line][0] + 6
+    data = np.array([float(v) for v in lines[i0:-2]]).reshape(np.array(F.shape) + 1)
+    assert np.allclose(data[-1], data[0]) and np.allclose(data[:, -1], data[:, 0]) and np.allclose(data[:, :, -1], data[:, :, 0])
+
+    # Npy files with float32 data and compression are loaded back as float64
+    for dtype, compress in [(None, False), (np.float32, False), (np.float32, True)]:
+        save_scal_field("io_test", F, lvec, data_format="npy", dtype=dtype, compress=compress)
+        save_vec_field("io_test_vec", FF, lvec, data_format="npy", dtype=dtype, compress=compress)
+        F_, lvec_, _, _ = load_scal_field("io_test", data_format="npy")
+        FF_, _, _, _ = load_vec_field("io_test_vec", data_format="npy")
+        assert F_.dtype == np.float64 and F_.flags["C_CONTIGUOUS"]
+        assert FF_.dtype == np.float64 and FF_.flags["C_CONTIGUOUS"]
+        assert np.allclose(F_, F, rtol=1e-6)
+        assert np.allclose(FF_, FF, rtol=1e-6)
+        assert np.allclose(lvec_, lvec)
+        with np.load("io_test_vec.npz") as f:
+            assert f["FF"].dtype == (dtype or np.float64)
+
+    for fname in ["io_test.xsf", "io_test_x.xsf", "io_test_y.xsf", "io_test_z.xsf", "io_test.npz", "io_test_vec.npz"]:
+        os.remove(fname)
+
+
+def test_open_fields():
+    from ppafm.io import (
+        LazyField,
+        load_scal_field,
+        load_vec_field,
+        open_scal_field,
+        open_vec_field,
+        save_scal_field,
+        save_vec_field,
+    )
+
+    rng = np.random.default_rng(0)
+    lvec = np.array([[0.0, 0.0, 0.0], [4.0, 0.0, 0.0], [0.0, 5.0, 0.0], [0.0, 0.0, 6.0]])
+    F = rng.uniform(-1, 1, size=(9, 7, 8))
+    FF = rng.uniform(-1, 1, size=(9, 7, 8, 3))
+
+    for data_format, compress in [("xsf", False), ("npy", False), ("npy", True)]:
+        save_scal_field("io_test", F, lvec, data_format=data_format, compress=compress)
+        save_vec_field("io_test_vec", FF, lvec, data_format=data_format, compress=compress)
+        F_ref, _, nDim_ref, _ = load_scal_field("io_test", data_format=data_format)
+        FF_ref, _, _, _ = load_vec_field("io_test_vec", data_format=data_format)
+        F_, lvec_, nDim, _ = open_scal_field("io_test", data_format=data_format)
+        FF_, _, _, _ = open_vec_field("io_test_vec", data_format=data_format)
+
+        assert isinstance(F_, LazyField) and isinstance(FF_, LazyField)
+        assert F_.shape == F_ref.shape and FF_.shape == FF_ref.shape
+        assert np.allclose(lvec_, lvec)
+        assert np.allclose(nDim, nDim_ref)
+        # Read slices out of order, so that the xsf offsets are found both by skipping ahead and from earlier offsets
+        for i in [5, 2, 8, 0, -1]:
+            assert np.allclose(F_[i], F_ref[i])
+            assert np.allclose(FF_[i], FF_ref[i])
+        assert np.allclose(F_[3:7], F_ref[3:7])
+        assert np.allclose(F_[1:8:3, 2], F_ref[1:8:3, 2])
+        assert np.allclose(FF_[4:6, :, :, 2], FF_ref[4:6, :, :, 2])
+        assert np.allclose(F_[[6, 1]], F_ref[[6, 1]])
+        assert np.allclose(np.asarray(FF_), FF_ref)
+
+    for fname in ["io_test.xsf", "io_test_vec_x.xsf", "io_test_vec_y.xsf", "io_test_vec_z.xsf", "io_test.npz", "io_test_vec.npz"]:
+        os.remove(fname)